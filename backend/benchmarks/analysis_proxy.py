@@ -0,0 +1,117 @@
+"""
+Analysis proxy benchmark
+Encodes the ingest-time analysis proxy of a recording and runs the video
+analysis reads against the original and against the proxy: bytes on disk,
+motion-energy curve time, frame-bus decode of pose batches and the time to
+cut one analysis clip (re-encode from the original, stream copy from the proxy)
+
+The motion curves of both renditions are compared so any loss from analyzing
+the proxy shows up as their correlation next to the time saved.
+
+Usage:
+    python backend/benchmarks/analysis_proxy.py [--video clip.mp4] [--duration 300] [--clip-seconds 60]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from cme_media_ingest import PROXY_FPS, PROXY_HEIGHT, proxy_clip_start, proxy_encode_command  # noqa: E402
+from frame_bus import FrameBatchConsumer, FrameBus, probe_video  # noqa: E402
+from motion_prefilter import motion_energy_curve  # noqa: E402
+
+
+def make_synthetic_clip(path: str, duration: float, size: str = '1280x720', rate: int = 30) -> None:
+    """Render a deterministic moving test pattern with ffmpeg"""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={rate}:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        path
+    ], check=True)
+
+
+def timed(function, *args, **kwargs) -> tuple:
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def pose_decode(video: str, fps: float) -> int:
+    """Decode pose batches through the frame bus without inference"""
+    consumer = FrameBatchConsumer(fps, 32, width=640)
+    bus = FrameBus(video)
+    bus.register(consumer)
+    bus.start()
+    frames = sum(len(batch) for batch in consumer.batches())
+    bus.wait()
+    return frames
+
+
+def cut_original(video: str, start: float, duration: float, output: str) -> None:
+    """Per-test clip from the original as extraction did before the proxy"""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-nostdin', '-y', '-ss', f"{start:.3f}", '-i', video, '-t', f"{duration:.3f}",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-an', output
+    ], check=True)
+
+
+def cut_proxy(proxy: str, start: float, duration: float, output: str) -> None:
+    """Stream-copy cut from the proxy keyframe at or before start"""
+    media_start = proxy_clip_start(start)
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-nostdin', '-y', '-ss', f"{media_start:.3f}", '-i', proxy,
+        '-t', f"{start + duration - media_start:.3f}", '-map', '0:v:0', '-c', 'copy', output
+    ], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video', default=None, help='Recording to analyze (default: synthetic test pattern)')
+    parser.add_argument('--duration', type=float, default=300.0, help='Synthetic clip length in seconds')
+    parser.add_argument('--height', type=int, default=PROXY_HEIGHT, help='Proxy height')
+    parser.add_argument('--fps', type=float, default=PROXY_FPS, help='Proxy frame rate')
+    parser.add_argument('--clip-seconds', type=float, default=60.0, help='Length of the clip cut')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video = args.video
+        if not video:
+            video = os.path.join(temp_dir, 'synthetic.mp4')
+            make_synthetic_clip(video, args.duration)
+        duration = probe_video(video)['duration']
+
+        proxy = os.path.join(temp_dir, 'proxy.mp4')
+        _, encode_seconds = timed(subprocess.run, proxy_encode_command(video, proxy, args.height, args.fps), check=True)
+        print(f"proxy {args.height}p {args.fps:g} fps encoded in {encode_seconds:.2f}s (once per session)")
+
+        clip_start = round(duration / 3, 2) + 0.4
+        clip_seconds = min(args.clip_seconds, duration - clip_start)
+        rows, curves = {}, {}
+        for name, path, cut in (('original', video, cut_original), ('proxy', proxy, cut_proxy)):
+            curves[name], motion_seconds = timed(motion_energy_curve, path)
+            frames, pose_seconds = timed(pose_decode, path, args.fps)
+            _, cut_seconds = timed(cut, path, clip_start, clip_seconds, os.path.join(temp_dir, f'{name}_clip.mp4'))
+            rows[name] = (os.path.getsize(path), motion_seconds, pose_seconds, frames, cut_seconds)
+
+        print(f"{'rendition':>10} {'MiB':>8} {'motion_s':>9} {'pose_decode_s':>14} {'frames':>7} {'clip_cut_s':>11}")
+        for name, (size, motion_seconds, pose_seconds, frames, cut_seconds) in rows.items():
+            print(f"{name:>10} {size / 2 ** 20:>8.1f} {motion_seconds:>9.2f} {pose_seconds:>14.2f} "
+                  f"{frames:>7} {cut_seconds:>11.2f}")
+
+        # Both curves are on the same analysis grid; compare where they overlap
+        length = min(len(curves['original']['energy']), len(curves['proxy']['energy']))
+        agreement = np.corrcoef(curves['original']['energy'][1:length], curves['proxy']['energy'][1:length])[0, 1]
+        print(f"motion curve correlation (original vs proxy): {agreement:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Audio demeanor benchmark
+Writes a synthetic two-speaker conversation (harmonic voices taking turns, with
+a few shouted stretches) as a 16 kHz WAV and runs raised-voice detection on it
+through the ffmpeg PCM stream, reporting speed, peak memory and which of the
+shouted stretches were found
+
+Each length runs in a fresh process so peak RSS shows whether memory grows
+with the recording.
+
+Usage:
+    python backend/benchmarks/audio_demeanor.py [--minutes 10 60]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from audio_demeanor import AUDIO_SAMPLE_RATE, detect_raised_voice  # noqa: E402
+
+TURN_SECONDS = 5.0
+SHOUT_EVERY_SECONDS = 600.0
+
+
+def voice(f0: float, seconds: float, dbfs: float, sample_rate: int = AUDIO_SAMPLE_RATE) -> np.ndarray:
+    """Harmonic tone with vibrato and a syllable-rate envelope at the given RMS level"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    phase = 2 * np.pi * np.cumsum(f0 * (1 + 0.02 * np.sin(2 * np.pi * 3 * t))) / sample_rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, 8)) * (0.6 + 0.4 * np.abs(np.sin(2 * np.pi * 2 * t)))
+    return signal / np.sqrt(np.mean(signal ** 2)) * 10 ** (dbfs / 20)
+
+
+def write_conversation(path: str, minutes: float) -> tuple:
+    """WAV file, diarization-shaped transcript and the shouted (start, end) stretches"""
+    rng = np.random.default_rng(0)
+    total = int(minutes * 60)
+    segments, shouts = [], []
+    with wave.open(path, 'wb') as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(AUDIO_SAMPLE_RATE)
+        # One turn at a time, so the writer's memory does not grow either
+        for turn, start in enumerate(np.arange(0, total, TURN_SECONDS)):
+            speaker = turn % 2
+            f0, level = (120, -26) if speaker == 0 else (210, -30)
+            if speaker == 0 and start % SHOUT_EVERY_SECONDS == 300:
+                f0, level = 175, -12
+                shouts.append((float(start), float(start + 4.5)))
+            audio = rng.normal(0, 10 ** (-60 / 20), int(TURN_SECONDS * AUDIO_SAMPLE_RATE))
+            audio[:int(4.5 * AUDIO_SAMPLE_RATE)] += voice(f0, 4.5, level)
+            output.writeframes((np.clip(audio, -1, 0.99997) * 32768).astype('<i2').tobytes())
+            segments.append({'start_time': str(start), 'end_time': str(start + 4.5), 'speaker_label': f'spk_{speaker}'})
+    return {'results': {'speaker_labels': {'segments': segments}}}, shouts
+
+
+def run_one(minutes: float) -> None:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'conversation.wav')
+        transcript, shouts = write_conversation(path, minutes)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        result = detect_raised_voice(path, transcript)
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        found = sum(
+            any(i['start'] < end and i['end'] > start and i['speaker_label'] == 'spk_0' for i in result['intervals'])
+            for start, end in shouts
+        )
+        print(f"{minutes:>6.0f} min  {result['processing_seconds']:>7.2f}s  {result['realtime_factor']:>7.0f}x real time  "
+              f"peak RSS {peak / 1024:>6.0f} MiB (+{(peak - before) / 1024:.0f} during detection)  "
+              f"shouts found {found}/{len(shouts)}  intervals {len(result['intervals'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--minutes', type=float, nargs='+', default=[10.0, 60.0], help='Conversation lengths')
+    parser.add_argument('--single', type=float, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        run_one(args.single)
+        return
+    for minutes in args.minutes:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--single', str(minutes)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Frame bus decode benchmark
+Feeds motion-energy, pose-batch, sprite-sheet and snapshot consumers from one
+shared decode and from one decode per consumer, reporting wall time, CPU time,
+decoded frames, decoder stall time and peak memory of each
+
+Every mode runs in a fresh child process so its peak RSS is its own. Pose
+batches are drained without inference (--pose runs MediaPipe on them) so the
+numbers isolate decoding; --slow-ms adds a consumer that sleeps per frame to
+show backpressure holding memory flat while the decoder waits.
+
+Usage:
+    python backend/benchmarks/frame_bus.py [--video clip.mp4] [--duration 120] [--slow-ms 0]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from frame_bus import (  # noqa: E402
+    FrameBatchConsumer, FrameBus, FrameConsumer, MotionEnergyConsumer, SnapshotConsumer, SpriteSheetConsumer,
+    probe_video
+)
+
+MODES = ('shared', 'separate')
+
+
+class SlowConsumer(FrameConsumer):
+    """Stands in for a consumer slower than the decoder"""
+
+    name = 'slow'
+
+    def __init__(self, fps: float, delay: float):
+        super().__init__(fps, 320)
+        self.delay = delay
+        self.frames = 0
+
+    def consume(self, timestamp, frame):
+        time.sleep(self.delay)
+        self.frames += 1
+
+    def finish(self):
+        return self.frames
+
+
+def make_synthetic_clip(path: str, duration: float, size: str = '1280x720', rate: int = 30) -> None:
+    """Render a deterministic moving test pattern with ffmpeg"""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={rate}:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        path
+    ], check=True)
+
+
+def build_consumers(args, duration: float) -> list:
+    consumers = [
+        MotionEnergyConsumer(5.0),
+        FrameBatchConsumer(args.pose_fps, 32, width=640),
+        SpriteSheetConsumer(10.0, 160, 90, 10, 10, lambda index, sheet: None),
+        SnapshotConsumer([duration * i / (args.snapshots + 1) for i in range(1, args.snapshots + 1)], width=640)
+    ]
+    if args.slow_ms:
+        consumers.append(SlowConsumer(5.0, args.slow_ms / 1000.0))
+    return consumers
+
+
+def drain_batches(consumer: FrameBatchConsumer, pose: bool) -> threading.Thread:
+    """Read pose batches while the bus runs, optionally running MediaPipe on them"""
+    def run():
+        if pose:
+            from cme_video_processor import PoseEstimationEngine
+            PoseEstimationEngine.estimate_poses_on_batches(consumer.batches())
+        else:
+            for _ in consumer.batches():
+                pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def run_buses(video: str, consumers: list, shared: bool, pose: bool) -> dict:
+    groups = [consumers] if shared else [[consumer] for consumer in consumers]
+    totals = {'frames_decoded': 0, 'stalled_seconds': 0.0, 'ring_bytes': 0, 'decoder': None}
+
+    # Separate decodes run concurrently, as independent pipeline steps would
+    buses = []
+    for group in groups:
+        bus = FrameBus(video)
+        for consumer in group:
+            bus.register(consumer)
+        bus.start()
+        buses.append(bus)
+    readers = [drain_batches(c, pose) for c in consumers if isinstance(c, FrameBatchConsumer)]
+
+    for bus in buses:
+        stats = bus.wait()
+        totals['frames_decoded'] += stats['frames_decoded']
+        totals['stalled_seconds'] += stats['stalled_seconds']
+        totals['ring_bytes'] += stats['ring_bytes']
+        totals['decoder'] = stats['decoder']
+    for reader in readers:
+        reader.join()
+    return totals
+
+
+def child(args) -> None:
+    """Run one mode and print its measurements as JSON"""
+    consumers = build_consumers(args, args.clip_duration)
+    before = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    totals = run_buses(args.video, consumers, args.mode == 'shared', args.pose)
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = sum((a.ru_utime + a.ru_stime) - (b.ru_utime + b.ru_stime) for a, b in zip(after, before))
+    print(json.dumps({
+        **totals,
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        # ru_maxrss is KiB on Linux; ffmpeg children report their own peak
+        'peak_rss_mib': round(after[0].ru_maxrss / 1024, 1),
+        'peak_decoder_rss_mib': round(after[1].ru_maxrss / 1024, 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video', default=None, help='Clip to decode (default: synthetic test pattern)')
+    parser.add_argument('--duration', type=float, default=120.0, help='Synthetic clip length in seconds')
+    parser.add_argument('--pose-fps', type=float, default=5.0, help='Pose batch sampling rate')
+    parser.add_argument('--snapshots', type=int, default=8, help='Snapshot times spread over the clip')
+    parser.add_argument('--slow-ms', type=float, default=0.0, help='Add a consumer sleeping this long per frame')
+    parser.add_argument('--pose', action='store_true', help='Run MediaPipe on pose batches')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--clip-duration', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video = args.video
+        duration = args.duration
+        if video:
+            duration = probe_video(video)['duration']
+        else:
+            video = os.path.join(temp_dir, 'synthetic.mp4')
+            make_synthetic_clip(video, duration)
+
+        print(f"{'mode':>9} {'decoded':>8} {'wall_s':>7} {'cpu_s':>7} {'stall_s':>8} "
+              f"{'ring_MiB':>9} {'rss_MiB':>8} {'ffmpeg_MiB':>11}")
+        for mode in MODES:
+            command = [sys.executable, os.path.abspath(__file__), '--mode', mode, '--video', video,
+                       '--clip-duration', str(duration), '--pose-fps', str(args.pose_fps),
+                       '--snapshots', str(args.snapshots), '--slow-ms', str(args.slow_ms)]
+            if args.pose:
+                command.append('--pose')
+            result = json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+            print(f"{mode:>9} {result['frames_decoded']:>8} {result['wall_seconds']:>7.2f} "
+                  f"{result['cpu_seconds']:>7.2f} {result['stalled_seconds']:>8.2f} "
+                  f"{result['ring_bytes'] / 2 ** 20:>9.1f} {result['peak_rss_mib']:>8.1f} "
+                  f"{result['peak_decoder_rss_mib']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
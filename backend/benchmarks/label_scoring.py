@@ -0,0 +1,125 @@
+"""
+Rekognition label scoring benchmark
+Scores a corpus of label-detection responses with the legacy substring matcher
+and with the label → movement index, reporting time per test, expected-movement
+hit rate and agreement with the annotated verdict
+
+The bundled corpus (corpus/rekognition_labels.jsonl) is hand-written in the
+get_label_detection response shape. Recorded responses can be added as more
+lines with the same fields: case, test_type, annotation.motion_present,
+persons and label_pages (raw response pages).
+
+Usage:
+    python backend/benchmarks/label_scoring.py [--corpus corpus.jsonl] [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from cme_video_processor import (  # noqa: E402
+    LABEL_MOVEMENT_INDEX, TEST_MOTION_EXPECTATIONS, analyze_rekognition_results
+)
+from rekognition_store import MIN_LABEL_CONFIDENCE, RekognitionTimeline  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'rekognition_labels.jsonl')
+
+
+def legacy_movements_found(timeline: RekognitionTimeline, expected_movements: list) -> list:
+    """The substring matcher analyze_rekognition_results used before the index"""
+    motion_labels = timeline.label_names(min_confidence=MIN_LABEL_CONFIDENCE)
+    found = []
+    for expected in expected_movements:
+        for label in motion_labels:
+            if expected.lower() in label.lower():
+                found.append(expected)
+                break
+    return found
+
+
+def legacy_verdict(found: list, expected_movements: list, person_count: int) -> str:
+    if len(found) >= len(expected_movements) * 0.7:
+        return 'performed'
+    return 'brief' if found else 'not_observed'
+
+
+def load_corpus(path: str) -> list:
+    cases = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                case = json.loads(line)
+                case['timeline'] = RekognitionTimeline.from_pages('motion_analysis', case['label_pages'])
+                cases.append(case)
+    return cases
+
+
+def observed(verdict: str) -> bool:
+    return verdict in ('performed', 'brief')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSONL corpus of label-detection responses')
+    parser.add_argument('--repeat', type=int, default=200, help='Timing repetitions per case')
+    parser.add_argument('--verbose', action='store_true', help='Print per-case results')
+    args = parser.parse_args()
+
+    cases = load_corpus(args.corpus)
+    totals = {'legacy': {'hits': 0, 'agree': 0, 'seconds': 0.0}, 'index': {'hits': 0, 'agree': 0, 'seconds': 0.0}}
+    expected_total = 0
+
+    for case in cases:
+        timeline = case['timeline']
+        expected = TEST_MOTION_EXPECTATIONS[case['test_type']]['expected_movements']
+        annotated = observed(case['annotation']['motion_present'])
+        expected_total += len(expected)
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            legacy_found = legacy_movements_found(timeline, expected)
+        totals['legacy']['seconds'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            index_found = LABEL_MOVEMENT_INDEX.movements_found(timeline, expected, MIN_LABEL_CONFIDENCE)
+        totals['index']['seconds'] += time.perf_counter() - started
+
+        motion_result = {'status': 'COMPLETED', 'timeline': timeline}
+        persons = RekognitionTimeline.from_pages('pose_detection', [{'Persons': [
+            {'Timestamp': 0, 'Person': {'Index': i}} for i in range(case.get('persons', 0))]}])
+        index_verdict = analyze_rekognition_results(
+            motion_result, {'status': 'COMPLETED', 'timeline': persons}, case['test_type'])[0]
+        legacy = legacy_verdict(legacy_found, expected, case.get('persons', 0))
+
+        totals['legacy']['hits'] += len(legacy_found)
+        totals['index']['hits'] += len(index_found)
+        totals['legacy']['agree'] += observed(legacy) == annotated
+        totals['index']['agree'] += observed(index_verdict) == annotated
+
+        if args.verbose:
+            print(f"{case['case']:>24} {case['annotation']['motion_present']:>13} "
+                  f"legacy={legacy:<13} index={index_verdict:<13} found={sorted(index_found)}")
+
+    print(f"cases={len(cases)} expected_movements={expected_total} rows={sum(len(c['timeline']) for c in cases)}")
+    print(f"{'scorer':>8} {'us/test':>9} {'hit_rate':>9} {'agreement':>10}")
+    for name, total in totals.items():
+        per_test = total['seconds'] / (len(cases) * args.repeat) * 1e6
+        print(f"{name:>8} {per_test:>9.1f} {total['hits'] / max(expected_total, 1):>9.2f} "
+              f"{total['agree'] / max(len(cases), 1):>10.2f}")
+
+    # Vocabulary-wide view: which movements no corpus label ever supports
+    evidence = np.max([LABEL_MOVEMENT_INDEX.movement_evidence(c['timeline'], MIN_LABEL_CONFIDENCE)
+                       for c in cases], axis=0)
+    unsupported = [m for m, e in zip(LABEL_MOVEMENT_INDEX.movements, evidence) if e == 0]
+    print(f"movements without label evidence in corpus: {len(unsupported)}/{len(LABEL_MOVEMENT_INDEX.movements)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Pose store benchmark
+Writes a synthetic session pose track (smooth per-landmark random walks at the
+pose sampling rate, with dropped frames) to the pose store and compares its
+size and time-range reads with one compressed float32 .npz of the whole track
+
+Reads go to a local directory standing in for S3, so times exclude network
+latency; bytes read are what a Lambda would transfer.
+
+Usage:
+    python backend/benchmarks/pose_store.py [--hours 3] [--fps 5] [--window 60]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from pose_store import PoseTrackStore  # noqa: E402
+
+
+class DirectoryS3:
+    """put_object / ranged get_object / list_objects_v2 over a local directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        os.makedirs(os.path.dirname(self._path(Key)), exist_ok=True)
+        with open(self._path(Key), 'wb') as f:
+            f.write(Body)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, Range: str = None) -> dict:
+        with open(self._path(Key), 'rb') as f:
+            if Range:
+                first, last = (int(value) for value in Range[len('bytes='):].split('-'))
+                f.seek(first)
+                data = f.read(last - first + 1)
+            else:
+                data = f.read()
+        return {'Body': io.BytesIO(data)}
+
+    def get_paginator(self, name: str):
+        root = self.root
+
+        class Paginator:
+            def paginate(self, Bucket: str, Prefix: str):
+                directory = os.path.join(root, Prefix)
+                names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+                yield {'Contents': [{'Key': Prefix + name} for name in names]}
+
+        return Paginator()
+
+
+def synthetic_track(hours: float, fps: float, seed: int = 0) -> tuple:
+    """Keypoints drifting smoothly around a standing pose, NaN on ~5% of frames"""
+    rng = np.random.default_rng(seed)
+    frames = int(hours * 3600 * fps)
+    base = rng.uniform(0.3, 0.7, size=(1, 1, 33, 3))
+    drift = np.cumsum(rng.normal(0, 0.002, size=(frames, 1, 33, 3)), axis=0)
+    keypoints = np.clip(base + drift - drift.mean(axis=0), 0, 1).astype(np.float32)
+    keypoints[..., 2] = rng.uniform(0.5, 1.0, size=(frames, 1, 33))
+    keypoints[rng.random(frames) < 0.05] = np.nan
+    return np.arange(frames) / fps, keypoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=3.0, help='Session length')
+    parser.add_argument('--fps', type=float, default=5.0, help='Pose sampling rate')
+    parser.add_argument('--window', type=float, default=60.0, help='Seconds per range query')
+    parser.add_argument('--parts', type=int, default=12, help='Estimation runs the track is written as')
+    args = parser.parse_args()
+
+    timestamps, keypoints = synthetic_track(args.hours, args.fps)
+    root = tempfile.mkdtemp()
+    try:
+        s3 = DirectoryS3(os.path.join(root, 's3'))
+        store = PoseTrackStore('bench', 'session', s3_client=s3, cache_dir=os.path.join(root, 'cache'))
+
+        started = time.perf_counter()
+        stored = sum(
+            store.write(t, k, 16 / 9, args.fps)['stored_bytes']
+            for t, k in zip(np.array_split(timestamps, args.parts), np.array_split(keypoints, args.parts))
+        )
+        write_seconds = time.perf_counter() - started
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, timestamps=timestamps, keypoints=keypoints)
+        whole = buffer.getvalue()
+
+        print(f"frames={len(timestamps)} raw_float32={keypoints.nbytes / 2 ** 20:.1f} MiB "
+              f"npz_float32={len(whole) / 2 ** 20:.1f} MiB store={stored / 2 ** 20:.1f} MiB "
+              f"(written in {write_seconds:.2f}s)")
+
+        starts = np.random.default_rng(1).uniform(0, timestamps[-1] - args.window, size=20)
+        for label in ('cold', 'warm'):
+            reader = PoseTrackStore('bench', 'session', s3_client=s3, cache_dir=os.path.join(root, 'cache'))
+            started = time.perf_counter()
+            frames = sum(reader.load_range(s, s + args.window)['frames_processed'] for s in starts)
+            seconds = (time.perf_counter() - started) / len(starts)
+            print(f"store {label:>5}: {seconds * 1000:7.2f} ms/query  {frames // len(starts)} frames  "
+                  f"{reader.bytes_read / len(starts) / 1024:8.1f} KiB read/query")
+
+        started = time.perf_counter()
+        for s in starts:
+            with np.load(io.BytesIO(whole)) as data:
+                in_range = (data['timestamps'] >= s) & (data['timestamps'] <= s + args.window)
+                data['keypoints'][in_range]
+        seconds = (time.perf_counter() - started) / len(starts)
+        print(f"npz whole : {seconds * 1000:7.2f} ms/query  {len(whole) / 1024:8.1f} KiB read/query")
+
+        loaded = PoseTrackStore('bench', 'session', s3_client=s3, cache_dir=os.path.join(root, 'cache'))
+        check = loaded.load_range(0, timestamps[-1])
+        error = np.nanmax(np.abs(check['keypoints'] - keypoints))
+        print(f"float16 max abs error: {error:.5f} (normalized coordinates)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
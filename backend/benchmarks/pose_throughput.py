@@ -0,0 +1,56 @@
+"""
+Pose estimation throughput benchmark
+Measures PoseEstimationEngine frames-per-second on a synthetic clip at several
+sampling rates
+
+Usage:
+    python backend/benchmarks/pose_throughput.py [--duration 60] [--rates 1 2 5 10 15]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from cme_video_processor import PoseEstimationEngine, available_cpus  # noqa: E402
+
+
+def make_synthetic_clip(path: str, duration: float, size: str = '1280x720', rate: int = 30) -> None:
+    """Render a deterministic moving test pattern with ffmpeg"""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={rate}:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        path
+    ], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=60.0, help='Synthetic clip length in seconds')
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 2, 5, 10, 15], help='Sampling rates (fps)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: vCPUs)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clip = os.path.join(temp_dir, 'synthetic.mp4')
+        make_synthetic_clip(clip, args.duration)
+
+        print(f"clip={args.duration:.0f}s workers={args.workers or available_cpus()}")
+        print(f"{'sample_fps':>10} {'frames':>7} {'wall_s':>8} {'frames/s':>9} {'x_realtime':>10}")
+
+        for rate in args.rates:
+            started = time.perf_counter()
+            result = PoseEstimationEngine.estimate_poses_mediapipe(clip, sample_fps=rate, workers=args.workers)
+            elapsed = time.perf_counter() - started
+
+            frames = result['frames_processed']
+            print(f"{rate:>10.1f} {frames:>7d} {elapsed:>8.2f} {frames / elapsed:>9.1f} {args.duration / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
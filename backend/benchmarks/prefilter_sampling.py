@@ -0,0 +1,128 @@
+"""
+Adaptive vs uniform pose sampling benchmark
+Runs PoseEstimationEngine on the same frame budget with uniform sampling and
+with the motion-energy prefilter, and scores both against a dense reference
+
+Accuracy needs a clip with a person in it (--video); the synthetic default
+(moving bursts between still stretches) only exercises frame counts and timing.
+
+Usage:
+    python backend/benchmarks/prefilter_sampling.py [--video clip.mp4] [--budgets 30 60 120]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from cme_video_processor import (  # noqa: E402
+    JOINT_ANGLE_SIGNALS, MOVEMENT_RULES, PoseEstimationEngine, compute_joint_signals
+)
+from motion_prefilter import plan_pose_sampling  # noqa: E402
+
+
+def make_bursty_clip(path: str, bursts: int = 4, moving: float = 5.0, still: float = 10.0) -> float:
+    """Render alternating moving test-pattern bursts and frozen stretches"""
+    parts = []
+    for i in range(bursts):
+        start = i * moving
+        parts.append(
+            f"[0]trim={start}:{start + moving},setpts=PTS-STARTPTS,"
+            f"tpad=stop_mode=clone:stop_duration={still}[p{i}]"
+        )
+    inputs = ''.join(f"[p{i}]" for i in range(bursts))
+    graph = ';'.join(parts) + f";{inputs}concat=n={bursts}:v=1:a=0[out]"
+
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={bursts * moving}',
+        '-filter_complex', graph, '-map', '[out]',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        path
+    ], check=True)
+    return bursts * (moving + still)
+
+
+def resample_keypoints(keypoints: np.ndarray, times: np.ndarray, target_times: np.ndarray) -> np.ndarray:
+    """Linearly interpolate a keypoint tensor onto target_times"""
+    if times.shape[0] < 2:
+        return np.full((target_times.shape[0],) + keypoints.shape[1:], np.nan, dtype=np.float32)
+    right = np.clip(np.searchsorted(times, target_times), 1, times.shape[0] - 1)
+    left = right - 1
+    weight = np.clip((target_times - times[left]) / (times[right] - times[left]), 0.0, 1.0)
+    weight = weight.reshape((-1,) + (1,) * (keypoints.ndim - 1))
+    return (keypoints[left] * (1 - weight) + keypoints[right] * weight).astype(np.float32)
+
+
+def score(result, reference) -> tuple:
+    """Joint-angle MAE (degrees) and movement-verdict agreement against the reference"""
+    ref_times = reference['timestamps']
+    resampled = resample_keypoints(result['keypoints'], result['timestamps'], ref_times)
+
+    ref_signals = compute_joint_signals(reference['keypoints'], ref_times, reference['aspect_ratio'])
+    signals = compute_joint_signals(resampled, ref_times, reference['aspect_ratio'])
+    errors = [np.abs(signals[name] - ref_signals[name]) for name in JOINT_ANGLE_SIGNALS]
+    errors = np.concatenate([e[np.isfinite(e)] for e in errors])
+    mae = float(errors.mean()) if errors.size else float('nan')
+
+    ref_verdicts = PoseEstimationEngine.analyze_motion_patterns(
+        reference['keypoints'], ref_times, aspect_ratio=reference['aspect_ratio'])['movements']
+    verdicts = PoseEstimationEngine.analyze_motion_patterns(
+        resampled, ref_times, aspect_ratio=reference['aspect_ratio'])['movements']
+    agreement = np.mean([verdicts[m]['detected'] == ref_verdicts[m]['detected'] for m in MOVEMENT_RULES])
+
+    return mae, float(agreement)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video', help='Clip to analyze (default: synthetic bursts)')
+    parser.add_argument('--budgets', type=int, nargs='+', default=[30, 60, 120], help='Pose frames per clip')
+    parser.add_argument('--reference-fps', type=float, default=10.0, help='Dense reference sampling rate')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: vCPUs)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clip = args.video
+        if clip:
+            import cv2
+            capture = cv2.VideoCapture(clip)
+            duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / (capture.get(cv2.CAP_PROP_FPS) or 30.0)
+            capture.release()
+        else:
+            clip = os.path.join(temp_dir, 'bursty.mp4')
+            duration = make_bursty_clip(clip)
+
+        started = time.perf_counter()
+        reference = PoseEstimationEngine.estimate_poses_mediapipe(clip, sample_fps=args.reference_fps, workers=args.workers)
+        reference_wall = time.perf_counter() - started
+
+        print(f"clip={duration:.0f}s reference={reference['frames_processed']} frames in {reference_wall:.2f}s")
+        print(f"{'sampling':>9} {'budget':>7} {'frames':>7} {'wall_s':>8} {'energy_cov':>10} {'angle_mae':>10} {'agreement':>10}")
+
+        for budget in args.budgets:
+            plan = plan_pose_sampling(clip, budget)
+            uniform_index = np.unique(np.linspace(0, plan['frames_considered'] - 1, budget).round().astype(int))
+            uniform_coverage = float(plan['energy'][uniform_index].sum() / max(plan['energy'].sum(), 1e-9))
+
+            runs = [
+                ('uniform', uniform_coverage, {'sample_fps': budget / duration}),
+                ('adaptive', plan['energy_coverage'], {'frame_budget': budget}),
+            ]
+            for name, coverage, options in runs:
+                started = time.perf_counter()
+                result = PoseEstimationEngine.estimate_poses_mediapipe(clip, workers=args.workers, **options)
+                elapsed = time.perf_counter() - started
+                mae, agreement = score(result, reference)
+                print(f"{name:>9} {budget:>7d} {result['frames_processed']:>7d} {elapsed:>8.2f} "
+                      f"{coverage:>10.2f} {mae:>10.1f} {agreement:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Recording integrity benchmark
+Hashes one object as a single-stream SHA-256 (one GET, read start to end) and
+as the ingest Merkle fingerprint (parallel ranged GETs, chunks hashed
+concurrently) and reports the throughput of each
+
+Without --bucket the object is a local file of random bytes behind an S3
+stand-in; --stream-mib-s caps each GET's transfer rate the way a single S3
+connection is capped, which is what parallel ranged reads work around.
+With --bucket/--key, a real S3 object is read.
+
+Usage:
+    python backend/benchmarks/recording_integrity.py [--size-mib 1024] [--stream-mib-s 80] [--workers 1 4 16]
+    python backend/benchmarks/recording_integrity.py --bucket my-bucket --key recordings/session.mp4
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from recording_integrity import HASH_READ_BYTES, RECORDING_HASH_CHUNK_BYTES, hash_recording  # noqa: E402
+
+
+class ThrottledBody:
+    """File range read at no more than rate bytes per second (0 = unthrottled)"""
+
+    def __init__(self, path: str, start: int, end: int, rate: float):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+        self.rate = rate
+        self.started = time.perf_counter()
+        self.sent = 0
+
+    def read(self, amt: int = -1) -> bytes:
+        amt = self.remaining if amt is None or amt < 0 else min(amt, self.remaining)
+        data = self.file.read(amt)
+        self.remaining -= len(data)
+        self.sent += len(data)
+        if self.rate:
+            ahead = self.sent / self.rate - (time.perf_counter() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+        return data
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class FileS3:
+    """head_object / (ranged) get_object over one local file"""
+
+    def __init__(self, path: str, rate: float):
+        self.path = path
+        self.rate = rate
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        return {'ContentLength': os.path.getsize(self.path), 'ETag': '"local"'}
+
+    def get_object(self, Bucket: str, Key: str, Range: str = None, IfMatch: str = None) -> dict:
+        start, end = 0, os.path.getsize(self.path)
+        if Range:
+            first, last = (int(value) for value in Range[len('bytes='):].split('-'))
+            start, end = first, last + 1
+        return {'Body': ThrottledBody(self.path, start, end, self.rate)}
+
+
+def single_stream_sha256(s3_client, bucket: str, key: str) -> tuple:
+    started = time.perf_counter()
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+    digest = hashlib.sha256()
+    size = 0
+    for data in iter(lambda: body.read(HASH_READ_BYTES), b''):
+        digest.update(data)
+        size += len(data)
+    body.close()
+    return size, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bucket', default=None, help='S3 bucket of a real object')
+    parser.add_argument('--key', default=None, help='S3 key of a real object')
+    parser.add_argument('--size-mib', type=int, default=1024, help='Local object size')
+    parser.add_argument('--stream-mib-s', type=float, default=80.0, help='Per-GET transfer cap (0 = none)')
+    parser.add_argument('--chunk-mib', type=float, default=RECORDING_HASH_CHUNK_BYTES / 2 ** 20, help='Leaf size')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16], help='Concurrent ranged GETs')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.bucket and args.key:
+            import boto3
+
+            s3_client, bucket, key = boto3.client('s3'), args.bucket, args.key
+        else:
+            path = os.path.join(temp_dir, 'recording.bin')
+            with open(path, 'wb') as f:
+                for _ in range(args.size_mib):
+                    f.write(os.urandom(2 ** 20))
+            s3_client, bucket, key = FileS3(path, args.stream_mib_s * 2 ** 20), 'local', 'recording.bin'
+
+        size, seconds = single_stream_sha256(s3_client, bucket, key)
+        print(f"object {size / 2 ** 20:.0f} MiB, {os.cpu_count()} CPUs")
+        print(f"{'single-stream sha256':>24}: {seconds:7.2f}s  {size / 2 ** 20 / seconds:8.1f} MiB/s")
+
+        for workers in args.workers:
+            result = hash_recording(bucket, key, s3_client=s3_client,
+                                    chunk_bytes=int(args.chunk_mib * 2 ** 20), workers=workers)
+            print(f"{f'merkle, {workers} workers':>24}: {result['hash_seconds']:7.2f}s  "
+                  f"{result['throughput_mib_s']:8.1f} MiB/s  ({len(result['chunk_hashes'])} chunks)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Test alignment benchmark
+Builds a synthetic session (declared tests, each performed some seconds after
+or shortly before its declaration, plus unrelated motion events) and times the
+alignment of the declared tests to the motion events
+
+Accuracy is the fraction of performed tests matched to their own event.
+
+Usage:
+    python backend/benchmarks/test_alignment.py [--tests 400] [--noise-events 300] [--repeats 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+from test_alignment import aligned_windows  # noqa: E402
+
+
+def synthetic_session(tests: int, noise_events: int, seed: int = 0) -> tuple:
+    """Declaration times, motion events and the event index each test was performed in"""
+    rng = np.random.default_rng(seed)
+    declared = np.cumsum(rng.uniform(30, 120, size=tests))
+
+    # Tests are performed in declaration order: mostly after the declaration
+    # (up to most of the way to the next one), sometimes narrated afterwards
+    spacing = np.append(np.diff(declared), 120)
+    lead = rng.uniform(0, 1, tests) * np.minimum(90, spacing - 30)
+    performed = declared + np.where(rng.random(tests) < 0.8, lead, -rng.uniform(5, 20, tests) - 5)
+    noise = rng.uniform(0, declared[-1] + 120, size=noise_events)
+
+    starts = np.concatenate([performed, noise])
+    lengths = np.concatenate([rng.uniform(5, 20, tests), rng.uniform(1, 4, noise_events)])
+    order = np.argsort(starts)
+    starts, ends = starts[order], (starts + lengths)[order]
+
+    # Overlapping events would be one run of motion; keep them disjoint
+    ends = np.minimum(ends, np.append(starts[1:] - 0.1, np.inf))
+    truth = np.argsort(order)[:tests]
+    return declared, {'starts': starts, 'ends': ends}, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tests', type=int, default=400, help='Declared tests in the session')
+    parser.add_argument('--noise-events', type=int, default=300, help='Motion events unrelated to any test')
+    parser.add_argument('--repeats', type=int, default=20, help='Timed runs')
+    args = parser.parse_args()
+
+    declared, events, truth = synthetic_session(args.tests, args.noise_events)
+    aligned_windows(declared, events)
+
+    started = time.perf_counter()
+    for _ in range(args.repeats):
+        alignment = aligned_windows(declared, events)
+    seconds = (time.perf_counter() - started) / args.repeats
+
+    matched = np.array(alignment['events'])
+    print(f"tests={args.tests} events={len(events['starts'])} session={declared[-1] / 3600:.1f} h")
+    print(f"alignment: {seconds * 1000:.2f} ms  aligned={alignment['aligned']}  cost={alignment['cost']}")
+    print(f"matched to own event: {np.mean(matched == truth):.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Video processor stage benchmark
+Renders deterministic synthetic recordings (moving shapes over a test pattern
+with a tone track), runs each video-processor stage against a local S3
+stand-in and compares wall time, bytes moved, peak RSS and /tmp usage with a
+stored baseline
+
+Each stage runs in a fresh process so its peak RSS (including ffmpeg
+children) and its /tmp footprint are measured in isolation, as they would be
+in a cold Lambda container. Reads ffmpeg makes through presigned URLs go to
+local files and are reported as a count, not as bytes.
+
+Usage:
+    python backend/benchmarks/video_stages.py [--durations 10m 1h 3h] [--stages ...]
+    python backend/benchmarks/video_stages.py --save-baseline   # record a new baseline
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import types
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_functions'))
+
+DURATIONS = {'10m': 600, '1h': 3600, '3h': 10800}
+STAGES = ['extract_segment', 'package_hls', 'clip_playlists', 'extract_audio',
+          'local_motion', 'snapshots', 'thumbnails']
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'video_stages_baseline.json')
+BUCKET = 'bench-bucket'
+RECORDING_KEY = 'cme-recordings/bench/recording.mp4'
+
+# Metrics compared with the baseline; a stage regresses when one grows by more than the tolerance
+COMPARED_METRICS = ['wall_s', 'bytes_in', 'bytes_out', 'peak_rss_mb', 'peak_tmp_mb']
+
+
+def make_synthetic_recording(path: str, duration: float) -> None:
+    """
+    Render a deterministic recording: test pattern, two moving shapes, 440 Hz tone
+
+    Fixed size, rate, GOP and single-threaded x264 keep the output identical
+    between runs, so baselines stay comparable.
+    """
+    graph = (
+        "[0:v][1:v]overlay=x='mod(t*180,W-w)':y='(H-h)/2+(H-h)/2*sin(t)'[a];"
+        "[a][2:v]overlay=x='(W-w)/2+(W-w)/2*cos(t/3)':y='mod(t*90,H-h)'[v]"
+    )
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', 'color=c=red:size=160x160',
+        '-f', 'lavfi', '-i', 'color=c=blue:size=96x96',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-filter_complex', graph, '-map', '[v]', '-map', '3:a',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '28', '-g', '60', '-threads', '1',
+        '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-b:a', '64k',
+        '-t', str(duration), '-movflags', '+faststart', path
+    ], check=True)
+
+
+class LocalS3:
+    """
+    The S3 client calls the video processor makes, served from a directory
+
+    Presigned URLs are plain local paths, which ffmpeg and ffprobe read directly.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.presigned = 0
+        self._lock = threading.Lock()
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def _count(self, attribute, size):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + size)
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(filename, path)
+        self._count('bytes_out', os.path.getsize(path))
+
+    def download_file(self, bucket, key, filename):
+        shutil.copyfile(self._path(bucket, key), filename)
+        self._count('bytes_in', os.path.getsize(filename))
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(Body)
+        self._count('bytes_out', len(Body))
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with open(self._path(Bucket, Key), 'rb') as f:
+            data = f.read()
+        self._count('bytes_in', len(data))
+        return {'Body': io.BytesIO(data)}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn=3600):
+        self._count('presigned', 1)
+        return self._path(Params['Bucket'], Params['Key'])
+
+
+class LocalTable:
+    """DynamoDB table stand-in: writes are accepted and discarded"""
+
+    def get_item(self, **kwargs):
+        return {}
+
+    def update_item(self, **kwargs):
+        return {}
+
+    def put_item(self, **kwargs):
+        return {}
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass  # removed while walking
+    return total
+
+
+def run_stage(stage: str, duration: float, store_root: str, tmp_dir: str, results) -> None:
+    """Child process: run one stage against the local store and report its metrics"""
+    os.environ['TMPDIR'] = tmp_dir
+    import tempfile
+    tempfile.tempdir = tmp_dir
+
+    import cme_media_ingest
+    import cme_video_processor
+    from motion_prefilter import motion_energy_curve
+
+    s3 = LocalS3(store_root)
+    table = LocalTable()
+    cme_video_processor.s3_client = s3
+    cme_video_processor.boto3 = types.SimpleNamespace(resource=lambda *args, **kwargs: types.SimpleNamespace(Table=lambda name: table))
+    cme_media_ingest.s3_client = s3
+    cme_media_ingest.dynamodb = types.SimpleNamespace(Table=lambda name: table)
+    cme_media_ingest._media_playlist_cache.clear()
+
+    # Declared tests spread over the recording, as the NLP step would return them
+    test_times = [duration * (i + 0.5) / 12 for i in range(12)]
+
+    peak_tmp = [0]
+    sampling = threading.Event()
+
+    def sample_tmp():
+        while not sampling.wait(0.2):
+            peak_tmp[0] = max(peak_tmp[0], directory_bytes(tmp_dir))
+
+    sampler = threading.Thread(target=sample_tmp, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+
+    if stage == 'extract_segment':
+        processor = cme_video_processor.CMEVideoProcessor(BUCKET, rekognition=object())
+        outputs = [processor.extract_video_segment(RECORDING_KEY, t, 60.0, mode='mp4') for t in test_times]
+    elif stage == 'package_hls':
+        outputs = [cme_media_ingest.package_hls('bench', RECORDING_KEY, BUCKET)]
+    elif stage == 'clip_playlists':
+        processor = cme_video_processor.CMEVideoProcessor(BUCKET, rekognition=object())
+        playlist_key = f"{cme_media_ingest.hls_prefix('bench')}/media.m3u8"
+        outputs = [processor.extract_video_segment(RECORDING_KEY, t, 60.0, mode='hls', hls_playlist_key=playlist_key)
+                   for t in test_times]
+    elif stage == 'extract_audio':
+        source = s3.generate_presigned_url('get_object', {'Bucket': BUCKET, 'Key': RECORDING_KEY})
+        outputs = [cme_media_ingest.extract_transcription_audio('bench', source, BUCKET)]
+    elif stage == 'local_motion':
+        source = s3.generate_presigned_url('get_object', {'Bucket': BUCKET, 'Key': RECORDING_KEY})
+        outputs = [motion_energy_curve(source, cme_video_processor.LOCAL_MOTION_FPS, max(0.0, t - 30), t + 30)
+                   for t in test_times]
+    elif stage == 'snapshots':
+        outputs = cme_video_processor.generate_frame_snapshots(
+            RECORDING_KEY, [t + offset for t in test_times for offset in (-10.0, 0.0, 10.0)], BUCKET)
+    elif stage == 'thumbnails':
+        outputs = [cme_video_processor.generate_thumbnail_track('bench', RECORDING_KEY, BUCKET)]
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    wall = time.perf_counter() - started
+    sampling.set()
+    sampler.join()
+    peak_tmp[0] = max(peak_tmp[0], directory_bytes(tmp_dir))
+
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 / 1024 if platform.system() != 'Darwin' else 1 / (1024 * 1024)
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+    results.put({
+        'wall_s': round(wall, 3),
+        'bytes_in': s3.bytes_in,
+        'bytes_out': s3.bytes_out,
+        'presigned_reads': s3.presigned,
+        'peak_rss_mb': round(peak_rss, 1),
+        'peak_tmp_mb': round(peak_tmp[0] / (1024 * 1024), 1),
+        'outputs': sum(1 for output in outputs if output is not None and output != [])
+    })
+
+
+def measure(stage: str, duration: float, store_root: str, work_dir: str) -> dict:
+    tmp_dir = os.path.join(work_dir, 'tmp', stage)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run_stage, args=(stage, duration, store_root, tmp_dir, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {'error': f"exit code {process.exitcode}"}
+    return results.get()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Rows of (label, stage, metric, baseline, current, ratio, regressed)"""
+    rows = []
+    for label, stages in results.items():
+        for stage, metrics in stages.items():
+            previous = baseline.get(label, {}).get(stage)
+            if not previous or 'error' in metrics or 'error' in previous:
+                continue
+            for metric in COMPARED_METRICS:
+                old, new = previous.get(metric), metrics.get(metric)
+                if old is None or new is None:
+                    continue
+                ratio = new / old if old else (1.0 if new == old else float('inf'))
+                rows.append((label, stage, metric, old, new, ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--durations', nargs='+', choices=list(DURATIONS), default=list(DURATIONS))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--work-dir', default=os.path.join(os.path.expanduser('~'), '.cache', 'cme-video-bench'),
+                        help='Synthetic recordings are rendered once and kept here')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='Write these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed growth before a metric regresses')
+    args = parser.parse_args()
+
+    results = {}
+    for label in args.durations:
+        duration = DURATIONS[label]
+        store_root = os.path.join(args.work_dir, label, 'store')
+        recording = os.path.join(store_root, BUCKET, RECORDING_KEY)
+        if not os.path.exists(recording):
+            os.makedirs(os.path.dirname(recording), exist_ok=True)
+            print(f"Rendering {label} synthetic recording...")
+            make_synthetic_recording(recording, duration)
+
+        print(f"\nrecording={label} ({os.path.getsize(recording) / 1e6:.0f} MB)")
+        print(f"{'stage':>16} {'wall_s':>8} {'in_MB':>8} {'out_MB':>8} {'rss_MB':>8} {'tmp_MB':>8} {'outputs':>8}")
+
+        results[label] = {}
+        # clip_playlists reads the package written by package_hls
+        stages = sorted(args.stages, key=STAGES.index)
+        if 'clip_playlists' in stages and 'package_hls' not in stages and not os.path.exists(
+                os.path.join(store_root, BUCKET, 'cme-hls', 'bench', 'media.m3u8')):
+            stages.insert(stages.index('clip_playlists'), 'package_hls')
+
+        for stage in stages:
+            metrics = measure(stage, duration, store_root, os.path.join(args.work_dir, label))
+            results[label][stage] = metrics
+            if 'error' in metrics:
+                print(f"{stage:>16} failed: {metrics['error']}")
+                continue
+            print(f"{stage:>16} {metrics['wall_s']:>8.2f} {metrics['bytes_in'] / 1e6:>8.1f} "
+                  f"{metrics['bytes_out'] / 1e6:>8.1f} {metrics['peak_rss_mb']:>8.0f} "
+                  f"{metrics['peak_tmp_mb']:>8.0f} {metrics['outputs']:>8d}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    rows = compare(results, baseline, args.tolerance)
+    regressions = [row for row in rows if row[6]]
+    print(f"\n{'recording':>9} {'stage':>16} {'metric':>12} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for label, stage, metric, old, new, ratio, regressed in rows:
+        print(f"{label:>9} {stage:>16} {metric:>12} {old:>12} {new:>12} {ratio:>7.2f}{'  REGRESSED' if regressed else ''}")
+    print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Analysis Cache - Content-addressed clips and analysis results
+Clips are keyed by (recording ETag, window, extraction profile, analyzer
+version) and every analysis artifact derived from a clip by (clip key,
+analysis profile, analyzer version), so a rerun over an unchanged recording
+finds its work with HEAD requests instead of redoing it
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import boto3
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Bump when extraction or scoring changes so earlier artifacts stop matching
+ANALYZER_VERSION = os.environ.get('ANALYZER_VERSION', '1')
+
+CACHE_PREFIX = 'cme-cache'
+
+
+def recording_etag(s3_client, s3_bucket: str, s3_key: str) -> str:
+    """ETag of a recording's current object (one HEAD request)"""
+    response = s3_client.head_object(Bucket=s3_bucket, Key=s3_key)
+    return response['ETag'].strip('"')
+
+
+def _digest(parts: list) -> str:
+    return hashlib.sha256(json.dumps(parts, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Content-addressed artifact keys for one recording, with hit/miss counters
+
+    Lookups may come from several batch worker threads; counters are guarded
+    by a lock. The recording's ETag is read once per cache, i.e. once per run:
+    a session's upload key is fixed, so a re-upload replaces the object and
+    a container reused by a later run must not key it by the old ETag.
+    """
+
+    def __init__(self, s3_bucket: str, recording_s3_key: str, s3_client=None, version: str = ANALYZER_VERSION):
+        self.s3_bucket = s3_bucket
+        self.recording_s3_key = recording_s3_key
+        self.s3_client = s3_client or boto3.client('s3')
+        self.version = version
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._etag: Optional[str] = None
+
+    @property
+    def etag(self) -> str:
+        with self._lock:
+            if self._etag is None:
+                self._etag = recording_etag(self.s3_client, self.s3_bucket, self.recording_s3_key)
+            return self._etag
+
+    def _window_digest(self, window: Optional[Tuple[float, float]], profile: str) -> str:
+        bounds = [round(float(window[0]), 3), round(float(window[1]), 3)] if window else None
+        return _digest([self.etag, bounds, profile, self.version])
+
+    def clip_key(self, window: Tuple[float, float], profile: str, extension: str = '.mp4') -> str:
+        """Key of a clip cut from the recording with the given extraction profile"""
+        digest = self._window_digest(window, profile)
+        return f"{CACHE_PREFIX}/clips/{digest[:2]}/{digest}{extension}"
+
+    def derived_key(self, source_key: str, profile: str, extension: str = '.npz') -> str:
+        """Key of an analysis artifact computed from a cached clip (or recording artifact)"""
+        digest = _digest([source_key, profile, self.version])
+        return f"{CACHE_PREFIX}/analysis/{digest[:2]}/{digest}{extension}"
+
+    def window_key(self, window: Optional[Tuple[float, float]], profile: str, extension: str = '.npz') -> str:
+        """Key of an analysis artifact over a recording window (None = the whole recording)"""
+        digest = self._window_digest(window, profile)
+        return f"{CACHE_PREFIX}/analysis/{digest[:2]}/{digest}{extension}"
+
+    def lookup(self, key: str, kind: str) -> bool:
+        """HEAD the artifact and count a hit or miss for kind"""
+        try:
+            self.s3_client.head_object(Bucket=self.s3_bucket, Key=key)
+            found = True
+        except Exception as e:
+            # 404 is the expected miss; anything else also means "recompute"
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code not in ('404', 'NoSuchKey', 'NotFound'):
+                logger.warning(f"Cache lookup failed for {key}: {str(e)}")
+            found = False
+
+        with self._lock:
+            counter = self.hits if found else self.misses
+            counter[kind] = counter.get(kind, 0) + 1
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit / miss totals and per-kind counts"""
+        with self._lock:
+            return {
+                'hits': sum(self.hits.values()),
+                'misses': sum(self.misses.values()),
+                'by_kind': {
+                    kind: {'hits': self.hits.get(kind, 0), 'misses': self.misses.get(kind, 0)}
+                    for kind in sorted(set(self.hits) | set(self.misses))
+                }
+            }
+
+    def save_arrays(self, key: str, arrays: Dict[str, np.ndarray]) -> str:
+        """Store a small set of NumPy arrays (e.g. a motion-energy curve)"""
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        self.s3_client.put_object(
+            Bucket=self.s3_bucket,
+            Key=key,
+            Body=buffer.getvalue(),
+            ContentType='application/octet-stream'
+        )
+        return key
+
+    def load_arrays(self, key: str) -> Dict[str, np.ndarray]:
+        response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)
+        with np.load(io.BytesIO(response['Body'].read()), allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+
+def record_cache_stats(session_id: str, stats: Dict[str, Any], sessions_table=None) -> None:
+    """
+    Add a run's hit / miss counts to the session item
+
+    ADD keeps the totals correct when several batch invocations of the same
+    session report concurrently.
+    """
+    if not stats.get('hits') and not stats.get('misses'):
+        return
+    try:
+        if sessions_table is None:
+            sessions_table = boto3.session.Session().resource('dynamodb').Table(
+                os.environ.get('CME_SESSIONS_TABLE', 'cme-sessions')
+            )
+        sessions_table.update_item(
+            Key={'session_id': session_id},
+            UpdateExpression='ADD cache_hits :hits, cache_misses :misses SET updated_at = :updated',
+            ExpressionAttributeValues={
+                ':hits': stats['hits'],
+                ':misses': stats['misses'],
+                ':updated': int(time.time())
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error recording cache stats for session {session_id}: {str(e)}")
@@ -0,0 +1,386 @@
+"""
+Audio Demeanor - Raised-voice detection on the session's speech track
+Streams decoded PCM from ffmpeg in fixed-size chunks, measures loudness and
+pitch per short frame with NumPy and reports intervals where a speaker's voice
+rises well above their own usual level, attributed to speakers by the
+transcript's diarization
+"""
+
+import functools
+import logging
+import os
+import subprocess
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# The ingest speech track is mono 16 kHz; other sources are resampled to it
+AUDIO_SAMPLE_RATE = 16000
+
+# Seconds of PCM read from the ffmpeg pipe per chunk (bounds memory on long recordings)
+AUDIO_CHUNK_SECONDS = float(os.environ.get('AUDIO_CHUNK_SECONDS', '30'))
+
+# Analysis frames: 40 ms long every 20 ms
+AUDIO_FRAME_SECONDS = 0.04
+AUDIO_HOP_SECONDS = 0.02
+
+# Pitch search range (adult speech, including raised voices) and the
+# normalized autocorrelation peak a frame needs to count as voiced
+PITCH_MIN_HZ = 75.0
+PITCH_MAX_HZ = 500.0
+PITCH_CLARITY = 0.5
+SILENCE_DBFS = -50.0
+
+# A voiced frame is raised when it is RAISED_VOICE_DB louder than the
+# speaker's median voiced level, or half that louder while pitched
+# RAISED_VOICE_SEMITONES above the speaker's median pitch. Raised frames
+# closer than RAISED_VOICE_MERGE_GAP form one interval; shorter intervals
+# than RAISED_VOICE_MIN_SECONDS are dropped.
+RAISED_VOICE_DB = float(os.environ.get('RAISED_VOICE_DB', '10'))
+RAISED_VOICE_SEMITONES = float(os.environ.get('RAISED_VOICE_SEMITONES', '3'))
+RAISED_VOICE_MERGE_GAP = 0.5
+RAISED_VOICE_MIN_SECONDS = 1.0
+
+# Voiced seconds of a speaker before their own level is the baseline; until
+# then the level of all speakers so far is used, and before that nothing is flagged
+BASELINE_MIN_SECONDS = 20.0
+
+# Running level and pitch distributions are fixed-size histograms
+LOUDNESS_EDGES = np.arange(-90.0, 0.25, 0.5)
+PITCH_EDGES = np.arange(0.0, 12 * np.log2(PITCH_MAX_HZ / PITCH_MIN_HZ) + 0.125, 0.25)
+
+UNKNOWN_SPEAKER = 'unknown'
+
+
+def pcm_command(source: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> list:
+    """ffmpeg command decoding the first audio stream of source to mono s16le on stdout"""
+    return [
+        'ffmpeg', '-v', 'error', '-nostdin', '-i', source,
+        '-map', '0:a:0', '-vn', '-sn', '-dn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 's16le', '-acodec', 'pcm_s16le', 'pipe:1'
+    ]
+
+
+def stream_pcm(
+    source: str,
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    chunk_seconds: float = AUDIO_CHUNK_SECONDS
+) -> Iterator[np.ndarray]:
+    """
+    Decoded audio of source as float32 chunks in [-1, 1)
+
+    Every chunk but the last holds exactly chunk_seconds of samples; each is
+    read into the same buffer, so memory stays constant for any length.
+    """
+    chunk_bytes = int(chunk_seconds * sample_rate) * 2
+    buffer = bytearray(chunk_bytes)
+    view = memoryview(buffer)
+
+    process = subprocess.Popen(pcm_command(source, sample_rate), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            filled = 0
+            while filled < chunk_bytes:
+                count = process.stdout.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            usable = filled - filled % 2
+            if usable:
+                yield np.frombuffer(buffer, dtype='<i2', count=usable // 2).astype(np.float32) / 32768.0
+            if filled < chunk_bytes:
+                break
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        process.stderr.close()
+        process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Audio decode failed: {stderr.strip()}")
+
+
+@functools.lru_cache(maxsize=4)
+def _analysis_window(frame_length: int, fft_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hann window and its normalized autocorrelation (to undo its taper on frame autocorrelations)"""
+    window = np.hanning(frame_length)
+    window_acf = np.fft.irfft(np.abs(np.fft.rfft(window, fft_length)) ** 2, fft_length)
+    return window, window_acf / window_acf[0]
+
+
+def frame_features(frames: np.ndarray, sample_rate: int = AUDIO_SAMPLE_RATE) -> Dict[str, np.ndarray]:
+    """
+    Loudness and pitch of each analysis frame
+
+    Pitch is the strongest peak of the frame's normalized autocorrelation
+    (computed through the FFT for all frames at once) between the lags of
+    PITCH_MAX_HZ and PITCH_MIN_HZ, refined by parabolic interpolation.
+
+    Args:
+        frames: float32 (frames, samples) audio in [-1, 1)
+
+    Returns:
+        rms_db: float32 (frames,) RMS level in dBFS
+        pitch_hz: float32 (frames,) pitch estimate (NaN when unvoiced)
+        voiced: bool (frames,) clear periodicity above the silence level
+    """
+    frame_length = frames.shape[1]
+    min_lag = int(sample_rate / PITCH_MAX_HZ)
+    max_lag = int(np.ceil(sample_rate / PITCH_MIN_HZ))
+    fft_length = 1 << int(np.ceil(np.log2(frame_length + max_lag + 1)))
+    window, window_acf = _analysis_window(frame_length, fft_length)
+
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    rms_db = (20 * np.log10(np.maximum(rms, 1e-5))).astype(np.float32)
+
+    centered = (frames - frames.mean(axis=1, keepdims=True)) * window
+    acf = np.fft.irfft(np.abs(np.fft.rfft(centered, fft_length)) ** 2, fft_length)[:, :max_lag + 2]
+    acf /= np.maximum(acf[:, :1], 1e-12)
+    acf /= window_acf[:max_lag + 2]
+
+    peak = np.argmax(acf[:, min_lag:max_lag + 1], axis=1) + min_lag
+    rows = np.arange(len(frames))
+    left, center, right = acf[rows, peak - 1], acf[rows, peak], acf[rows, peak + 1]
+    curvature = left - 2 * center + right
+    offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1.0), 0.0)
+
+    voiced = (center >= PITCH_CLARITY) & (rms_db > SILENCE_DBFS)
+    pitch_hz = np.where(voiced, sample_rate / (peak + np.clip(offset, -0.5, 0.5)), np.nan).astype(np.float32)
+    return {'rms_db': rms_db, 'pitch_hz': pitch_hz, 'voiced': voiced}
+
+
+def stream_frame_features(
+    source: str,
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    chunk_seconds: float = AUDIO_CHUNK_SECONDS,
+    frame_seconds: float = AUDIO_FRAME_SECONDS,
+    hop_seconds: float = AUDIO_HOP_SECONDS
+) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """
+    Frame times (centers, seconds) and frame_features of source, one PCM chunk at a time
+
+    Samples of a frame that straddles two chunks are carried over, so the
+    frame grid is the same as if the whole track were analyzed at once.
+    """
+    frame_length = int(frame_seconds * sample_rate)
+    hop = int(hop_seconds * sample_rate)
+    carry = np.zeros(0, dtype=np.float32)
+    first_frame = 0
+
+    for chunk in stream_pcm(source, sample_rate, chunk_seconds):
+        samples = np.concatenate([carry, chunk]) if carry.size else chunk
+        count = 1 + (samples.size - frame_length) // hop if samples.size >= frame_length else 0
+        if count:
+            frames = np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop][:count]
+            times = (first_frame + np.arange(count)) * hop_seconds + frame_seconds / 2
+            yield times, frame_features(frames, sample_rate)
+        carry = samples[count * hop:].copy()
+        first_frame += count
+
+
+class SpeakerTimeline:
+    """Speaker turns from a Transcribe transcript's diarization, queried by time"""
+
+    def __init__(self, transcript: Dict[str, Any]):
+        segments = ((transcript or {}).get('results', {}).get('speaker_labels') or {}).get('segments', [])
+        segments = sorted(segments, key=lambda segment: float(segment.get('start_time', 0)))
+        self.labels = sorted({segment.get('speaker_label') or UNKNOWN_SPEAKER for segment in segments})
+        codes = {label: code for code, label in enumerate(self.labels)}
+        self.starts = np.array([float(segment.get('start_time', 0)) for segment in segments])
+        self.ends = np.array([float(segment.get('end_time', 0)) for segment in segments])
+        self.codes = np.array([codes[segment.get('speaker_label') or UNKNOWN_SPEAKER] for segment in segments],
+                              dtype=np.int64)
+
+    def speakers_at(self, times: np.ndarray) -> np.ndarray:
+        """Speaker code (index into labels) at each time, -1 outside every turn"""
+        turn = np.searchsorted(self.starts, times, side='right') - 1
+        inside = (turn >= 0) & (times <= self.ends[np.maximum(turn, 0)]) if self.starts.size else turn >= 0
+        return np.where(inside, self.codes[np.maximum(turn, 0)] if self.codes.size else -1, -1)
+
+
+def _histogram_median(histogram: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Median of each row of a histogram (bin centers)"""
+    cumulative = np.cumsum(histogram, axis=1)
+    index = np.argmax(cumulative >= cumulative[:, -1:] / 2, axis=1)
+    return (edges[index] + edges[index + 1]) / 2
+
+
+class RaisedVoiceDetector:
+    """
+    Online raised-voice intervals from frame features
+
+    Each speaker's voiced level and pitch go into fixed-size histograms, and
+    every chunk is judged against the medians of what came before it, so state
+    does not grow with the recording. Runs of raised frames of one speaker
+    are carried across chunk boundaries.
+    """
+
+    def __init__(
+        self,
+        speakers: List[str],
+        hop_seconds: float = AUDIO_HOP_SECONDS,
+        raised_db: float = RAISED_VOICE_DB,
+        raised_semitones: float = RAISED_VOICE_SEMITONES,
+        merge_gap: float = RAISED_VOICE_MERGE_GAP,
+        min_seconds: float = RAISED_VOICE_MIN_SECONDS,
+        baseline_seconds: float = BASELINE_MIN_SECONDS
+    ):
+        self.speakers = list(speakers) + [UNKNOWN_SPEAKER]
+        self.hop_seconds = hop_seconds
+        self.raised_db = raised_db
+        self.raised_semitones = raised_semitones
+        self.merge_gap = merge_gap
+        self.min_seconds = min_seconds
+        self.baseline_frames = int(baseline_seconds / hop_seconds)
+
+        # One row per speaker plus a last row for everyone
+        rows = len(self.speakers) + 1
+        self.loudness = np.zeros((rows, LOUDNESS_EDGES.size - 1), dtype=np.int64)
+        self.pitch = np.zeros((rows, PITCH_EDGES.size - 1), dtype=np.int64)
+        self.intervals: List[Dict[str, Any]] = []
+        self._run: Optional[Dict[str, Any]] = None
+
+    def _baselines(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per-speaker median level (dBFS), median pitch (semitones above PITCH_MIN_HZ) and readiness"""
+        voiced = self.loudness.sum(axis=1)
+        loudness = _histogram_median(self.loudness, LOUDNESS_EDGES)
+        pitch = _histogram_median(self.pitch, PITCH_EDGES)
+
+        own = voiced[:-1] >= self.baseline_frames
+        loudness = np.where(own, loudness[:-1], loudness[-1])
+        pitch = np.where(own, pitch[:-1], pitch[-1])
+        ready = own | (voiced[-1] >= self.baseline_frames)
+        return loudness, pitch, ready
+
+    def update(self, times: np.ndarray, features: Dict[str, np.ndarray], speakers: np.ndarray) -> None:
+        """Judge one chunk of frames, then add its voiced frames to the histograms"""
+        speakers = np.where(speakers < 0, len(self.speakers) - 1, speakers)
+        voiced = features['voiced']
+        semitones = 12 * np.log2(np.where(voiced, features['pitch_hz'], PITCH_MIN_HZ) / PITCH_MIN_HZ)
+
+        base_loudness, base_pitch, ready = self._baselines()
+        rise = features['rms_db'] - base_loudness[speakers]
+        pitch_rise = semitones - base_pitch[speakers]
+        raised = voiced & ready[speakers] & (
+            (rise >= self.raised_db) | ((rise >= self.raised_db / 2) & (pitch_rise >= self.raised_semitones))
+        )
+
+        loudness_bin = np.clip(np.digitize(features['rms_db'][voiced], LOUDNESS_EDGES) - 1, 0, LOUDNESS_EDGES.size - 2)
+        pitch_bin = np.clip(np.digitize(semitones[voiced], PITCH_EDGES) - 1, 0, PITCH_EDGES.size - 2)
+        for rows in (speakers[voiced], np.full(int(voiced.sum()), len(self.speakers))):
+            self.loudness += np.bincount(
+                rows * self.loudness.shape[1] + loudness_bin, minlength=self.loudness.size
+            ).reshape(self.loudness.shape)
+            self.pitch += np.bincount(
+                rows * self.pitch.shape[1] + pitch_bin, minlength=self.pitch.size
+            ).reshape(self.pitch.shape)
+
+        index = np.flatnonzero(raised)
+        if index.size == 0:
+            return
+        # Runs of raised frames: split where the speaker changes or frames are far apart
+        breaks = np.flatnonzero(
+            (np.diff(times[index]) > self.merge_gap) | (np.diff(speakers[index]) != 0)
+        ) + 1
+        for run in np.split(index, breaks):
+            speaker = int(speakers[run[0]])
+            start, end = float(times[run[0]]), float(times[run[-1]])
+            current = self._run
+            if current and current['speaker'] == speaker and start - current['end'] <= self.merge_gap:
+                current['end'] = end
+            else:
+                self._close()
+                current = self._run = {
+                    'speaker': speaker, 'start': start, 'end': end,
+                    'frames': 0, 'rise_sum': 0.0, 'rise_max': -np.inf, 'pitch_sum': 0.0, 'pitch_rise_sum': 0.0
+                }
+            current['frames'] += run.size
+            current['rise_sum'] += float(rise[run].sum())
+            current['rise_max'] = max(current['rise_max'], float(rise[run].max()))
+            current['pitch_sum'] += float(features['pitch_hz'][run].sum())
+            current['pitch_rise_sum'] += float(pitch_rise[run].sum())
+
+    def _close(self) -> None:
+        run, self._run = self._run, None
+        if not run:
+            return
+        start = run['start'] - self.hop_seconds / 2
+        end = run['end'] + self.hop_seconds / 2
+        if end - start < self.min_seconds:
+            return
+        self.intervals.append({
+            'start': round(start, 2),
+            'end': round(end, 2),
+            'speaker_label': self.speakers[run['speaker']],
+            'raised_fraction': round(min(1.0, run['frames'] * self.hop_seconds / (end - start)), 3),
+            'peak_rise_db': round(run['rise_max'], 1),
+            'mean_rise_db': round(run['rise_sum'] / run['frames'], 1),
+            'mean_pitch_hz': round(run['pitch_sum'] / run['frames'], 1),
+            'pitch_rise_semitones': round(run['pitch_rise_sum'] / run['frames'], 1)
+        })
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Close the open run and return every interval, in time order"""
+        self._close()
+        return self.intervals
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Voiced seconds and baseline level / pitch of each speaker heard"""
+        loudness, pitch, _ = self._baselines()
+        voiced = self.loudness.sum(axis=1)
+        return {
+            speaker: {
+                'voiced_seconds': round(float(voiced[code] * self.hop_seconds), 1),
+                'median_dbfs': round(float(loudness[code]), 1),
+                'median_pitch_hz': round(float(PITCH_MIN_HZ * 2 ** (pitch[code] / 12)), 1)
+            }
+            for code, speaker in enumerate(self.speakers) if voiced[code]
+        }
+
+
+def detect_raised_voice(
+    source: str,
+    transcript: Dict[str, Any],
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    chunk_seconds: float = AUDIO_CHUNK_SECONDS
+) -> Dict[str, Any]:
+    """
+    Raised-voice intervals of a recording's speech, attributed to speakers
+
+    Args:
+        source: Speech track or recording (local path or URL ffmpeg can read)
+        transcript: Transcribe output with speaker_labels (diarization)
+
+    Returns:
+        Dictionary with intervals (start, end, speaker_label, peak and mean
+        loudness rise over the speaker's baseline, mean pitch and pitch rise),
+        speakers (baseline per speaker), audio_seconds, processing_seconds
+        and realtime_factor
+    """
+    started = time.perf_counter()
+    timeline = SpeakerTimeline(transcript)
+    detector = RaisedVoiceDetector(timeline.labels)
+
+    audio_seconds = 0.0
+    for times, features in stream_frame_features(source, sample_rate, chunk_seconds):
+        detector.update(times, features, timeline.speakers_at(times))
+        audio_seconds = float(times[-1]) + AUDIO_FRAME_SECONDS / 2
+
+    intervals = detector.finish()
+    processing_seconds = time.perf_counter() - started
+    logger.info(f"Raised voice: {len(intervals)} intervals in {audio_seconds:.0f}s of audio "
+                f"({processing_seconds:.1f}s, {audio_seconds / max(processing_seconds, 1e-6):.0f}x real time)")
+
+    return {
+        'intervals': intervals,
+        'speakers': detector.summary(),
+        'audio_seconds': round(audio_seconds, 2),
+        'processing_seconds': round(processing_seconds, 3),
+        'realtime_factor': round(audio_seconds / max(processing_seconds, 1e-6), 1)
+    }
@@ -5,7 +5,9 @@ Implements the Florida happy-path workflow for AI-powered CME recording analysis
 
 import json
 import boto3
+import hashlib
 import logging
+import math
 from typing import Dict, Any, Optional, List
 import os
 import time
@@ -13,6 +15,9 @@ import uuid
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from cme_media_ingest import transcribe_media_format
+from recording_integrity import byte_range_chunks, clip_chunks, verify_chunks
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -34,6 +39,9 @@ CME_DEMEANOR_TABLE = os.environ.get('CME_DEMEANOR_TABLE', 'cme-demeanor-flags')
 CME_CONSENT_TABLE = os.environ.get('CME_CONSENT_TABLE', 'cme-consents')
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 
+# Chunks one integrity request may rehash, so it finishes inside API Gateway's 29 s
+INTEGRITY_MAX_VERIFY_CHUNKS = int(os.environ.get('INTEGRITY_MAX_VERIFY_CHUNKS', '32'))
+
 # State configurations for recording permissions
 STATE_RECORDING_RULES = {
     'FL': {'video': True, 'audio': True, 'mode': 'Full Record', 'rule': 'Rule 1.360'},
@@ -177,6 +185,17 @@ class CMEDataModel:
             'ip_address': '',
             'created_at': timestamp
         }
+    
+    @staticmethod
+    def consent_record_hash(consent: Dict[str, Any]) -> str:
+        """SHA-256 over the signed fields of a ConsentRecord (canonical JSON)"""
+        signed = {
+            field: consent.get(field, '')
+            for field in ('consent_id', 'session_id', 'participant_role', 'signature',
+                          'consent_text', 'timestamp', 'ip_address')
+        }
+        canonical = json.dumps(signed, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
 
 def handle_create_cme_session(body: Dict[str, Any]) -> Dict[str, Any]:
@@ -275,18 +294,20 @@ def handle_submit_consent(body: Dict[str, Any]) -> Dict[str, Any]:
             consent_text=consent_text or ''
         )
         consent_data['ip_address'] = ip_address
+        consent_data['consent_hash'] = CMEDataModel.consent_record_hash(consent_data)
         
         # Store consent in DynamoDB
         consent_table = dynamodb.Table(CME_CONSENT_TABLE)
         consent_table.put_item(Item=consent_data)
         
-        # Update session with consent hash
+        # Link the session to the consent record and its hash
         sessions_table = dynamodb.Table(CME_SESSIONS_TABLE)
         sessions_table.update_item(
             Key={'session_id': session_id},
-            UpdateExpression='SET consent_hash = :hash, updated_at = :updated',
+            UpdateExpression='SET consent_id = :consent, consent_hash = :hash, updated_at = :updated',
             ExpressionAttributeValues={
-                ':hash': consent_data['consent_id'],
+                ':consent': consent_data['consent_id'],
+                ':hash': consent_data['consent_hash'],
                 ':updated': int(time.time())
             }
         )
@@ -295,6 +316,7 @@ def handle_submit_consent(body: Dict[str, Any]) -> Dict[str, Any]:
         
         return create_response(200, {
             'consent_id': consent_data['consent_id'],
+            'consent_hash': consent_data['consent_hash'],
             'session_id': session_id,
             'participant_role': participant_role,
             'timestamp': consent_data['timestamp'],
@@ -414,20 +436,19 @@ def handle_start_cme_processing(body: Dict[str, Any]) -> Dict[str, Any]:
             UpdateExpression='SET status = :status, processing_stage = :stage, updated_at = :updated',
             ExpressionAttributeValues={
                 ':status': 'processing',
-                ':stage': 'transcription',
+                ':stage': 'ingestion',
                 ':updated': int(time.time())
             }
         )
         
-        # Start Step 3: Speech-to-Text & Diarization
-        transcription_job = start_transcription_job(session)
-        
         # *** START STEP FUNCTION WORKFLOW ***
+        # The workflow's ingest step extracts a speech-only track and starts
+        # Step 3 (Speech-to-Text & Diarization) on it
+        transcription_job = None
         step_functions_arn = os.environ.get('STEP_FUNCTION_ARN')
         if step_functions_arn:
             execution_input = {
                 'session_id': session_id,
-                'transcription_job_name': transcription_job.get('job_name'),
                 'video_s3_key': session.get('video_uri').replace('s3://', '').split('/', 1)[1] if session.get('video_uri').startswith('s3://') else session.get('video_uri')
             }
             
@@ -443,14 +464,18 @@ def handle_start_cme_processing(body: Dict[str, Any]) -> Dict[str, Any]:
                 
             except Exception as sf_error:
                 logger.error(f"Failed to start Step Function: {str(sf_error)}")
-                # Continue anyway - transcription is running
+                step_functions_arn = None
+        
+        if not step_functions_arn:
+            # No workflow to ingest the recording - transcribe the upload directly
+            transcription_job = start_transcription_job(session)
         
         logger.info(f"Started CME processing for session: {session_id}")
         
         return create_response(200, {
             'session_id': session_id,
             'status': 'processing',
-            'stage': 'transcription',
+            'stage': 'transcription' if transcription_job else 'ingestion',
             'transcription_job': transcription_job,
             'message': 'CME analysis processing started - full pipeline will run automatically',
             'estimated_time': 'Processing time depends on recording length (typically 5-15 minutes)'
@@ -461,6 +486,133 @@ def handle_start_cme_processing(body: Dict[str, Any]) -> Dict[str, Any]:
         return create_response(500, {'error': f'Error starting processing: {str(e)}'})
 
 
+def handle_get_thumbnails(session_id: str) -> Dict[str, Any]:
+    """
+    Scrub-preview thumbnail track for a session
+    Returns presigned URLs for the WebVTT track and every sprite sheet it references
+    """
+    try:
+        sessions_table = dynamodb.Table(CME_SESSIONS_TABLE)
+        session = sessions_table.get_item(Key={'session_id': session_id}).get('Item')
+        
+        if not session:
+            return create_response(404, {'error': 'CME session not found'})
+        
+        track = session.get('thumbnail_track')
+        if not track:
+            return create_response(404, {'error': 'Thumbnails not generated yet'})
+        
+        def presign(key):
+            return s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': S3_BUCKET, 'Key': key},
+                ExpiresIn=3600
+            )
+        
+        return create_response(200, {
+            'session_id': session_id,
+            'vtt_url': presign(track['vtt_key']),
+            # Keyed by the relative sprite names used inside the VTT cues
+            'sprites': {key.rsplit('/', 1)[-1]: presign(key) for key in track.get('sprite_keys', [])},
+            'interval': track.get('interval'),
+            'tile_width': track.get('tile_width'),
+            'tile_height': track.get('tile_height'),
+            'duration': track.get('duration')
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting thumbnails: {str(e)}")
+        return create_response(500, {'error': f'Error getting thumbnails: {str(e)}'})
+
+
+def _query_numbers(query: Dict[str, Any], names: List[str], cast) -> Optional[List[Any]]:
+    """Parse a pair of query parameters; None if absent, ValueError if malformed"""
+    values = [query.get(name) for name in names]
+    if all(value is None for value in values):
+        return None
+    if any(value is None for value in values):
+        raise ValueError(f"{' and '.join(names)} must be given together")
+    try:
+        numbers = [cast(value) for value in values]
+    except (TypeError, ValueError):
+        raise ValueError(f"{' and '.join(names)} must be numbers")
+    if not all(math.isfinite(number) for number in numbers) or numbers[0] < 0 or numbers[0] >= numbers[1]:
+        raise ValueError(f"{names[0]} must be at least 0 and less than {names[1]}")
+    return numbers
+
+
+def handle_get_integrity(session_id: str, query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Chain-of-custody fingerprint of a session's recording
+    With start and end (seconds), or first_byte and end_byte, also verifies
+    the recording bytes behind that clip or range by rehashing only the
+    chunks it spans. Clip times resolve to chunks through the time index
+    stored at ingest, so nothing here probes the recording.
+    """
+    try:
+        try:
+            clip = _query_numbers(query, ['start', 'end'], float)
+            byte_range = _query_numbers(query, ['first_byte', 'end_byte'], int)
+        except ValueError as e:
+            return create_response(400, {'error': str(e)})
+        if clip and byte_range:
+            return create_response(400, {'error': 'Give either start/end or first_byte/end_byte, not both'})
+        
+        sessions_table = dynamodb.Table(CME_SESSIONS_TABLE)
+        session = sessions_table.get_item(Key={'session_id': session_id}).get('Item')
+        
+        if not session:
+            return create_response(404, {'error': 'CME session not found'})
+        
+        integrity = session.get('recording_integrity')
+        if not integrity:
+            return create_response(404, {'error': 'Recording not fingerprinted yet'})
+        
+        response = {
+            'session_id': session_id,
+            'algorithm': integrity.get('algorithm'),
+            'root': integrity.get('root'),
+            'chunk_bytes': integrity.get('chunk_bytes'),
+            'object_bytes': integrity.get('object_bytes'),
+            'chunk_count': len(integrity.get('chunk_hashes', [])),
+            'etag': integrity.get('etag'),
+            'version_id': integrity.get('version_id')
+        }
+        
+        if clip:
+            if not integrity.get('chunk_times'):
+                return create_response(409, {'error': 'Recording has no time index; verify by first_byte and end_byte'})
+            chunks = clip_chunks(integrity, *clip)
+            if not chunks:
+                return create_response(400, {'error': f"No media between {clip[0]}s and {clip[1]}s"})
+            checked = {'start': clip[0], 'end': clip[1]}
+        elif byte_range:
+            if byte_range[1] > int(integrity['object_bytes']):
+                return create_response(400, {'error': f"end_byte is past the end of the recording ({integrity['object_bytes']} bytes)"})
+            chunks = byte_range_chunks(integrity, *byte_range)
+            checked = {'first_byte': byte_range[0], 'end_byte': byte_range[1]}
+        else:
+            return create_response(200, response)
+        
+        if len(chunks) > INTEGRITY_MAX_VERIFY_CHUNKS:
+            return create_response(400, {
+                'error': f"Range spans {len(chunks)} chunks; at most {INTEGRITY_MAX_VERIFY_CHUNKS} are verified per request"
+            })
+        
+        video_uri = session.get('video_uri', '')
+        video_s3_key = video_uri.replace('s3://', '').split('/', 1)[1] if video_uri.startswith('s3://') else video_uri
+        response['clip'] = {
+            **checked,
+            **verify_chunks(S3_BUCKET, video_s3_key, integrity, chunks, s3_client=s3_client)
+        }
+        
+        return create_response(200, response)
+        
+    except Exception as e:
+        logger.error(f"Error verifying recording integrity: {str(e)}")
+        return create_response(500, {'error': f'Error verifying recording integrity: {str(e)}'})
+
+
 def start_transcription_job(session: Dict[str, Any]) -> Dict[str, Any]:
     """
     Step 3: Speech-to-Text & Speaker Diarization
@@ -484,7 +636,7 @@ def start_transcription_job(session: Dict[str, Any]) -> Dict[str, Any]:
         response = transcribe_client.start_medical_transcription_job(
             MedicalTranscriptionJobName=job_name,
             LanguageCode='en-US',
-            MediaFormat='mp4',  # Or detect from file extension
+            MediaFormat=transcribe_media_format(key),
             Media={
                 'MediaFileUri': f"s3://{bucket}/{key}"
             },
@@ -593,6 +745,12 @@ def handler(event, context):
             return handle_upload_cme_recording(body)
         elif path.endswith('/cme/process') and http_method == 'POST':
             return handle_start_cme_processing(body)
+        elif path.endswith('/thumbnails') and http_method == 'GET':
+            session_id = (event.get('pathParameters') or {}).get('session_id') or path.rstrip('/').split('/')[-2]
+            return handle_get_thumbnails(session_id)
+        elif path.endswith('/integrity') and http_method == 'GET':
+            session_id = (event.get('pathParameters') or {}).get('session_id') or path.rstrip('/').split('/')[-2]
+            return handle_get_integrity(session_id, event.get('queryStringParameters') or {})
         else:
             return create_response(404, {'error': 'Endpoint not found'})
     
@@ -0,0 +1,783 @@
+"""
+CME Media Ingest - One-time preparation of an uploaded recording
+Probes the upload, extracts a compact mono speech track and starts Transcribe
+on it, and (when video is analyzed) packages the recording into short
+HLS/fMP4 segments so per-test clips become sub-playlists over those segments,
+and encodes the low-resolution proxy the CV analysis reads. The upload is
+fingerprinted (Merkle root over chunk hashes) for chain of custody. The
+packaging, proxy and fingerprint run as parallel workflow states of their own,
+so each has a full invocation to itself.
+"""
+
+import json
+import boto3
+import logging
+import math
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+
+from recording_integrity import fingerprint_recording
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+s3_client = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+transcribe_client = boto3.client('transcribe')
+
+CME_SESSIONS_TABLE = os.environ.get('CME_SESSIONS_TABLE', 'cme-sessions')
+
+# Target HLS segment length; clips are cut on these boundaries
+HLS_SEGMENT_SECONDS = float(os.environ.get('HLS_SEGMENT_SECONDS', '6'))
+
+# Re-encode with forced keyframes for exactly fixed segment durations. Stream
+# copy (the default) is far cheaper but cuts at the source's own keyframes.
+HLS_REENCODE = os.environ.get('HLS_REENCODE', 'false').lower() == 'true'
+
+HLS_UPLOAD_WORKERS = 16
+
+# Seconds of an invocation kept back from a subprocess for the uploads and
+# session update after it (see remaining_seconds)
+INGEST_RESERVE_SECONDS = float(os.environ.get('INGEST_RESERVE_SECONDS', '120'))
+
+# Analysis proxy: every CV path reads this low-resolution, low-frame-rate
+# rendition; evidentiary clips keep coming from the original. A keyframe
+# every PROXY_KEYFRAME_SECONDS lets clips be cut from it by stream copy.
+ANALYSIS_PROXY_ENABLED = os.environ.get('ANALYSIS_PROXY_ENABLED', 'true').lower() == 'true'
+PROXY_HEIGHT = int(os.environ.get('PROXY_HEIGHT', '360'))
+PROXY_FPS = float(os.environ.get('PROXY_FPS', '5'))
+PROXY_KEYFRAME_SECONDS = 1.0
+
+# Speech track handed to Transcribe: 'flac' (lossless) or 'opus' (smaller)
+TRANSCRIPTION_AUDIO_CODEC = os.environ.get('TRANSCRIPTION_AUDIO_CODEC', 'flac')
+TRANSCRIPTION_SAMPLE_RATE = 16000
+
+# Transcribe MediaFormat by ffprobe demuxer name and by file extension
+TRANSCRIBE_FORMATS_BY_DEMUXER = {
+    'mp3': 'mp3', 'wav': 'wav', 'flac': 'flac', 'ogg': 'ogg',
+    'amr': 'amr', 'webm': 'webm', 'matroska': 'webm', 'mov': 'mp4', 'mp4': 'mp4'
+}
+TRANSCRIBE_FORMATS_BY_EXTENSION = {
+    'mp3': 'mp3', 'wav': 'wav', 'flac': 'flac', 'ogg': 'ogg', 'opus': 'ogg',
+    'amr': 'amr', 'webm': 'webm', 'mp4': 'mp4', 'mov': 'mp4', 'm4a': 'm4a'
+}
+
+# Parsed media playlists already read by this container, keyed by S3 key
+_media_playlist_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def hls_prefix(session_id: str) -> str:
+    """S3 prefix holding a session's HLS package"""
+    return f"cme-hls/{session_id}"
+
+
+def recording_url(s3_bucket: str, key: str) -> str:
+    """Presigned URL ffmpeg/ffprobe can stream the object from"""
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': s3_bucket, 'Key': key},
+        ExpiresIn=3600
+    )
+
+
+def probe_media(source: str) -> Dict[str, Any]:
+    """
+    Container and stream inventory of a recording
+
+    Returns:
+        Dictionary with format_name (ffprobe demuxer list), has_video,
+        has_audio, duration and the audio sample_rate/channels if present
+    """
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', source
+    ], capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"Media probe failed: {result.stderr.strip()}")
+
+    info = json.loads(result.stdout or '{}')
+    streams = info.get('streams', [])
+    # Cover art is reported as a video stream; it is not a recording
+    video = [s for s in streams if s.get('codec_type') == 'video'
+             and not s.get('disposition', {}).get('attached_pic')]
+    audio = [s for s in streams if s.get('codec_type') == 'audio']
+
+    return {
+        'format_name': info.get('format', {}).get('format_name', ''),
+        'has_video': bool(video),
+        'has_audio': bool(audio),
+        'duration': float(info.get('format', {}).get('duration') or 0.0),
+        'sample_rate': int(audio[0].get('sample_rate', 0)) if audio else 0,
+        'channels': int(audio[0].get('channels', 0)) if audio else 0
+    }
+
+
+def transcribe_media_format(key: str, format_name: str = '') -> str:
+    """
+    Transcribe MediaFormat for a file, from the probed demuxer when known
+
+    ffprobe reports demuxer families ('mov,mp4,m4a,3gp,3g2,mj2',
+    'matroska,webm'), so the extension breaks ties within a family.
+    """
+    extension = key.rsplit('.', 1)[-1].lower() if '.' in key else ''
+    demuxers = [name for name in format_name.split(',') if name]
+
+    if extension in TRANSCRIBE_FORMATS_BY_EXTENSION and (
+            not demuxers or extension in demuxers
+            or TRANSCRIBE_FORMATS_BY_DEMUXER.get(demuxers[0]) == TRANSCRIBE_FORMATS_BY_EXTENSION[extension]):
+        return TRANSCRIBE_FORMATS_BY_EXTENSION[extension]
+    for name in demuxers:
+        if name in TRANSCRIBE_FORMATS_BY_DEMUXER:
+            return TRANSCRIBE_FORMATS_BY_DEMUXER[name]
+    return TRANSCRIBE_FORMATS_BY_EXTENSION.get(extension, 'mp4')
+
+
+def extract_transcription_audio(
+    session_id: str,
+    source: str,
+    s3_bucket: str,
+    codec: str = TRANSCRIPTION_AUDIO_CODEC,
+    timeout: float = 840
+) -> Dict[str, Any]:
+    """
+    Extract a mono 16 kHz speech track for Transcribe
+
+    Transcribe resamples to 16 kHz internally for speech anyway, so nothing is
+    lost, and the file it fetches shrinks from the full recording to a few MB
+    per hour of audio.
+
+    Returns:
+        Dictionary with the S3 key, Transcribe media_format, sample rate and size
+    """
+    if codec == 'opus':
+        codec_args, extension, media_format = ['-c:a', 'libopus', '-b:a', '32k', '-application', 'voip'], 'ogg', 'ogg'
+    else:
+        codec_args, extension, media_format = ['-c:a', 'flac', '-compression_level', '5'], 'flac', 'flac'
+
+    audio_key = f"cme-audio/{session_id}/speech.{extension}"
+
+    with tempfile.TemporaryDirectory() as audio_dir:
+        local_output = os.path.join(audio_dir, f"speech.{extension}")
+        result = subprocess.run([
+            'ffmpeg', '-v', 'error', '-nostdin', '-y',
+            '-i', source,
+            '-map', '0:a:0', '-vn', '-sn', '-dn',
+            '-ac', '1', '-ar', str(TRANSCRIPTION_SAMPLE_RATE),
+            *codec_args,
+            local_output
+        ], capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"Audio extraction failed: {result.stderr.strip()}")
+
+        size = os.path.getsize(local_output)
+        s3_client.upload_file(
+            local_output, s3_bucket, audio_key,
+            ExtraArgs={'ContentType': f"audio/{extension}"}
+        )
+
+    return {
+        'audio_key': audio_key,
+        'media_format': media_format,
+        'sample_rate': TRANSCRIPTION_SAMPLE_RATE,
+        'audio_bytes': size
+    }
+
+
+def start_transcription(
+    session_id: str,
+    s3_bucket: str,
+    media_key: str,
+    media_format: str,
+    sample_rate: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Step 3: Speech-to-Text & Speaker Diarization on the prepared media
+    Start AWS Transcribe Medical job with speaker identification
+    """
+    job_name = f"cme-transcribe-{session_id}-{int(time.time())}"
+
+    request = {
+        'MedicalTranscriptionJobName': job_name,
+        'LanguageCode': 'en-US',
+        'MediaFormat': media_format,
+        'Media': {'MediaFileUri': f"s3://{s3_bucket}/{media_key}"},
+        'OutputBucketName': s3_bucket,
+        'OutputKey': f"cme-transcripts/{session_id}/transcript.json",
+        'Settings': {
+            'ShowSpeakerLabels': True,
+            'MaxSpeakerLabels': 5,  # Examiner, patient, and possibly observers
+            'ChannelIdentification': False
+        },
+        'Specialty': 'PRIMARYCARE',
+        'Type': 'CONVERSATION'
+    }
+    if sample_rate:
+        request['MediaSampleRateHertz'] = sample_rate
+
+    transcribe_client.start_medical_transcription_job(**request)
+    logger.info(f"Started transcription job: {job_name} ({media_format})")
+
+    return {
+        'job_name': job_name,
+        'media_key': media_key,
+        'media_format': media_format,
+        'output_uri': f"s3://{s3_bucket}/cme-transcripts/{session_id}/transcript.json"
+    }
+
+
+def package_hls(
+    session_id: str,
+    video_s3_key: str,
+    s3_bucket: str,
+    segment_seconds: float = HLS_SEGMENT_SECONDS,
+    reencode: bool = HLS_REENCODE,
+    timeout: float = 840
+) -> Dict[str, Any]:
+    """
+    Package a recording as HLS with fMP4 segments and a master playlist
+
+    ffmpeg streams the recording from S3 through a presigned URL and writes
+    the package to /tmp, which is then uploaded in parallel.
+
+    Args:
+        session_id: CME session ID
+        video_s3_key: S3 key of the uploaded recording
+        s3_bucket: Bucket holding the recording and the package
+        segment_seconds: Target segment duration
+        reencode: Force keyframes for exactly fixed segment durations
+        timeout: Seconds ffmpeg may run (see remaining_seconds)
+
+    Returns:
+        Keys of the master and media playlists plus segment statistics
+    """
+    source = recording_url(s3_bucket, video_s3_key)
+    prefix = hls_prefix(session_id)
+
+    if reencode:
+        codec_args = [
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23',
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+            '-c:a', 'aac', '-b:a', '128k'
+        ]
+    else:
+        codec_args = ['-c', 'copy']
+
+    started = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as package_dir:
+        command = [
+            'ffmpeg', '-v', 'error', '-nostdin', '-y',
+            '-i', source,
+            '-map', '0:v:0?', '-map', '0:a:0?',
+            *codec_args,
+            '-f', 'hls',
+            '-hls_time', str(segment_seconds),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', os.path.join(package_dir, 'segment_%05d.m4s'),
+            '-master_pl_name', 'master.m3u8',
+            os.path.join(package_dir, 'media.m3u8')
+        ]
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"HLS packaging failed: {result.stderr.strip()}")
+
+        names = sorted(os.listdir(package_dir))
+
+        def upload(name):
+            content_type = 'application/vnd.apple.mpegurl' if name.endswith('.m3u8') else 'video/mp4'
+            s3_client.upload_file(
+                os.path.join(package_dir, name), s3_bucket, f"{prefix}/{name}",
+                ExtraArgs={'ContentType': content_type}
+            )
+            return os.path.getsize(os.path.join(package_dir, name))
+
+        with ThreadPoolExecutor(max_workers=HLS_UPLOAD_WORKERS) as pool:
+            package_bytes = sum(pool.map(upload, names))
+
+        with open(os.path.join(package_dir, 'media.m3u8')) as f:
+            playlist = parse_media_playlist(f.read())
+
+    hls = {
+        'master_key': f"{prefix}/master.m3u8",
+        'media_playlist_key': f"{prefix}/media.m3u8",
+        'segment_seconds': segment_seconds,
+        'segment_count': len(playlist['segments']),
+        'duration': round(sum(segment['duration'] for segment in playlist['segments']), 3),
+        'package_bytes': package_bytes,
+        'reencoded': reencode
+    }
+
+    logger.info(f"Packaged {video_s3_key} into {hls['segment_count']} HLS segments "
+                f"in {time.perf_counter() - started:.1f}s")
+    return hls
+
+
+def proxy_encode_command(source: str, output_path: str, height: int = PROXY_HEIGHT, fps: float = PROXY_FPS) -> list:
+    """ffmpeg command encoding the analysis proxy of source into output_path"""
+    keyframe_interval = max(1, int(round(fps * PROXY_KEYFRAME_SECONDS)))
+    return [
+        'ffmpeg', '-v', 'error', '-nostdin', '-y',
+        '-i', source, '-map', '0:v:0', '-an',
+        '-vf', f'fps={fps},scale=-2:{height}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '26', '-pix_fmt', 'yuv420p',
+        '-g', str(keyframe_interval), '-keyint_min', str(keyframe_interval), '-sc_threshold', '0',
+        '-movflags', '+faststart',
+        output_path
+    ]
+
+
+def build_analysis_proxy(
+    session_id: str,
+    video_s3_key: str,
+    s3_bucket: str,
+    height: int = PROXY_HEIGHT,
+    fps: float = PROXY_FPS,
+    timeout: float = 840
+) -> Dict[str, Any]:
+    """
+    Encode the low-resolution analysis proxy of a recording
+
+    Video only, scaled to height (width keeps the aspect ratio), resampled to
+    fps and encoded with a keyframe every PROXY_KEYFRAME_SECONDS, so any clip
+    can be cut from it by stream copy on a whole second.
+
+    Returns:
+        Dictionary with proxy_s3_key, geometry, proxy_bytes, source_bytes
+        and encode_seconds
+    """
+    source = recording_url(s3_bucket, video_s3_key)
+    proxy_key = f"cme-proxies/{session_id}/analysis_{height}p{fps:g}.mp4"
+    started = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as proxy_dir:
+        local_proxy = os.path.join(proxy_dir, 'proxy.mp4')
+        command = proxy_encode_command(source, local_proxy, height, fps)
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"Analysis proxy encode failed: {result.stderr.strip()}")
+
+        proxy_bytes = os.path.getsize(local_proxy)
+        s3_client.upload_file(local_proxy, s3_bucket, proxy_key, ExtraArgs={'ContentType': 'video/mp4'})
+
+    source_bytes = int(s3_client.head_object(Bucket=s3_bucket, Key=video_s3_key)['ContentLength'])
+    proxy = {
+        'proxy_s3_key': proxy_key,
+        'height': height,
+        'fps': fps,
+        'keyframe_seconds': PROXY_KEYFRAME_SECONDS,
+        'proxy_bytes': proxy_bytes,
+        'source_bytes': source_bytes,
+        'encode_seconds': round(time.perf_counter() - started, 3)
+    }
+
+    logger.info(f"Built {height}p {fps:g} fps analysis proxy for {video_s3_key}: "
+                f"{proxy_bytes} of {source_bytes} bytes in {proxy['encode_seconds']}s")
+    return proxy
+
+
+def proxy_clip_start(start_time: float) -> float:
+    """Proxy keyframe at or before start_time, where a stream-copy cut begins exactly"""
+    return max(0.0, math.floor(start_time / PROXY_KEYFRAME_SECONDS) * PROXY_KEYFRAME_SECONDS)
+
+
+def parse_media_playlist(text: str) -> Dict[str, Any]:
+    """
+    Parse an HLS media playlist into its init segment and timed segments
+
+    Returns:
+        Dictionary with version, target_duration, init_uri and segments, each
+        segment holding uri, duration and its start offset in seconds
+    """
+    playlist = {'version': 7, 'target_duration': 0, 'init_uri': None, 'segments': []}
+    duration = None
+    start = 0.0
+
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-VERSION:'):
+            playlist['version'] = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            playlist['target_duration'] = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-MAP:'):
+            attributes = line.split(':', 1)[1]
+            playlist['init_uri'] = attributes.split('URI="', 1)[1].split('"', 1)[0]
+        elif line.startswith('#EXTINF:'):
+            duration = float(line.split(':', 1)[1].split(',', 1)[0])
+        elif line and not line.startswith('#') and duration is not None:
+            playlist['segments'].append({'uri': line, 'duration': duration, 'start': start})
+            start += duration
+            duration = None
+
+    return playlist
+
+
+def load_media_playlist(s3_bucket: str, playlist_key: str) -> Dict[str, Any]:
+    """Read and parse a media playlist once per container"""
+    playlist = _media_playlist_cache.get(playlist_key)
+    if playlist is None:
+        response = s3_client.get_object(Bucket=s3_bucket, Key=playlist_key)
+        playlist = parse_media_playlist(response['Body'].read().decode('utf-8'))
+        _media_playlist_cache[playlist_key] = playlist
+    return playlist
+
+
+def build_clip_playlist(playlist: Dict[str, Any], start_time: float, duration: float) -> Optional[str]:
+    """
+    Media playlist covering [start_time, start_time + duration]
+
+    References the existing segments (same directory, same URIs) and sets
+    EXT-X-START so players begin at the exact clip start inside the first
+    segment. Returns None when the window lies past the end of the recording.
+    """
+    end_time = start_time + duration
+    segments = [
+        segment for segment in playlist['segments']
+        if segment['start'] < end_time and segment['start'] + segment['duration'] > start_time
+    ]
+    if not segments:
+        return None
+
+    first_index = playlist['segments'].index(segments[0])
+    target_duration = max(int(math.ceil(segment['duration'])) for segment in segments)
+
+    lines = [
+        '#EXTM3U',
+        f"#EXT-X-VERSION:{playlist['version']}",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        f"#EXT-X-MEDIA-SEQUENCE:{first_index}",
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        f"#EXT-X-START:TIME-OFFSET={max(0.0, start_time - segments[0]['start']):.3f},PRECISE=YES"
+    ]
+    if playlist['init_uri']:
+        lines.append(f'#EXT-X-MAP:URI="{playlist["init_uri"]}"')
+    for segment in segments:
+        lines += [f"#EXTINF:{segment['duration']:.6f},", segment['uri']]
+    lines.append('#EXT-X-ENDLIST')
+
+    return '\n'.join(lines) + '\n'
+
+
+def build_clip_playlist_key(media_playlist_key: str, start_time: float, duration: float) -> str:
+    """S3 key of the clip playlist write_clip_playlist publishes for a window"""
+    return f"{media_playlist_key.rsplit('/', 1)[0]}/clip_{int(start_time)}_{int(duration)}.m3u8"
+
+
+def write_clip_playlist(
+    s3_bucket: str,
+    media_playlist_key: str,
+    start_time: float,
+    duration: float
+) -> Optional[str]:
+    """
+    Publish a per-test clip as a sub-playlist next to the session's segments
+
+    No media is encoded or copied; only a few hundred bytes of playlist text
+    are written.
+
+    Returns:
+        S3 key of the clip playlist, or None if the window is out of range
+    """
+    playlist = load_media_playlist(s3_bucket, media_playlist_key)
+    text = build_clip_playlist(playlist, start_time, duration)
+    if text is None:
+        return None
+
+    clip_key = build_clip_playlist_key(media_playlist_key, start_time, duration)
+    s3_client.put_object(
+        Bucket=s3_bucket,
+        Key=clip_key,
+        Body=text.encode('utf-8'),
+        ContentType='application/vnd.apple.mpegurl'
+    )
+    return clip_key
+
+
+def clip_media_start(s3_bucket: str, media_playlist_key: str, start_time: float) -> float:
+    """
+    Recording time at which a clip playlist starting at start_time begins
+
+    Clip playlists reference whole segments, so their media (and a clip
+    materialized from them) starts at the first covering segment's start.
+    """
+    for segment in load_media_playlist(s3_bucket, media_playlist_key)['segments']:
+        if segment['start'] + segment['duration'] > start_time:
+            return segment['start']
+    return start_time
+
+
+def materialize_clip(s3_bucket: str, clip_playlist_key: str, output_key: str) -> str:
+    """
+    Remux a clip playlist into a standalone MP4 (stream copy, no encoding)
+
+    Only needed by consumers that cannot read HLS, such as the asynchronous
+    Rekognition video APIs. Downloads just the clip's segments.
+    """
+    base = clip_playlist_key.rsplit('/', 1)[0]
+    response = s3_client.get_object(Bucket=s3_bucket, Key=clip_playlist_key)
+    playlist = parse_media_playlist(response['Body'].read().decode('utf-8'))
+
+    uris = ([playlist['init_uri']] if playlist['init_uri'] else []) + [s['uri'] for s in playlist['segments']]
+
+    with tempfile.TemporaryDirectory() as clip_dir:
+        fragmented = os.path.join(clip_dir, 'clip_fragmented.mp4')
+        with open(fragmented, 'wb') as out:
+            # init segment followed by its fragments is a valid fragmented MP4
+            for uri in uris:
+                out.write(s3_client.get_object(Bucket=s3_bucket, Key=f"{base}/{uri}")['Body'].read())
+
+        local_output = os.path.join(clip_dir, 'clip.mp4')
+        result = subprocess.run([
+            'ffmpeg', '-v', 'error', '-nostdin', '-y', '-i', fragmented,
+            '-c', 'copy', '-movflags', '+faststart', local_output
+        ], capture_output=True, text=True, timeout=120)
+        if result.returncode != 0:
+            raise RuntimeError(f"Clip remux failed: {result.stderr.strip()}")
+
+        s3_client.upload_file(local_output, s3_bucket, output_key)
+
+    return output_key
+
+
+def remaining_seconds(context, reserve: float = INGEST_RESERVE_SECONDS, default: float = 840) -> float:
+    """
+    Timeout for a subprocess: the invocation's remaining time less reserve
+
+    The reserve covers what follows the subprocess (uploads, the session
+    update), so ffmpeg is stopped and the failure handled before Lambda
+    kills the invocation. Without a Lambda context the default applies.
+    """
+    if context is None:
+        return default
+    return max(1.0, context.get_remaining_time_in_millis() / 1000.0 - reserve)
+
+
+def ingest_recording(session_id: str, video_s3_key: str, s3_bucket: str, context=None) -> Dict[str, Any]:
+    """
+    Ingest stage: probe the upload and start transcription on an extracted
+    speech track
+
+    The renditions are separate workflow states, each in its own
+    invocation: package_recording_hls, build_recording_proxy and
+    fingerprint_upload run in parallel once this returns, and
+    merge_renditions collects what they produced.
+
+    Video is analyzed only when the recording has a video stream and the
+    session's jurisdiction allows video (Audio Only sessions do not). The
+    speech track extraction gets the invocation's remaining time (context is
+    the Lambda context), less a reserve that still lets a timed-out
+    extraction fall back to transcribing the original.
+
+    Returns:
+        Dictionary with media (probe results), transcription and analyze_video
+    """
+    sessions_table = dynamodb.Table(CME_SESSIONS_TABLE)
+    session = sessions_table.get_item(Key={'session_id': session_id}).get('Item') or {}
+
+    source = recording_url(s3_bucket, video_s3_key)
+    media = probe_media(source)
+    media['media_format'] = transcribe_media_format(video_s3_key, media['format_name'])
+
+    if not media['has_audio']:
+        raise ValueError(f"Recording {video_s3_key} has no audio track to transcribe")
+
+    try:
+        audio = extract_transcription_audio(session_id, source, s3_bucket, timeout=remaining_seconds(context))
+        transcription = start_transcription(
+            session_id, s3_bucket, audio['audio_key'], audio['media_format'], audio['sample_rate']
+        )
+        transcription['audio_bytes'] = audio['audio_bytes']
+    except Exception as e:
+        # Transcribe can still read the original upload in its detected format
+        logger.error(f"Speech track extraction failed, transcribing original: {str(e)}")
+        transcription = start_transcription(session_id, s3_bucket, video_s3_key, media['media_format'])
+
+    video_allowed = session.get('recording_allowed', {}).get('video', True)
+    analyze_video = media['has_video'] and bool(video_allowed)
+
+    sessions_table.update_item(
+        Key={'session_id': session_id},
+        UpdateExpression='SET media = :media, transcription_job_name = :job, processing_stage = :stage, updated_at = :updated',
+        ExpressionAttributeValues={
+            ':media': json.loads(json.dumps(media), parse_float=Decimal),
+            ':job': transcription['job_name'],
+            ':stage': 'transcription',
+            ':updated': int(time.time())
+        }
+    )
+
+    logger.info(f"Ingested {video_s3_key}: format={media['media_format']} "
+                f"video={media['has_video']} analyze_video={analyze_video}")
+
+    return {
+        'session_id': session_id,
+        'video_s3_key': video_s3_key,
+        'media': media,
+        'transcription': transcription,
+        'analyze_video': analyze_video
+    }
+
+
+def _store_on_session(session_id: str, attribute: str, value: Dict[str, Any]) -> None:
+    """Write one ingest output to the session (parallel states set different attributes)"""
+    dynamodb.Table(CME_SESSIONS_TABLE).update_item(
+        Key={'session_id': session_id},
+        UpdateExpression='SET #attribute = :value',
+        ExpressionAttributeNames={'#attribute': attribute},
+        ExpressionAttributeValues={':value': json.loads(json.dumps(value), parse_float=Decimal)}
+    )
+
+
+def package_recording_hls(
+    session_id: str,
+    video_s3_key: str,
+    s3_bucket: str,
+    analyze_video: bool = True,
+    timeout: float = 840
+) -> Dict[str, Any]:
+    """
+    HLS state of ingest: package the recording and store the package on the session
+
+    A failed packaging is logged and clip extraction falls back to the original.
+
+    Returns:
+        Dictionary with hls and hls_playlist_key (both None when skipped or failed)
+    """
+    hls = None
+    if analyze_video:
+        try:
+            hls = package_hls(session_id, video_s3_key, s3_bucket, timeout=timeout)
+            _store_on_session(session_id, 'hls', hls)
+        except Exception as e:
+            # Transcription is already running; clips are then cut from the original
+            logger.error(f"HLS packaging failed, clips will be cut from the original: {str(e)}")
+            hls = None
+    return {'hls': hls, 'hls_playlist_key': hls['media_playlist_key'] if hls else None}
+
+
+def build_recording_proxy(
+    session_id: str,
+    video_s3_key: str,
+    s3_bucket: str,
+    analyze_video: bool = True,
+    timeout: float = 840
+) -> Dict[str, Any]:
+    """
+    Proxy state of ingest: encode the analysis proxy and store it on the session
+
+    A failed encode is logged and video analysis reads the original.
+
+    Returns:
+        Dictionary with proxy and proxy_s3_key (both None when skipped or failed)
+    """
+    proxy = None
+    if analyze_video and ANALYSIS_PROXY_ENABLED:
+        try:
+            proxy = build_analysis_proxy(session_id, video_s3_key, s3_bucket, timeout=timeout)
+            _store_on_session(session_id, 'analysis_proxy', proxy)
+        except Exception as e:
+            logger.error(f"Analysis proxy failed, video analysis will read the original: {str(e)}")
+            proxy = None
+    return {'proxy': proxy, 'proxy_s3_key': proxy['proxy_s3_key'] if proxy else None}
+
+
+def fingerprint_upload(session_id: str, video_s3_key: str, s3_bucket: str) -> Dict[str, Any]:
+    """
+    Integrity state of ingest: hash the upload into its fingerprint
+
+    The fingerprint is stored on the session with the time span of each chunk
+    so clips can be verified by time later; a failed hash is logged and the
+    pipeline carries on.
+
+    Returns:
+        Dictionary with integrity (root and chunk layout, or None; the chunk
+        hashes stay on the session)
+    """
+    integrity = None
+    try:
+        integrity = fingerprint_recording(s3_bucket, video_s3_key, recording_url(s3_bucket, video_s3_key), s3_client)
+        _store_on_session(session_id, 'recording_integrity', integrity)
+    except Exception as e:
+        logger.error(f"Recording integrity hash failed for {video_s3_key}: {str(e)}")
+        integrity = None
+
+    return {
+        'integrity': {
+            'algorithm': integrity['algorithm'],
+            'root': integrity['root'],
+            'chunk_bytes': integrity['chunk_bytes'],
+            'chunk_count': len(integrity['chunk_hashes'])
+        } if integrity else None
+    }
+
+
+def merge_renditions(session_id: str, ingest: Dict[str, Any], outputs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine the ingest result with the outputs of the parallel rendition states
+
+    A state that failed outright (e.g. its invocation timed out) is caught
+    by the workflow and arrives here with an error instead of its output; its
+    rendition is then None and the pipeline degrades to the original.
+
+    Returns:
+        The ingest result plus hls, hls_playlist_key, proxy, proxy_s3_key and integrity
+    """
+    merged = {
+        **ingest,
+        'hls': None, 'hls_playlist_key': None,
+        'proxy': None, 'proxy_s3_key': None,
+        'integrity': None
+    }
+    for output in outputs:
+        if 'error' in output:
+            logger.error(f"Ingest state failed for {session_id}, using the original: "
+                         f"{output['error'].get('Error')}: {output['error'].get('Cause')}")
+            continue
+        merged.update({key: value for key, value in output.items() if key in merged})
+    return merged
+
+
+def handler(event, context):
+    """
+    Lambda handler for Step Functions invocation (the ingest states)
+
+    action selects the state: 'ingest' (default; probe and transcription),
+    'hls', 'proxy' and 'integrity' (the parallel renditions) or 'merge'.
+    """
+    try:
+        logger.info(f"Media Ingest invoked: {json.dumps(event)}")
+
+        s3_bucket = os.environ.get('S3_BUCKET', 'default-bucket')
+        action = event.get('action', 'ingest')
+        analyze_video = event.get('analyze_video', True)
+
+        if action == 'hls':
+            result = package_recording_hls(event['session_id'], event['video_s3_key'], s3_bucket,
+                                           analyze_video, timeout=remaining_seconds(context))
+        elif action == 'proxy':
+            result = build_recording_proxy(event['session_id'], event['video_s3_key'], s3_bucket,
+                                           analyze_video, timeout=remaining_seconds(context))
+        elif action == 'integrity':
+            result = fingerprint_upload(event['session_id'], event['video_s3_key'], s3_bucket)
+        elif action == 'merge':
+            result = merge_renditions(event['session_id'], event['ingest'], event.get('renditions', []))
+        else:
+            result = ingest_recording(event['session_id'], event['video_s3_key'], s3_bucket, context)
+
+        return {
+            'statusCode': 200,
+            **result
+        }
+
+    except Exception as e:
+        logger.error(f"Error in media ingest handler: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise e
@@ -6,6 +6,7 @@ Implements Steps 4 & 7 from the technical documentation
 import json
 import boto3
 import logging
+import os
 import re
 from typing import Dict, Any, List, Tuple, Optional
 from decimal import Decimal
@@ -18,6 +19,10 @@ logger.setLevel(logging.INFO)
 comprehend_client = boto3.client('comprehend')
 bedrock_client = boto3.client('bedrock-runtime')
 
+# Declared tests are handed to the video Lambda in chunks of this many,
+# so each invocation fetches the recording once for several tests
+VIDEO_BATCH_SIZE = int(os.environ.get('VIDEO_BATCH_SIZE', '8'))
+
 # Comprehensive Medical Test Taxonomy for CME/IME Detection
 # Based on common physical examination tests in medico-legal contexts
 TEST_TAXONOMY = {
@@ -406,6 +411,10 @@ TEST_TAXONOMY = {
     }
 }
 
+# Raised-voice flags from the speech track: an examiner interval whose peak
+# is this many dB over their usual level is high severity
+RAISED_VOICE_HIGH_DB = float(os.environ.get('RAISED_VOICE_HIGH_DB', '16'))
+
 # Demeanor analysis patterns
 NEGATIVE_TONE_INDICATORS = [
     'that\'s ridiculous', 'you\'re lying', 'i don\'t believe', 'that\'s impossible',
@@ -689,6 +698,62 @@ class CMENLPProcessor:
         
         return flags
     
+    def analyze_vocal_intensity(
+        self,
+        transcript: Dict[str, Any],
+        speech_source: str,
+        examiner_speaker_label: str = 'speaker_0'
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Step 7 (audio): Raised-voice detection on the speech track
+        Flags shouting or sharp tone that the transcript alone does not show
+        
+        Args:
+            transcript: AWS Transcribe output (diarization attributes intervals to speakers)
+            speech_source: Speech track URL or path ffmpeg can read
+            examiner_speaker_label: Speaker label for the examiner
+            
+        Returns:
+            (raised_voice flags, analysis summary); ([], None) when the audio
+            could not be analyzed
+        """
+        try:
+            from audio_demeanor import detect_raised_voice
+            
+            analysis = detect_raised_voice(speech_source, transcript)
+        except Exception as e:
+            logger.error(f"Error analyzing speech audio: {str(e)}")
+            return [], None
+        
+        items = transcript.get('results', {}).get('items', [])
+        flags = []
+        for interval in analysis['intervals']:
+            speaker = interval['speaker_label']
+            is_examiner = speaker == examiner_speaker_label
+            if is_examiner:
+                severity = 'high' if interval['peak_rise_db'] >= RAISED_VOICE_HIGH_DB else 'medium'
+            else:
+                severity = 'low'
+            
+            flags.append({
+                'flag_type': 'raised_voice',
+                'timestamp': interval['start'],
+                'end_timestamp': interval['end'],
+                'speaker_label': speaker,
+                'transcript_excerpt': self._get_segment_text(
+                    {'start_time': interval['start'], 'end_time': interval['end']}, items
+                )[:200],
+                'severity': severity,
+                'description': (
+                    f"{'Examiner' if is_examiner else speaker} voice raised {interval['peak_rise_db']} dB "
+                    f"above their usual level for {interval['end'] - interval['start']:.1f}s "
+                    f"(pitch {interval['pitch_rise_semitones']:+.1f} semitones)"
+                )
+            })
+        
+        summary = {key: analysis[key] for key in ('speakers', 'audio_seconds', 'processing_seconds', 'realtime_factor')}
+        return flags, summary
+    
     def extract_medical_entities(self, text: str) -> List[Dict[str, Any]]:
         """Extract medical entities using AWS Comprehend Medical"""
         entities = []
@@ -715,14 +780,32 @@ class CMENLPProcessor:
             return []
 
 
+def batch_declared_tests(
+    declared_tests: List[Dict[str, Any]],
+    batch_size: int = VIDEO_BATCH_SIZE
+) -> List[List[Dict[str, Any]]]:
+    """
+    Split declared tests into chunks for the video Lambda's batch mode
+    Tests are ordered by timestamp first, so each chunk covers one stretch
+    of the recording.
+    """
+    ordered = sorted(declared_tests, key=lambda test: float(test.get('timestamp', 0) or 0))
+    size = max(1, batch_size)
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+
 def process_transcript_for_cme_analysis(
     session_id: str,
-    transcript_data: Dict[str, Any]
+    transcript_data: Dict[str, Any],
+    speech_source: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Main processing function for CME transcript analysis
     Combines test intent detection and demeanor analysis
     **NOW WITH DYNAMODB PERSISTENCE**
+    
+    With speech_source (the session's speech track), demeanor analysis also
+    flags raised-voice intervals from the audio.
     """
     import os
     import boto3
@@ -757,8 +840,18 @@ def process_transcript_for_cme_analysis(
         persisted_step_ids.append(step_id)
         logger.info(f"Persisted declared step: {step_id} - {test.get('label')}")
     
+    # Chunks carry each test's step ID so observed actions link back to it
+    declared_test_batches = batch_declared_tests([
+        {**test, 'declared_step_id': step_id}
+        for test, step_id in zip(declared_tests, persisted_step_ids)
+    ])
+    
     # Step 7: Analyze demeanor
     demeanor_flags = processor.analyze_examiner_demeanor(transcript_data)
+    audio_analysis = None
+    if speech_source:
+        voice_flags, audio_analysis = processor.analyze_vocal_intensity(transcript_data, speech_source)
+        demeanor_flags.extend(voice_flags)
     
     # *** PERSIST DEMEANOR FLAGS TO DYNAMODB ***
     persisted_flag_ids = []
@@ -775,6 +868,9 @@ def process_transcript_for_cme_analysis(
             'description': flag.get('description', ''),
             'created_at': int(time.time())
         }
+        if 'end_timestamp' in flag:
+            flag_item['end_timestamp'] = Decimal(str(flag['end_timestamp']))
+            flag_item['speaker_label'] = flag.get('speaker_label', '')
         
         demeanor_table.put_item(Item=flag_item)
         persisted_flag_ids.append(flag_id)
@@ -794,8 +890,10 @@ def process_transcript_for_cme_analysis(
     
     return {
         'session_id': session_id,
-        'declared_tests': declared_tests,  # Return for Step Function to map over
+        'declared_tests': declared_tests,
+        'declared_test_batches': declared_test_batches,  # Return for Step Function to map over
         'demeanor_flags': demeanor_flags,
+        'audio_analysis': audio_analysis,
         'persisted_step_ids': persisted_step_ids,
         'persisted_flag_ids': persisted_flag_ids,
         'processing_timestamp': int(time.time()),
@@ -874,8 +972,18 @@ def handler(event, context):
                     transcript_json = response['Body'].read().decode('utf-8')
                     transcript_data = json.loads(transcript_json)
         
+        # Speech track extracted at ingest, streamed by ffmpeg for the audio demeanor pass
+        speech_source = None
+        speech_s3_key = event.get('speech_s3_key')
+        s3_bucket = os.environ.get('S3_BUCKET')
+        if speech_s3_key and s3_bucket:
+            import boto3
+            speech_source = boto3.client('s3').generate_presigned_url(
+                'get_object', Params={'Bucket': s3_bucket, 'Key': speech_s3_key}, ExpiresIn=3600
+            )
+        
         # Process transcript
-        result = process_transcript_for_cme_analysis(session_id, transcript_data)
+        result = process_transcript_for_cme_analysis(session_id, transcript_data, speech_source=speech_source)
         
         return {
             'statusCode': 200,
@@ -341,10 +341,14 @@ class CMEReportGenerator:
             )
             consents = consent_response.get('Items', [])
             
+            session_actions = [step_actions[step['declared_step_id']] for step in declared_steps
+                               if step.get('declared_step_id') in step_actions]
+            
             return {
                 'session': session,
                 'declared_steps': sorted(declared_steps, key=lambda x: float(x.get('timestamp', 0))),
                 'step_actions': step_actions,
+                'analysis_cascade': summarize_analysis_tiers(session_actions),
                 'demeanor_flags': sorted(demeanor_flags, key=lambda x: float(x.get('timestamp', 0))),
                 'consents': consents
             }
@@ -369,6 +373,17 @@ class CMEReportGenerator:
                                  if step_actions.get(step['declared_step_id'], {}).get('motion_present') == 'not_observed')
         high_severity_flags = sum(1 for flag in demeanor_flags if flag.get('severity') == 'high')
         
+        # Scrub previews: a handful of sprite sheets serve every thumbnail in the report
+        track = session.get('thumbnail_track') or {}
+        sprite_urls = [
+            s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.s3_bucket, 'Key': key},
+                ExpiresIn=86400
+            )
+            for key in track.get('sprite_keys', [])
+        ]
+        
         # Build HTML content
         content = f"""
         <div class="header">
@@ -467,6 +482,7 @@ class CMEReportGenerator:
                         <div class="confidence-fill" style="width: {confidence * 100}%"></div>
                     </div>
                     <small>Detection Confidence: {confidence * 100:.1f}%</small>
+                    {self._thumbnail_tile(track, sprite_urls, timestamp)}
             """
             
             if include_video and step.get('video_snippet_uri'):
@@ -483,6 +499,9 @@ class CMEReportGenerator:
         </div>
         """
         
+        if sprite_urls:
+            content += self._scrub_preview_section(track, sprite_urls)
+        
         # Add demeanor analysis section
         if demeanor_flags:
             content += """
@@ -518,6 +537,20 @@ class CMEReportGenerator:
             
             content += "</div>"
         
+        # Add analysis cascade section
+        cascade = data.get('analysis_cascade') or {}
+        if cascade.get('total'):
+            tier_counts = ', '.join(f"{tier.replace('_', ' ')}: {count}" for tier, count in cascade['tiers'].items())
+            latency_saved = cascade.get('latency_saved_seconds')
+            content += f"""
+        <div class="section">
+            <h2>🔀 Analysis Cascade</h2>
+            <p><strong>Deciding tier:</strong> {tier_counts}</p>
+            <p><strong>Escalated to Rekognition:</strong> {cascade['escalation_rate'] * 100:.0f}% of tests</p>
+            <p><strong>Estimated latency saved:</strong> {f'{latency_saved:.0f} seconds' if latency_saved is not None else 'N/A'}</p>
+        </div>
+        """
+        
         # Add legal basis section
         recording_rules = session.get('recording_allowed', {})
         content += f"""
@@ -541,6 +574,75 @@ class CMEReportGenerator:
         
         return HTML_REPORT_TEMPLATE.format(content=content)
     
+    @staticmethod
+    def _tile_style(track: Dict[str, Any], sprite_urls: List[str], timestamp: float) -> Optional[str]:
+        """CSS showing the sprite tile that covers timestamp"""
+        columns = int(track.get('columns', 10))
+        per_sheet = columns * int(track.get('rows', 10))
+        tile_width = int(track.get('tile_width', 160))
+        tile_height = int(track.get('tile_height', 90))
+        
+        sheet, tile = divmod(int(timestamp // float(track.get('interval', 10))), per_sheet)
+        if sheet >= len(sprite_urls):
+            return None
+        row, column = divmod(tile, columns)
+        return (f"width:{tile_width}px;height:{tile_height}px;"
+                f"background:url('{sprite_urls[sheet]}') -{column * tile_width}px -{row * tile_height}px;")
+    
+    def _thumbnail_tile(self, track: Dict[str, Any], sprite_urls: List[str], timestamp: float) -> str:
+        """Thumbnail of the recording at a timeline item"""
+        if not sprite_urls:
+            return ''
+        style = self._tile_style(track, sprite_urls, timestamp)
+        return f'<div style="{style}border-radius:4px;margin-top:10px;"></div>' if style else ''
+    
+    def _scrub_preview_section(self, track: Dict[str, Any], sprite_urls: List[str]) -> str:
+        """Hover-to-scrub strip over the whole recording, driven by the sprite sheets"""
+        config = json.dumps({
+            'sprites': sprite_urls,
+            'interval': float(track.get('interval', 10)),
+            'columns': int(track.get('columns', 10)),
+            'rows': int(track.get('rows', 10)),
+            'tileWidth': int(track.get('tile_width', 160)),
+            'tileHeight': int(track.get('tile_height', 90)),
+            'duration': float(track.get('duration', 0))
+        })
+        
+        return """
+        <div class="section">
+            <h2>🎞️ Recording Preview</h2>
+            <p>Hover over the bar to preview the recording.</p>
+            <div id="scrub-bar" style="height:24px;background:#e2e8f0;border-radius:12px;cursor:pointer;"></div>
+            <div style="display:flex;align-items:center;gap:12px;margin-top:12px;">
+                <div id="scrub-tile" style="border-radius:4px;"></div>
+                <span id="scrub-time"></span>
+            </div>
+        </div>
+        <script>
+        (function () {
+            var track = """ + config + """;
+            var bar = document.getElementById('scrub-bar');
+            var tile = document.getElementById('scrub-tile');
+            var label = document.getElementById('scrub-time');
+            var perSheet = track.columns * track.rows;
+            bar.addEventListener('mousemove', function (event) {
+                var rect = bar.getBoundingClientRect();
+                var t = Math.max(0, (event.clientX - rect.left) / rect.width * track.duration);
+                var index = Math.floor(t / track.interval);
+                var sheet = Math.floor(index / perSheet);
+                if (sheet >= track.sprites.length) return;
+                var position = index % perSheet;
+                tile.style.width = track.tileWidth + 'px';
+                tile.style.height = track.tileHeight + 'px';
+                tile.style.background = 'url(' + track.sprites[sheet] + ') -' +
+                    (position % track.columns) * track.tileWidth + 'px -' +
+                    Math.floor(position / track.columns) * track.tileHeight + 'px';
+                label.textContent = new Date(t * 1000).toISOString().substr(11, 8);
+            });
+        })();
+        </script>
+        """
+    
     def create_report_bundle(
         self,
         session_id: str,
@@ -622,6 +724,42 @@ class CMEReportGenerator:
             return {'error': str(e)}
 
 
+def summarize_analysis_tiers(actions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Escalation rate and latency saved by the tiered video analysis
+    
+    Latency saved is estimated per locally decided test as the session's mean
+    Rekognition turnaround minus the local decision time.
+    """
+    tiers: Dict[str, int] = {}
+    for action in actions:
+        tier = action.get('decided_by_tier', 'rekognition')
+        tiers[tier] = tiers.get(tier, 0) + 1
+    
+    def decision_seconds(action):
+        value = (action.get('analysis_details') or {}).get('decision_seconds')
+        return float(value) if value is not None else None
+    
+    rekognition_waits = [decision_seconds(a) for a in actions
+                         if a.get('decided_by_tier', 'rekognition') == 'rekognition' and decision_seconds(a) is not None]
+    local_times = [decision_seconds(a) or 0.0 for a in actions
+                   if a.get('decided_by_tier') in ('local_motion', 'pose')]
+    
+    latency_saved = None
+    if rekognition_waits and local_times:
+        mean_wait = sum(rekognition_waits) / len(rekognition_waits)
+        latency_saved = round(sum(max(0.0, mean_wait - t) for t in local_times), 1)
+    
+    escalated = sum(count for tier, count in tiers.items() if tier.startswith('rekognition'))
+    
+    return {
+        'total': len(actions),
+        'tiers': tiers,
+        'escalation_rate': round(escalated / len(actions), 3) if actions else 0.0,
+        'latency_saved_seconds': latency_saved
+    }
+
+
 # Import os for environment variables
 import os
 
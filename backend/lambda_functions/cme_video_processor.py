@@ -5,13 +5,48 @@ Implements Steps 5 & 6 from the technical documentation
 
 import json
 import boto3
+import collections
+import hashlib
+import itertools
 import logging
-from typing import Dict, Any, List, Optional, Tuple
+import re
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 import subprocess
 import os
 import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
+import numpy as np
+
+from analysis_cache import AnalysisCache, record_cache_stats
+from cme_media_ingest import (
+    build_clip_playlist_key,
+    clip_media_start,
+    materialize_clip,
+    proxy_clip_start,
+    write_clip_playlist,
+)
+from contact_timeline import ContactTimeline
+from frame_bus import FrameBatchConsumer, FrameBus, MotionEnergyConsumer, SnapshotConsumer, SpriteSheetConsumer
+from label_movements import LabelMovementIndex
+from motion_prefilter import POSE_FRAME_BUDGET, motion_energy_curve, plan_pose_sampling
+from pose_store import PoseTrackStore
+from rekognition_callback import reconcile_jobs
+from rekognition_store import (
+    MIN_LABEL_CONFIDENCE,
+    RekognitionTimeline,
+    artifact_key,
+    iter_result_pages,
+    load_timeline,
+    save_timeline,
+)
+from segment_extraction import get_extraction_backend
+from test_alignment import ALIGNMENT_MAX_LAG, ALIGNMENT_MAX_LEAD, aligned_windows, motion_events
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -19,6 +54,88 @@ logger.setLevel(logging.INFO)
 s3_client = boto3.client('s3')
 rekognition_client = boto3.client('rekognition')
 
+# Rekognition publishes job completion here instead of being polled
+REKOGNITION_SNS_TOPIC_ARN = os.environ.get('REKOGNITION_SNS_TOPIC_ARN', '')
+REKOGNITION_ROLE_ARN = os.environ.get('REKOGNITION_ROLE_ARN', '')
+
+# Analysis window around each declared test (30 seconds before, 30 after)
+SEGMENT_PRE_ROLL = 30.0
+SEGMENT_DURATION = 60.0
+
+# 'hls': clips are sub-playlists over the ingest-time HLS package (no encoding);
+# 'mp4': clips are encoded with ffmpeg. HLS needs a packaged recording.
+SEGMENT_EXTRACTION_MODE = os.environ.get('SEGMENT_EXTRACTION_MODE', 'hls')
+
+# Pose estimation: frames sampled per second of video and frames per worker batch
+POSE_SAMPLE_FPS = float(os.environ.get('POSE_SAMPLE_FPS', '5'))
+POSE_BATCH_SIZE = int(os.environ.get('POSE_BATCH_SIZE', '32'))
+POSE_LANDMARK_COUNT = 33
+
+# Tiered analysis: a local frame-difference score settles clear cases before
+# any Rekognition job is started. Scores are the fraction of the window whose
+# motion energy (mean grey-level change per pixel) exceeds the threshold.
+LOCAL_MOTION_ENERGY_THRESHOLD = float(os.environ.get('LOCAL_MOTION_ENERGY_THRESHOLD', '3.0'))
+LOCAL_MOTION_STILL_FRACTION = float(os.environ.get('LOCAL_MOTION_STILL_FRACTION', '0.02'))
+LOCAL_MOTION_ACTIVE_FRACTION = float(os.environ.get('LOCAL_MOTION_ACTIVE_FRACTION', '0.35'))
+LOCAL_MOTION_FPS = 5.0
+
+# Batch and session modes: declared tests are aligned to the motion events of
+# the recording-wide motion curve (see test_alignment) and analyzed over the
+# aligned span; tests left unaligned keep the fixed window around the declaration
+VIDEO_TEST_ALIGNMENT = os.environ.get('VIDEO_TEST_ALIGNMENT', 'true') == 'true'
+
+# Tier used for clips the local score cannot decide: 'rekognition' or 'pose'
+VIDEO_ESCALATION_TIER = os.environ.get('VIDEO_ESCALATION_TIER', 'rekognition')
+
+# Rekognition image mode: clips up to this many seconds (short spans such as
+# an aligned reflex check, well under the standard 60 s window) are answered
+# in-line from sampled frames with DetectLabels, whose Person instances carry
+# the bounding boxes, instead of a start/notify/fetch cycle of video jobs
+# (0 = always video jobs). Frames are taken in short bursts at evenly spaced
+# points, so consecutive frames of a burst can form a contact interval.
+REKOGNITION_IMAGE_MAX_SECONDS = float(os.environ.get('REKOGNITION_IMAGE_MAX_SECONDS', '12'))
+REKOGNITION_IMAGE_SAMPLES = int(os.environ.get('REKOGNITION_IMAGE_SAMPLES', '6'))
+REKOGNITION_IMAGE_BURST = 2
+REKOGNITION_IMAGE_BURST_SPACING = 0.5
+REKOGNITION_IMAGE_WORKERS = int(os.environ.get('REKOGNITION_IMAGE_WORKERS', '8'))
+
+# Snapshot extraction: forward-decode instead of re-seeking for gaps up to this
+# many seconds, open at most this many seek chains per ffmpeg run, upload in parallel
+SNAPSHOT_MAX_DECODE_GAP = 2.0
+SNAPSHOT_INPUTS_PER_RUN = 32
+SNAPSHOT_UPLOAD_WORKERS = 16
+
+# Cache profile of analysis clips cut from the proxy (stream copy)
+PROXY_CLIP_PROFILE = 'proxy-copy'
+
+# Batch mode: overlapping test windows are merged into one clip of at most
+# this many seconds, extracted and analyzed once
+MERGED_CLIP_MAX_DURATION = float(os.environ.get('MERGED_CLIP_MAX_DURATION', '300'))
+
+# Batch mode: the tests of one chunk are analyzed concurrently in-process.
+# Workers mostly block on S3, Rekognition and ffmpeg subprocesses, so the
+# default pool is twice the container's vCPUs (0 = size from vCPUs)
+VIDEO_BATCH_WORKERS = int(os.environ.get('VIDEO_BATCH_WORKERS', '0'))
+
+# Scrub previews: one thumbnail every THUMBNAIL_INTERVAL seconds, tiled into sprite sheets
+THUMBNAIL_INTERVAL = float(os.environ.get('THUMBNAIL_INTERVAL', '10'))
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_COLUMNS = 10
+THUMBNAIL_ROWS = 10
+
+# Session-level timelines already loaded by this container, keyed by S3 key
+_session_results_cache: Dict[str, RekognitionTimeline] = {}
+
+# Examiner/patient contact timelines built from those, keyed by the same S3 key
+_contact_timeline_cache: Dict[str, ContactTimeline] = {}
+
+# Recording-wide motion-energy curves already loaded by this container, keyed by cache key
+_recording_motion_curves: Dict[str, Dict[str, np.ndarray]] = {}
+
+# Recordings already downloaded to /tmp by this container, keyed by bucket/key
+_local_recordings: Dict[str, str] = {}
+_local_recordings_lock = threading.Lock()
+
 # Expected motion patterns for different test types - Comprehensive CME/IME Taxonomy
 TEST_MOTION_EXPECTATIONS = {
     'range_of_motion': {
@@ -245,20 +362,42 @@ TEST_MOTION_EXPECTATIONS = {
     }
 }
 
+# Rekognition label → expected movement lookup over every movement above
+LABEL_MOVEMENT_INDEX = LabelMovementIndex(
+    movement
+    for expectations in TEST_MOTION_EXPECTATIONS.values()
+    for movement in expectations['expected_movements']
+)
+
 
 class CMEVideoProcessor:
     """Process CME video recordings for action analysis"""
     
-    def __init__(self, s3_bucket: str):
+    def __init__(
+        self,
+        s3_bucket: str,
+        rekognition=None,
+        extraction_backend=None,
+        cache: Optional[AnalysisCache] = None,
+        pose_store: Optional[PoseTrackStore] = None
+    ):
         self.s3_bucket = s3_bucket
         self.temp_dir = tempfile.gettempdir()
+        self.rekognition = rekognition or rekognition_client
+        self.extraction_backend = extraction_backend
+        self.cache = cache
+        self.pose_store = pose_store
     
     def extract_video_segment(
         self,
         video_s3_key: str,
         start_time: float,
         duration: float = 60.0,
-        output_key_prefix: str = 'cme-segments'
+        output_key_prefix: str = 'cme-segments',
+        mode: str = SEGMENT_EXTRACTION_MODE,
+        hls_playlist_key: Optional[str] = None,
+        pre_roll: float = SEGMENT_PRE_ROLL,
+        output_s3_key: Optional[str] = None
     ) -> Optional[str]:
         """
         Step 5: Video Segment Extraction
@@ -269,26 +408,44 @@ class CMEVideoProcessor:
             start_time: Start timestamp in seconds
             duration: Duration to extract (default 60 seconds: ±30s around declaration)
             output_key_prefix: S3 prefix for output segments
+            mode: 'hls' to publish a sub-playlist over the packaged segments,
+                  'mp4' to encode a standalone clip
+            hls_playlist_key: Media playlist of the session's HLS package
+            pre_roll: Seconds of footage kept before start_time (0 for a
+                      window that is already planned, e.g. a merged clip)
+            output_s3_key: Key for the encoded clip (e.g. a content-addressed
+                           cache key) instead of one under output_key_prefix
             
         Returns:
-            S3 key of extracted segment
+            S3 key of extracted segment (a .m3u8 playlist in hls mode)
         """
         try:
             # Calculate extraction window (30 seconds before, 30 seconds after)
-            extract_start = max(0, start_time - 30)
+            extract_start = max(0, start_time - pre_roll)
+            
+            if mode == 'hls' and hls_playlist_key:
+                clip_key = write_clip_playlist(self.s3_bucket, hls_playlist_key, extract_start, duration)
+                logger.info(f"Published clip playlist {clip_key}: start={extract_start}s, duration={duration}s")
+                return clip_key
             
             # Generate output filename
             segment_id = f"segment_{int(start_time)}_{int(duration)}"
-            local_input = os.path.join(self.temp_dir, 'input_video.mp4')
-            local_output = os.path.join(self.temp_dir, f'{segment_id}.mp4')
-            output_s3_key = f"{output_key_prefix}/{segment_id}.mp4"
+            # Unique per call: batched tests may cut the same window concurrently
+            local_output = os.path.join(self.temp_dir, f'{segment_id}_{uuid.uuid4().hex[:8]}.mp4')
+            output_s3_key = output_s3_key or f"{output_key_prefix}/{segment_id}.mp4"
+            
+            # For Lambda, you'd need to check if ffmpeg is available
+            if not ffmpeg_available():
+                # No ffmpeg in this container: hand the cut to the extraction backend
+                logger.warning("FFmpeg not available, submitting to the extraction backend")
+                return self._extract_segment_with_backend(
+                    video_s3_key, extract_start, duration, output_s3_key
+                )
             
-            # Download video from S3
-            logger.info(f"Downloading video from s3://{self.s3_bucket}/{video_s3_key}")
-            s3_client.download_file(self.s3_bucket, video_s3_key, local_input)
+            # Download video from S3 (once per container; reused by later tests)
+            local_input = local_recording(self.s3_bucket, video_s3_key)
             
             # Extract segment using FFmpeg
-            # Note: In production Lambda, you'd include FFmpeg layer or use MediaConvert
             command = [
                 'ffmpeg',
                 '-i', local_input,
@@ -302,28 +459,19 @@ class CMEVideoProcessor:
             
             logger.info(f"Extracting segment: start={extract_start}s, duration={duration}s")
             
-            # For Lambda, you'd need to check if ffmpeg is available
-            if os.path.exists('/usr/bin/ffmpeg') or os.path.exists('/opt/bin/ffmpeg'):
-                result = subprocess.run(command, capture_output=True, text=True, timeout=60)
-                if result.returncode != 0:
-                    logger.error(f"FFmpeg error: {result.stderr}")
-                    return None
-                
-                # Upload segment to S3
-                s3_client.upload_file(local_output, self.s3_bucket, output_s3_key)
-                logger.info(f"Uploaded segment to s3://{self.s3_bucket}/{output_s3_key}")
-                
-                # Cleanup
-                os.remove(local_input)
-                os.remove(local_output)
-                
-                return output_s3_key
-            else:
-                # Fallback: Use AWS MediaConvert or Elemental for video processing
-                logger.warning("FFmpeg not available, using MediaConvert fallback")
-                return self._extract_segment_with_mediaconvert(
-                    video_s3_key, extract_start, duration, output_s3_key
-                )
+            result = subprocess.run(command, capture_output=True, text=True, timeout=60)
+            if result.returncode != 0:
+                logger.error(f"FFmpeg error: {result.stderr}")
+                return None
+            
+            # Upload segment to S3
+            s3_client.upload_file(local_output, self.s3_bucket, output_s3_key)
+            logger.info(f"Uploaded segment to s3://{self.s3_bucket}/{output_s3_key}")
+            
+            # Cleanup (the cached recording is kept for the next test)
+            os.remove(local_output)
+            
+            return output_s3_key
             
         except Exception as e:
             logger.error(f"Error extracting video segment: {str(e)}")
@@ -331,48 +479,138 @@ class CMEVideoProcessor:
             logger.error(traceback.format_exc())
             return None
     
-    def _extract_segment_with_mediaconvert(
+    def extract_proxy_segment(
+        self,
+        proxy_s3_key: str,
+        start_time: float,
+        duration: float,
+        output_s3_key: str
+    ) -> Optional[str]:
+        """
+        Cut an analysis clip from the session's proxy without re-encoding
+        
+        The proxy has a keyframe every second, so the cut seeks to the
+        keyframe at or before start_time (proxy_clip_start) and stream copy
+        starts exactly there.
+        
+        Returns:
+            S3 key of the clip, or None on failure
+        """
+        media_start = proxy_clip_start(start_time)
+        local_output = os.path.join(self.temp_dir, f"proxy_{uuid.uuid4().hex[:8]}.mp4")
+        try:
+            source = s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.s3_bucket, 'Key': proxy_s3_key},
+                ExpiresIn=900
+            )
+            command = [
+                'ffmpeg', '-v', 'error', '-nostdin', '-y',
+                '-ss', f"{media_start:.3f}", '-i', source,
+                '-t', f"{start_time + duration - media_start:.3f}",
+                '-map', '0:v:0', '-c', 'copy', '-movflags', '+faststart',
+                local_output
+            ]
+            result = subprocess.run(command, capture_output=True, text=True, timeout=300)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip())
+            
+            s3_client.upload_file(local_output, self.s3_bucket, output_s3_key,
+                                  ExtraArgs={'ContentType': 'video/mp4'})
+            return output_s3_key
+        
+        except Exception as e:
+            logger.error(f"Error cutting proxy clip at {start_time}s: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(local_output):
+                os.remove(local_output)
+    
+    def _extract_segment_with_backend(
         self,
         input_key: str,
         start_time: float,
         duration: float,
         output_key: str
     ) -> Optional[str]:
-        """Fallback method using AWS MediaConvert for video segmentation"""
+        """Submit the cut to the extraction backend and wait for its output key"""
         try:
-            # In production, implement AWS Elemental MediaConvert job
-            # This would create a job to extract the segment
-            logger.info(f"MediaConvert extraction not yet implemented")
-            return None
+            backend = self.extraction_backend or get_extraction_backend()
+            segment_key = backend.extract(self.s3_bucket, input_key, start_time, duration, output_key)
+            logger.info(f"Extraction backend metrics: {json.dumps(backend.metrics())}")
+            return segment_key
         except Exception as e:
-            logger.error(f"MediaConvert error: {str(e)}")
+            logger.error(f"Extraction backend error: {str(e)}")
             return None
     
     def analyze_video_segment(
         self,
         segment_s3_key: str,
-        test_type: str
+        test_type: str,
+        job_tag: str = '',
+        escalation_tier: str = VIDEO_ESCALATION_TIER,
+        duration: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Step 6: Visual Action Analysis
         Analyze video segment for motion and actions using computer vision
         
+        Runs as a cascade: a low-resolution local motion score decides clear
+        'not_observed' and 'performed' clips on the spot, and only clips in
+        the uncertain band escalate to pose estimation or Rekognition.
+        
         Args:
             segment_s3_key: S3 key of video segment
             test_type: Type of medical test (e.g., 'lumbar_rom', 'gait')
+            job_tag: Tag echoed back in the Rekognition completion notification
+            escalation_tier: 'rekognition' (async jobs) or 'pose' (local CPU)
+            duration: Segment length in seconds; short segments use
+                      Rekognition image mode instead of video jobs
             
         Returns:
-            Analysis results with motion detection and pose estimation
+            Analysis results; 'tier' names the deciding tier and 'verdict'
+            holds the scores when the clip was decided without Rekognition.
+            Image mode returns sampled_results (already fetched) instead of jobs.
         """
         try:
             # Get expected movements for this test type
             expectations = TEST_MOTION_EXPECTATIONS.get(test_type, {})
+            started = time.perf_counter()
+            
+            # Tier 1: local motion score
+            local_motion = self._local_motion_tier(segment_s3_key)
+            verdict = local_motion_verdict(local_motion)
+            if verdict:
+                return self._tier_result(segment_s3_key, test_type, expectations, 'local_motion',
+                                         verdict, started, local_motion=local_motion)
+            
+            # Tier 2 (optional): CPU pose estimation
+            if escalation_tier == 'pose':
+                patterns = self._pose_tier(segment_s3_key, expectations.get('expected_movements', []))
+                verdict = pose_motion_verdict(patterns)
+                if verdict:
+                    return self._tier_result(segment_s3_key, test_type, expectations, 'pose',
+                                             verdict, started, local_motion=local_motion, pose_patterns=patterns)
+            
+            # Tier 3: analyze video using AWS Rekognition, in-line for short segments
+            if rekognition_mode(duration) == 'image':
+                sampled = self._analyze_frames_rekognition(segment_s3_key, duration)
+                if sampled['results']:
+                    return {
+                        'segment_key': segment_s3_key,
+                        'test_type': test_type,
+                        'tier': 'rekognition',
+                        'escalated': True,
+                        'local_motion': local_motion,
+                        'sampled_results': store_sampled_results(self.s3_bucket, sampled),
+                        'expectations': expectations
+                    }
+                logger.warning(f"Image mode failed for {segment_s3_key}, starting video jobs")
             
-            # Analyze video using AWS Rekognition
-            motion_analysis = self._analyze_motion_rekognition(segment_s3_key)
+            motion_analysis = self._analyze_motion_rekognition(segment_s3_key, job_tag)
             
             # Detect people and poses
-            pose_analysis = self._detect_poses_rekognition(segment_s3_key)
+            pose_analysis = self._detect_poses_rekognition(segment_s3_key, job_tag)
             
             # Compare observed actions against expectations
             comparison = self._compare_with_expectations(
@@ -384,6 +622,9 @@ class CMEVideoProcessor:
             return {
                 'segment_key': segment_s3_key,
                 'test_type': test_type,
+                'tier': 'rekognition',
+                'escalated': True,
+                'local_motion': local_motion,
                 'motion_detected': motion_analysis,
                 'poses_detected': pose_analysis,
                 'comparison': comparison,
@@ -398,11 +639,382 @@ class CMEVideoProcessor:
                 'test_type': test_type
             }
     
-    def _analyze_motion_rekognition(self, video_s3_key: str) -> Dict[str, Any]:
+    def _tier_result(
+        self,
+        segment_s3_key: str,
+        test_type: str,
+        expectations: Dict[str, Any],
+        tier: str,
+        verdict: Tuple[str, str, float],
+        started: float,
+        **details
+    ) -> Dict[str, Any]:
+        """Analysis result for a clip decided without Rekognition"""
+        motion_present, pose_match, confidence = verdict
+        decision_seconds = round(time.perf_counter() - started, 3)
+        logger.info(f"{tier} tier decided {segment_s3_key}: {motion_present} in {decision_seconds}s")
+        
+        return {
+            'segment_key': segment_s3_key,
+            'test_type': test_type,
+            'tier': tier,
+            'escalated': tier != 'local_motion',
+            'verdict': {
+                'motion_present': motion_present,
+                'pose_match': pose_match,
+                'confidence': confidence
+            },
+            'decision_seconds': decision_seconds,
+            'expectations': expectations,
+            **details
+        }
+    
+    def _local_motion_curve(self, video_s3_key: str) -> Optional[Dict[str, np.ndarray]]:
+        """Frame-difference motion-energy curve of a segment, streamed from S3 by ffmpeg"""
+        try:
+            url = s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.s3_bucket, 'Key': video_s3_key},
+                ExpiresIn=900
+            )
+            return motion_energy_curve(url, analysis_fps=LOCAL_MOTION_FPS)
+        except Exception as e:
+            # No verdict: the clip simply escalates to the next tier
+            logger.warning(f"Local motion tier unavailable for {video_s3_key}: {str(e)}")
+            return None
+    
+    def _local_motion_tier(self, video_s3_key: str) -> Optional[Dict[str, Any]]:
+        """Frame-difference motion score of a segment, streamed from S3 by ffmpeg"""
+        curve = self._local_motion_curve(video_s3_key)
+        return local_motion_score(curve) if curve is not None else None
+    
+    def _pose_estimates(self, video_s3_key: str) -> Optional[Dict[str, Any]]:
+        """CPU pose estimates for every sampled frame of a segment"""
+        if ffmpeg_available() and POSE_FRAME_BUDGET <= 0:
+            # Stream the clip through the frame bus: no download, scaled while decoding
+            try:
+                url = s3_client.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': self.s3_bucket, 'Key': video_s3_key},
+                    ExpiresIn=900
+                )
+                poses = PoseEstimationEngine.estimate_poses_streamed(url)
+                return poses if not poses.get('error') and poses['frames_processed'] else None
+            except Exception as e:
+                logger.warning(f"Pose tier unavailable for {video_s3_key}: {str(e)}")
+                return None
+        
+        local_path = os.path.join(self.temp_dir, f"pose_{uuid.uuid4().hex[:8]}.mp4")
+        try:
+            s3_client.download_file(self.s3_bucket, video_s3_key, local_path)
+            poses = PoseEstimationEngine.estimate_poses_mediapipe(local_path)
+            if poses.get('error') or not poses['frames_processed']:
+                return None
+            return poses
+        except Exception as e:
+            logger.warning(f"Pose tier unavailable for {video_s3_key}: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+    
+    def _clip_poses(
+        self,
+        video_s3_key: str,
+        recording_window: Optional[Tuple[float, float]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Pose estimates of a clip, through the session's pose store when there is one
+        
+        Poses already stored for the clip's recording window are loaded
+        instead of estimated; fresh estimates are stored in recording time
+        for the report, re-scoring and cross-test comparison. Timestamps
+        returned are seconds from the clip start either way.
+        """
+        store = self.pose_store if recording_window else None
+        if store:
+            media_start, media_end = recording_window
+            try:
+                if store.covers(media_start, media_end, max_gap=max(1.0, 2.0 / POSE_SAMPLE_FPS)):
+                    stored = store.load_range(media_start, media_end)
+                    if stored['frames_processed']:
+                        logger.info(f"Loaded {stored['frames_processed']} stored pose frames for {video_s3_key}")
+                        return {**stored, 'timestamps': stored['timestamps'] - media_start, 'stored': True}
+            except Exception as e:
+                logger.warning(f"Stored poses unavailable for {video_s3_key}: {str(e)}")
+        
+        poses = self._pose_estimates(video_s3_key)
+        if poses and store:
+            try:
+                store.write(poses['timestamps'] + media_start, poses['keypoints'], poses['aspect_ratio'],
+                            sample_fps=poses.get('sample_fps'), source=video_s3_key)
+            except Exception as e:
+                logger.error(f"Error storing poses for {video_s3_key}: {str(e)}")
+        return poses
+    
+    def _pose_tier(self, video_s3_key: str, expected_movements: List[str]) -> Optional[Dict[str, Any]]:
+        """Run CPU pose estimation on a segment and classify the expected movements"""
+        poses = self._pose_estimates(video_s3_key)
+        if not poses:
+            return None
+        return PoseEstimationEngine.analyze_motion_patterns(
+            poses['keypoints'], poses['timestamps'], expected_movements, poses['aspect_ratio']
+        )
+    
+    def plan_clip_windows(
+        self,
+        declared_tests: List[Dict[str, Any]],
+        pre_roll: float = SEGMENT_PRE_ROLL,
+        duration: float = SEGMENT_DURATION,
+        max_clip_duration: float = MERGED_CLIP_MAX_DURATION,
+        test_windows: Optional[List[Optional[List[float]]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Merge overlapping test windows into the fewest clips that cover them
+        
+        Windows are swept in start order. A window joins the current clip when
+        it overlaps it and the merged clip stays within max_clip_duration;
+        otherwise it opens a new clip.
+        
+        Args:
+            declared_tests: Tests of one session (each with a timestamp)
+            pre_roll: Seconds before each declaration (default ±30s window)
+            duration: Length of each test's window
+            max_clip_duration: Upper bound on a merged clip's length
+            test_windows: Per-test [start, end] replacing the fixed window
+                          (e.g. from align_test_windows); None entries keep it
+        
+        Returns:
+            Dictionary with clips (start, end, tests as indices into
+            declared_tests, and each test's absolute window), plus
+            requested_seconds (sum of the per-test windows) and
+            analyzed_seconds (sum of the merged clips)
+        """
+        windows = []
+        for index, test in enumerate(declared_tests):
+            window = test_windows[index] if test_windows else None
+            if window:
+                windows.append((float(window[0]), float(window[1]), index))
+            else:
+                start = max(0.0, float(test.get('timestamp', 0)) - pre_roll)
+                windows.append((start, start + duration, index))
+        windows.sort()
+        
+        clips = []
+        for start, end, index in windows:
+            current = clips[-1] if clips else None
+            if current and start <= current['end'] and max(end, current['end']) - current['start'] <= max_clip_duration:
+                current['end'] = max(current['end'], end)
+            else:
+                current = {'start': start, 'end': end, 'tests': [], 'windows': []}
+                clips.append(current)
+            current['tests'].append(index)
+            current['windows'].append([start, end])
+        
+        return {
+            'clips': clips,
+            'requested_seconds': round(sum(end - start for start, end, _ in windows), 3),
+            'analyzed_seconds': round(sum(clip['end'] - clip['start'] for clip in clips), 3)
+        }
+    
+    def analyze_clip_windows(
+        self,
+        segment_s3_key: str,
+        test_types: List[str],
+        windows: List[Tuple[float, float]],
+        job_tag: str = '',
+        escalation_tier: str = VIDEO_ESCALATION_TIER,
+        recording_window: Optional[Tuple[float, float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the analysis cascade once over a merged clip and score every test
+        window inside it
+        
+        The motion-energy curve and pose estimates are computed for the whole
+        clip and sliced per window. If any window is still uncertain, one pair
+        of Rekognition jobs is started for the clip and shared by those windows.
+        
+        Args:
+            segment_s3_key: S3 key of the merged clip
+            test_types: Test type of each window
+            windows: (start, end) of each window, in seconds from the clip start
+            job_tag: Tag echoed back in the Rekognition completion notification
+            escalation_tier: 'rekognition' (async jobs) or 'pose' (local CPU)
+            recording_window: (start, end) of the clip's media in recording
+                time; lets the motion curve come from the recording-wide
+                curve of the thumbnail pass instead of decoding the clip, and
+                pose estimates come from (or go to) the session's pose store
+        
+        Returns:
+            Dictionary with windows (one analysis per window, shaped like
+            analyze_video_segment's; tier 'rekognition' for escalated windows)
+            and the clip's motion_detected / poses_detected jobs. With a
+            cache, cached_results holds the stored Rekognition timelines
+            when they already exist (no jobs are started), otherwise
+            cache_keys says where the finished jobs' timelines belong.
+            Clips short enough for image mode return sampled_results
+            (fetched results, shaped like fetch_rekognition_results')
+            instead of jobs.
+        """
+        started = time.perf_counter()
+        curve = self._cached_local_motion_curve(segment_s3_key, recording_window)
+        
+        # Tier 1: local motion score of each window's slice of the curve
+        analyses = []
+        for test_type, (start, end) in zip(test_types, windows):
+            expectations = TEST_MOTION_EXPECTATIONS.get(test_type, {})
+            local_motion = None
+            if curve is not None:
+                in_window = (curve['timestamps'] >= start) & (curve['timestamps'] <= end)
+                local_motion = local_motion_score({key: values[in_window] for key, values in curve.items()})
+            verdict = local_motion_verdict(local_motion)
+            if verdict:
+                analyses.append(self._tier_result(segment_s3_key, test_type, expectations, 'local_motion',
+                                                  verdict, started, local_motion=local_motion))
+            else:
+                analyses.append({
+                    'segment_key': segment_s3_key,
+                    'test_type': test_type,
+                    'tier': 'rekognition',
+                    'escalated': True,
+                    'local_motion': local_motion,
+                    'expectations': expectations
+                })
+        
+        # Tier 2 (optional): one pose pass over the clip for the uncertain windows
+        undecided = [i for i, analysis in enumerate(analyses) if 'verdict' not in analysis]
+        if undecided and escalation_tier == 'pose':
+            poses = self._clip_poses(segment_s3_key, recording_window)
+            for i in (undecided if poses else []):
+                start, end = windows[i]
+                in_window = (poses['timestamps'] >= start) & (poses['timestamps'] <= end)
+                if not in_window.any():
+                    continue
+                expectations = analyses[i]['expectations']
+                patterns = PoseEstimationEngine.analyze_motion_patterns(
+                    poses['keypoints'][in_window], poses['timestamps'][in_window],
+                    expectations.get('expected_movements', []), poses['aspect_ratio']
+                )
+                verdict = pose_motion_verdict(patterns)
+                if verdict:
+                    analyses[i] = self._tier_result(segment_s3_key, test_types[i], expectations, 'pose', verdict,
+                                                    started, local_motion=analyses[i]['local_motion'],
+                                                    pose_patterns=patterns)
+            undecided = [i for i, analysis in enumerate(analyses) if 'verdict' not in analysis]
+        
+        # Tier 3: Rekognition once for the clip, shared by every uncertain window;
+        # short clips are answered in-line from sampled frames
+        motion_analysis, pose_analysis = {}, {}
+        cache_keys = {}
+        clip_seconds = max(end for _, end in windows) if windows else 0.0
+        mode = rekognition_mode(clip_seconds)
+        profile = 'rekognition' if mode == 'video' else 'rekognition-image'
+        if undecided and self.cache:
+            cache_keys = {
+                job_type: self.cache.derived_key(segment_s3_key, f'{profile}:{job_type}')
+                for job_type in ('motion_analysis', 'pose_detection')
+            }
+            # Look up (and count) both before deciding
+            if all([self.cache.lookup(key, 'rekognition') for key in cache_keys.values()]):
+                logger.info(f"Reusing cached Rekognition results for {segment_s3_key}")
+                return {
+                    'segment_key': segment_s3_key,
+                    'windows': analyses,
+                    'motion_detected': motion_analysis,
+                    'poses_detected': pose_analysis,
+                    'cached_results': cache_keys
+                }
+        if undecided and mode == 'image':
+            sampled = self._analyze_frames_rekognition(segment_s3_key, clip_seconds)
+            if sampled['results']:
+                logger.info(f"Answered {len(undecided)} windows of {segment_s3_key} from "
+                            f"{sampled['frames']} sampled frames in {round(time.perf_counter() - started, 3)}s")
+                return {
+                    'segment_key': segment_s3_key,
+                    'windows': analyses,
+                    'motion_detected': motion_analysis,
+                    'poses_detected': pose_analysis,
+                    'sampled_results': store_sampled_results(self.s3_bucket, sampled, cache_keys)
+                }
+            logger.warning(f"Image mode failed for {segment_s3_key}, starting video jobs")
+        if undecided:
+            motion_analysis = self._analyze_motion_rekognition(segment_s3_key, job_tag)
+            pose_analysis = self._detect_poses_rekognition(segment_s3_key, job_tag)
+        
+        logger.info(f"Analyzed clip {segment_s3_key}: {len(windows) - len(undecided)} of {len(windows)} "
+                    f"windows decided locally in {round(time.perf_counter() - started, 3)}s")
+        
+        return {
+            'segment_key': segment_s3_key,
+            'windows': analyses,
+            'motion_detected': motion_analysis,
+            'poses_detected': pose_analysis,
+            'cache_keys': cache_keys
+        }
+    
+    def _cached_local_motion_curve(
+        self,
+        video_s3_key: str,
+        recording_window: Optional[Tuple[float, float]] = None
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Motion-energy curve of a clip, read from the cache when already computed"""
+        if not self.cache:
+            return self._local_motion_curve(video_s3_key)
+        
+        if recording_window is not None:
+            curve = self._recording_motion_slice(*recording_window)
+            if curve is not None:
+                return curve
+        
+        curve_key = self.cache.derived_key(video_s3_key, f'local_motion:{LOCAL_MOTION_FPS}')
+        if self.cache.lookup(curve_key, 'local_motion'):
+            try:
+                return self.cache.load_arrays(curve_key)
+            except Exception as e:
+                logger.warning(f"Cached motion curve {curve_key} unreadable: {str(e)}")
+        
+        curve = self._local_motion_curve(video_s3_key)
+        if curve is not None:
+            try:
+                self.cache.save_arrays(curve_key, curve)
+            except Exception as e:
+                logger.warning(f"Could not cache motion curve {curve_key}: {str(e)}")
+        return curve
+    
+    def _recording_motion_slice(self, start: float, end: float) -> Optional[Dict[str, np.ndarray]]:
+        """A clip's part of the recording-wide motion curve, if the thumbnail pass cached one"""
+        curve = recording_motion_curve(self.cache)
+        if curve is None:
+            return None
+        
+        in_clip = (curve['timestamps'] >= start) & (curve['timestamps'] <= end)
+        if not in_clip.any():
+            return None
+        return {'timestamps': curve['timestamps'][in_clip] - start, 'energy': curve['energy'][in_clip]}
+    
+    def _notification_options(self, job_tag: str = '') -> Dict[str, Any]:
+        """NotificationChannel/JobTag arguments for async Rekognition jobs"""
+        options = {}
+        if REKOGNITION_SNS_TOPIC_ARN and REKOGNITION_ROLE_ARN:
+            options['NotificationChannel'] = {
+                'SNSTopicArn': REKOGNITION_SNS_TOPIC_ARN,
+                'RoleArn': REKOGNITION_ROLE_ARN
+            }
+        else:
+            # A job nobody hears about would leave its task waiting until timeout
+            require_notification_channel(None if self.rekognition is rekognition_client else self.rekognition)
+        
+        # JobTag only allows [a-zA-Z0-9_.-:] and at most 1024 characters
+        tag = ''.join(c if c.isalnum() or c in '_.-:' else '_' for c in job_tag)[:1024]
+        if tag:
+            options['JobTag'] = tag
+        return options
+    
+    def _analyze_motion_rekognition(self, video_s3_key: str, job_tag: str = '') -> Dict[str, Any]:
         """Use AWS Rekognition to detect motion in video segment"""
         try:
-            # Start video analysis job
-            response = rekognition_client.start_label_detection(
+            # Start video analysis job; completion is published to SNS
+            response = self.rekognition.start_label_detection(
                 Video={
                     'S3Object': {
                         'Bucket': self.s3_bucket,
@@ -410,14 +1022,13 @@ class CMEVideoProcessor:
                     }
                 },
                 MinConfidence=60.0,
-                Features=['GENERAL_LABELS']
+                Features=['GENERAL_LABELS'],
+                **self._notification_options(job_tag)
             )
             
             job_id = response['JobId']
             logger.info(f"Started Rekognition label detection: {job_id}")
             
-            # Wait for job completion (in production, use async processing)
-            # For now, return job ID for async polling
             return {
                 'job_id': job_id,
                 'status': 'IN_PROGRESS',
@@ -428,17 +1039,18 @@ class CMEVideoProcessor:
             logger.error(f"Rekognition motion analysis error: {str(e)}")
             return {'error': str(e)}
     
-    def _detect_poses_rekognition(self, video_s3_key: str) -> Dict[str, Any]:
+    def _detect_poses_rekognition(self, video_s3_key: str, job_tag: str = '') -> Dict[str, Any]:
         """Use AWS Rekognition to detect people and body poses"""
         try:
-            # Start person tracking
-            response = rekognition_client.start_person_tracking(
+            # Start person tracking; completion is published to SNS
+            response = self.rekognition.start_person_tracking(
                 Video={
                     'S3Object': {
                         'Bucket': self.s3_bucket,
                         'Name': video_s3_key
                     }
-                }
+                },
+                **self._notification_options(job_tag)
             )
             
             job_id = response['JobId']
@@ -454,13 +1066,89 @@ class CMEVideoProcessor:
             logger.error(f"Rekognition pose detection error: {str(e)}")
             return {'error': str(e)}
     
+    def _analyze_frames_rekognition(self, video_s3_key: str, duration: float) -> Dict[str, Any]:
+        """
+        Rekognition image mode: labels and people on frames sampled from a
+        short clip, answered synchronously on a bounded thread pool
+        
+        One DetectLabels call per frame serves both timelines: its labels are
+        reshaped into label-detection pages and the instances (bounding boxes)
+        of its Person label into person-tracking pages (Timestamp in ms from
+        the clip start, people indexed left to right), so the timelines are
+        scored exactly like a video job's.
+        
+        Returns:
+            Dictionary with results (job_type -> completed result, empty when
+            the calls failed on every frame) and frames sampled
+        """
+        try:
+            frames = sample_clip_frames(recording_source(self.s3_bucket, video_s3_key), image_sample_times(duration))
+        except Exception as e:
+            logger.error(f"Rekognition image mode sampling error: {str(e)}")
+            return {'results': {}, 'frames': 0}
+        
+        def detect(frame):
+            timestamp, image = frame
+            response = self.rekognition.detect_labels(Image={'Bytes': image}, MinConfidence=MIN_LABEL_CONFIDENCE)
+            labels = response.get('Labels', [])
+            instances = [
+                instance for label in labels if label.get('Name') == 'Person'
+                for instance in label.get('Instances', []) if instance.get('BoundingBox')
+            ]
+            instances.sort(key=lambda instance: instance['BoundingBox'].get('Left', 0.0))
+            return (
+                {'Labels': [{'Timestamp': timestamp, 'Label': label} for label in labels]},
+                {'Persons': [
+                    {'Timestamp': timestamp, 'Person': {'Index': index, 'BoundingBox': instance['BoundingBox']}}
+                    for index, instance in enumerate(instances)
+                ]}
+            )
+            
+        pages = {'motion_analysis': [], 'pose_detection': []}
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(1, min(REKOGNITION_IMAGE_WORKERS, len(frames)))) as pool:
+            futures = [pool.submit(detect, frame) for frame in frames]
+            # Submission order keeps the pages in time order
+            for future in futures:
+                try:
+                    label_page, person_page = future.result()
+                except Exception as e:
+                    errors.append(str(e))
+                    continue
+                pages['motion_analysis'].append(label_page)
+                pages['pose_detection'].append(person_page)
+        
+        if errors:
+            logger.warning(f"{len(errors)} of {len(frames)} Rekognition image calls failed for {video_s3_key}: {errors[0]}")
+        if not all(pages.values()):
+            return {'results': {}, 'frames': len(frames)}
+        
+        return {
+            'results': {
+                job_type: {
+                    'status': 'COMPLETED',
+                    'job_type': job_type,
+                    'timeline': RekognitionTimeline.from_pages(job_type, job_pages)
+                }
+                for job_type, job_pages in pages.items()
+            },
+            'frames': len(frames)
+        }
+    
     def _compare_with_expectations(
         self,
         motion_analysis: Dict[str, Any],
         pose_analysis: Dict[str, Any],
-        expectations: Dict[str, Any]
+        expectations: Dict[str, Any],
+        contact_timeline: Optional[ContactTimeline] = None,
+        window: Optional[Tuple[float, float]] = None
     ) -> Dict[str, Any]:
-        """Compare observed motion/poses with expected test actions"""
+        """
+        Compare observed motion/poses with expected test actions
+        
+        When a contact timeline is available, examiner_touch is checked over
+        the given (start, end) window, or over the whole timeline.
+        """
         
         # This would be more sophisticated in production
         # For now, return a basic comparison structure
@@ -476,6 +1164,10 @@ class CMEVideoProcessor:
             pose_match = 'full_match'  # or 'partial' or 'no_match'
             confidence = 0.75
         
+        contact = None
+        if contact_timeline is not None:
+            contact = contact_timeline.window(*(window or ()))
+        
         return {
             'motion_present': motion_present,
             'pose_match': pose_match,
@@ -483,25 +1175,30 @@ class CMEVideoProcessor:
             'expected_movements': expectations.get('expected_movements', []),
             'patient_motion_required': expectations.get('patient_motion_required', False),
             'examiner_touch_required': expectations.get('examiner_touch', False),
+            'examiner_touch_observed': contact['contact'] if contact else None,
             'analysis_status': 'pending' if motion_analysis.get('status') == 'IN_PROGRESS' else 'completed'
         }
     
     def get_rekognition_results(self, job_id: str, job_type: str) -> Dict[str, Any]:
-        """Poll Rekognition job results"""
+        """
+        Fetch Rekognition job results
+        
+        Every result page is streamed into a columnar RekognitionTimeline, so
+        long clips keep all of their detections and the raw response is not
+        carried around.
+        """
         try:
-            if job_type == 'motion_analysis':
-                response = rekognition_client.get_label_detection(JobId=job_id)
-            elif job_type == 'pose_detection':
-                response = rekognition_client.get_person_tracking(JobId=job_id)
-            else:
+            if job_type not in ('motion_analysis', 'pose_detection'):
                 return {'error': 'Unknown job type'}
             
+            pages = iter_result_pages(self.rekognition, job_id, job_type)
+            response = next(pages)
             job_status = response.get('JobStatus')
             
             if job_status == 'SUCCEEDED':
                 return {
                     'status': 'COMPLETED',
-                    'results': response,
+                    'timeline': RekognitionTimeline.from_pages(job_type, itertools.chain([response], pages)),
                     'job_type': job_type
                 }
             elif job_status == 'IN_PROGRESS':
@@ -521,195 +1218,1963 @@ class CMEVideoProcessor:
             return {'error': str(e)}
 
 
-class PoseEstimationEngine:
-    """
-    Advanced pose estimation using MediaPipe or OpenPose
-    This would be deployed as a separate service or Lambda with custom container
+def local_motion_score(curve: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Summarize a motion-energy curve into the scores used by the local tier"""
+    energy = curve['energy']
+    if energy.size == 0:
+        return {'frames': 0, 'active_fraction': 0.0, 'peak_energy': 0.0, 'mean_energy': 0.0}
+    
+    # Measure against the clip's own quiet level so sensor noise does not count
+    above_floor = energy - np.percentile(energy, 10)
+    return {
+        'frames': int(energy.size),
+        'active_fraction': round(float(np.mean(above_floor > LOCAL_MOTION_ENERGY_THRESHOLD)), 4),
+        'peak_energy': round(float(above_floor.max()), 2),
+        'mean_energy': round(float(energy.mean()), 2)
+    }
+
+
+def local_motion_verdict(score: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str, float]]:
     """
+    Decide clear cases from the local motion score
     
-    @staticmethod
-    def estimate_poses_mediapipe(video_frames: List[Any]) -> List[Dict[str, Any]]:
-        """
-        Use MediaPipe Pose to extract skeletal keypoints
-        
-        In production, this would:
-        1. Load video frames
-        2. Run MediaPipe Pose on each frame
-        3. Extract 33 body keypoints per person
-        4. Track motion patterns
-        5. Classify movements (bending, raising leg, etc.)
-        """
-        try:
-            # This is a placeholder - real implementation would use:
-            # import mediapipe as mp
-            # mp_pose = mp.solutions.pose
-            # pose = mp_pose.Pose()
-            
-            logger.info("MediaPipe pose estimation not yet implemented")
-            
-            # Return mock structure
-            return [{
-                'frame': 0,
-                'timestamp': 0.0,
-                'persons': [{
-                    'person_id': 0,
-                    'keypoints': {},  # Would contain 33 keypoint coordinates
-                    'pose_landmarks': [],
-                    'visibility': []
-                }]
-            }]
-            
-        except Exception as e:
-            logger.error(f"MediaPipe pose estimation error: {str(e)}")
-            return []
+    Returns:
+        (motion_present, pose_match, confidence), or None when the clip falls in
+        the uncertain band and must escalate
+    """
+    if not score or not score['frames']:
+        return None
     
-    @staticmethod
-    def analyze_motion_patterns(pose_sequence: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """
-        Analyze sequence of poses to detect specific movements
-        
-        Returns:
-            Classification of observed movements with confidence scores
-        """
-        movements_detected = {
-            'forward_bend': False,
-            'leg_raise': False,
-            'walking': False,
-            'examiner_touch': False,
-            'patient_response': False
-        }
-        
-        # In production, analyze pose keypoint sequences to detect:
-        # - Trunk flexion/extension
-        # - Limb movements
-        # - Gait patterns
-        # - Examiner-patient interactions
-        
-        return {
-            'movements': movements_detected,
-            'confidence': 0.0,
-            'frames_analyzed': len(pose_sequence)
-        }
+    active = score['active_fraction']
+    if active <= LOCAL_MOTION_STILL_FRACTION and score['peak_energy'] <= 2 * LOCAL_MOTION_ENERGY_THRESHOLD:
+        # Nothing moved at all during the window
+        confidence = 0.9 - 0.3 * active / max(LOCAL_MOTION_STILL_FRACTION, 1e-6)
+        return ('not_observed', 'no_match', round(confidence, 3))
+    if active >= LOCAL_MOTION_ACTIVE_FRACTION:
+        # Sustained movement through the window; which movement is not checked
+        confidence = 0.6 + 0.2 * min(1.0, (active - LOCAL_MOTION_ACTIVE_FRACTION) / (1 - LOCAL_MOTION_ACTIVE_FRACTION))
+        return ('performed', 'unknown', round(confidence, 3))
+    return None
 
 
-def process_video_for_cme_test(
-    session_id: str,
-    declared_test: Dict[str, Any],
-    video_s3_key: str,
-    s3_bucket: str
-) -> Dict[str, Any]:
-    """
-    Main processing function for video analysis of a declared test
-    Combines video segmentation and action analysis
-    **NOW WITH PERSISTENCE AND REKOGNITION POLLING**
+def pose_motion_verdict(patterns: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str, float]]:
     """
-    import os
-    import boto3
+    Score classified pose movements like analyze_rekognition_results does
     
-    dynamodb = boto3.resource('dynamodb')
-    actions_table = dynamodb.Table(os.environ.get('CME_ACTIONS_TABLE', 'cme-observed-actions'))
+    Returns None when no expected movement can be judged from pose alone.
+    """
+    if not patterns:
+        return None
     
-    processor = CMEVideoProcessor(s3_bucket)
+    evaluated = [m for m in patterns.get('movements', {}).values() if m['evaluated']]
+    if not evaluated:
+        return None
     
-    test_timestamp = float(declared_test.get('timestamp', 0))
-    test_type = declared_test.get('label', 'unknown')
-    declared_step_id = declared_test.get('declared_step_id', '')
+    detected = [m for m in evaluated if m['detected']]
+    confidence = float(np.mean([m['confidence'] for m in detected])) if detected else 0.0
     
-    # Step 5: Extract video segment
-    segment_key = processor.extract_video_segment(
-        video_s3_key=video_s3_key,
-        start_time=test_timestamp,
-        duration=60.0,
-        output_key_prefix=f'cme-segments/{session_id}'
-    )
+    if len(detected) >= len(evaluated) * 0.7:
+        return ('performed', 'full_match', round(max(confidence, 0.5), 3))
+    if detected:
+        return ('brief', 'partial', round(min(confidence, 0.6), 3))
+    return ('not_observed', 'no_match', 0.6)
+
+
+def recording_motion_curve(cache: AnalysisCache) -> Optional[Dict[str, np.ndarray]]:
+    """The recording-wide motion-energy curve, if the thumbnail pass cached one"""
+    curve_key = cache.window_key(None, f'local_motion:{LOCAL_MOTION_FPS}')
+    curve = _recording_motion_curves.get(curve_key)
+    if curve is None:
+        if not cache.lookup(curve_key, 'local_motion'):
+            return None
+        try:
+            curve = cache.load_arrays(curve_key)
+        except Exception as e:
+            logger.warning(f"Recording motion curve {curve_key} unreadable: {str(e)}")
+            return None
+        _recording_motion_curves[curve_key] = curve
+    return curve
+
+
+def align_test_windows(declared_tests: List[Dict[str, Any]], cache: AnalysisCache) -> Optional[Dict[str, Any]]:
+    """
+    Align declared tests to the motion events of the recording
     
-    if not segment_key:
-        logger.warning(f"Failed to extract segment, using simple analysis")
-        # Even without segment, record that we tried
-        action_id = f"action_{int(time.time())}"
-        action_item = {
-            'observed_action_id': action_id,
-            'declared_step_id': declared_step_id,
-            'motion_present': 'not_observed',
-            'pose_match': 'no_match',
-            'confidence_score': 0.0,
-            'analysis_details': {'error': 'Segment extraction failed'},
-            'created_at': int(time.time())
-        }
-        actions_table.put_item(Item=action_item)
-        
-        return {
-            'session_id': session_id,
-            'test_type': test_type,
-            'timestamp': test_timestamp,
-            'error': 'Failed to extract video segment'
-        }
+    Tests are taken in timestamp order and matched to the events of the
+    recording-wide motion curve near them (see test_alignment.align_tests).
     
-    # Step 6: Analyze the segment
-    analysis = processor.analyze_video_segment(segment_key, test_type)
+    Args:
+        declared_tests: Tests in any order
+        cache: Analysis cache of the recording
     
-    # Poll Rekognition jobs until complete
-    motion_job_id = analysis.get('motion_detected', {}).get('job_id')
-    pose_job_id = analysis.get('poses_detected', {}).get('job_id')
+    Returns:
+        Dictionary with windows (per declared test, in the given order;
+        None where the fixed window applies), aligned, events, cost and
+        alignment_ms, or None when alignment is off or no curve is cached
+    """
+    if not VIDEO_TEST_ALIGNMENT or not declared_tests:
+        return None
+    curve = recording_motion_curve(cache)
+    if curve is None:
+        logger.warning(f"No recording motion curve cached for {cache.recording_s3_key}: "
+                       f"{len(declared_tests)} tests keep their fixed windows")
+        return None
     
-    # Simple polling (in production, use Step Function wait states)
-    import time as time_module
-    max_wait = 60  # Wait up to 60 seconds
-    waited = 0
+    started = time.perf_counter()
+    test_times = np.array([float(test.get('timestamp', 0)) for test in declared_tests])
+    order = np.argsort(test_times, kind='stable')
     
-    motion_result = None
-    pose_result = None
+    # Only the part of the recording any test could align to; measured
+    # against the recording's quiet level as in local_motion_score
+    timestamps, energy = curve['timestamps'], curve['energy']
+    if energy.size == 0:
+        return None
+    in_reach = (timestamps >= test_times.min() - ALIGNMENT_MAX_LAG) & (timestamps <= test_times.max() + ALIGNMENT_MAX_LEAD)
+    events = motion_events(
+        timestamps[in_reach],
+        energy[in_reach] - np.percentile(energy, 10),
+        LOCAL_MOTION_ENERGY_THRESHOLD
+    )
     
-    while waited < max_wait:
-        if motion_job_id and not motion_result:
-            motion_result = processor.get_rekognition_results(motion_job_id, 'motion_analysis')
-            if motion_result.get('status') == 'COMPLETED':
-                logger.info(f"Motion analysis completed for {motion_job_id}")
-        
-        if pose_job_id and not pose_result:
-            pose_result = processor.get_rekognition_results(pose_job_id, 'pose_detection')
-            if pose_result.get('status') == 'COMPLETED':
-                logger.info(f"Pose detection completed for {pose_job_id}")
-        
-        if (motion_result and motion_result.get('status') == 'COMPLETED' and
-            pose_result and pose_result.get('status') == 'COMPLETED'):
-            break
-        
-        time_module.sleep(5)
-        waited += 5
+    alignment = aligned_windows(test_times[order].tolist(), events)
+    windows: List[Optional[List[float]]] = [None] * len(declared_tests)
+    event_indices = [-1] * len(declared_tests)
+    for rank, index in enumerate(order):
+        windows[index] = alignment['windows'][rank]
+        event_indices[index] = alignment['events'][rank]
     
-    # Analyze Rekognition results
-    motion_present, pose_match, confidence = analyze_rekognition_results(
-        motion_result, pose_result, test_type
-    )
+    return {
+        'windows': windows,
+        'events': event_indices,
+        'event_count': int(len(events['starts'])),
+        'aligned': alignment['aligned'],
+        'cost': alignment['cost'],
+        'alignment_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def rekognition_mode(clip_seconds: Optional[float]) -> str:
+    """'image' (sampled frames, answered in-line) for short clips, else 'video' (async jobs)"""
+    if clip_seconds and 0 < clip_seconds <= REKOGNITION_IMAGE_MAX_SECONDS and ffmpeg_available():
+        return 'image'
+    return 'video'
+
+
+def image_sample_times(
+    duration: float,
+    samples: int = REKOGNITION_IMAGE_SAMPLES,
+    burst: int = REKOGNITION_IMAGE_BURST,
+    spacing: float = REKOGNITION_IMAGE_BURST_SPACING
+) -> List[float]:
+    """Frame times (seconds) for image mode: a burst at the centre of each of samples equal slots"""
+    slot = duration / max(samples, 1)
+    times = []
+    for index in range(max(samples, 1)):
+        first = max(0.0, (index + 0.5) * slot - spacing * (burst - 1) / 2)
+        times.extend(round(first + spacing * step, 3) for step in range(burst))
+    return sorted(set(t for t in times if t < duration))
+
+
+def sample_clip_frames(video_source: str, times: List[float]) -> List[Tuple[int, bytes]]:
+    """
+    JPEG frames of a clip at the given times, decoded by one ffmpeg run
+    
+    Returns:
+        (timestamp ms of the decoded frame, JPEG bytes) in time order; times
+        falling on the same frame share one entry, and times past the end of
+        the clip have no frame
+    """
+    times = sorted(times)
+    with tempfile.TemporaryDirectory() as frames_dir:
+        result = subprocess.run([
+            'ffmpeg', '-hide_banner', '-nostats', '-v', 'info', '-nostdin', '-y', '-i', video_source,
+            '-filter_complex', f"[0:v:0]select='{_snapshot_select_expression(times)}',showinfo[sampled]",
+            '-map', '[sampled]', '-vsync', 'vfr', '-q:v', '3',
+            os.path.join(frames_dir, 'sample_%04d.jpg')
+        ], capture_output=True, text=True, timeout=120)
+        if result.returncode != 0:
+            raise RuntimeError(f"Frame sampling failed: {result.stderr.strip()[-2000:]}")
+        
+        frames = []
+        for frame_number, frame_time in enumerate(_selected_frame_times(result.stderr).get(1, []), start=1):
+            path = os.path.join(frames_dir, f'sample_{frame_number:04d}.jpg')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    frames.append((int(round(frame_time * 1000)), f.read()))
+        return frames
+
+
+def ffmpeg_available() -> bool:
+    """Whether this container ships an ffmpeg binary (Lambda layer or image)"""
+    return os.path.exists('/usr/bin/ffmpeg') or os.path.exists('/opt/bin/ffmpeg')
+
+
+def available_cpus() -> int:
+    """vCPUs available to this container (affinity mask and cgroup quota aware)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    
+    # Containers may be throttled by a cgroup v2 CPU quota below the affinity mask
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    
+    return max(1, cpus)
+
+
+def decode_sampled_frames(
+    video_path: str,
+    sample_fps: float,
+    start_time: float = 0.0,
+    end_time: Optional[float] = None,
+    max_width: int = 640,
+    sample_times: Optional[np.ndarray] = None
+):
+    """
+    Yield (timestamp_seconds, RGB frame) pairs sampled at sample_fps
+    
+    Skipped frames are only grabbed, not converted, and kept frames are
+    downscaled to max_width, which is plenty for pose landmarks. When
+    sample_times is given (e.g. from the motion prefilter), the frames nearest
+    those times are kept instead of a fixed stride.
+    """
+    import cv2
+    
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video: {video_path}")
+    
+    try:
+        native_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, int(round(native_fps / sample_fps)))
+        wanted = None
+        if sample_times is not None:
+            wanted = set(np.round(np.asarray(sample_times) * native_fps).astype(np.int64).tolist())
+            end_time = min(end_time if end_time is not None else np.inf, max(wanted, default=0) / native_fps)
+        
+        if start_time > 0:
+            capture.set(cv2.CAP_PROP_POS_MSEC, start_time * 1000)
+        # Seeking may land on a nearby frame; count from where it actually landed
+        frame_index = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+        
+        while True:
+            if not capture.grab():
+                break
+            timestamp = frame_index / native_fps
+            if end_time is not None and timestamp > end_time:
+                break
+            
+            keep = frame_index in wanted if wanted is not None else frame_index % step == 0
+            if keep:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                height, width = frame.shape[:2]
+                if width > max_width:
+                    frame = cv2.resize(frame, (max_width, int(height * max_width / width)), interpolation=cv2.INTER_AREA)
+                yield timestamp, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            
+            frame_index += 1
+    finally:
+        capture.release()
+
+
+def _estimate_pose_batch(frames: np.ndarray) -> np.ndarray:
+    """
+    Pose-estimate one contiguous batch of RGB frames (runs in a worker process)
+    
+    A fresh tracker per batch lets MediaPipe track across consecutive frames
+    without carrying state across unrelated batches.
+    """
+    import mediapipe as mp
+    
+    keypoints = np.full((len(frames), 1, POSE_LANDMARK_COUNT, 3), np.nan, dtype=np.float32)
+    
+    with mp.solutions.pose.Pose(static_image_mode=False, model_complexity=1, enable_segmentation=False) as pose:
+        for i, frame in enumerate(frames):
+            result = pose.process(frame)
+            if result.pose_landmarks:
+                keypoints[i, 0] = [
+                    (landmark.x, landmark.y, landmark.visibility)
+                    for landmark in result.pose_landmarks.landmark
+                ]
+    
+    return keypoints
+
+
+class PoseEstimationEngine:
+    """
+    CPU pose estimation using MediaPipe Pose
+    Best deployed as a container image Lambda or service with several vCPUs
+    """
+    
+    @staticmethod
+    def estimate_poses_mediapipe(
+        video_path: str,
+        sample_fps: float = POSE_SAMPLE_FPS,
+        batch_size: int = POSE_BATCH_SIZE,
+        workers: Optional[int] = None,
+        start_time: float = 0.0,
+        end_time: Optional[float] = None,
+        frame_budget: int = POSE_FRAME_BUDGET
+    ) -> Dict[str, Any]:
+        """
+        Use MediaPipe Pose to extract skeletal keypoints on CPU
+        
+        Frames are decoded at sample_fps, grouped into contiguous batches and
+        run through MediaPipe Pose in a process pool sized to the container's
+        vCPUs (in-process when a pool cannot be created, e.g. on Lambda where
+        /dev/shm is unavailable).
+        
+        With a frame_budget, the motion prefilter replaces uniform sampling:
+        at most frame_budget frames are chosen, dense during motion bursts and
+        sparse while nobody moves.
+        
+        Args:
+            video_path: Local path of the clip
+            sample_fps: Frames per second of video to analyze
+            batch_size: Contiguous frames handed to a worker at a time
+            workers: Worker processes (default: available vCPUs)
+            start_time: Analyze from this offset in seconds
+            end_time: Stop at this offset in seconds (default: end of clip)
+            frame_budget: Adaptive sampling budget per clip (0 = uniform)
+            
+        Returns:
+            keypoints: float32 array (frames, persons, 33, 3) holding normalized
+                       x, y and visibility; NaN where no pose was found.
+                       MediaPipe Pose tracks one person, so persons == 1.
+            timestamps: float64 array (frames,) in seconds
+            aspect_ratio: Frame width / height, needed to measure angles
+            sampling: 'uniform' or 'adaptive'
+        """
+        try:
+            timestamps = []
+            frame_shape = []
+            sample_times = None
+            
+            if frame_budget > 0:
+                sample_times = plan_pose_sampling(video_path, frame_budget, start_time, end_time)['sample_times']
+            
+            def batches():
+                batch = []
+                frames = decode_sampled_frames(video_path, sample_fps, start_time, end_time, sample_times=sample_times)
+                for timestamp, frame in frames:
+                    if not frame_shape:
+                        frame_shape.extend(frame.shape[:2])
+                    timestamps.append(timestamp)
+                    batch.append(frame)
+                    if len(batch) >= batch_size:
+                        yield np.stack(batch)
+                        batch = []
+                if batch:
+                    yield np.stack(batch)
+            
+            keypoints = PoseEstimationEngine.estimate_poses_on_batches(batches(), workers)
+            
+            sampling = 'adaptive' if sample_times is not None else 'uniform'
+            logger.info(f"Estimated poses on {len(timestamps)} frames ({sampling} sampling)")
+            
+            return {
+                'keypoints': keypoints,
+                'timestamps': np.asarray(timestamps, dtype=np.float64),
+                'aspect_ratio': frame_shape[1] / frame_shape[0] if frame_shape else 16 / 9,
+                'sample_fps': sample_fps,
+                'sampling': sampling,
+                'frames_processed': len(timestamps)
+            }
+        
+        except Exception as e:
+            logger.error(f"MediaPipe pose estimation error: {str(e)}")
+            return {
+                'keypoints': np.full((0, 1, POSE_LANDMARK_COUNT, 3), np.nan, dtype=np.float32),
+                'timestamps': np.zeros(0, dtype=np.float64),
+                'sample_fps': sample_fps,
+                'frames_processed': 0,
+                'error': str(e)
+            }
+    
+    @staticmethod
+    def estimate_poses_streamed(
+        source: str,
+        sample_fps: float = POSE_SAMPLE_FPS,
+        batch_size: int = POSE_BATCH_SIZE,
+        workers: Optional[int] = None,
+        start_time: float = 0.0,
+        end_time: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        estimate_poses_mediapipe over frames delivered by the frame bus
+        
+        The clip is decoded once, at sample_fps and at most 640 px wide, into
+        the bus's ring buffer; frames are copied only into the batches handed
+        to workers. source may be a presigned URL, so nothing is downloaded
+        first. Uniform sampling only; returns the same dictionary as
+        estimate_poses_mediapipe.
+        """
+        try:
+            frames = FrameBatchConsumer(sample_fps, batch_size, width=640)
+            bus = FrameBus(source, start_time, end_time)
+            bus.register(frames)
+            bus.start()
+            try:
+                keypoints = PoseEstimationEngine.estimate_poses_on_batches(frames.batches(), workers)
+            finally:
+                frames.close()
+                stats = bus.wait()
+            
+            shape = frames.frame_shape
+            logger.info(f"Estimated poses on {len(frames.timestamps)} frames streamed at {stats['decode_fps']} fps")
+            
+            return {
+                'keypoints': keypoints,
+                'timestamps': np.asarray(frames.timestamps[:keypoints.shape[0]], dtype=np.float64),
+                'aspect_ratio': shape[1] / shape[0] if shape else 16 / 9,
+                'sample_fps': sample_fps,
+                'sampling': 'uniform',
+                'frames_processed': int(keypoints.shape[0])
+            }
+            
+        except Exception as e:
+            logger.error(f"MediaPipe pose estimation error: {str(e)}")
+            return {
+                'keypoints': np.full((0, 1, POSE_LANDMARK_COUNT, 3), np.nan, dtype=np.float32),
+                'timestamps': np.zeros(0, dtype=np.float64),
+                'sample_fps': sample_fps,
+                'frames_processed': 0,
+                'error': str(e)
+            }
+    
+    @staticmethod
+    def estimate_poses_on_batches(batches: Iterable[np.ndarray], workers: Optional[int] = None) -> np.ndarray:
+        """
+        Run pose estimation over batches of RGB frames (each shaped N×H×W×3)
+        
+        Batches are consumed lazily with at most two per worker in flight, so
+        decoding overlaps inference without buffering the whole clip.
+        
+        Returns:
+            float32 array (frames, 1, 33, 3) in batch order
+        """
+        workers = workers or available_cpus()
+        results = []
+        pool = None
+        
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            try:
+                pool = ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError) as e:
+                # Lambda has no /dev/shm, which multiprocessing queues require
+                logger.warning(f"Process pool unavailable ({e}); estimating poses in-process")
+        
+        try:
+            if pool is None:
+                results = [_estimate_pose_batch(batch) for batch in batches]
+            else:
+                pending = collections.deque()
+                for batch in batches:
+                    pending.append(pool.submit(_estimate_pose_batch, batch))
+                    if len(pending) >= 2 * workers:
+                        results.append(pending.popleft().result())
+                while pending:
+                    results.append(pending.popleft().result())
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        
+        if not results:
+            return np.full((0, 1, POSE_LANDMARK_COUNT, 3), np.nan, dtype=np.float32)
+        return np.concatenate(results, axis=0)
+    
+    @staticmethod
+    def analyze_motion_patterns(
+        keypoints: np.ndarray,
+        timestamps: np.ndarray,
+        expected_movements: Optional[List[str]] = None,
+        aspect_ratio: float = 16 / 9
+    ) -> Dict[str, Any]:
+        """
+        Analyze a keypoint sequence to detect specific movements
+        
+        Joint angles (hip/knee/trunk flexion, cervical and trunk rotation,
+        shoulder elevation, ...) are computed for every frame and person at
+        once with NumPy; each movement rule is then a vectorized threshold on
+        an angle, its range or its angular velocity. Movements that pose alone
+        cannot show (e.g. 'tapping', 'cotton_wisp') are reported with
+        evaluated=False.
+        
+        Args:
+            keypoints: (frames, persons, 33, 3) array from estimate_poses_mediapipe
+            timestamps: (frames,) seconds
+            expected_movements: Movements to classify (default: every movement
+                                with a pose rule)
+            aspect_ratio: Frame width / height of the analyzed video
+        
+        Returns:
+            Classification of observed movements with confidence scores and
+            time spans
+        """
+        if expected_movements is None:
+            expected_movements = list(MOVEMENT_RULES)
+        
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        
+        movements = {}
+        if keypoints.ndim != 4 or keypoints.shape[0] < 2:
+            for movement in expected_movements:
+                movements[movement] = {'detected': False, 'confidence': 0.0, 'spans': [],
+                                       'evaluated': movement in MOVEMENT_RULES}
+            return {'movements': movements, 'confidence': 0.0, 'frames_analyzed': int(keypoints.shape[0]) if keypoints.ndim else 0}
+        
+        signals = compute_joint_signals(keypoints, timestamps, aspect_ratio)
+        
+        for movement in expected_movements:
+            rule = MOVEMENT_RULES.get(movement)
+            if rule is None:
+                movements[movement] = {'detected': False, 'confidence': 0.0, 'spans': [], 'evaluated': False}
+                continue
+            movements[movement] = _classify_movement(rule, signals, timestamps)
+        
+        evaluated = [m for m in movements.values() if m['evaluated']]
+        confidence = float(np.mean([m['confidence'] for m in evaluated])) if evaluated else 0.0
+        
+        return {
+            'movements': movements,
+            'confidence': round(confidence, 3),
+            'frames_analyzed': int(keypoints.shape[0]),
+            'joint_angle_ranges': {
+                name: [round(float(np.nanmin(values)), 1), round(float(np.nanmax(values)), 1)]
+                for name, values in signals.items()
+                if name in JOINT_ANGLE_SIGNALS and np.isfinite(values).any()
+            }
+        }
+
+
+# MediaPipe Pose landmark indices
+NOSE = 0
+LEFT_EAR, RIGHT_EAR = 7, 8
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_INDEX, RIGHT_INDEX = 19, 20
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+
+# Landmarks below this visibility are treated as missing
+MIN_LANDMARK_VISIBILITY = 0.5
+
+# Signals measured in degrees (reported back as per-clip ranges)
+JOINT_ANGLE_SIGNALS = (
+    'hip_flexion', 'knee_flexion', 'trunk_flexion', 'trunk_incline',
+    'trunk_rotation', 'cervical_rotation', 'neck_pitch', 'shoulder_elevation', 'wrist_flexion'
+)
+
+# Pose rules for TEST_MOTION_EXPECTATIONS movements. Each rule is
+# (signals, kind, threshold, min_duration_seconds); any listed signal may satisfy it.
+#   above    - signal >= threshold
+#   below    - signal <= threshold
+#   range    - signal moves at least threshold away from its clip baseline
+#   velocity - |d signal / dt| >= threshold per second
+MOVEMENT_RULES = {
+    'flexion': (('trunk_flexion', 'hip_flexion', 'knee_flexion'), 'range', 25.0, 0.3),
+    'extension': (('knee_flexion', 'trunk_extension'), 'range', 20.0, 0.3),
+    'bending': (('trunk_flexion',), 'above', 30.0, 0.5),
+    'forward_flexion': (('shoulder_elevation',), 'above', 90.0, 0.3),
+    'rotation': (('trunk_rotation', 'cervical_rotation'), 'range', 20.0, 0.3),
+    'trunk_rotation': (('trunk_rotation',), 'range', 20.0, 0.3),
+    'en_bloc_rotation': (('trunk_rotation',), 'range', 15.0, 0.3),
+    'external_rotation': (('hip_flexion',), 'above', 30.0, 0.5),
+    'hip_flexion': (('hip_flexion',), 'above', 30.0, 0.3),
+    'leg_raise': (('straight_leg_raise',), 'above', 30.0, 0.3),
+    'opposite_leg_raise': (('straight_leg_raise',), 'above', 30.0, 0.3),
+    'seated_leg_extension': (('knee_flexion',), 'range', 45.0, 0.3),
+    'patient_supine': (('trunk_incline',), 'above', 60.0, 1.0),
+    'supine_slr_comparison': (('straight_leg_raise',), 'above', 30.0, 0.3),
+    'abduction': (('shoulder_elevation', 'hip_flexion'), 'range', 25.0, 0.3),
+    'arm_abduction': (('shoulder_elevation',), 'above', 60.0, 0.3),
+    'arm_lowering': (('shoulder_elevation',), 'velocity', 30.0, 0.2),
+    'shoulder_flexion': (('shoulder_elevation',), 'above', 80.0, 0.3),
+    'overhead_reach': (('wrist_above_head',), 'above', 0.0, 0.3),
+    'neck_extension': (('neck_pitch',), 'range', 15.0, 0.3),
+    'knee_flexion': (('knee_flexion',), 'range', 30.0, 0.3),
+    'wrist_flexion': (('wrist_flexion',), 'above', 45.0, 1.0),
+    'standing': (('upright',), 'above', 0.5, 1.0),
+    'balance': (('upright',), 'above', 0.5, 2.0),
+    'balance_observation': (('upright',), 'above', 0.5, 2.0),
+    'one_leg_stand': (('ankle_separation',), 'above', 0.12, 1.0),
+    'walking': (('gait_speed',), 'above', 0.2, 1.0),
+    'stride_observation': (('gait_speed',), 'above', 0.2, 1.0),
+    'heel_walk': (('gait_speed',), 'above', 0.15, 1.0),
+    'toe_walk': (('gait_speed',), 'above', 0.15, 1.0),
+    'heel_to_toe': (('gait_speed',), 'above', 0.1, 1.0),
+    'stepping': (('ankle_separation',), 'velocity', 0.3, 0.2),
+    'squatting': (('knee_flexion',), 'above', 90.0, 0.5),
+    'rising': (('hip_rise_speed',), 'above', 0.3, 0.3),
+    'chair_transfer': (('hip_rise_speed',), 'above', 0.3, 0.3),
+    'sudden_collapse': (('hip_rise_speed',), 'below', -0.5, 0.1),
+    'limb_movement': (('knee_flexion', 'shoulder_elevation', 'hip_flexion'), 'velocity', 45.0, 0.2),
+    'joint_movement': (('knee_flexion', 'shoulder_elevation', 'wrist_flexion'), 'velocity', 30.0, 0.2),
+}
+
+
+def _joint_angle(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """Angle ABC in degrees for (..., 2) point arrays"""
+    ba = a - b
+    bc = c - b
+    cosine = np.sum(ba * bc, axis=-1) / (np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1))
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def compute_joint_signals(keypoints: np.ndarray, timestamps: np.ndarray, aspect_ratio: float) -> Dict[str, np.ndarray]:
+    """
+    Per-frame, per-person joint angles and body kinematics
+    
+    Returns:
+        Mapping of signal name -> (frames, persons) float array (NaN where the
+        landmarks involved were not visible). Left/right pairs are merged by
+        taking the larger value.
+    """
+    # Scale x so image-space angles are not distorted by the frame's aspect ratio
+    points = keypoints[..., :2] * np.array([aspect_ratio, 1.0], dtype=np.float32)
+    visible = keypoints[..., 2] >= MIN_LANDMARK_VISIBILITY
+    points = np.where(visible[..., None], points, np.nan)
+    
+    def lm(index):
+        return points[:, :, index]
+    
+    mid_shoulder = (lm(LEFT_SHOULDER) + lm(RIGHT_SHOULDER)) / 2
+    mid_hip = (lm(LEFT_HIP) + lm(RIGHT_HIP)) / 2
+    mid_ear = (lm(LEFT_EAR) + lm(RIGHT_EAR)) / 2
+    trunk = mid_shoulder - mid_hip
+    body_height = np.nanmedian(np.linalg.norm(trunk, axis=-1), axis=0) * 3.0  # trunk ≈ 1/3 of height
+    
+    # Facing direction from the nose relative to the shoulders (+1 right, -1 left)
+    facing = np.sign(np.nanmedian(lm(NOSE)[..., 0] - mid_shoulder[..., 0], axis=0))
+    facing = np.where(facing == 0, 1.0, facing)
+    
+    hip_flexion = np.fmax(
+        180.0 - _joint_angle(lm(LEFT_SHOULDER), lm(LEFT_HIP), lm(LEFT_KNEE)),
+        180.0 - _joint_angle(lm(RIGHT_SHOULDER), lm(RIGHT_HIP), lm(RIGHT_KNEE))
+    )
+    left_knee = 180.0 - _joint_angle(lm(LEFT_HIP), lm(LEFT_KNEE), lm(LEFT_ANKLE))
+    right_knee = 180.0 - _joint_angle(lm(RIGHT_HIP), lm(RIGHT_KNEE), lm(RIGHT_ANKLE))
+    knee_flexion = np.fmax(left_knee, right_knee)
+    
+    # Straight leg raise: hip flexion on a side whose knee stays extended
+    left_slr = np.where(left_knee <= 30.0, 180.0 - _joint_angle(lm(LEFT_SHOULDER), lm(LEFT_HIP), lm(LEFT_ANKLE)), np.nan)
+    right_slr = np.where(right_knee <= 30.0, 180.0 - _joint_angle(lm(RIGHT_SHOULDER), lm(RIGHT_HIP), lm(RIGHT_ANKLE)), np.nan)
+    
+    # Signed trunk lean from vertical (image y grows downwards); positive = forward
+    trunk_flexion = np.degrees(np.arctan2(facing * trunk[..., 0], -trunk[..., 1]))
+    trunk_incline = np.abs(np.degrees(np.arctan2(trunk[..., 0], -trunk[..., 1])))
+    
+    # Rotation about the vertical axis foreshortens the shoulder line in 2D
+    shoulder_width = np.linalg.norm(lm(LEFT_SHOULDER) - lm(RIGHT_SHOULDER), axis=-1)
+    hip_width = np.linalg.norm(lm(LEFT_HIP) - lm(RIGHT_HIP), axis=-1)
+    width_ratio = shoulder_width / np.nanmax(shoulder_width, axis=0)
+    trunk_rotation = np.degrees(np.arccos(np.clip(width_ratio, 0.0, 1.0)))
+    
+    # Head turn moves the nose off the ear midline in proportion to ear spacing
+    ear_spacing = np.linalg.norm(lm(LEFT_EAR) - lm(RIGHT_EAR), axis=-1)
+    nose_offset = (lm(NOSE)[..., 0] - mid_ear[..., 0]) / np.nanmax(ear_spacing, axis=0)
+    cervical_rotation = np.degrees(np.arcsin(np.clip(2.0 * nose_offset, -1.0, 1.0)))
+    neck_pitch = np.degrees(np.arctan2(mid_ear[..., 1] - lm(NOSE)[..., 1], ear_spacing))
+    
+    shoulder_elevation = np.fmax(
+        _joint_angle(lm(LEFT_HIP), lm(LEFT_SHOULDER), lm(LEFT_ELBOW)),
+        _joint_angle(lm(RIGHT_HIP), lm(RIGHT_SHOULDER), lm(RIGHT_ELBOW))
+    )
+    wrist_flexion = np.fmax(
+        180.0 - _joint_angle(lm(LEFT_ELBOW), lm(LEFT_WRIST), lm(LEFT_INDEX)),
+        180.0 - _joint_angle(lm(RIGHT_ELBOW), lm(RIGHT_WRIST), lm(RIGHT_INDEX))
+    )
+    wrist_above_head = lm(NOSE)[..., 1] - np.fmin(lm(LEFT_WRIST)[..., 1], lm(RIGHT_WRIST)[..., 1])
+    
+    # Kinematics in body heights (per second for speeds)
+    dt = np.gradient(timestamps)[:, None]
+    hip_x = mid_hip[..., 0] / body_height
+    hip_y = mid_hip[..., 1] / body_height
+    gait_speed = np.abs(np.gradient(hip_x, axis=0) / dt)
+    hip_rise_speed = -np.gradient(hip_y, axis=0) / dt
+    ankle_separation = np.abs(lm(LEFT_ANKLE)[..., 1] - lm(RIGHT_ANKLE)[..., 1]) / body_height
+    
+    upright = ((trunk_incline <= 20.0) & (knee_flexion <= 25.0)).astype(np.float32)
+    upright[np.isnan(trunk_incline) | np.isnan(knee_flexion)] = np.nan
+    
+    return {
+        'hip_flexion': hip_flexion,
+        'knee_flexion': knee_flexion,
+        'straight_leg_raise': np.fmax(left_slr, right_slr),
+        'trunk_flexion': trunk_flexion,
+        'trunk_extension': -trunk_flexion,
+        'trunk_incline': trunk_incline,
+        'trunk_rotation': trunk_rotation,
+        'cervical_rotation': cervical_rotation,
+        'neck_pitch': neck_pitch,
+        'shoulder_elevation': shoulder_elevation,
+        'wrist_flexion': wrist_flexion,
+        'wrist_above_head': wrist_above_head,
+        'gait_speed': gait_speed,
+        'hip_rise_speed': hip_rise_speed,
+        'ankle_separation': ankle_separation,
+        'upright': upright,
+        'hip_width': hip_width,
+    }
+
+
+def _active_mask(values: np.ndarray, kind: str, threshold: float, timestamps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Frames satisfying a rule, plus a 0-1 strength per frame
+    
+    Args:
+        values: (frames, persons) signal
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if kind == 'above':
+            active = values >= threshold
+            strength = np.clip(values / (threshold * 1.5), 0.0, 1.0) if threshold > 0 else active.astype(np.float32)
+        elif kind == 'below':
+            active = values <= threshold
+            strength = np.clip(values / (threshold * 1.5), 0.0, 1.0) if threshold < 0 else active.astype(np.float32)
+        elif kind == 'range':
+            baseline = np.nanpercentile(values, 10, axis=0) if np.isfinite(values).any() else np.zeros(values.shape[1])
+            excursion = np.abs(values - baseline)
+            active = excursion >= threshold
+            strength = np.clip(excursion / (threshold * 1.5), 0.0, 1.0)
+        else:  # velocity
+            speed = np.abs(np.gradient(values, axis=0) / np.gradient(timestamps)[:, None])
+            active = speed >= threshold
+            strength = np.clip(speed / (threshold * 1.5), 0.0, 1.0)
+    
+    return active & np.isfinite(values), np.nan_to_num(strength)
+
+
+def _mask_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start (inclusive) and end (exclusive) indices of True runs in a 1-D mask"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _classify_movement(rule: tuple, signals: Dict[str, np.ndarray], timestamps: np.ndarray) -> Dict[str, Any]:
+    """Evaluate one movement rule across every person and keep the best one"""
+    signal_names, kind, threshold, min_duration = rule
+    
+    # Combine the rule's alternative signals: a frame counts if any satisfies it
+    active, strength = None, None
+    for name in signal_names:
+        signal_active, signal_strength = _active_mask(signals[name], kind, threshold, timestamps)
+        active = signal_active if active is None else active | signal_active
+        strength = signal_strength if strength is None else np.maximum(strength, signal_strength)
+    
+    # Best person is the one active for the longest time
+    frame_time = np.gradient(timestamps)[:, None]
+    person = int(np.argmax(np.sum(active * frame_time, axis=0)))
+    person_active = active[:, person]
+    
+    starts, ends = _mask_runs(person_active)
+    end_times = timestamps[np.minimum(ends, len(timestamps) - 1)]
+    durations = end_times - timestamps[starts]
+    keep = durations >= min_duration
+    spans = [[round(float(a), 2), round(float(b), 2)] for a, b in zip(timestamps[starts[keep]], end_times[keep])]
+    
+    detected = bool(keep.any())
+    confidence = 0.0
+    if detected:
+        in_spans = np.zeros(len(timestamps), dtype=bool)
+        for start, end in zip(starts[keep], ends[keep]):
+            in_spans[start:end] = True
+        duration_factor = min(1.0, float(durations[keep].max()) / (2.0 * min_duration))
+        confidence = float(np.mean(strength[in_spans, person])) * (0.5 + 0.5 * duration_factor)
+    
+    return {
+        'detected': detected,
+        'confidence': round(confidence, 3),
+        'spans': spans,
+        'evaluated': True
+    }
+
+
+def require_notification_channel(rekognition=None) -> None:
+    """
+    Raise unless Rekognition can publish job completions to SNS
+    
+    The callback Lambda only learns that a video job finished from its SNS
+    notification, so starting jobs without a NotificationChannel leaves the
+    waiting task hanging until it times out. Injected clients (the local
+    stand-in) complete their jobs through their own channel and need none.
+    """
+    if rekognition is None and not (REKOGNITION_SNS_TOPIC_ARN and REKOGNITION_ROLE_ARN):
+        raise RuntimeError("REKOGNITION_SNS_TOPIC_ARN and REKOGNITION_ROLE_ARN must be set to start Rekognition video jobs")
+
+
+def process_video_for_cme_test(
+    session_id: str,
+    declared_test: Dict[str, Any],
+    video_s3_key: str,
+    s3_bucket: str,
+    task_token: Optional[str] = None,
+    job_registry=None,
+    stepfunctions=None,
+    rekognition=None,
+    hls_playlist_key: Optional[str] = None,
+    proxy_s3_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Main processing function for video analysis of a declared test
+    Extracts the segment and starts the Rekognition jobs, then returns without
+    waiting. When a Step Functions task token is supplied it is registered
+    against the job IDs so the Rekognition callback Lambda can resume the
+    workflow once both jobs have published their completion notification.
+    
+    Args:
+        task_token: Step Functions task token (waitForTaskToken integration)
+        job_registry: Registry linking job IDs to the token (defaults to DynamoDB)
+        stepfunctions: Client used to resume the task directly on early exit
+        rekognition: Rekognition client override (e.g. the local stand-in)
+        hls_playlist_key: Session HLS media playlist; clips become sub-playlists
+        proxy_s3_key: Session analysis proxy; the test is analyzed on a cut of it
+    """
+    if task_token:
+        # Fail the task now rather than after a segment has been cut and analyzed
+        require_notification_channel(rekognition)
+    processor = CMEVideoProcessor(s3_bucket, rekognition=rekognition)
+    
+    test_timestamp = float(declared_test.get('timestamp', 0))
+    test_type = declared_test.get('label', 'unknown')
+    declared_step_id = declared_test.get('declared_step_id', '')
+    
+    # Step 5: Extract video segment
+    if proxy_s3_key:
+        # Analyze a stream-copy cut of the proxy; the original stays the evidentiary clip
+        window_start = max(0.0, test_timestamp - SEGMENT_PRE_ROLL)
+        segment_key = processor.extract_proxy_segment(
+            proxy_s3_key, window_start, SEGMENT_DURATION,
+            f"cme-segments/{session_id}/proxy_{int(window_start * 1000)}_{int(SEGMENT_DURATION * 1000)}.mp4"
+        )
+    else:
+        segment_key = processor.extract_video_segment(
+            video_s3_key=video_s3_key,
+            start_time=test_timestamp,
+            duration=SEGMENT_DURATION,
+            output_key_prefix=f'cme-segments/{session_id}',
+            hls_playlist_key=hls_playlist_key
+        )
+    
+    clip_playlist_key = None
+    if proxy_s3_key and SEGMENT_EXTRACTION_MODE == 'hls' and hls_playlist_key:
+        clip_playlist_key = write_clip_playlist(s3_bucket, hls_playlist_key, window_start, SEGMENT_DURATION)
+    elif segment_key and segment_key.endswith('.m3u8'):
+        # Rekognition and the CV tiers read plain MP4; remux the clip's
+        # segments without re-encoding
+        clip_playlist_key = segment_key
+        try:
+            segment_key = materialize_clip(
+                s3_bucket, clip_playlist_key,
+                f"cme-segments/{session_id}/{os.path.basename(clip_playlist_key).replace('.m3u8', '.mp4')}"
+            )
+        except Exception as e:
+            logger.error(f"Error materializing clip {clip_playlist_key}: {str(e)}")
+            segment_key = None
+    
+    if not segment_key:
+        logger.warning(f"Failed to extract segment, using simple analysis")
+        # Even without segment, record that we tried
+        action_id = persist_observed_action(
+            declared_step_id=declared_step_id,
+            motion_present='not_observed',
+            pose_match='no_match',
+            confidence=0.0,
+            analysis_details={'error': 'Segment extraction failed'}
+        )
+        
+        result = {
+            'session_id': session_id,
+            'test_type': test_type,
+            'timestamp': test_timestamp,
+            'action_id': action_id,
+            'error': 'Failed to extract video segment'
+        }
+        # Nothing will notify for this test, so resume the workflow now
+        if task_token:
+            (stepfunctions or boto3.client('stepfunctions')).send_task_success(
+                taskToken=task_token,
+                output=json.dumps({**result, 'status': 'completed'})
+            )
+        return result
+    
+    # Step 6: Analysis cascade; Rekognition jobs only start for uncertain clips
+    analysis = processor.analyze_video_segment(segment_key, test_type, job_tag=declared_step_id or session_id,
+                                               duration=SEGMENT_DURATION)
+    
+    verdict = analysis.get('verdict')
+    if verdict:
+        action_id = persist_observed_action(
+            declared_step_id=declared_step_id,
+            motion_present=verdict['motion_present'],
+            pose_match=verdict['pose_match'],
+            confidence=verdict['confidence'],
+            analysis_details={
+                'segment_key': segment_key,
+                'clip_playlist_key': clip_playlist_key,
+                'test_type': test_type,
+                'decision_seconds': analysis['decision_seconds'],
+                'local_motion': analysis.get('local_motion'),
+                'pose_movements': (analysis.get('pose_patterns') or {}).get('movements')
+            },
+            decided_by_tier=analysis['tier']
+        )
+        result = {
+            'session_id': session_id,
+            'test_type': test_type,
+            'timestamp': test_timestamp,
+            'segment_key': segment_key,
+            'clip_playlist_key': clip_playlist_key,
+            'action_id': action_id,
+            **verdict,
+            'decided_by_tier': analysis['tier'],
+            'status': 'completed'
+        }
+        if task_token:
+            (stepfunctions or boto3.client('stepfunctions')).send_task_success(
+                taskToken=task_token,
+                output=json.dumps(result, default=str)
+            )
+        return result
+    
+    if analysis.get('sampled_results'):
+        # Image mode already has the results; score them without waiting
+        result = finalize_video_for_cme_test(session_id, declared_test, segment_key, {}, s3_bucket,
+                                             local_motion=analysis.get('local_motion'),
+                                             fetched=analysis['sampled_results'])
+        result['clip_playlist_key'] = clip_playlist_key
+        if task_token:
+            (stepfunctions or boto3.client('stepfunctions')).send_task_success(
+                taskToken=task_token,
+                output=json.dumps(result, default=str)
+            )
+        return result
+    
+    jobs = {}
+    for job_type, job in (('motion_analysis', analysis.get('motion_detected', {})),
+                          ('pose_detection', analysis.get('poses_detected', {}))):
+        if job.get('job_id'):
+            jobs[job_type] = job['job_id']
+    
+    context = {
+        'session_id': session_id,
+        'declared_test': declared_test,
+        'segment_key': segment_key,
+        'clip_playlist_key': clip_playlist_key,
+        'local_motion': analysis.get('local_motion'),
+        'escalated_at': time.time()
+    }
+    
+    if task_token and jobs:
+        if job_registry is None:
+            from rekognition_callback import RekognitionJobRegistry
+            job_registry = RekognitionJobRegistry()
+        callback_id = f"callback_{uuid.uuid4().hex[:12]}"
+        job_registry.register(callback_id, task_token, jobs, context)
+        logger.info(f"Registered callback {callback_id} for jobs {jobs}")
+        # A job may have finished, and its notification been dropped, before registration
+        reconcile_jobs(jobs, job_registry, stepfunctions or boto3.client('stepfunctions'), processor.rekognition)
+        status = 'WAITING_FOR_REKOGNITION'
+    elif task_token:
+        # Neither job could be started; finalise immediately as not observed
+        result = finalize_video_for_cme_test(session_id, declared_test, segment_key, {}, s3_bucket, rekognition,
+                                             local_motion=context['local_motion'], escalated_at=context['escalated_at'])
+        (stepfunctions or boto3.client('stepfunctions')).send_task_success(
+            taskToken=task_token,
+            output=json.dumps(result, default=str)
+        )
+        return result
+    else:
+        status = 'IN_PROGRESS'
+    
+    return {
+        **context,
+        'test_type': test_type,
+        'timestamp': test_timestamp,
+        'jobs': {job_type: {'job_id': job_id, 'status': 'IN_PROGRESS'} for job_type, job_id in jobs.items()},
+        'status': status
+    }
+
+
+def finalize_video_for_cme_test(
+    session_id: str,
+    declared_test: Dict[str, Any],
+    segment_key: str,
+    jobs: Dict[str, Any],
+    s3_bucket: str,
+    rekognition=None,
+    local_motion: Optional[Dict[str, Any]] = None,
+    escalated_at: Optional[float] = None,
+    window: Optional[Tuple[float, float]] = None,
+    fetched: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Fetch finished Rekognition results for a declared test, score them and
+    persist the observed action. Runs after the callback resumes the workflow,
+    so every job here has already finished.
+    
+    Args:
+        jobs: Mapping of job_type -> {'job_id', 'status'} (or a bare job ID)
+        local_motion: Local tier score that sent the clip to Rekognition
+        escalated_at: Epoch seconds when the Rekognition jobs were started
+        window: (start, end) of this test inside a merged clip, in seconds
+                from the clip start; the clip's results are sliced to it
+        fetched: Results already fetched for the clip by fetch_rekognition_results
+    """
+    test_timestamp = float(declared_test.get('timestamp', 0))
+    test_type = declared_test.get('label', 'unknown')
+    declared_step_id = declared_test.get('declared_step_id', '')
+    
+    if fetched is None:
+        processor = CMEVideoProcessor(s3_bucket, rekognition=rekognition)
+        fetched = fetch_rekognition_results(processor, jobs, s3_bucket)
+    job_ids = fetched['job_ids']
+    artifact_keys = fetched['result_keys']
+    motion_job_id = job_ids.get('motion_analysis')
+    pose_job_id = job_ids.get('pose_detection')
+    
+    motion_result = fetched['results'].get('motion_analysis')
+    pose_result = fetched['results'].get('pose_detection')
+    if window:
+        # Merged clip: score only this test's slice of the shared results
+        motion_result, pose_result = (
+            slice_rekognition_results(result['timeline'], *window)
+            if result and result.get('timeline') is not None else result
+            for result in (motion_result, pose_result)
+        )
+    
+    # Analyze Rekognition results
+    contact = examiner_contact(pose_result)
+    motion_present, pose_match, confidence = analyze_rekognition_results(
+        motion_result, pose_result, test_type, contact=contact
+    )
     
     # *** PERSIST OBSERVED ACTION TO DYNAMODB ***
-    action_id = f"action_{int(time.time())}"
-    action_item = {
+    action_id = persist_observed_action(
+        declared_step_id=declared_step_id,
+        motion_present=motion_present,
+        pose_match=pose_match,
+        confidence=confidence,
+        analysis_details={
+            'segment_key': segment_key,
+            'test_type': test_type,
+            'motion_job_id': motion_job_id,
+            'pose_job_id': pose_job_id,
+            'result_keys': artifact_keys,
+            'motion_labels': extract_motion_labels(motion_result),
+            'person_count': count_persons(pose_result),
+            'examiner_contact': contact,
+            'local_motion': local_motion,
+            'clip_window': list(window) if window else None,
+            'rekognition_mode': fetched.get('mode', 'video'),
+            'decision_seconds': round(time.time() - escalated_at, 3) if escalated_at else None
+        },
+        decided_by_tier='rekognition'
+    )
+    logger.info(f"Persisted observed action: {action_id} - {motion_present}")
+    
+    return {
+        'session_id': session_id,
+        'test_type': test_type,
+        'timestamp': test_timestamp,
+        'segment_key': segment_key,
+        'action_id': action_id,
+        'motion_present': motion_present,
+        'pose_match': pose_match,
+        'confidence': confidence,
+        'decided_by_tier': 'rekognition',
+        'status': 'completed'
+    }
+
+
+def fetch_rekognition_results(
+    processor: CMEVideoProcessor,
+    jobs: Dict[str, Any],
+    s3_bucket: str,
+    cache_keys: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Fetch the finished Rekognition jobs of one clip and store their artifacts
+    
+    Args:
+        jobs: Mapping of job_type -> {'job_id', 'status'} (or a bare job ID)
+        cache_keys: Content-addressed keys to store each job type's timeline
+                    under, so a rerun over the same clip reuses it
+    
+    Returns:
+        Dictionary with job_ids, results (job_type -> result) and result_keys
+        (job_type -> S3 key of the stored timeline)
+    """
+    job_ids = {
+        job_type: job.get('job_id') if isinstance(job, dict) else job
+        for job_type, job in (jobs or {}).items()
+    }
+    
+    results = {}
+    for job_type in ('motion_analysis', 'pose_detection'):
+        if job_ids.get(job_type):
+            results[job_type] = processor.get_rekognition_results(job_ids[job_type], job_type)
+    
+    # Keep one compact binary artifact per finished job
+    artifact_keys = {}
+    for job_type, result in results.items():
+        if result and result.get('timeline') is not None:
+            artifact_keys[job_type] = save_timeline(
+                s3_client, s3_bucket,
+                (cache_keys or {}).get(job_type) or artifact_key(job_ids[job_type]),
+                result['timeline']
+            )
+    
+    return {'job_ids': job_ids, 'results': results, 'result_keys': artifact_keys}
+
+
+def load_cached_results(s3_bucket: str, result_keys: Dict[str, str]) -> Dict[str, Any]:
+    """Rekognition results of a clip from its cached timelines, shaped like fetch_rekognition_results"""
+    results = {
+        job_type: {
+            'status': 'COMPLETED',
+            'job_type': job_type,
+            'timeline': load_timeline(s3_client, s3_bucket, result_key)
+        }
+        for job_type, result_key in result_keys.items()
+    }
+    return {'job_ids': {}, 'results': results, 'result_keys': dict(result_keys)}
+
+
+def store_sampled_results(
+    s3_bucket: str,
+    sampled: Dict[str, Any],
+    cache_keys: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Store the timelines of a Rekognition image-mode run like finished jobs'
+    
+    Returns:
+        The results shaped like fetch_rekognition_results (no job IDs), with
+        mode 'image' and the number of frames sampled
+    """
+    run_id = f"image-{uuid.uuid4().hex[:12]}"
+    result_keys = {
+        job_type: save_timeline(
+            s3_client, s3_bucket,
+            (cache_keys or {}).get(job_type) or artifact_key(f"{run_id}-{job_type}"),
+            result['timeline']
+        )
+        for job_type, result in sampled['results'].items()
+    }
+    return {
+        'job_ids': {},
+        'results': sampled['results'],
+        'result_keys': result_keys,
+        'mode': 'image',
+        'frames': sampled['frames']
+    }
+
+
+def batch_workers(test_count: int) -> int:
+    """Thread pool size for a batch of tests (VIDEO_BATCH_WORKERS or 2 x vCPUs)"""
+    return max(1, min(test_count, VIDEO_BATCH_WORKERS or available_cpus() * 2))
+
+
+def batch_error(declared_test: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+    """Per-test error record returned by the batch entry points"""
+    logger.error(f"Error analyzing test {declared_test.get('label', 'unknown')} "
+                 f"at {declared_test.get('timestamp')}s: {str(error)}")
+    return {
+        'declared_step_id': declared_test.get('declared_step_id', ''),
+        'test_type': declared_test.get('label', 'unknown'),
+        'timestamp': declared_test.get('timestamp'),
+        'error': str(error)
+    }
+
+
+def run_test_batch(declared_tests: List[Dict[str, Any]], analyze, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run analyze(index, declared_test) for every test of a batch on a thread pool
+    
+    One failing test does not fail the batch: its exception is recorded in
+    errors (with the test it belongs to) and the other tests carry on.
+    
+    Returns:
+        Dictionary with results (input order, failures omitted) and errors
+    """
+    results = []
+    errors = []
+    if not declared_tests:
+        return {'results': results, 'errors': errors}
+    
+    with ThreadPoolExecutor(max_workers=workers or batch_workers(len(declared_tests))) as pool:
+        futures = [pool.submit(analyze, index, test) for index, test in enumerate(declared_tests)]
+        for test, future in zip(declared_tests, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(batch_error(test, e))
+    
+    return {'results': results, 'errors': errors}
+
+
+def run_clip_batch(
+    clips: List[Dict[str, Any]],
+    declared_tests: List[Dict[str, Any]],
+    analyze,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Run analyze(clip_index, clip) for every merged clip on a thread pool
+    
+    Each call returns the results, pending contexts and Rekognition jobs of
+    its clip's tests. A failing clip is reported as an error for every test
+    it covers; the other clips carry on.
+    
+    Returns:
+        Dictionary with results, pending, jobs and errors of the whole batch
+    """
+    batch = {'results': [], 'pending': [], 'jobs': {}, 'errors': []}
+    if not clips:
+        return batch
+    
+    with ThreadPoolExecutor(max_workers=workers or batch_workers(len(clips))) as pool:
+        futures = [pool.submit(analyze, clip.get('clip_index', index), clip) for index, clip in enumerate(clips)]
+        for clip, future in zip(clips, futures):
+            try:
+                outcome = future.result()
+            except Exception as e:
+                batch['errors'] += [batch_error(declared_tests[i], e) for i in clip['tests']]
+                continue
+            batch['results'] += outcome.get('results', [])
+            batch['pending'] += outcome.get('pending', [])
+            batch['jobs'].update(outcome.get('jobs', {}))
+    
+    return batch
+
+
+def process_merged_clip(
+    processor: CMEVideoProcessor,
+    session_id: str,
+    clip_index: int,
+    clip: Dict[str, Any],
+    declared_tests: List[Dict[str, Any]],
+    video_s3_key: str,
+    s3_bucket: str,
+    hls_playlist_key: Optional[str] = None,
+    proxy_s3_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Extract and analyze one merged clip, then assign its results to the tests
+    whose windows it covers
+    
+    Tests decided by a local tier are persisted here. Tests left uncertain
+    share the clip's Rekognition jobs and come back as pending contexts
+    holding their window inside the clip. With a cache on the processor, a
+    clip already extracted (or analyzed) for the same recording, window and
+    profile is reused instead of being cut (or sent to Rekognition) again.
+    
+    With an analysis proxy the clip analyzed is a stream-copy cut of the
+    proxy, and the original is only referenced by the evidentiary clip
+    playlist (HLS mode); nothing is encoded or remuxed from the original.
+    
+    Args:
+        clip: Planned clip from plan_clip_windows
+        declared_tests: The clip's tests, in the order of clip['windows']
+        proxy_s3_key: Session analysis proxy (None = analyze the original)
+    
+    Returns:
+        Dictionary with results, pending contexts, the clip's jobs keyed
+        "<clip index>:<job type>" and analysis_bytes (size of the clip the
+        CV tiers read)
+    """
+    duration = clip['end'] - clip['start']
+    clip_details = {'start': clip['start'], 'end': clip['end'], 'test_count': len(declared_tests)}
+    
+    use_hls = SEGMENT_EXTRACTION_MODE == 'hls' and bool(hls_playlist_key)
+    cache = processor.cache
+    cached_clip_key = None
+    if cache:
+        profile = PROXY_CLIP_PROFILE if proxy_s3_key else ('hls-remux' if use_hls else 'h264-aac')
+        cached_clip_key = cache.clip_key((clip['start'], clip['end']), profile)
+    
+    # Recording time at which the clip's media begins; HLS clips start on a
+    # segment boundary at or before the planned start, proxy cuts on a keyframe
+    media_start = clip['start']
+    clip_playlist_key = None
+    
+    if proxy_s3_key:
+        media_start = proxy_clip_start(clip['start'])
+        if use_hls:
+            clip_playlist_key = write_clip_playlist(s3_bucket, hls_playlist_key, clip['start'], duration)
+        if cached_clip_key and cache.lookup(cached_clip_key, 'clip'):
+            segment_key = cached_clip_key
+        else:
+            segment_key = processor.extract_proxy_segment(
+                proxy_s3_key, clip['start'], duration,
+                cached_clip_key or f"cme-segments/{session_id}/proxy_{int(clip['start'] * 1000)}_{int(duration * 1000)}.mp4"
+            )
+    elif cached_clip_key and cache.lookup(cached_clip_key, 'clip'):
+        segment_key = cached_clip_key
+        if use_hls:
+            clip_playlist_key = build_clip_playlist_key(hls_playlist_key, clip['start'], duration)
+            media_start = clip_media_start(s3_bucket, hls_playlist_key, clip['start'])
+    else:
+        segment_key = processor.extract_video_segment(
+            video_s3_key=video_s3_key,
+            start_time=clip['start'],
+            duration=duration,
+            output_key_prefix=f'cme-segments/{session_id}',
+            hls_playlist_key=hls_playlist_key,
+            pre_roll=0.0,
+            output_s3_key=cached_clip_key
+        )
+        if segment_key and segment_key.endswith('.m3u8'):
+            clip_playlist_key = segment_key
+            media_start = clip_media_start(s3_bucket, hls_playlist_key, clip['start'])
+            try:
+                segment_key = materialize_clip(
+                    s3_bucket, clip_playlist_key,
+                    cached_clip_key or
+                    f"cme-segments/{session_id}/{os.path.basename(clip_playlist_key).replace('.m3u8', '.mp4')}"
+                )
+            except Exception as e:
+                logger.error(f"Error materializing clip {clip_playlist_key}: {str(e)}")
+                segment_key = None
+    
+    if not segment_key:
+        logger.warning(f"Failed to extract merged clip {clip_index}, recording its tests as not observed")
+        results = []
+        for declared_test in declared_tests:
+            action_id = persist_observed_action(
+                declared_step_id=declared_test.get('declared_step_id', ''),
+                motion_present='not_observed',
+                pose_match='no_match',
+                confidence=0.0,
+                analysis_details={'error': 'Segment extraction failed', 'merged_clip': clip_details}
+            )
+            results.append({
+                'session_id': session_id,
+                'test_type': declared_test.get('label', 'unknown'),
+                'timestamp': float(declared_test.get('timestamp', 0)),
+                'action_id': action_id,
+                'error': 'Failed to extract video segment',
+                'status': 'completed'
+            })
+        return {'results': results}
+    
+    windows = [(start - media_start, end - media_start) for start, end in clip['windows']]
+    analysis = processor.analyze_clip_windows(
+        segment_key,
+        [declared_test.get('label', 'unknown') for declared_test in declared_tests],
+        windows,
+        job_tag=f"{session_id}_clip{clip_index}",
+        recording_window=(media_start, clip['end'])
+    )
+    
+    jobs = {}
+    for job_type, job in (('motion_analysis', analysis['motion_detected']),
+                          ('pose_detection', analysis['poses_detected'])):
+        if job.get('job_id'):
+            jobs[job_type] = job['job_id']
+    escalated_at = time.time()
+    
+    # Cached or image-mode Rekognition timelines score the uncertain windows right away
+    cached = load_cached_results(s3_bucket, analysis['cached_results']) if analysis.get('cached_results') \
+        else analysis.get('sampled_results')
+    
+    results = []
+    pending = []
+    for declared_test, window, window_analysis in zip(declared_tests, windows, analysis['windows']):
+        test_type = declared_test.get('label', 'unknown')
+        test_timestamp = float(declared_test.get('timestamp', 0))
+        verdict = window_analysis.get('verdict')
+        
+        if verdict:
+            action_id = persist_observed_action(
+                declared_step_id=declared_test.get('declared_step_id', ''),
+                motion_present=verdict['motion_present'],
+                pose_match=verdict['pose_match'],
+                confidence=verdict['confidence'],
+                analysis_details={
+                    'segment_key': segment_key,
+                    'clip_playlist_key': clip_playlist_key,
+                    'test_type': test_type,
+                    'merged_clip': clip_details,
+                    'clip_window': list(window),
+                    'decision_seconds': window_analysis['decision_seconds'],
+                    'local_motion': window_analysis.get('local_motion'),
+                    'pose_movements': (window_analysis.get('pose_patterns') or {}).get('movements')
+                },
+                decided_by_tier=window_analysis['tier']
+            )
+            results.append({
+                'session_id': session_id,
+                'test_type': test_type,
+                'timestamp': test_timestamp,
+                'segment_key': segment_key,
+                'clip_playlist_key': clip_playlist_key,
+                'action_id': action_id,
+                **verdict,
+                'decided_by_tier': window_analysis['tier'],
+                'status': 'completed'
+            })
+        elif cached:
+            results.append(finalize_video_for_cme_test(
+                session_id, declared_test, segment_key, {}, s3_bucket,
+                local_motion=window_analysis.get('local_motion'), window=window, fetched=cached
+            ))
+        elif jobs:
+            pending.append({
+                'session_id': session_id,
+                'declared_test': declared_test,
+                'segment_key': segment_key,
+                'clip_playlist_key': clip_playlist_key,
+                'clip_index': clip_index,
+                'window': list(window),
+                'local_motion': window_analysis.get('local_motion'),
+                'escalated_at': escalated_at,
+                'cache_keys': analysis.get('cache_keys') or {}
+            })
+        else:
+            # Neither Rekognition job could be started; score as not observed now
+            results.append(finalize_video_for_cme_test(
+                session_id, declared_test, segment_key, {}, s3_bucket,
+                local_motion=window_analysis.get('local_motion'), escalated_at=escalated_at,
+                window=window, fetched={'job_ids': {}, 'results': {}, 'result_keys': {}}
+            ))
+    
+    return {
+        'results': results,
+        'pending': pending,
+        'jobs': {f"{clip_index}:{job_type}": job_id for job_type, job_id in jobs.items()},
+        'analysis_bytes': object_size(s3_bucket, segment_key)
+    }
+
+
+def process_video_batch(
+    session_id: str,
+    declared_tests: List[Dict[str, Any]],
+    video_s3_key: str,
+    s3_bucket: str,
+    task_token: Optional[str] = None,
+    job_registry=None,
+    stepfunctions=None,
+    rekognition=None,
+    hls_playlist_key: Optional[str] = None,
+    proxy_s3_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Batch form of process_video_for_cme_test for a chunk of one session's tests
+    
+    The recording is fetched once. Tests are aligned to the motion events of
+    the recording-wide motion curve when the thumbnail pass cached one, and
+    their windows (aligned spans, or the fixed window around the declaration)
+    are planned into merged clips, so footage shared by tests declared close together is
+    extracted and analyzed once. Clips are processed concurrently; tests
+    decided locally are finished here, and the Rekognition jobs of the
+    escalated clips are registered under a single callback, so the task
+    token resumes the workflow once every job of the chunk has finished.
+    
+    Args:
+        declared_tests: Declared tests of the chunk (each with declared_step_id)
+        task_token: Step Functions task token (waitForTaskToken integration)
+        job_registry: Registry linking job IDs to the token (defaults to DynamoDB)
+        stepfunctions: Client used to resume the task when nothing escalated
+        rekognition: Rekognition client override (e.g. the local stand-in)
+        hls_playlist_key: Session HLS media playlist; clips become sub-playlists
+        proxy_s3_key: Session analysis proxy; clips are analyzed on cuts of it
+    
+    Returns:
+        Dictionary with per-test results, per-test errors, the clip plan
+        (requested vs analyzed seconds, whether the recording's motion curve
+        was cached, and the alignment summary), the rendition analyzed with the bytes
+        its clips hold and, for escalated tests, the pending contexts that
+        finalize_video_batch completes
+    """
+    if task_token:
+        require_notification_channel(rekognition)
+    cache = AnalysisCache(s3_bucket, video_s3_key, s3_client=s3_client)
+    processor = CMEVideoProcessor(s3_bucket, rekognition=rekognition, cache=cache,
+                                  pose_store=PoseTrackStore(s3_bucket, session_id, s3_client=s3_client))
+    motion_curve = 'cached' if recording_motion_curve(cache) is not None else 'unavailable'
+    if motion_curve == 'unavailable':
+        # Pose sampling cannot slice the recording's curve; each clip decodes its own
+        logger.warning(f"No recording motion curve for {session_id}; clips compute their own")
+    alignment = align_test_windows(declared_tests, cache)
+    plan = processor.plan_clip_windows(declared_tests, test_windows=alignment['windows'] if alignment else None)
+    if alignment:
+        logger.info(f"Aligned {alignment['aligned']}/{len(declared_tests)} tests to "
+                    f"{alignment['event_count']} motion events (cost {alignment['cost']}) "
+                    f"in {alignment['alignment_ms']} ms")
+    logger.info(f"Analysis cache for {video_s3_key}: ETag {cache.etag}, analyzer version {cache.version}")
+    
+    # Workers share one extraction backend, and local_recording downloads the
+    # recording at most once, only if some clip is not already cached
+    if not proxy_s3_key and not (SEGMENT_EXTRACTION_MODE == 'hls' and hls_playlist_key) and not ffmpeg_available():
+        get_extraction_backend()
+    
+    clip_bytes = []
+    
+    def process_clip(clip_index, clip):
+        outcome = process_merged_clip(
+            processor, session_id, clip_index, clip, [declared_tests[i] for i in clip['tests']],
+            video_s3_key, s3_bucket, hls_playlist_key=hls_playlist_key, proxy_s3_key=proxy_s3_key
+        )
+        clip_bytes.append(outcome.get('analysis_bytes', 0))
+        return outcome
+    
+    started_at = time.time()
+    batch = run_clip_batch(plan['clips'], declared_tests, process_clip)
+    
+    context = {
+        'session_id': session_id,
+        'results': batch['results'],
+        'errors': batch['errors'],
+        'pending': batch['pending'],
+        'test_count': len(declared_tests),
+        'clip_plan': {
+            'clips': len(plan['clips']),
+            'requested_seconds': plan['requested_seconds'],
+            'analyzed_seconds': plan['analyzed_seconds'],
+            'motion_curve': motion_curve,
+            'alignment': {
+                key: alignment[key] for key in ('aligned', 'event_count', 'cost', 'alignment_ms')
+            } if alignment else None
+        },
+        'batch_seconds': round(time.time() - started_at, 3),
+        'rendition': 'proxy' if proxy_s3_key else 'original',
+        'analysis_bytes': sum(clip_bytes),
+        'cache': cache.stats()
+    }
+    record_cache_stats(session_id, context['cache'])
+    record_analysis_usage(session_id, context['rendition'], context['analysis_bytes'], context['batch_seconds'])
+    logger.info(f"Batch of {len(declared_tests)} tests in {len(plan['clips'])} clips "
+                f"({plan['requested_seconds']}s of windows -> {plan['analyzed_seconds']}s analyzed): "
+                f"{len(batch['results'])} decided, {len(batch['pending'])} escalated, "
+                f"{len(batch['errors'])} failed in {context['batch_seconds']}s on the {context['rendition']} "
+                f"({context['analysis_bytes']} bytes); "
+                f"cache {context['cache']['hits']} hits / {context['cache']['misses']} misses")
+    
+    # One callback for the whole chunk; job keys are "<clip index>:<job type>"
+    jobs = batch['jobs']
+    if task_token and jobs:
+        if job_registry is None:
+            from rekognition_callback import RekognitionJobRegistry
+            job_registry = RekognitionJobRegistry()
+        callback_id = f"callback_{uuid.uuid4().hex[:12]}"
+        job_registry.register(callback_id, task_token, jobs, context)
+        logger.info(f"Registered callback {callback_id} for {len(jobs)} jobs of {len(batch['pending'])} tests")
+        # Early clips' jobs may have finished, and their notifications been dropped, while later clips ran
+        reconcile_jobs(jobs, job_registry, stepfunctions or boto3.client('stepfunctions'), processor.rekognition)
+        return {**context, 'status': 'WAITING_FOR_REKOGNITION'}
+    
+    result = {**context, 'status': 'completed' if not batch['pending'] else 'IN_PROGRESS'}
+    if task_token:
+        # Nothing will notify for this chunk, so resume the workflow now
+        (stepfunctions or boto3.client('stepfunctions')).send_task_success(
+            taskToken=task_token,
+            output=json.dumps(result, default=str)
+        )
+    return result
+
+
+def finalize_video_batch(
+    analysis: Dict[str, Any],
+    s3_bucket: str,
+    rekognition=None
+) -> Dict[str, Any]:
+    """
+    Score the escalated tests of a batch once the callback has resumed it
+    
+    Each merged clip's results are fetched once and sliced to the window of
+    every test that shares them.
+    
+    Args:
+        analysis: Output of the callback task (process_video_batch context
+                  plus the chunk's job statuses keyed "<clip index>:<job type>")
+    """
+    processor = CMEVideoProcessor(s3_bucket, rekognition=rekognition)
+    pending_tests = analysis.get('pending', [])
+    callback_jobs = analysis.get('jobs', {})
+    
+    clips = {}
+    for index, pending in enumerate(pending_tests):
+        clips.setdefault(pending['clip_index'], {'clip_index': pending['clip_index'], 'tests': []})['tests'].append(index)
+    
+    def finalize_clip(clip_index, clip):
+        prefix = f"{clip_index}:"
+        jobs = {key[len(prefix):]: job for key, job in callback_jobs.items() if key.startswith(prefix)}
+        fetched = fetch_rekognition_results(
+            processor, jobs, s3_bucket, cache_keys=pending_tests[clip['tests'][0]].get('cache_keys')
+        )
+        return {'results': [
+            finalize_video_for_cme_test(
+                session_id=pending_tests[i]['session_id'],
+                declared_test=pending_tests[i]['declared_test'],
+                segment_key=pending_tests[i]['segment_key'],
+                jobs=jobs,
+                s3_bucket=s3_bucket,
+                local_motion=pending_tests[i].get('local_motion'),
+                escalated_at=pending_tests[i].get('escalated_at'),
+                window=tuple(pending_tests[i]['window']),
+                fetched=fetched
+            )
+            for i in clip['tests']
+        ]}
+    
+    batch = run_clip_batch(
+        list(clips.values()), [pending['declared_test'] for pending in pending_tests], finalize_clip
+    )
+    
+    return {
+        'session_id': analysis.get('session_id'),
+        'results': list(analysis.get('results', [])) + batch['results'],
+        'errors': list(analysis.get('errors', [])) + batch['errors'],
+        'test_count': analysis.get('test_count'),
+        'clip_plan': analysis.get('clip_plan'),
+        'status': 'completed'
+    }
+
+
+def object_size(s3_bucket: str, s3_key: Optional[str]) -> int:
+    """Size in bytes of an S3 object (0 when unknown)"""
+    if not s3_key:
+        return 0
+    try:
+        return int(s3_client.head_object(Bucket=s3_bucket, Key=s3_key)['ContentLength'])
+    except Exception as e:
+        logger.warning(f"Could not size {s3_key}: {str(e)}")
+        return 0
+
+
+def record_analysis_usage(session_id: str, rendition: str, analysis_bytes: int, analysis_seconds: float) -> None:
+    """
+    Add the media bytes read and analysis time of a run to the session
+    
+    Totals are kept per rendition ('proxy' or 'original') so sessions can be
+    compared; ADD keeps them correct when batch invocations report concurrently.
+    """
+    try:
+        sessions_table = boto3.session.Session().resource('dynamodb').Table(
+            os.environ.get('CME_SESSIONS_TABLE', 'cme-sessions')
+        )
+        sessions_table.update_item(
+            Key={'session_id': session_id},
+            UpdateExpression='ADD #bytes :bytes, #seconds :seconds',
+            ExpressionAttributeNames={
+                '#bytes': f'{rendition}_analysis_bytes',
+                '#seconds': f'{rendition}_analysis_seconds'
+            },
+            ExpressionAttributeValues={
+                ':bytes': int(analysis_bytes),
+                ':seconds': Decimal(str(round(analysis_seconds, 3)))
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error recording analysis usage for session {session_id}: {str(e)}")
+
+
+def persist_observed_action(
+    declared_step_id: str,
+    motion_present: str,
+    pose_match: str,
+    confidence: float,
+    analysis_details: Dict[str, Any],
+    decided_by_tier: str = 'rekognition'
+) -> str:
+    """
+    Write an ObservedAction item to DynamoDB and return its ID
+    
+    decided_by_tier records which analysis tier produced the verdict
+    ('local_motion', 'pose', 'rekognition' or 'rekognition_session').
+    """
+    # A fresh session per call: batch workers persist from several threads,
+    # and the default session is not safe to share between them
+    dynamodb = boto3.session.Session().resource('dynamodb')
+    actions_table = dynamodb.Table(os.environ.get('CME_ACTIONS_TABLE', 'cme-observed-actions'))
+    
+    action_id = f"action_{uuid.uuid4().hex[:12]}"
+    actions_table.put_item(Item={
         'observed_action_id': action_id,
         'declared_step_id': declared_step_id,
         'motion_present': motion_present,
         'pose_match': pose_match,
-        'confidence_score': confidence,
-        'analysis_details': {
-            'segment_key': segment_key,
+        'confidence_score': Decimal(str(confidence)),
+        'analysis_details': json.loads(json.dumps(analysis_details, default=str), parse_float=Decimal),
+        'decided_by_tier': decided_by_tier,
+        'created_at': int(time.time())
+    })
+    return action_id
+
+
+def start_session_analysis(
+    session_id: str,
+    analysis_s3_key: str,
+    s3_bucket: str,
+    task_token: Optional[str] = None,
+    job_registry=None,
+    rekognition=None,
+    stepfunctions=None,
+    rendition: str = 'original'
+) -> Dict[str, Any]:
+    """
+    Session-level analysis mode: start ONE label-detection job and ONE
+    person-tracking job on the whole recording (or its low-resolution proxy)
+    instead of a pair per declared test. Each declared test is later answered
+    by slicing the stored results to its time window.
+    
+    Results are stored under content-addressed keys for the recording's ETag,
+    so a rerun over an unchanged recording finds them and starts no jobs.
+    
+    Args:
+        analysis_s3_key: Full recording (or proxy) to analyze
+        task_token: Step Functions task token resumed by the callback Lambda
+        stepfunctions: Client used to resume the task directly on a cache hit
+        rendition: 'proxy' or 'original', for the session's usage totals
+    """
+    if task_token:
+        require_notification_channel(rekognition)
+    cache = AnalysisCache(s3_bucket, analysis_s3_key, s3_client=s3_client)
+    cache_keys = {
+        job_type: cache.window_key(None, f'rekognition:{job_type}')
+        for job_type in ('motion_analysis', 'pose_detection')
+    }
+    found = all([cache.lookup(key, 'session_results') for key in cache_keys.values()])
+    record_cache_stats(session_id, cache.stats())
+    
+    if found:
+        logger.info(f"Reusing cached session analysis for {session_id}: {cache_keys}")
+        result = {
+            'session_id': session_id,
+            'analysis_s3_key': analysis_s3_key,
+            'mode': 'session',
+            'result_keys': cache_keys,
+            'cached': True,
+            'status': 'completed'
+        }
+        if task_token:
+            (stepfunctions or boto3.client('stepfunctions')).send_task_success(
+                taskToken=task_token,
+                output=json.dumps(result)
+            )
+        return result
+    
+    processor = CMEVideoProcessor(s3_bucket, rekognition=rekognition)
+    
+    motion = processor._analyze_motion_rekognition(analysis_s3_key, job_tag=session_id)
+    poses = processor._detect_poses_rekognition(analysis_s3_key, job_tag=session_id)
+    
+    jobs = {}
+    for job_type, job in (('motion_analysis', motion), ('pose_detection', poses)):
+        if job.get('job_id'):
+            jobs[job_type] = job['job_id']
+    
+    if not jobs:
+        raise RuntimeError(f"Could not start session analysis jobs: {motion.get('error')} {poses.get('error')}")
+    
+    # Each job reads the whole rendition once; the work itself runs in Rekognition
+    record_analysis_usage(session_id, rendition, len(jobs) * object_size(s3_bucket, analysis_s3_key), 0.0)
+    
+    context = {
+        'session_id': session_id,
+        'analysis_s3_key': analysis_s3_key,
+        'mode': 'session',
+        'cache_keys': cache_keys
+    }
+    
+    if task_token:
+        if job_registry is None:
+            from rekognition_callback import RekognitionJobRegistry
+            job_registry = RekognitionJobRegistry()
+        job_registry.register(f"session_{session_id}_{uuid.uuid4().hex[:8]}", task_token, jobs, context)
+        # A job may have finished, and its notification been dropped, before registration
+        reconcile_jobs(jobs, job_registry, stepfunctions or boto3.client('stepfunctions'), processor.rekognition)
+    
+    logger.info(f"Started session analysis for {session_id}: {jobs}")
+    
+    return {
+        **context,
+        'jobs': {job_type: {'job_id': job_id, 'status': 'IN_PROGRESS'} for job_type, job_id in jobs.items()},
+        'status': 'WAITING_FOR_REKOGNITION' if task_token else 'IN_PROGRESS'
+    }
+
+
+def store_session_analysis(
+    session_id: str,
+    jobs: Dict[str, Any],
+    s3_bucket: str,
+    rekognition=None,
+    cache_keys: Optional[Dict[str, str]] = None,
+    result_keys: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Fetch every page of the finished session-level jobs and store each once in
+    S3 as a columnar timeline artifact for per-test window queries
+    
+    Args:
+        cache_keys: Content-addressed keys from start_session_analysis
+        result_keys: Already stored timelines (cache hit); nothing is fetched
+    
+    Returns:
+        S3 keys of the stored timelines per job type
+    """
+    if result_keys:
+        return {
+            'session_id': session_id,
+            'result_keys': result_keys,
+            'cached': True,
+            'status': 'stored'
+        }
+    
+    processor = CMEVideoProcessor(s3_bucket, rekognition=rekognition)
+    result_keys = {}
+    
+    for job_type, job in (jobs or {}).items():
+        job_id = job.get('job_id') if isinstance(job, dict) else job
+        status = job.get('status', 'SUCCEEDED') if isinstance(job, dict) else 'SUCCEEDED'
+        if not job_id or status != 'SUCCEEDED':
+            logger.warning(f"Session {session_id} {job_type} job unusable (status {status})")
+            continue
+        
+        result = processor.get_rekognition_results(job_id, job_type)
+        if result.get('status') != 'COMPLETED':
+            logger.warning(f"Session {session_id} {job_type} results unavailable: {result.get('error')}")
+            continue
+        
+        result_key = save_timeline(
+            s3_client, s3_bucket,
+            (cache_keys or {}).get(job_type) or f"cme-analysis/{session_id}/{job_type}.npz",
+            result['timeline']
+        )
+        result_keys[job_type] = result_key
+        logger.info(f"Stored {len(result['timeline'])} {job_type} rows for session {session_id} at {result_key}")
+    
+    return {
+        'session_id': session_id,
+        'result_keys': result_keys,
+        'status': 'stored'
+    }
+
+
+def load_session_results(s3_bucket: str, result_key: str) -> RekognitionTimeline:
+    """Load a stored session-level timeline, reusing this container's copy"""
+    if result_key not in _session_results_cache:
+        _session_results_cache[result_key] = load_timeline(s3_client, s3_bucket, result_key)
+    return _session_results_cache[result_key]
+
+
+def load_contact_timeline(s3_bucket: str, result_key: str) -> ContactTimeline:
+    """Contact timeline of a stored session-level person-tracking result, built once"""
+    if result_key not in _contact_timeline_cache:
+        _contact_timeline_cache[result_key] = ContactTimeline.from_person_timeline(
+            load_session_results(s3_bucket, result_key)
+        )
+    return _contact_timeline_cache[result_key]
+
+
+def slice_rekognition_results(
+    timeline: RekognitionTimeline,
+    start_time: float,
+    end_time: float
+) -> Dict[str, Any]:
+    """
+    Interval query over a stored session-level timeline
+    
+    Args:
+        timeline: Session-level results (rows sorted by timestamp)
+        start_time: Window start in seconds
+        end_time: Window end in seconds
+        
+    Returns:
+        A completed result in the shape analyze_rekognition_results consumes
+    """
+    return {
+        'status': 'COMPLETED',
+        'job_type': timeline.job_type,
+        'timeline': timeline.slice(start_time, end_time)
+    }
+
+
+def analyze_test_window(
+    session_id: str,
+    declared_test: Dict[str, Any],
+    result_keys: Dict[str, str],
+    s3_bucket: str,
+    hls_playlist_key: Optional[str] = None,
+    window: Optional[List[float]] = None
+) -> Dict[str, Any]:
+    """
+    Score a declared test from the session-level results by slicing them to
+    the test's ±30s window (or its aligned span when window is given), then
+    persist the observed action. With an HLS package, the window is also
+    published as a reviewable clip playlist.
+    """
+    test_timestamp = float(declared_test.get('timestamp', 0))
+    test_type = declared_test.get('label', 'unknown')
+    declared_step_id = declared_test.get('declared_step_id', '')
+    
+    if window:
+        window_start, window_end = float(window[0]), float(window[1])
+    else:
+        window_start = max(0.0, test_timestamp - SEGMENT_PRE_ROLL)
+        window_end = window_start + SEGMENT_DURATION
+    
+    clip_playlist_key = None
+    if hls_playlist_key:
+        clip_playlist_key = write_clip_playlist(s3_bucket, hls_playlist_key, window_start, window_end - window_start)
+    
+    sliced = {}
+    for job_type, result_key in (result_keys or {}).items():
+        sliced[job_type] = slice_rekognition_results(
+            load_session_results(s3_bucket, result_key), window_start, window_end
+        )
+    
+    motion_result = sliced.get('motion_analysis')
+    pose_result = sliced.get('pose_detection')
+    
+    contact = None
+    if (result_keys or {}).get('pose_detection'):
+        contact = load_contact_timeline(s3_bucket, result_keys['pose_detection']).window(window_start, window_end)
+    
+    motion_present, pose_match, confidence = analyze_rekognition_results(
+        motion_result, pose_result, test_type, contact=contact
+    )
+    
+    action_id = persist_observed_action(
+        declared_step_id=declared_step_id,
+        motion_present=motion_present,
+        pose_match=pose_match,
+        confidence=confidence,
+        analysis_details={
+            'analysis_mode': 'session',
+            'window_start': window_start,
+            'window_end': window_end,
+            'aligned': window is not None,
+            'clip_playlist_key': clip_playlist_key,
             'test_type': test_type,
-            'motion_job_id': motion_job_id,
-            'pose_job_id': pose_job_id,
+            'result_keys': result_keys,
             'motion_labels': extract_motion_labels(motion_result),
-            'person_count': count_persons(pose_result)
+            'person_count': count_persons(pose_result),
+            'examiner_contact': contact
         },
-        'created_at': int(time.time())
-    }
-    
-    actions_table.put_item(Item=action_item)
-    logger.info(f"Persisted observed action: {action_id} - {motion_present}")
+        decided_by_tier='rekognition_session'
+    )
     
     return {
         'session_id': session_id,
         'test_type': test_type,
         'timestamp': test_timestamp,
-        'segment_key': segment_key,
+        'window': [window_start, window_end],
+        'clip_playlist_key': clip_playlist_key,
         'action_id': action_id,
         'motion_present': motion_present,
         'pose_match': pose_match,
@@ -718,14 +3183,71 @@ def process_video_for_cme_test(
     }
 
 
+def analyze_window_batch(
+    session_id: str,
+    declared_tests: List[Dict[str, Any]],
+    result_keys: Dict[str, str],
+    s3_bucket: str,
+    hls_playlist_key: Optional[str] = None,
+    video_s3_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Batch form of analyze_test_window for a chunk of one session's tests
+    
+    The stored session timelines are loaded once up front; the window
+    queries, clip playlists and DynamoDB writes then run on a thread pool.
+    With the recording's key, tests are first aligned to the motion events
+    of its cached motion curve and queried over their aligned spans.
+    
+    Returns:
+        Dictionary with per-test results, per-test errors and the alignment
+        summary (None when no alignment ran)
+    """
+    alignment = None
+    if video_s3_key:
+        try:
+            alignment = align_test_windows(declared_tests, AnalysisCache(s3_bucket, video_s3_key, s3_client=s3_client))
+        except Exception as e:
+            logger.warning(f"Test alignment skipped for {session_id}: {str(e)}")
+    windows = alignment['windows'] if alignment else [None] * len(declared_tests)
+    
+    for job_type, result_key in (result_keys or {}).items():
+        load_session_results(s3_bucket, result_key)
+        if job_type == 'pose_detection':
+            load_contact_timeline(s3_bucket, result_key)
+    
+    batch = run_test_batch(
+        declared_tests,
+        lambda index, declared_test: analyze_test_window(
+            session_id, declared_test, result_keys, s3_bucket,
+            hls_playlist_key=hls_playlist_key, window=windows[index]
+        )
+    )
+    
+    return {
+        'session_id': session_id,
+        **batch,
+        'test_count': len(declared_tests),
+        'alignment': {
+            key: alignment[key] for key in ('aligned', 'event_count', 'cost', 'alignment_ms')
+        } if alignment else None,
+        'status': 'completed'
+    }
+
+
 def analyze_rekognition_results(
     motion_result: Dict[str, Any],
     pose_result: Dict[str, Any],
-    test_type: str
+    test_type: str,
+    contact: Optional[Dict[str, Any]] = None
 ) -> tuple:
     """
     Actually analyze Rekognition results instead of returning placeholders
     
+    Tests that expect examiner touch need contact between the two tracked
+    people for a full match. `contact` is a ContactTimeline window summary;
+    without one it is computed from pose_result.
+    
     Returns: (motion_present, pose_match, confidence)
     """
     motion_present = 'unknown'
@@ -739,21 +3261,18 @@ def analyze_rekognition_results(
     if not pose_result or pose_result.get('status') != 'COMPLETED':
         return ('not_observed', 'no_match', 0.0)
     
-    # Extract labels from motion analysis
-    motion_labels = extract_motion_labels(motion_result)
     person_count = count_persons(pose_result)
     
     # Analyze based on test type
     expectations = TEST_MOTION_EXPECTATIONS.get(test_type, {})
     expected_movements = expectations.get('expected_movements', [])
     
-    # Check if any expected movement was detected
-    movements_found = []
-    for expected in expected_movements:
-        for label in motion_labels:
-            if expected.lower() in label.lower():
-                movements_found.append(expected)
-                break
+    # Score every detected label against the expected movements in one lookup
+    movements_found = LABEL_MOVEMENT_INDEX.movements_found(
+        _result_timeline(motion_result, 'motion_analysis'),
+        expected_movements,
+        min_confidence=MIN_LABEL_CONFIDENCE
+    )
     
     # Determine motion_present
     if len(movements_found) >= len(expected_movements) * 0.7:  # 70% of movements found
@@ -778,45 +3297,211 @@ def analyze_rekognition_results(
         pose_match = 'no_match'
         confidence = min(confidence, 0.4)  # Lower confidence if not enough people
     
+    if expectations.get('examiner_touch') and pose_match != 'no_match':
+        contact = contact or examiner_contact(pose_result)
+        if contact and not contact['contact']:
+            # The hands-on part of the test was not seen
+            pose_match = 'partial'
+            confidence = min(confidence, 0.5)
+    
     return (motion_present, pose_match, confidence)
 
 
+def _result_timeline(result: Dict[str, Any], job_type: str) -> Optional[RekognitionTimeline]:
+    """Columnar timeline of a result, converting a raw response if needed"""
+    if not result:
+        return None
+    if result.get('timeline') is not None:
+        return result['timeline']
+    if 'results' in result:
+        return RekognitionTimeline.from_pages(job_type, [result['results']])
+    return None
+
+
 def extract_motion_labels(motion_result: Dict[str, Any]) -> list:
     """Extract relevant motion labels from Rekognition results"""
-    labels = []
-    
-    if not motion_result or 'results' not in motion_result:
-        return labels
+    timeline = _result_timeline(motion_result, 'motion_analysis')
+    if timeline is None:
+        return []
     
-    results = motion_result.get('results', {})
-    if 'Labels' in results:
-        for label_detection in results['Labels']:
-            label = label_detection.get('Label', {})
-            name = label.get('Name', '')
-            confidence = label.get('Confidence', 0)
-            
-            if confidence > 60:  # Only high-confidence labels
-                labels.append(name)
+    # Only high-confidence labels, deduplicated
+    return timeline.label_names(min_confidence=MIN_LABEL_CONFIDENCE)
+
+
+def examiner_contact(pose_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Contact summary over the whole of a person-tracking result"""
+    timeline = _result_timeline(pose_result, 'pose_detection')
+    if timeline is None:
+        return None
     
-    return list(set(labels))  # Deduplicate
+    return ContactTimeline.from_person_timeline(timeline).window()
 
 
 def count_persons(pose_result: Dict[str, Any]) -> int:
     """Count number of distinct persons detected"""
-    if not pose_result or 'results' not in pose_result:
+    timeline = _result_timeline(pose_result, 'pose_detection')
+    if timeline is None:
         return 0
     
-    results = pose_result.get('results', {})
-    if 'Persons' in results:
-        person_ids = set()
-        for person_detection in results['Persons']:
-            person = person_detection.get('Person', {})
-            index = person.get('Index')
-            if index is not None:
-                person_ids.add(index)
-        return len(person_ids)
+    return timeline.person_count()
+
+
+def local_recording(s3_bucket: str, s3_key: str) -> str:
+    """
+    Local copy of a recording, downloaded at most once per warm container
+    
+    Recordings are immutable once uploaded, so a cached copy in /tmp is reused
+    by segment extraction and snapshot generation alike.
+    """
+    cache_key = f"{s3_bucket}/{s3_key}"
+    local_path = _local_recordings.get(cache_key)
+    if local_path and os.path.exists(local_path):
+        return local_path
+    
+    recordings_dir = os.path.join(tempfile.gettempdir(), 'recordings')
+    os.makedirs(recordings_dir, exist_ok=True)
+    extension = os.path.splitext(s3_key)[1] or '.mp4'
+    local_path = os.path.join(recordings_dir, hashlib.sha1(cache_key.encode('utf-8')).hexdigest()[:16] + extension)
+    
+    # Batch workers that miss together wait for one download instead of each starting their own
+    with _local_recordings_lock:
+        if not os.path.exists(local_path):
+            logger.info(f"Downloading recording from s3://{s3_bucket}/{s3_key}")
+            partial_path = f"{local_path}.part"
+            s3_client.download_file(s3_bucket, s3_key, partial_path)
+            os.replace(partial_path, local_path)
+    
+    _local_recordings[cache_key] = local_path
+    return local_path
+
+
+def recording_source(s3_bucket: str, s3_key: str) -> str:
+    """Cached local copy of a recording if present, else a presigned URL ffmpeg can stream"""
+    local_path = _local_recordings.get(f"{s3_bucket}/{s3_key}")
+    if local_path and os.path.exists(local_path):
+        return local_path
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': s3_bucket, 'Key': s3_key},
+        ExpiresIn=3600
+    )
+
+
+def probe_video_stream(video_source: str) -> Dict[str, float]:
+    """Width, height and duration (seconds) of the first video stream"""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height:format=duration', '-of', 'json', video_source
+    ], capture_output=True, text=True, timeout=60, check=True)
+    
+    info = json.loads(result.stdout)
+    stream = (info.get('streams') or [{}])[0]
+    return {
+        'width': float(stream.get('width', 0)),
+        'height': float(stream.get('height', 0)),
+        'duration': float(info.get('format', {}).get('duration', 0))
+    }
+
+
+def probe_keyframes(video_path: str) -> np.ndarray:
+    """
+    Keyframe timestamps (seconds) of the first video stream
+    
+    Reads packet flags only, so nothing is decoded.
+    """
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+    ], capture_output=True, text=True, timeout=120)
+    
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    return np.unique(np.asarray(keyframes, dtype=np.float64))
+
+
+def plan_snapshot_seeks(
+    timestamps: List[float],
+    keyframes: np.ndarray,
+    max_decode_gap: float = SNAPSHOT_MAX_DECODE_GAP
+) -> List[Tuple[float, List[float]]]:
+    """
+    Group sorted snapshot times into seek chains
+    
+    Times that share a keyframe, or sit within max_decode_gap of the previous
+    snapshot, are decoded forward from a single seek instead of seeking again.
+    
+    Returns:
+        List of (seek_time, [snapshot times]) with seek_time on a keyframe
+        where keyframes are known
+    """
+    times = np.unique(np.asarray(timestamps, dtype=np.float64))
+    if times.size == 0:
+        return []
+    
+    if keyframes.size:
+        # Keyframe at or before each snapshot
+        preceding = keyframes[np.maximum(np.searchsorted(keyframes, times, side='right') - 1, 0)]
+    else:
+        preceding = np.maximum(times - max_decode_gap, 0.0)
+    
+    # Start a new chain where the keyframe changes and the gap is too long to decode through
+    new_chain = np.ones(times.size, dtype=bool)
+    new_chain[1:] = (preceding[1:] != preceding[:-1]) & (np.diff(times) > max_decode_gap)
+    chain_ids = np.cumsum(new_chain) - 1
+    
+    return [
+        (float(preceding[chain_ids == chain][0]), times[chain_ids == chain].tolist())
+        for chain in range(int(chain_ids[-1]) + 1)
+    ]
+
+
+def _snapshot_select_expression(times: List[float]) -> str:
+    """ffmpeg select expression keeping the first frame at or after each time"""
+    terms = '+'.join(
+        f"gte(t,{t:.3f})*(isnan(prev_selected_t)+lt(prev_selected_t,{t:.3f}))"
+        for t in times
+    )
+    return f"gt({terms},0)"
+
+
+# showinfo log lines, tagged with the filter's index in its graph: the input
+# time base, and each frame's integer pts (pts_time is printed with only six
+# significant digits by older ffmpeg, too coarse an hour into a recording)
+SHOWINFO_TIME_BASE_PATTERN = re.compile(r'\[Parsed_showinfo_(\d+) @ [^\]]*\] config in time_base: (\d+)/(\d+)')
+SHOWINFO_FRAME_PATTERN = re.compile(r'\[Parsed_showinfo_(\d+) @ [^\]]*\] n:\s*\d+ pts:\s*(-?\d+) pts_time:\s*(\S+)')
+
+
+def _selected_frame_times(stderr: str) -> Dict[int, List[float]]:
+    """
+    Time (seconds) of each frame a showinfo filter passed, in output order,
+    keyed by the filter's index in the graph (Parsed_showinfo_<index>)
+    """
+    time_bases = {
+        int(match.group(1)): int(match.group(2)) / int(match.group(3))
+        for match in SHOWINFO_TIME_BASE_PATTERN.finditer(stderr) if int(match.group(3))
+    }
+    frame_times: Dict[int, List[float]] = {}
+    for match in SHOWINFO_FRAME_PATTERN.finditer(stderr):
+        index = int(match.group(1))
+        frame_time = int(match.group(2)) * time_bases[index] if index in time_bases else float(match.group(3))
+        frame_times.setdefault(index, []).append(frame_time)
+    return frame_times
+
+
+def _frame_numbers_for_times(times: List[float], frame_times: List[float]) -> List[Optional[int]]:
+    """
+    Output frame number (from 1) holding each requested time
     
-    return 0
+    The select expression keeps the first frame at or after each time, so a
+    time's frame is the first selected frame at or after it. Times closer
+    together than a frame interval share a frame; times past the last frame
+    have None.
+    """
+    indices = np.searchsorted(np.asarray(frame_times, dtype=float), np.round(np.asarray(times, dtype=float), 3) - 1e-6)
+    return [int(index) + 1 if index < len(frame_times) else None for index in indices]
 
 
 def generate_frame_snapshots(
@@ -828,46 +3513,85 @@ def generate_frame_snapshots(
     """
     Extract still frame images at specific timestamps for report inclusion
     
+    All timestamps are extracted by one ffmpeg process: snapshots are grouped
+    into seek chains planned from the keyframe positions, each chain is an
+    input that seeks once (-ss before -i) and a select filter keeps the
+    requested frames. JPEGs are uploaded concurrently and the recording is
+    taken from the local cache when a previous step already downloaded it.
+    
     Returns:
-        List of S3 keys for extracted frames
+        List of S3 keys for extracted frames, in the order of timestamps
     """
-    frame_keys = []
+    if not timestamps:
+        return []
+    
+    if not ffmpeg_available():
+        logger.warning("FFmpeg not available, skipping frame snapshots")
+        return []
     
     try:
-        temp_dir = tempfile.gettempdir()
-        local_video = os.path.join(temp_dir, 'video_for_frames.mp4')
-        
-        # Download video
-        s3_client.download_file(s3_bucket, video_s3_key, local_video)
-        
-        for i, timestamp in enumerate(timestamps):
-            frame_filename = f'frame_{i}_{int(timestamp)}.jpg'
-            local_frame = os.path.join(temp_dir, frame_filename)
-            output_key = f"{output_prefix}/{frame_filename}"
-            
-            # Extract frame using FFmpeg
-            if os.path.exists('/usr/bin/ffmpeg'):
-                command = [
-                    'ffmpeg',
-                    '-i', local_video,
-                    '-ss', str(timestamp),
-                    '-frames:v', '1',
-                    '-q:v', '2',
-                    '-y',
-                    local_frame
-                ]
+        local_video = local_recording(s3_bucket, video_s3_key)
+        
+        try:
+            keyframes = probe_keyframes(local_video)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"Keyframe probe failed ({e}); planning seeks without keyframes")
+            keyframes = np.zeros(0)
+        
+        chains = plan_snapshot_seeks(timestamps, keyframes)
+        frames_by_time: Dict[float, str] = {}
+        
+        with tempfile.TemporaryDirectory() as frames_dir:
+            # Bound the decoders open at once; typical reports need a single run
+            for first in range(0, len(chains), SNAPSHOT_INPUTS_PER_RUN):
+                run_chains = chains[first:first + SNAPSHOT_INPUTS_PER_RUN]
+                command = ['ffmpeg', '-hide_banner', '-nostats', '-v', 'info', '-nostdin', '-y', '-copyts']
+                for seek_time, times in run_chains:
+                    command += ['-threads', '1', '-ss', f"{seek_time:.3f}",
+                                '-t', f"{times[-1] - seek_time + 1.0:.3f}", '-i', local_video]
+                # One graph, so chain index maps to filter index: select is 2i, showinfo 2i + 1
+                command += ['-filter_complex', ';'.join(
+                    f"[{index}:v:0]select='{_snapshot_select_expression(times)}',showinfo[chain{index}]"
+                    for index, (_, times) in enumerate(run_chains)
+                )]
+                for index in range(len(run_chains)):
+                    command += [
+                        '-map', f'[chain{index}]', '-vsync', 'vfr', '-q:v', '2',
+                        os.path.join(frames_dir, f'chain_{first + index:04d}_%04d.jpg')
+                    ]
                 
-                subprocess.run(command, capture_output=True, timeout=30)
+                result = subprocess.run(command, capture_output=True, text=True, timeout=300)
+                if result.returncode != 0:
+                    logger.error(f"FFmpeg snapshot error: {result.stderr[-2000:]}")
+                    continue
                 
-                if os.path.exists(local_frame):
-                    s3_client.upload_file(local_frame, s3_bucket, output_key)
-                    frame_keys.append(output_key)
-                    os.remove(local_frame)
-        
-        # Cleanup
-        if os.path.exists(local_video):
-            os.remove(local_video)
+                selected = _selected_frame_times(result.stderr)
+                for index, (_, times) in enumerate(run_chains):
+                    # Map by the frames' real pts (-copyts keeps recording time): two
+                    # times inside one frame interval share a frame
+                    frame_numbers = _frame_numbers_for_times(times, selected.get(2 * index + 1, []))
+                    for t, frame_number in zip(times, frame_numbers):
+                        if frame_number is None:
+                            continue
+                        path = os.path.join(frames_dir, f'chain_{first + index:04d}_{frame_number:04d}.jpg')
+                        if os.path.exists(path):
+                            frames_by_time[t] = path
+            
+            uploads = []
+            for i, timestamp in enumerate(timestamps):
+                local_frame = frames_by_time.get(float(timestamp))
+                if local_frame:
+                    uploads.append((local_frame, f"{output_prefix}/frame_{i}_{int(timestamp)}.jpg"))
+            
+            def upload(item):
+                local_frame, output_key = item
+                s3_client.upload_file(local_frame, s3_bucket, output_key, ExtraArgs={'ContentType': 'image/jpeg'})
+                return output_key
+            
+            with ThreadPoolExecutor(max_workers=min(SNAPSHOT_UPLOAD_WORKERS, max(1, len(uploads)))) as pool:
+                frame_keys = list(pool.map(upload, uploads))
         
+        logger.info(f"Extracted {len(frame_keys)} of {len(timestamps)} snapshots in {len(chains)} seek chains")
         return frame_keys
         
     except Exception as e:
@@ -875,26 +3599,373 @@ def generate_frame_snapshots(
         return []
 
 
+def upload_snapshots(
+    frames: Dict[float, np.ndarray],
+    timestamps: List[float],
+    s3_bucket: str,
+    output_prefix: str = 'cme-frames'
+) -> List[str]:
+    """
+    Encode captured RGB frames as JPEGs and upload them concurrently
+    
+    Keys follow generate_frame_snapshots: frame_<index>_<seconds>.jpg in the
+    order of timestamps; times past the end of the video have no frame.
+    """
+    import cv2
+    
+    uploads = []
+    for i, timestamp in enumerate(timestamps):
+        frame = frames.get(float(timestamp))
+        if frame is not None:
+            uploads.append((frame, f"{output_prefix}/frame_{i}_{int(timestamp)}.jpg"))
+    
+    def upload(item):
+        frame, output_key = item
+        ok, encoded = cv2.imencode('.jpg', frame[..., ::-1], [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if not ok:
+            raise RuntimeError(f"Could not encode snapshot {output_key}")
+        s3_client.put_object(Bucket=s3_bucket, Key=output_key, Body=encoded.tobytes(), ContentType='image/jpeg')
+        return output_key
+    
+    with ThreadPoolExecutor(max_workers=min(SNAPSHOT_UPLOAD_WORKERS, max(1, len(uploads)))) as pool:
+        return list(pool.map(upload, uploads))
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def build_thumbnail_vtt(
+    thumbnail_count: int,
+    duration: float,
+    sprite_names: List[str],
+    interval: float,
+    tile_width: int,
+    tile_height: int,
+    columns: int = THUMBNAIL_COLUMNS,
+    rows: int = THUMBNAIL_ROWS
+) -> str:
+    """
+    WebVTT thumbnail track mapping each interval to its sprite tile
+    
+    Cues use the media-fragment form `sprite.jpg#xywh=x,y,w,h` understood by
+    common players, with sprite names relative to the track itself.
+    """
+    per_sheet = columns * rows
+    lines = ['WEBVTT', '']
+    
+    for index in range(min(thumbnail_count, len(sprite_names) * per_sheet)):
+        start = index * interval
+        end = min(start + interval, duration) if duration > start else start + interval
+        sheet, tile = divmod(index, per_sheet)
+        row, column = divmod(tile, columns)
+        lines += [
+            f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}",
+            f"{sprite_names[sheet]}#xywh={column * tile_width},{row * tile_height},{tile_width},{tile_height}",
+            ''
+        ]
+    
+    return '\n'.join(lines)
+
+
+def decode_recording_frames(
+    source: str,
+    sprites_dir: Optional[str] = None,
+    tile_size: Tuple[int, int] = (THUMBNAIL_WIDTH, 90),
+    interval: float = THUMBNAIL_INTERVAL,
+    snapshot_times: Optional[List[float]] = None,
+    motion_fps: Optional[float] = LOCAL_MOTION_FPS
+) -> Dict[str, Any]:
+    """
+    One decode of a recording on the frame bus, shared by every consumer
+    
+    Depending on the arguments the pass writes sprite sheets (JPEG, named
+    like ffmpeg's sprite_%04d.jpg) into sprites_dir, computes the
+    recording's motion-energy curve and captures snapshot frames. Frames are
+    decoded once at the fastest consumer's rate and the widest consumer's
+    size.
+    
+    Returns:
+        Dictionary with motion_curve (or None), snapshots {time: RGB frame},
+        sprite_count and the bus stats
+    """
+    import cv2
+    
+    bus = FrameBus(source)
+    motion = bus.register(MotionEnergyConsumer(motion_fps)) if motion_fps else None
+    snapshots = bus.register(SnapshotConsumer(snapshot_times, width=1280)) if snapshot_times else None
+    sprites = None
+    if sprites_dir:
+        def write_sheet(sheet_index, sheet):
+            cv2.imwrite(os.path.join(sprites_dir, f'sprite_{sheet_index + 1:04d}.jpg'), sheet[..., ::-1],
+                        [cv2.IMWRITE_JPEG_QUALITY, 80])
+        sprites = bus.register(SpriteSheetConsumer(interval, tile_size[0], tile_size[1],
+                                                   THUMBNAIL_COLUMNS, THUMBNAIL_ROWS, write_sheet))
+    
+    stats = bus.run()
+    results = stats.pop('results')
+    if stats['errors']:
+        raise RuntimeError(f"Frame consumers failed: {stats['errors']}")
+    logger.info(f"Decoded {stats['frames_decoded']} frames once for {len(bus.consumers)} consumers "
+                f"at {stats['decode_fps']} fps ({stats['stalled_seconds']}s held back by consumers)")
+    
+    return {
+        'motion_curve': results.get(motion.name) if motion else None,
+        'snapshots': results.get(snapshots.name, {}) if snapshots else {},
+        'sprite_count': results.get(sprites.name, 0) if sprites else 0,
+        'bus': stats
+    }
+
+
+def generate_thumbnail_track(
+    session_id: str,
+    video_s3_key: str,
+    s3_bucket: str,
+    interval: float = THUMBNAIL_INTERVAL,
+    output_prefix: str = 'cme-thumbnails',
+    snapshot_times: Optional[List[float]] = None,
+    analysis_s3_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Build scrub-preview sprite sheets and a WebVTT thumbnail track
+    
+    The recording is decoded once on the frame bus: the same frames become
+    sprite tiles, the recording's motion-energy curve (stored in the analysis
+    cache, where batch analysis slices it instead of decoding each clip) and
+    any requested snapshots. When the curve is already cached and no
+    snapshots are wanted, or when the frame bus cannot decode, a cheaper
+    ffmpeg pass decodes only keyframes and tiles them; a curve still missing
+    then comes from its own ffmpeg pass. The recording is read from the local cache when present,
+    otherwise streamed from S3. The track location is stored on the session.
+    
+    Args:
+        video_s3_key: Recording the analysis cache is keyed by
+        snapshot_times: Optional times (seconds) to capture as JPEG stills
+        analysis_s3_key: Rendition to decode (e.g. a proxy; default the recording)
+    
+    Returns:
+        Track metadata: vtt_key, sprite_keys, interval and tile geometry,
+        motion_curve ('cached', 'computed' or 'unavailable'), plus
+        snapshot_keys when snapshots were requested
+    """
+    source = recording_source(s3_bucket, analysis_s3_key or video_s3_key)
+    stream = probe_video_stream(source)
+    
+    tile_width = THUMBNAIL_WIDTH
+    tile_height = int(round(THUMBNAIL_WIDTH * stream['height'] / stream['width'] / 2) * 2) if stream['width'] else 90
+    thumbnail_count = int(np.ceil(stream['duration'] / interval)) if stream['duration'] else 0
+    prefix = f"{output_prefix}/{session_id}"
+    
+    # The motion curve is measured on 160x90 grey frames, so any rendition
+    # of the recording yields the same curve
+    cache = AnalysisCache(s3_bucket, video_s3_key)
+    curve_key = cache.window_key(None, f'local_motion:{LOCAL_MOTION_FPS}')
+    try:
+        need_curve = not cache.lookup(curve_key, 'local_motion')
+    except Exception as e:
+        logger.warning(f"Recording motion curve lookup failed: {str(e)}")
+        need_curve = False
+    
+    snapshot_keys = []
+    motion_curve = 'cached' if not need_curve else 'unavailable'
+    with tempfile.TemporaryDirectory() as sprites_dir:
+        decoded = None
+        if need_curve or snapshot_times:
+            try:
+                decoded = decode_recording_frames(
+                    source, sprites_dir, (tile_width, tile_height), interval,
+                    snapshot_times=snapshot_times, motion_fps=LOCAL_MOTION_FPS if need_curve else None
+                )
+            except Exception as e:
+                # Fall back to ffmpeg alone: keyframe sprites, and the curve from its own pass
+                logger.error(f"Frame bus decode failed for {session_id}, snapshots skipped: {str(e)}")
+                for name in os.listdir(sprites_dir):
+                    os.remove(os.path.join(sprites_dir, name))
+        
+        if decoded is not None:
+            if decoded['motion_curve'] is not None:
+                cache.save_arrays(curve_key, decoded['motion_curve'])
+                motion_curve = 'computed'
+            snapshot_keys = upload_snapshots(decoded['snapshots'], snapshot_times or [], s3_bucket,
+                                             f"cme-frames/{session_id}")
+        else:
+            if need_curve:
+                try:
+                    cache.save_arrays(curve_key, motion_energy_curve(source, analysis_fps=LOCAL_MOTION_FPS))
+                    motion_curve = 'computed'
+                except Exception as e:
+                    logger.error(f"Recording motion curve unavailable for {session_id}: {str(e)}")
+            command = [
+                'ffmpeg', '-v', 'error', '-nostdin', '-y',
+                '-skip_frame', 'nokey', '-i', source, '-an',
+                '-vf', f"fps=1/{interval},scale={tile_width}:{tile_height},tile={THUMBNAIL_COLUMNS}x{THUMBNAIL_ROWS}",
+                '-vsync', 'vfr', '-q:v', '5',
+                os.path.join(sprites_dir, 'sprite_%04d.jpg')
+            ]
+            result = subprocess.run(command, capture_output=True, text=True, timeout=900)
+            if result.returncode != 0:
+                raise RuntimeError(f"Sprite sheet generation failed: {result.stderr.strip()}")
+        
+        sprite_names = sorted(name for name in os.listdir(sprites_dir) if name.endswith('.jpg'))
+        
+        def upload(name):
+            key = f"{prefix}/{name}"
+            s3_client.upload_file(os.path.join(sprites_dir, name), s3_bucket, key,
+                                  ExtraArgs={'ContentType': 'image/jpeg'})
+            return key
+        
+        with ThreadPoolExecutor(max_workers=min(SNAPSHOT_UPLOAD_WORKERS, max(1, len(sprite_names)))) as pool:
+            sprite_keys = list(pool.map(upload, sprite_names))
+    
+    vtt_key = f"{prefix}/thumbnails.vtt"
+    s3_client.put_object(
+        Bucket=s3_bucket,
+        Key=vtt_key,
+        Body=build_thumbnail_vtt(thumbnail_count, stream['duration'], sprite_names, interval,
+                                 tile_width, tile_height).encode('utf-8'),
+        ContentType='text/vtt'
+    )
+    
+    track = {
+        'vtt_key': vtt_key,
+        'sprite_keys': sprite_keys,
+        'interval': interval,
+        'tile_width': tile_width,
+        'tile_height': tile_height,
+        'columns': THUMBNAIL_COLUMNS,
+        'rows': THUMBNAIL_ROWS,
+        'duration': round(stream['duration'], 3)
+    }
+    
+    sessions_table = boto3.resource('dynamodb').Table(os.environ.get('CME_SESSIONS_TABLE', 'cme-sessions'))
+    sessions_table.update_item(
+        Key={'session_id': session_id},
+        UpdateExpression='SET thumbnail_track = :track',
+        ExpressionAttributeValues={':track': json.loads(json.dumps(track), parse_float=Decimal)}
+    )
+    
+    logger.info(f"Generated {thumbnail_count} thumbnails in {len(sprite_keys)} sprite sheets for {session_id} "
+                f"(motion curve {motion_curve})")
+    result = {**track, 'motion_curve': motion_curve}
+    return {**result, 'snapshot_keys': snapshot_keys} if snapshot_times else result
+
+
 def handler(event, context):
     """
     Lambda handler for Step Functions invocation
-    Processes a single declared test
+    Per-test mode processes a single declared test in two phases:
+    - 'start' (default): extract the segment and start Rekognition jobs; the
+      workflow then waits on the task token until the callback resumes it
+    - 'finalize': score the finished jobs and persist the observed action
+    - 'start_batch' / 'finalize_batch': the same for a chunk of tests, which
+      share one recording fetch, one thread pool and one task token
+    Session mode analyzes the recording once and slices it per test:
+    - 'start_session': start one label and one person-tracking job
+    - 'finalize_session': store the paginated results once in S3
+    - 'analyze_window': score one declared test from its time slice
+    - 'analyze_windows': score a chunk of declared tests concurrently
+    'thumbnails' decodes the recording once for the report's scrub previews,
+    the recording-wide motion curve batch analysis slices, and optional
+    snapshots; the workflow runs it alongside transcription.
     """
+    task_token = event.get('task_token')
     try:
         logger.info(f"Video Processor invoked: {json.dumps(event)}")
         
-        session_id = event['session_id']
-        declared_test = event['declared_test']
-        video_s3_key = event['video_s3_key']
+        action = event.get('action', 'start')
         s3_bucket = os.environ.get('S3_BUCKET', 'default-bucket')
         
-        # Process the test
-        result = process_video_for_cme_test(
-            session_id=session_id,
-            declared_test=declared_test,
-            video_s3_key=video_s3_key,
-            s3_bucket=s3_bucket
-        )
+        if action == 'start_session':
+            result = start_session_analysis(
+                session_id=event['session_id'],
+                analysis_s3_key=event.get('proxy_s3_key') or event['video_s3_key'],
+                s3_bucket=s3_bucket,
+                task_token=task_token,
+                rendition='proxy' if event.get('proxy_s3_key') else 'original'
+            )
+        elif action == 'finalize_session':
+            analysis = event.get('analysis', event)
+            result = store_session_analysis(
+                session_id=analysis['session_id'],
+                jobs=analysis.get('jobs', {}),
+                s3_bucket=s3_bucket,
+                cache_keys=analysis.get('cache_keys'),
+                result_keys=analysis.get('result_keys')
+            )
+        elif action == 'analyze_window':
+            result = analyze_test_window(
+                session_id=event['session_id'],
+                declared_test=event['declared_test'],
+                result_keys=event.get('result_keys', {}),
+                s3_bucket=s3_bucket,
+                hls_playlist_key=event.get('hls_playlist_key')
+            )
+        elif action == 'analyze_windows':
+            result = analyze_window_batch(
+                session_id=event['session_id'],
+                declared_tests=event.get('declared_tests', []),
+                result_keys=event.get('result_keys', {}),
+                s3_bucket=s3_bucket,
+                hls_playlist_key=event.get('hls_playlist_key'),
+                video_s3_key=event.get('video_s3_key')
+            )
+        elif action == 'start_batch':
+            result = process_video_batch(
+                session_id=event['session_id'],
+                declared_tests=event.get('declared_tests', []),
+                video_s3_key=event['video_s3_key'],
+                s3_bucket=s3_bucket,
+                task_token=task_token,
+                hls_playlist_key=event.get('hls_playlist_key'),
+                proxy_s3_key=event.get('proxy_s3_key')
+            )
+        elif action == 'finalize_batch':
+            # Output of the batch callback task: batch context plus job statuses
+            analysis = event.get('analysis', event)
+            if analysis.get('status') == 'completed':
+                # Every test was decided before the wait
+                result = analysis
+            else:
+                result = finalize_video_batch(analysis, s3_bucket)
+        elif action == 'thumbnails':
+            result = {
+                'session_id': event['session_id'],
+                'thumbnail_track': generate_thumbnail_track(
+                    session_id=event['session_id'],
+                    video_s3_key=event['video_s3_key'],
+                    s3_bucket=s3_bucket,
+                    snapshot_times=event.get('snapshot_times'),
+                    analysis_s3_key=event.get('proxy_s3_key')
+                )
+            }
+        elif action == 'finalize':
+            # Output of the callback task: session context plus job statuses
+            analysis = event.get('analysis', event)
+            if analysis.get('status') == 'completed':
+                # Finalised before the wait (decided locally, or segment extraction failed)
+                result = analysis
+            else:
+                result = finalize_video_for_cme_test(
+                    session_id=analysis['session_id'],
+                    declared_test=analysis['declared_test'],
+                    segment_key=analysis['segment_key'],
+                    jobs=analysis.get('jobs', {}),
+                    s3_bucket=s3_bucket,
+                    local_motion=analysis.get('local_motion'),
+                    escalated_at=analysis.get('escalated_at')
+                )
+        else:
+            result = process_video_for_cme_test(
+                session_id=event['session_id'],
+                declared_test=event['declared_test'],
+                video_s3_key=event['video_s3_key'],
+                s3_bucket=s3_bucket,
+                task_token=task_token,
+                hls_playlist_key=event.get('hls_playlist_key'),
+                proxy_s3_key=event.get('proxy_s3_key')
+            )
         
         return {
             'statusCode': 200,
@@ -905,5 +3976,11 @@ def handler(event, context):
         logger.error(f"Error in video processor handler: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
+        # Fail the waiting task instead of leaving it to time out
+        if task_token:
+            boto3.client('stepfunctions').send_task_failure(
+                taskToken=task_token,
+                error='VideoProcessingError',
+                cause=str(e)[:256]
+            )
         raise e
-
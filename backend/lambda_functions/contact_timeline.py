@@ -0,0 +1,150 @@
+"""
+Contact Timeline - Examiner/patient proximity from Rekognition person tracking
+Aligns the two main person tracks on a shared time grid, computes their
+bounding-box IoU and gap for every frame in one NumPy pass, and extracts
+contact intervals that can be queried for any test window
+"""
+
+import logging
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Boxes overlapping at least this much, or closer than this gap (fraction of
+# the frame), count as the two people touching in that frame
+CONTACT_IOU_THRESHOLD = 0.02
+CONTACT_GAP_THRESHOLD = 0.015
+
+# Contact frames closer than this are one interval; shorter intervals are dropped
+CONTACT_MERGE_GAP_MS = 1000
+CONTACT_MIN_FRAMES = 2
+
+
+class ContactTimeline:
+    """
+    Per-frame proximity of the two most-tracked people and their contact intervals
+
+    Frame arrays are over the timestamps where both tracks have a box:
+        timestamps: int64 milliseconds
+        iou:        float32 intersection over union of the two boxes
+        gap:        float32 edge-to-edge distance (0 when overlapping), frame units
+        distance:   float32 centre-to-centre distance, frame units
+    Contact intervals are in starts / ends (ms) with the peak IoU of each.
+    """
+
+    def __init__(
+        self,
+        tracks: tuple,
+        timestamps: np.ndarray,
+        iou: np.ndarray,
+        gap: np.ndarray,
+        distance: np.ndarray
+    ):
+        self.tracks = tracks
+        self.timestamps = timestamps
+        self.iou = iou
+        self.gap = gap
+        self.distance = distance
+
+        contact = (iou >= CONTACT_IOU_THRESHOLD) | (gap <= CONTACT_GAP_THRESHOLD)
+        self.starts, self.ends, self.peak_iou = _contact_intervals(timestamps, contact, iou)
+
+    @classmethod
+    def from_person_timeline(cls, timeline) -> 'ContactTimeline':
+        """Build from a pose_detection RekognitionTimeline (all frames at once)"""
+        tracked = (timeline.person_index >= 0) & np.isfinite(timeline.bboxes).all(axis=1)
+        person = timeline.person_index[tracked]
+        timestamps = timeline.timestamps[tracked]
+        boxes = timeline.bboxes[tracked]
+
+        counts = np.bincount(person) if person.size else np.zeros(0, dtype=np.int64)
+        main = [int(i) for i in np.argsort(counts, kind='stable')[::-1][:2] if counts[i] > 0]
+        if len(main) < 2:
+            empty = np.zeros(0, dtype=np.float32)
+            return cls(tuple(main), np.zeros(0, dtype=np.int64), empty, empty, empty)
+
+        grid, slot = np.unique(timestamps, return_inverse=True)
+        aligned = []
+        for track in main:
+            track_boxes = np.full((grid.shape[0], 4), np.nan, dtype=np.float32)
+            rows = person == track
+            track_boxes[slot[rows]] = boxes[rows]
+            aligned.append(track_boxes)
+
+        both = np.isfinite(aligned[0][:, 0]) & np.isfinite(aligned[1][:, 0])
+        a, b = aligned[0][both], aligned[1][both]
+        iou, gap, distance = _box_proximity(a, b)
+
+        return cls(tuple(main), grid[both], iou, gap, distance)
+
+    def __len__(self) -> int:
+        return int(self.timestamps.shape[0])
+
+    def window(self, start_time: float = 0.0, end_time: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Contact summary for start_time <= t <= end_time (seconds; None = to the end)
+
+        Returns:
+            Dictionary with contact (bool), contact_seconds, the clipped
+            intervals, frames where both people were tracked, and the
+            window's max IoU / min gap (None without such frames)
+        """
+        start_ms = int(start_time * 1000)
+        end_ms = int(end_time * 1000) if end_time is not None else np.iinfo(np.int64).max
+
+        overlapping = (self.starts <= end_ms) & (self.ends >= start_ms)
+        starts = np.maximum(self.starts[overlapping], start_ms)
+        ends = np.minimum(self.ends[overlapping], end_ms)
+
+        lo = int(np.searchsorted(self.timestamps, start_ms, side='left'))
+        hi = int(np.searchsorted(self.timestamps, end_ms, side='right'))
+
+        return {
+            'contact': bool(overlapping.any()),
+            'contact_seconds': round(float((ends - starts).sum()) / 1000.0, 3),
+            'intervals': [[round(float(s) / 1000.0, 3), round(float(e) / 1000.0, 3)] for s, e in zip(starts, ends)],
+            'frames_with_both': hi - lo,
+            'max_iou': round(float(self.iou[lo:hi].max()), 3) if hi > lo else None,
+            'min_gap': round(float(self.gap[lo:hi].min()), 3) if hi > lo else None
+        }
+
+
+def _box_proximity(a: np.ndarray, b: np.ndarray) -> tuple:
+    """IoU, edge gap and centre distance of paired (left, top, width, height) boxes"""
+    a_right, a_bottom = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    b_right, b_bottom = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+
+    overlap_w = np.minimum(a_right, b_right) - np.maximum(a[:, 0], b[:, 0])
+    overlap_h = np.minimum(a_bottom, b_bottom) - np.maximum(a[:, 1], b[:, 1])
+    intersection = np.clip(overlap_w, 0, None) * np.clip(overlap_h, 0, None)
+    union = a[:, 2] * a[:, 3] + b[:, 2] * b[:, 3] - intersection
+    iou = np.where(union > 0, intersection / np.where(union > 0, union, 1), 0).astype(np.float32)
+
+    # A negative overlap is the separation along that axis
+    gap = np.hypot(np.clip(-overlap_w, 0, None), np.clip(-overlap_h, 0, None)).astype(np.float32)
+    distance = np.hypot(
+        (a[:, 0] + a[:, 2] / 2) - (b[:, 0] + b[:, 2] / 2),
+        (a[:, 1] + a[:, 3] / 2) - (b[:, 1] + b[:, 3] / 2)
+    ).astype(np.float32)
+
+    return iou, gap, distance
+
+
+def _contact_intervals(timestamps: np.ndarray, contact: np.ndarray, iou: np.ndarray) -> tuple:
+    """Merge contact frames into intervals (start ms, end ms, peak IoU)"""
+    contact_times = timestamps[contact]
+    if contact_times.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    # A new interval starts wherever consecutive contact frames are far apart
+    breaks = np.flatnonzero(np.diff(contact_times) > CONTACT_MERGE_GAP_MS) + 1
+    first = np.concatenate([[0], breaks])
+    last = np.concatenate([breaks, [contact_times.size]]) - 1
+
+    keep = (last - first + 1) >= CONTACT_MIN_FRAMES
+    peak = np.maximum.reduceat(iou[contact], first) if first.size else np.zeros(0, dtype=np.float32)
+
+    return contact_times[first[keep]], contact_times[last[keep]], peak[keep].astype(np.float32)
@@ -0,0 +1,573 @@
+"""
+Frame Bus - One decode of a video shared by every frame consumer
+Frames are decoded once (ffmpeg rawvideo pipe, or PyAV) straight into a
+preallocated ring of NumPy frames and handed to registered consumers (motion
+energy, pose batches, snapshots, sprite sheets) at their own sample rates.
+Consumers read the ring slot in place; a slot is reused only after every
+consumer it was handed to has released it, so a slow consumer throttles the
+decoder instead of growing a backlog
+"""
+
+import itertools
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# 'ffmpeg' (rawvideo pipe), 'pyav' or 'auto' (PyAV when installed, else ffmpeg)
+FRAME_BUS_DECODER = os.environ.get('FRAME_BUS_DECODER', 'auto')
+
+# Decoded frames held in the ring; the bus's memory is this many frames at
+# the widest consumer resolution, whatever the video length
+FRAME_BUS_RING_SLOTS = int(os.environ.get('FRAME_BUS_RING_SLOTS', '8'))
+
+# Frames a consumer may have waiting before it holds back the decoder
+FRAME_BUS_QUEUE_DEPTH = 4
+
+# ITU-R BT.601 luma weights, matching ffmpeg's gray conversion
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+_END = None
+
+
+def probe_video(source: str) -> Dict[str, float]:
+    """Width, height, frame rate and duration (seconds) of the first video stream"""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,avg_frame_rate:format=duration', '-of', 'json', source
+    ], capture_output=True, text=True, timeout=60, check=True)
+
+    info = json.loads(result.stdout)
+    stream = (info.get('streams') or [{}])[0]
+    numerator, _, denominator = str(stream.get('avg_frame_rate', '0/1')).partition('/')
+    rate = float(numerator) / float(denominator or 1) if float(denominator or 1) else 0.0
+    return {
+        'width': float(stream.get('width', 0)),
+        'height': float(stream.get('height', 0)),
+        'fps': rate or 30.0,
+        'duration': float(info.get('format', {}).get('duration', 0) or 0)
+    }
+
+
+def downscale(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Box-filter a frame down to width x height (float32)
+
+    Whole-pixel blocks are averaged first, then rows and columns are picked to
+    land on the exact size, so a 640x360 frame becomes 160x90 by a 4x4 mean.
+    Blocks are summed with strided adds over whole rows, which is several
+    times faster than a reduction over a reshaped (non-contiguous) view.
+    """
+    rows, columns = frame.shape[:2]
+    if (columns, rows) == (width, height):
+        return frame.astype(np.float32)
+
+    block_y, block_x = max(1, rows // height), max(1, columns // width)
+    cropped = frame[:rows - rows % block_y, :columns - columns % block_x]
+
+    row_sums = np.zeros((cropped.shape[0] // block_y,) + cropped.shape[1:],
+                        dtype=np.uint16 if block_y <= 257 else np.uint32)
+    for offset in range(block_y):
+        row_sums += cropped[offset::block_y]
+    block_sums = np.zeros((row_sums.shape[0], cropped.shape[1] // block_x) + cropped.shape[2:], dtype=np.uint32)
+    for offset in range(block_x):
+        block_sums += row_sums[:, offset::block_x]
+    blocks = block_sums.astype(np.float32) * np.float32(1.0 / (block_y * block_x))
+
+    pick_rows = ((np.arange(height) + 0.5) * blocks.shape[0] / height).astype(np.int64)
+    pick_columns = ((np.arange(width) + 0.5) * blocks.shape[1] / width).astype(np.int64)
+    return blocks[pick_rows][:, pick_columns]
+
+
+class FrameConsumer:
+    """
+    Base for bus consumers
+
+    fps: sample rate (None = every frame the bus decodes, at the rate the
+         other consumers set)
+    width: widest frame the consumer needs (None = source resolution)
+
+    wants() runs on the decoder thread and must be cheap; consume() and
+    finish() run on the consumer's own thread. The frame passed to consume()
+    is a read-only view of a ring slot, valid only until consume() returns.
+    """
+
+    name = 'consumer'
+
+    def __init__(self, fps: Optional[float] = None, width: Optional[int] = None):
+        self.fps = fps
+        self.width = width
+        self._next_due = None
+
+    def wants(self, timestamp: float) -> bool:
+        if not self.fps:
+            return True
+        if self._next_due is not None and timestamp < self._next_due - 1e-6:
+            return False
+        # Stay on the consumer's own time grid whatever the bus rate is
+        self._next_due = (np.floor(timestamp * self.fps + 1e-6) + 1) / self.fps
+        return True
+
+    def consume(self, timestamp: float, frame: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> Any:
+        return None
+
+    def close(self) -> None:
+        """Called when the bus stops early; must unblock anything consume() waits on"""
+
+
+class MotionEnergyConsumer(FrameConsumer):
+    """Mean absolute grey-level change between consecutive samples (motion_energy_curve's output)"""
+
+    name = 'motion_energy'
+
+    def __init__(self, fps: float, width: int = 160, height: int = 90):
+        super().__init__(fps, width)
+        self.height = height
+        self.timestamps: List[float] = []
+        self.energy: List[float] = []
+        self._previous = None
+
+    def consume(self, timestamp: float, frame: np.ndarray) -> None:
+        gray = downscale(frame, self.width, self.height) @ LUMA_WEIGHTS
+        self.energy.append(float(np.abs(gray - self._previous).mean()) if self._previous is not None else 0.0)
+        self.timestamps.append(timestamp)
+        self._previous = gray
+
+    def finish(self) -> Dict[str, np.ndarray]:
+        return {
+            'timestamps': np.asarray(self.timestamps, dtype=np.float64),
+            'energy': np.asarray(self.energy, dtype=np.float32)
+        }
+
+
+class FrameBatchConsumer(FrameConsumer):
+    """
+    Contiguous batches of RGB frames for pose estimation
+
+    Batches are the one place frames are copied: they leave the ring for a
+    worker process. Iterate batches() on another thread while the bus runs;
+    at most max_pending finished batches wait there before consume() blocks.
+    """
+
+    name = 'frame_batches'
+
+    def __init__(self, fps: float, batch_size: int, width: int = 640, max_pending: int = 2):
+        super().__init__(fps, width)
+        self.batch_size = batch_size
+        self.timestamps: List[float] = []
+        self.frame_shape: Tuple[int, ...] = ()
+        self._ready = queue.Queue(maxsize=max_pending)
+        self._batch = None
+        self._filled = 0
+        self._closed = threading.Event()
+
+    def consume(self, timestamp: float, frame: np.ndarray) -> None:
+        if self._closed.is_set():
+            return
+        if frame.shape[1] > self.width:
+            height = int(round(frame.shape[0] * self.width / frame.shape[1] / 2) * 2)
+            frame = downscale(frame, self.width, height).astype(np.uint8)
+        if self._batch is None:
+            self.frame_shape = frame.shape
+            self._batch = np.empty((self.batch_size,) + frame.shape, dtype=np.uint8)
+        self._batch[self._filled] = frame
+        self._filled += 1
+        self.timestamps.append(timestamp)
+        if self._filled == self.batch_size:
+            self._hand_off(self._batch)
+            self._batch, self._filled = None, 0
+
+    def _hand_off(self, batch) -> None:
+        while not self._closed.is_set():
+            try:
+                self._ready.put(batch, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self) -> int:
+        if self._filled:
+            self._hand_off(self._batch[:self._filled])
+        self._hand_off(_END)
+        return len(self.timestamps)
+
+    def close(self) -> None:
+        self._closed.set()
+
+    def batches(self) -> Iterator[np.ndarray]:
+        """Yield batches (N x H x W x 3 uint8) as the bus fills them"""
+        while True:
+            try:
+                batch = self._ready.get(timeout=0.5)
+            except queue.Empty:
+                if self._closed.is_set():
+                    return
+                continue
+            if batch is _END:
+                return
+            yield batch
+
+
+class SnapshotConsumer(FrameConsumer):
+    """
+    Still frames at given times: the first bus frame at or after each time
+
+    With a slower bus rate a snapshot can land up to one bus frame late.
+    """
+
+    name = 'snapshots'
+
+    def __init__(self, times: List[float], width: Optional[int] = None):
+        super().__init__(None, width)
+        self.times = np.unique(np.asarray(times, dtype=np.float64))
+        self._wanted = 0
+        self._captured = 0
+        self.frames: Dict[float, np.ndarray] = {}
+
+    def wants(self, timestamp: float) -> bool:
+        due = int(np.searchsorted(self.times, timestamp + 1e-6, side='right'))
+        if due > self._wanted:
+            self._wanted = due
+            return True
+        return False
+
+    def consume(self, timestamp: float, frame: np.ndarray) -> None:
+        due = int(np.searchsorted(self.times, timestamp + 1e-6, side='right'))
+        for t in self.times[self._captured:due]:
+            self.frames[float(t)] = frame.copy()
+        self._captured = max(self._captured, due)
+
+    def finish(self) -> Dict[float, np.ndarray]:
+        return self.frames
+
+
+class SpriteSheetConsumer(FrameConsumer):
+    """
+    Scrub-preview tiles, one per interval, packed into sprite sheets
+
+    Each full sheet (rows x columns tiles, black where unused) is passed to
+    on_sheet(sheet_index, sheet) as soon as it is complete, so only the sheet
+    being filled is held in memory.
+    """
+
+    name = 'sprite_sheets'
+
+    def __init__(
+        self,
+        interval: float,
+        tile_width: int,
+        tile_height: int,
+        columns: int,
+        rows: int,
+        on_sheet: Callable[[int, np.ndarray], None]
+    ):
+        super().__init__(1.0 / interval, tile_width)
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.columns = columns
+        self.rows = rows
+        self.on_sheet = on_sheet
+        self.count = 0
+        self._sheet = None
+
+    def consume(self, timestamp: float, frame: np.ndarray) -> None:
+        sheet_index, tile = divmod(self.count, self.columns * self.rows)
+        if self._sheet is None:
+            self._sheet = np.zeros((self.rows * self.tile_height, self.columns * self.tile_width, 3), dtype=np.uint8)
+        row, column = divmod(tile, self.columns)
+        self._sheet[row * self.tile_height:(row + 1) * self.tile_height,
+                    column * self.tile_width:(column + 1) * self.tile_width] = \
+            downscale(frame, self.tile_width, self.tile_height)
+        self.count += 1
+        if tile == self.columns * self.rows - 1:
+            self.on_sheet(sheet_index, self._sheet)
+            self._sheet = None
+
+    def finish(self) -> int:
+        if self._sheet is not None:
+            self.on_sheet(self.count // (self.columns * self.rows), self._sheet)
+            self._sheet = None
+        return self.count
+
+
+class FrameBus:
+    """
+    Decode a video once and fan its frames out to consumers
+
+    The decode rate is the fastest consumer's fps (the source rate if no
+    consumer sets one) and the frame size the widest consumer's
+    width, so ffmpeg resamples and scales while decoding. Each consumer runs
+    on its own thread behind a bounded queue of ring slots.
+
+    Usage:
+        bus = FrameBus(source)
+        motion = bus.register(MotionEnergyConsumer(5.0))
+        stats = bus.run()
+        curve = stats['results']['motion_energy']
+    """
+
+    def __init__(
+        self,
+        source: str,
+        start_time: float = 0.0,
+        end_time: Optional[float] = None,
+        decoder: str = FRAME_BUS_DECODER,
+        ring_slots: int = FRAME_BUS_RING_SLOTS,
+        queue_depth: int = FRAME_BUS_QUEUE_DEPTH
+    ):
+        self.source = source
+        self.start_time = start_time
+        self.end_time = end_time
+        self.decoder = decoder
+        self.ring_slots = max(2, ring_slots)
+        self.queue_depth = max(1, queue_depth)
+        self.consumers: List[FrameConsumer] = []
+
+        self._ring = None
+        self._references = []
+        self._slot_released = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stats: Dict[str, Any] = {}
+        self._decode_error: Optional[BaseException] = None
+
+    def register(self, consumer: FrameConsumer) -> FrameConsumer:
+        self.consumers.append(consumer)
+        return consumer
+
+    def run(self) -> Dict[str, Any]:
+        """Decode to the end and return stats plus each consumer's finish() result"""
+        self.start()
+        return self.wait()
+
+    def start(self) -> None:
+        """Start decoding on a background thread (for consumers read concurrently)"""
+        decoder_thread = threading.Thread(target=self._decode, name='frame-bus-decoder', daemon=True)
+        self._threads = [decoder_thread]
+        decoder_thread.start()
+
+    def wait(self) -> Dict[str, Any]:
+        for thread in self._threads:
+            thread.join()
+        if self._decode_error is not None:
+            raise RuntimeError(f"Frame bus decode failed: {self._decode_error}")
+        return self._stats
+
+    def _bus_geometry(self, source_width: int, source_height: int) -> Tuple[int, int]:
+        widths = [c.width for c in self.consumers]
+        width = source_width if None in widths or not widths else min(source_width, max(widths))
+        height = int(round(width * source_height / source_width / 2) * 2) if source_width else source_height
+        return int(width), max(2, height)
+
+    def _bus_fps(self) -> Optional[float]:
+        rates = [c.fps for c in self.consumers if c.fps]
+        return max(rates) if rates else None
+
+    def _decode(self) -> None:
+        started = time.perf_counter()
+        stalled = 0.0
+        decoded = 0
+        delivered = {c.name: 0 for c in self.consumers}
+        channels = [queue.Queue(maxsize=self.queue_depth) for _ in self.consumers]
+        errors: Dict[str, str] = {}
+        consumer_threads = []
+        results: Dict[str, Any] = {}
+        frames = None
+        decoder_name = None
+
+        try:
+            frames, width, height, decoder_name = self._open_decoder()
+            self._ring = np.empty((self.ring_slots, height, width, 3), dtype=np.uint8)
+            self._references = [0] * self.ring_slots
+
+            for consumer, channel in zip(self.consumers, channels):
+                thread = threading.Thread(
+                    target=self._serve, args=(consumer, channel, errors, results),
+                    name=f'frame-bus-{consumer.name}', daemon=True
+                )
+                thread.start()
+                consumer_threads.append(thread)
+
+            slot = 0
+            for timestamp, fill in frames:
+                if self.end_time is not None and timestamp > self.end_time:
+                    break
+                takers = [i for i, consumer in enumerate(self.consumers) if consumer.wants(timestamp)]
+                if not takers:
+                    if not fill(None):
+                        break
+                    continue
+
+                # Backpressure: wait until every consumer has released this slot
+                waited = time.perf_counter()
+                with self._slot_released:
+                    while self._references[slot]:
+                        self._slot_released.wait()
+                stalled += time.perf_counter() - waited
+                if not fill(self._ring[slot]):
+                    break
+                decoded += 1
+
+                view = self._ring[slot].view()
+                view.flags.writeable = False
+                with self._slot_released:
+                    self._references[slot] = len(takers)
+                waited = time.perf_counter()
+                for i in takers:
+                    # A full queue means a slow consumer: block rather than buffer
+                    channels[i].put((timestamp, slot, view))
+                    delivered[self.consumers[i].name] += 1
+                stalled += time.perf_counter() - waited
+                slot = (slot + 1) % self.ring_slots
+        except BaseException as e:
+            logger.error(f"Frame bus decode error for {self.source}: {str(e)}")
+            self._decode_error = e
+            for consumer in self.consumers:
+                consumer.close()
+        finally:
+            if frames is not None:
+                frames.close()
+            for channel in channels:
+                channel.put(_END)
+            for thread in consumer_threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - started
+        self._stats = {
+            'decoder': decoder_name,
+            'frames_decoded': decoded,
+            'frames_delivered': delivered,
+            'decode_seconds': round(elapsed, 3),
+            'decode_fps': round(decoded / elapsed, 1) if elapsed > 0 else 0.0,
+            'stalled_seconds': round(stalled, 3),
+            'ring_bytes': int(self._ring.nbytes) if self._ring is not None else 0,
+            'frame_size': list(self._ring.shape[2:0:-1]) if self._ring is not None else [],
+            'errors': errors,
+            'results': results
+        }
+
+    def _serve(self, consumer: FrameConsumer, channel: queue.Queue, errors: Dict[str, str], results: Dict[str, Any]) -> None:
+        """Consumer thread: process handed-over slots, release them, then finish"""
+        failed = False
+        while True:
+            item = channel.get()
+            if item is _END:
+                break
+            timestamp, slot, view = item
+            try:
+                if not failed:
+                    consumer.consume(timestamp, view)
+            except Exception as e:
+                # Keep draining so a broken consumer never stalls the others
+                logger.error(f"Frame consumer {consumer.name} failed: {str(e)}")
+                errors[consumer.name] = str(e)
+                failed = True
+                consumer.close()
+            finally:
+                with self._slot_released:
+                    self._references[slot] -= 1
+                    self._slot_released.notify_all()
+        try:
+            results[consumer.name] = consumer.finish() if not failed else None
+        except Exception as e:
+            logger.error(f"Frame consumer {consumer.name} failed to finish: {str(e)}")
+            errors[consumer.name] = str(e)
+            results[consumer.name] = None
+
+    def _open_decoder(self):
+        """(frames generator, width, height, decoder name); frames yields (timestamp, fill)"""
+        if self.decoder in ('pyav', 'auto'):
+            try:
+                import av  # noqa: F401
+                return self._pyav_frames()
+            except ImportError:
+                if self.decoder == 'pyav':
+                    raise
+        return self._ffmpeg_frames()
+
+    def _ffmpeg_frames(self):
+        info = probe_video(self.source)
+        width, height = self._bus_geometry(int(info['width']), int(info['height']))
+        fps = self._bus_fps() or info['fps']
+
+        cmd = ['ffmpeg', '-v', 'error', '-nostdin']
+        if self.start_time > 0:
+            cmd += ['-ss', str(self.start_time)]
+        cmd += ['-i', self.source]
+        if self.end_time is not None:
+            cmd += ['-t', str(max(0.0, self.end_time - self.start_time))]
+        cmd += [
+            '-an', '-vf', f'fps={fps},scale={width}:{height}',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'
+        ]
+        frame_bytes = width * height * 3
+
+        def generate():
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            scratch = bytearray(frame_bytes)
+
+            def fill(slot: Optional[np.ndarray]) -> bool:
+                # Read the frame straight into the ring slot (no intermediate bytes object)
+                target = memoryview(slot.reshape(-1)) if slot is not None else memoryview(scratch)
+                filled = 0
+                while filled < frame_bytes:
+                    count = process.stdout.readinto(target[filled:])
+                    if not count:
+                        if process.wait() != 0:
+                            stderr = process.stderr.read().decode('utf-8', errors='replace')
+                            raise RuntimeError(stderr.strip() or f"ffmpeg exited with {process.returncode}")
+                        return False
+                    filled += count
+                return True
+
+            try:
+                for index in itertools.count():
+                    yield self.start_time + index / fps, fill
+            finally:
+                if process.poll() is None:
+                    # Stopped before the end (end_time or an error)
+                    process.kill()
+                process.stdout.close()
+                process.stderr.close()
+                process.wait()
+
+        return generate(), width, height, 'ffmpeg'
+
+    def _pyav_frames(self):
+        import av
+
+        container = av.open(self.source)
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        width, height = self._bus_geometry(stream.codec_context.width, stream.codec_context.height)
+        if self.start_time > 0 and stream.time_base:
+            container.seek(int(self.start_time / stream.time_base), stream=stream)
+
+        def generate():
+            try:
+                for frame in container.decode(stream):
+                    if frame.time is None or frame.time < self.start_time:
+                        continue
+
+                    def fill(slot: Optional[np.ndarray], frame=frame) -> bool:
+                        # Frames nobody wants are never converted
+                        if slot is not None:
+                            np.copyto(slot, frame.to_ndarray(width=width, height=height, format='rgb24'))
+                        return True
+
+                    yield float(frame.time), fill
+            finally:
+                container.close()
+
+        return generate(), width, height, 'pyav'
@@ -0,0 +1,234 @@
+"""
+Label → Movement Index - Maps Rekognition video labels to expected CME movements
+Rekognition reports scene and activity labels ("Sitting", "Walking", "Bed"),
+never examination movements ("hip_flexion"). This table states how strongly
+each label, or label category, evidences each movement; the index built from
+it scores a whole columnar label timeline with array lookups
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Rekognition label (or parent category) → {movement: weight 0-1}
+# Weights are evidence strengths: an activity label that is the movement
+# itself is ~0.9, a posture or body part that usually accompanies it lower,
+# and context (furniture, equipment) lower still.
+LABEL_MOVEMENT_WEIGHTS: Dict[str, Dict[str, float]] = {
+    # Locomotion
+    'Walking': {'walking': 0.9, 'stride_observation': 0.7, 'heel_walk': 0.4, 'toe_walk': 0.4,
+                'heel_to_toe': 0.4, 'limping': 0.3, 'stepping': 0.5},
+    'Running': {'walking': 0.4, 'stride_observation': 0.5},
+    'Hiking': {'walking': 0.6, 'stride_observation': 0.5, 'climbing': 0.4},
+    'Stairs': {'stepping': 0.6, 'climbing': 0.6, 'descending': 0.6},
+    'Staircase': {'stepping': 0.6, 'climbing': 0.6, 'descending': 0.6},
+    'Handrail': {'climbing': 0.4, 'descending': 0.4},
+    'Banister': {'climbing': 0.4, 'descending': 0.4},
+    'Climbing': {'climbing': 0.9, 'stepping': 0.6},
+    'Footwear': {'heel_walk': 0.2, 'toe_walk': 0.2},
+    # Posture and transfers
+    'Standing': {'standing': 0.9, 'balance': 0.5, 'balance_observation': 0.5, 'one_leg_stand': 0.3,
+                 'eyes_closed': 0.2},
+    'Sitting': {'chair_transfer': 0.5, 'rising': 0.3, 'seated_leg_extension': 0.5},
+    'Chair': {'chair_transfer': 0.4, 'seated_leg_extension': 0.3},
+    'Furniture': {'chair_transfer': 0.2, 'patient_supine': 0.2},
+    'Bed': {'patient_supine': 0.6, 'supine_slr_comparison': 0.4},
+    'Lying Down': {'patient_supine': 0.9, 'supine_slr_comparison': 0.6, 'leg_raise': 0.3},
+    'Couch': {'patient_supine': 0.4},
+    'Squatting': {'squatting': 0.9, 'knee_flexion': 0.6, 'rising': 0.3},
+    'Kneeling': {'knee_flexion': 0.6, 'squatting': 0.4},
+    'Crouching': {'squatting': 0.7, 'knee_flexion': 0.5},
+    'Bending': {'bending': 0.9, 'flexion': 0.7, 'forward_flexion': 0.7},
+    'Leaning': {'bending': 0.5, 'flexion': 0.4, 'extension': 0.3},
+    'Balance': {'balance': 0.9, 'balance_observation': 0.8, 'one_leg_stand': 0.5},
+    'Falling': {'sudden_collapse': 0.7},
+    # Exercise-like movement
+    'Stretch': {'flexion': 0.6, 'extension': 0.6, 'rotation': 0.4, 'leg_raise': 0.4,
+                'overhead_reach': 0.4, 'forward_flexion': 0.5, 'joint_movement': 0.5},
+    'Yoga': {'flexion': 0.5, 'extension': 0.5, 'rotation': 0.4, 'balance': 0.5, 'one_leg_stand': 0.4,
+             'leg_raise': 0.3},
+    'Exercise': {'joint_movement': 0.5, 'limb_movement': 0.6, 'flexion': 0.4, 'extension': 0.4,
+                 'resistance_testing': 0.3, 'muscle_testing': 0.3},
+    'Working Out': {'joint_movement': 0.5, 'limb_movement': 0.6, 'resistance_testing': 0.3,
+                    'muscle_testing': 0.3},
+    'Fitness': {'limb_movement': 0.4, 'joint_movement': 0.4},
+    'Physical Therapy': {'joint_movement': 0.7, 'limb_movement': 0.7, 'resistance_testing': 0.6,
+                         'muscle_testing': 0.6, 'leg_raise': 0.5, 'hip_flexion': 0.4, 'knee_flexion': 0.4,
+                         'position_testing': 0.4},
+    'Rehabilitation': {'joint_movement': 0.6, 'limb_movement': 0.6, 'resistance_testing': 0.5,
+                       'muscle_testing': 0.5},
+    'Dance Pose': {'balance': 0.4, 'one_leg_stand': 0.4, 'rotation': 0.3},
+    'Arm Wrestling': {'resistance_testing': 0.6, 'muscle_testing': 0.6, 'strength_grading': 0.4},
+    # Body parts in view (weak evidence of movement of that part)
+    'Arm': {'arm_abduction': 0.3, 'arm_lowering': 0.3, 'shoulder_flexion': 0.3, 'overhead_reach': 0.3,
+            'limb_movement': 0.3},
+    'Shoulder': {'shoulder_flexion': 0.3, 'arm_abduction': 0.3, 'internal_rotation': 0.2},
+    'Elbow': {'limb_movement': 0.2, 'joint_movement': 0.2},
+    'Hand': {'hands_pressed': 0.3, 'finger_flick': 0.2, 'thumb_flexion': 0.2, 'light_touch': 0.2,
+             'palpation': 0.2},
+    'Wrist': {'wrist_flexion': 0.4, 'hands_pressed': 0.3},
+    'Finger': {'finger_flick': 0.3, 'thumb_flexion': 0.3, 'tapping': 0.2},
+    'Thumbs Up': {'thumb_flexion': 0.2},
+    'Leg': {'leg_raise': 0.3, 'opposite_leg_raise': 0.3, 'hip_flexion': 0.3, 'knee_flexion': 0.3,
+            'limb_movement': 0.3, 'seated_leg_extension': 0.3},
+    'Knee': {'knee_flexion': 0.4, 'knee_press': 0.3, 'anterior_tibial_pull': 0.2},
+    'Thigh': {'hip_flexion': 0.3, 'leg_raise': 0.2},
+    'Foot': {'sole_stroke': 0.3, 'toe_movement': 0.3, 'rapid_dorsiflexion': 0.3, 'heel_lift': 0.2,
+             'toe_lift': 0.2, 'opposite_heel_pressure': 0.2},
+    'Barefoot': {'sole_stroke': 0.4, 'toe_movement': 0.3, 'rapid_dorsiflexion': 0.2},
+    'Toe': {'toe_movement': 0.4, 'toe_walk': 0.2},
+    'Neck': {'neck_extension': 0.4, 'rotation': 0.2, 'axial_pressure': 0.2},
+    'Head': {'head_compression': 0.2, 'neck_extension': 0.2, 'axial_pressure': 0.2},
+    'Back': {'bending': 0.3, 'flexion': 0.2, 'extension': 0.2, 'trunk_rotation': 0.3,
+             'en_bloc_rotation': 0.2, 'light_palpation': 0.2},
+    'Torso': {'trunk_rotation': 0.3, 'en_bloc_rotation': 0.3, 'rotation': 0.2},
+    'Hip': {'hip_flexion': 0.3, 'pelvic_observation': 0.4, 'external_rotation': 0.2},
+    # Examination context
+    'Massage': {'palpation': 0.7, 'light_palpation': 0.6, 'pressure_application': 0.6, 'skin_pinching': 0.3,
+                'downward_pressure': 0.4},
+    'Therapy': {'palpation': 0.4, 'pressure_application': 0.4, 'joint_movement': 0.4},
+    'Doctor': {'palpation': 0.2, 'muscle_testing': 0.2},
+    'Patient': {'patient_supine': 0.2},
+    'Hospital': {'patient_supine': 0.1},
+    'Clinic': {'patient_supine': 0.1},
+    'Hammer': {'hammer_tap': 0.6, 'reflex_response': 0.4, 'tapping': 0.4, 'percussion': 0.4},
+    'Tool': {'hammer_tap': 0.2, 'tuning_fork_application': 0.2, 'pin_touch': 0.2},
+    'Musical Instrument': {'tuning_fork_application': 0.2},
+    'Cotton': {'cotton_wisp': 0.7, 'light_touch': 0.5},
+    'Needle': {'pin_touch': 0.6, 'sharp_dull_alternation': 0.4},
+    'Blindfold': {'eyes_closed': 0.7},
+    'Closed Eyes': {'eyes_closed': 0.9},
+    'Sleeping': {'eyes_closed': 0.4, 'patient_supine': 0.3},
+    'Tickling': {'light_touch': 0.5, 'sole_stroke': 0.3},
+}
+
+# Parent categories (label_parents) pass on this share of their weight, so a
+# specific label always outweighs the category it was filed under
+PARENT_WEIGHT_FACTOR = 0.5
+
+# Movement evidence at or above this counts as the movement being found
+LABEL_EVIDENCE_THRESHOLD = 0.45
+
+# Label vocabularies whose weight matrices are kept per container
+MATRIX_CACHE_SIZE = 32
+
+
+def normalize_label(name: str) -> str:
+    """'Lying Down' → 'lying_down', the spelling movements use"""
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+class LabelMovementIndex:
+    """
+    Dense label × movement weight lookup
+
+    Built once per container from LABEL_MOVEMENT_WEIGHTS and the movement
+    vocabulary. A label whose normalized name is itself a movement
+    ('Walking' → 'walking') maps to it with full weight. A timeline's interned
+    label vocabulary is translated once into a (labels, movements) matrix;
+    a window is then scored with one gather and one reduction.
+    """
+
+    def __init__(
+        self,
+        movements: Iterable[str],
+        weights: Dict[str, Dict[str, float]] = LABEL_MOVEMENT_WEIGHTS,
+        parent_factor: float = PARENT_WEIGHT_FACTOR
+    ):
+        self.movements: List[str] = sorted(set(movements))
+        self.movement_index = {movement: i for i, movement in enumerate(self.movements)}
+        self.parent_factor = parent_factor
+
+        self._label_vectors: Dict[str, np.ndarray] = {}
+        unknown = set()
+        for label, movement_weights in weights.items():
+            vector = np.zeros(len(self.movements), dtype=np.float32)
+            for movement, weight in movement_weights.items():
+                if movement in self.movement_index:
+                    vector[self.movement_index[movement]] = weight
+                else:
+                    unknown.add(movement)
+            self._label_vectors[normalize_label(label)] = vector
+        for movement, i in self.movement_index.items():
+            vector = self._label_vectors.setdefault(movement, np.zeros(len(self.movements), dtype=np.float32))
+            vector[i] = 1.0
+        if unknown:
+            logger.warning(f"Label weights reference unknown movements: {sorted(unknown)}")
+
+        self._zero = np.zeros(len(self.movements), dtype=np.float32)
+        self._matrix_cache: Dict[int, tuple] = {}
+
+    def label_vector(self, name: str, parents: Optional[List[str]] = None) -> np.ndarray:
+        """Movement weights of one label, falling back on its parent categories"""
+        vector = self._label_vectors.get(normalize_label(name), self._zero)
+        for parent in parents or []:
+            parent_vector = self._label_vectors.get(normalize_label(parent))
+            if parent_vector is not None:
+                vector = np.maximum(vector, parent_vector * self.parent_factor)
+        return vector
+
+    def vocabulary_matrix(self, labels: List[str], label_parents: Optional[List[List[str]]] = None) -> np.ndarray:
+        """
+        (len(labels), movements) float32 weights for a timeline's label vocabulary
+
+        Slices of one timeline share its label list, so the matrix is built
+        once per stored timeline and reused for every window queried from it.
+        """
+        cached = self._matrix_cache.get(id(labels))
+        if cached is not None and cached[0] is labels and cached[1].shape[0] == len(labels):
+            return cached[1]
+
+        parents = label_parents or [[] for _ in labels]
+        if labels:
+            matrix = np.stack([self.label_vector(name, names) for name, names in zip(labels, parents)])
+        else:
+            matrix = np.zeros((0, len(self.movements)), dtype=np.float32)
+
+        if len(self._matrix_cache) >= MATRIX_CACHE_SIZE:
+            self._matrix_cache.pop(next(iter(self._matrix_cache)))
+        self._matrix_cache[id(labels)] = (labels, matrix)
+        return matrix
+
+    def movement_evidence(self, timeline, min_confidence: float = 0.0) -> np.ndarray:
+        """
+        Per-movement evidence over a label timeline
+
+        Rows are reduced to each distinct label's peak confidence first, so the
+        weight gather is over the (small) label vocabulary, not every row.
+
+        Returns:
+            float32 (movements,) max over labels of weight × confidence (0-1)
+        """
+        if timeline is None or len(timeline) == 0:
+            return self._zero.copy()
+
+        mask = (timeline.label_ids >= 0) & (timeline.confidence > min_confidence)
+        if not mask.any():
+            return self._zero.copy()
+
+        peak = np.zeros(len(timeline.labels), dtype=np.float32)
+        np.maximum.at(peak, timeline.label_ids[mask], timeline.confidence[mask])
+        present = np.flatnonzero(peak)
+
+        matrix = self.vocabulary_matrix(timeline.labels, timeline.label_parents)
+        return (matrix[present] * (peak[present, None] / 100.0)).max(axis=0)
+
+    def movements_found(
+        self,
+        timeline,
+        expected_movements: List[str],
+        min_confidence: float = 0.0,
+        threshold: float = LABEL_EVIDENCE_THRESHOLD
+    ) -> Dict[str, float]:
+        """Expected movements whose evidence reaches threshold, with that evidence"""
+        evidence = self.movement_evidence(timeline, min_confidence)
+        found = {}
+        for movement in expected_movements:
+            i = self.movement_index.get(movement)
+            if i is not None and evidence[i] >= threshold:
+                found[movement] = round(float(evidence[i]), 3)
+        return found
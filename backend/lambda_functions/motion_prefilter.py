@@ -0,0 +1,175 @@
+"""
+Motion Prefilter - Cheap motion-energy curve used to place pose-estimation frames
+Decodes a clip as tiny grayscale frames, measures frame-to-frame change and
+spends a fixed frame budget densely on motion bursts and sparsely on still periods
+"""
+
+import logging
+import os
+import subprocess
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Analysis grid for the motion-energy curve; also the densest pose sampling rate
+MOTION_ANALYSIS_FPS = float(os.environ.get('MOTION_ANALYSIS_FPS', '10'))
+MOTION_FRAME_WIDTH = 160
+MOTION_FRAME_HEIGHT = 90
+
+# Pose frames per clip when adaptive sampling is enabled (0 = uniform sampling)
+POSE_FRAME_BUDGET = int(os.environ.get('POSE_FRAME_BUDGET', '0'))
+
+# Minimum sampling rate kept during still periods, so a slow movement is never missed entirely
+STILL_SAMPLE_FPS = 0.5
+
+# Frames read from the ffmpeg pipe per chunk (bounds memory on long recordings)
+DECODE_CHUNK_FRAMES = 256
+
+
+def motion_energy_curve(
+    video_path: str,
+    analysis_fps: float = MOTION_ANALYSIS_FPS,
+    start_time: float = 0.0,
+    end_time: Optional[float] = None,
+    width: int = MOTION_FRAME_WIDTH,
+    height: int = MOTION_FRAME_HEIGHT
+) -> Dict[str, np.ndarray]:
+    """
+    Mean absolute frame difference over time on downscaled grayscale frames
+
+    ffmpeg does the decode, resampling and scaling; frames are read from its
+    pipe in fixed-size chunks so memory stays constant for any clip length.
+
+    Args:
+        video_path: Local path (or URL ffmpeg can read) of the clip
+        analysis_fps: Rate of the energy curve
+        start_time: Offset in seconds to start from
+        end_time: Offset in seconds to stop at (default: end of clip)
+
+    Returns:
+        timestamps: float64 (frames,) seconds from the start of the file
+        energy: float32 (frames,) mean absolute pixel change in 0-255 units
+                (the first frame has energy 0)
+    """
+    cmd = ['ffmpeg', '-v', 'error', '-nostdin']
+    if start_time > 0:
+        cmd += ['-ss', str(start_time)]
+    cmd += ['-i', video_path]
+    if end_time is not None:
+        cmd += ['-t', str(max(0.0, end_time - start_time))]
+    cmd += [
+        '-an', '-vf', f'fps={analysis_fps},scale={width}:{height},format=gray',
+        '-f', 'rawvideo', '-pix_fmt', 'gray', 'pipe:1'
+    ]
+
+    frame_bytes = width * height
+    energies = []
+    previous = None
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * DECODE_CHUNK_FRAMES)
+            usable = len(data) - len(data) % frame_bytes
+            if usable == 0:
+                break
+
+            frames = np.frombuffer(data[:usable], dtype=np.uint8).reshape(-1, height, width).astype(np.int16)
+            if previous is not None:
+                frames = np.concatenate([previous[None], frames])
+            diffs = np.abs(np.diff(frames, axis=0)).mean(axis=(1, 2), dtype=np.float32)
+            energies.append(diffs if previous is not None else np.concatenate([[0.0], diffs]).astype(np.float32))
+            previous = frames[-1]
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Motion energy decode failed: {stderr.strip()}")
+
+    energy = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+    timestamps = start_time + np.arange(energy.shape[0], dtype=np.float64) / analysis_fps
+
+    return {'timestamps': timestamps, 'energy': energy}
+
+
+def select_sample_times(
+    timestamps: np.ndarray,
+    energy: np.ndarray,
+    budget: int,
+    still_fps: float = STILL_SAMPLE_FPS
+) -> np.ndarray:
+    """
+    Choose at most `budget` frame times, dense where motion energy is high
+
+    A sparse uniform base (still_fps, capped at a quarter of the budget) keeps
+    still periods covered; the rest of the budget is placed by inverse-CDF
+    sampling of the motion energy above the clip's noise floor. Times are
+    snapped to the analysis grid, so the densest sampling equals its rate.
+
+    Returns:
+        Sorted float64 array of sample times (seconds)
+    """
+    count = timestamps.shape[0]
+    if count == 0 or budget <= 0:
+        return np.zeros(0, dtype=np.float64)
+    if budget >= count:
+        return timestamps.copy()
+
+    duration = float(timestamps[-1] - timestamps[0]) if count > 1 else 0.0
+    base_count = int(min(budget // 4, max(1, duration * still_fps)))
+    base_index = np.linspace(0, count - 1, base_count).round().astype(np.int64)
+
+    # Smooth over ~0.5 s and drop the compression/sensor noise floor
+    window = max(1, int(round(count / max(duration, 1e-6) * 0.5)))
+    smoothed = np.convolve(energy, np.ones(window, dtype=np.float32) / window, mode='same')
+    weight = np.clip(smoothed - np.median(smoothed) * 1.5, 0.0, None)
+
+    motion_index = np.zeros(0, dtype=np.int64)
+    motion_count = budget - base_count
+    if weight.sum() > 0 and motion_count > 0:
+        cdf = np.cumsum(weight)
+        targets = (np.arange(motion_count) + 0.5) / motion_count * cdf[-1]
+        motion_index = np.searchsorted(cdf, targets)
+    else:
+        # No motion anywhere: spend the whole budget uniformly
+        base_index = np.linspace(0, count - 1, budget).round().astype(np.int64)
+
+    chosen = np.unique(np.concatenate([base_index, np.minimum(motion_index, count - 1)]))
+    return timestamps[chosen]
+
+
+def plan_pose_sampling(
+    video_path: str,
+    budget: int = POSE_FRAME_BUDGET,
+    start_time: float = 0.0,
+    end_time: Optional[float] = None,
+    analysis_fps: float = MOTION_ANALYSIS_FPS
+) -> Dict[str, Any]:
+    """
+    Run the prefilter over a clip and pick adaptive pose sample times
+
+    Returns:
+        Dictionary with sample_times, the energy curve and the share of total
+        motion energy that falls on sampled frames
+    """
+    curve = motion_energy_curve(video_path, analysis_fps, start_time, end_time)
+    sample_times = select_sample_times(curve['timestamps'], curve['energy'], budget)
+
+    sampled = np.isin(curve['timestamps'], sample_times)
+    total_energy = float(curve['energy'].sum())
+
+    logger.info(f"Motion prefilter chose {sample_times.shape[0]} of {curve['timestamps'].shape[0]} frames")
+
+    return {
+        'sample_times': sample_times,
+        'timestamps': curve['timestamps'],
+        'energy': curve['energy'],
+        'frames_considered': int(curve['timestamps'].shape[0]),
+        'frames_selected': int(sample_times.shape[0]),
+        'energy_coverage': float(curve['energy'][sampled].sum()) / total_energy if total_energy > 0 else 1.0
+    }
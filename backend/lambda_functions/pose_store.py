@@ -0,0 +1,308 @@
+"""
+Pose Store - Per-session keypoint tracks in chunked, compressed S3 objects
+Each pose estimation run is written as one part: float16 keypoints split into
+fixed-size frame chunks, each compressed on its own behind a JSON time index,
+so a time-range query fetches only the chunks it overlaps (ranged GETs) and
+decompresses them into memory-mapped files in the container's /tmp
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Any, List, Optional
+
+import boto3
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+POSE_STORE_PREFIX = 'cme-poses'
+
+# Frames per compressed chunk (about 50 s at the default 5 fps sampling)
+POSE_CHUNK_FRAMES = int(os.environ.get('POSE_CHUNK_FRAMES', '256'))
+
+# Decompressed chunks are kept here as .npy files and opened memory-mapped
+POSE_CACHE_DIR = os.environ.get('POSE_CACHE_DIR', '/tmp/cme-poses')
+
+PART_MAGIC = b'CMEPOSE1'
+PART_PREAMBLE = struct.Struct('<8sI')
+
+# First read of a part; holds the index of a part over an hour long
+# (longer indexes take a second read)
+HEADER_PROBE_BYTES = 8192
+
+# Part indexes already read by this container, keyed by bucket/key
+_part_headers: Dict[str, Dict[str, Any]] = {}
+_part_headers_lock = threading.Lock()
+
+
+def encode_chunk(timestamps: np.ndarray, keypoints: np.ndarray) -> bytes:
+    """
+    Compress one chunk: float64 timestamps, then float16 keypoints byte-shuffled
+
+    Shuffling puts the high bytes (sign, exponent) of every value together,
+    which zlib compresses far better than interleaved float16.
+    """
+    shuffled = np.ascontiguousarray(keypoints.astype(np.float16)).view(np.uint8).reshape(-1, 2).T
+    return zlib.compress(timestamps.astype(np.float64).tobytes() + shuffled.tobytes(), 6)
+
+
+def decode_chunk(data: bytes, frames: int, persons: int, landmarks: int) -> tuple:
+    """Inverse of encode_chunk: (timestamps float64, keypoints float16 (frames, persons, landmarks, 3))"""
+    raw = zlib.decompress(data)
+    timestamps = np.frombuffer(raw[:frames * 8], dtype=np.float64)
+    shuffled = np.frombuffer(raw[frames * 8:], dtype=np.uint8).reshape(2, -1)
+    keypoints = np.ascontiguousarray(shuffled.T).view(np.float16).reshape(frames, persons, landmarks, 3)
+    return timestamps, keypoints
+
+
+def part_key(session_id: str, start: float, end: float, digest: str, prefix: str = POSE_STORE_PREFIX) -> str:
+    """S3 key of a part; the time range in the name lets a listing act as the session index"""
+    return f"{prefix}/{session_id}/{int(round(start * 1000)):010d}-{int(round(end * 1000)):010d}-{digest[:12]}.pose"
+
+
+def _part_range(key: str) -> Optional[tuple]:
+    """(start, end) seconds encoded in a part key"""
+    try:
+        start_ms, end_ms, _ = os.path.basename(key)[:-len('.pose')].split('-')
+        return int(start_ms) / 1000.0, int(end_ms) / 1000.0
+    except ValueError:
+        return None
+
+
+class PoseTrackStore:
+    """
+    Pose tracks of one session, written per estimation run and read by time range
+
+    Keypoints are (frames, persons, 33, 3) normalized x, y and visibility, NaN
+    where no pose was found; timestamps are seconds of recording time. Parts
+    written concurrently by batch workers never share a key.
+    """
+
+    def __init__(
+        self,
+        s3_bucket: str,
+        session_id: str,
+        s3_client=None,
+        prefix: str = POSE_STORE_PREFIX,
+        cache_dir: str = POSE_CACHE_DIR,
+        chunk_frames: int = POSE_CHUNK_FRAMES
+    ):
+        self.s3_bucket = s3_bucket
+        self.session_id = session_id
+        self.s3_client = s3_client or boto3.client('s3')
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self.chunk_frames = chunk_frames
+        self.bytes_read = 0
+        self._parts: Optional[Dict[str, tuple]] = None
+        self._lock = threading.Lock()
+
+    def parts(self) -> Dict[str, tuple]:
+        """Part keys of the session with their (start, end) seconds (one listing per store)"""
+        with self._lock:
+            if self._parts is None:
+                parts = {}
+                paginator = self.s3_client.get_paginator('list_objects_v2')
+                for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=f"{self.prefix}/{self.session_id}/"):
+                    for item in page.get('Contents', []):
+                        time_range = _part_range(item['Key'])
+                        if item['Key'].endswith('.pose') and time_range:
+                            parts[item['Key']] = time_range
+                self._parts = parts
+            return dict(self._parts)
+
+    def write(
+        self,
+        timestamps: np.ndarray,
+        keypoints: np.ndarray,
+        aspect_ratio: float,
+        sample_fps: Optional[float] = None,
+        source: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Store one estimation run as a part
+
+        Args:
+            timestamps: (frames,) seconds of recording time, increasing
+            keypoints: (frames, persons, landmarks, 3) pose estimates
+            aspect_ratio: Frame width / height of the estimated frames
+            source: Clip the poses were estimated on, kept in the index
+
+        Returns:
+            Dictionary with key, frames, chunks and stored / raw float32 bytes
+            (None when there are no frames)
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if timestamps.size == 0:
+            return None
+        frames, persons, landmarks, _ = keypoints.shape
+
+        chunks, blobs, offset = [], [], 0
+        for first in range(0, frames, self.chunk_frames):
+            last = min(first + self.chunk_frames, frames)
+            blob = encode_chunk(timestamps[first:last], keypoints[first:last])
+            chunks.append({
+                'start': float(timestamps[first]),
+                'end': float(timestamps[last - 1]),
+                'frames': last - first,
+                'offset': offset,
+                'length': len(blob)
+            })
+            blobs.append(blob)
+            offset += len(blob)
+
+        header = json.dumps({
+            'version': 1,
+            'dtype': 'float16',
+            'frames': frames,
+            'persons': persons,
+            'landmarks': landmarks,
+            'aspect_ratio': float(aspect_ratio),
+            'sample_fps': sample_fps,
+            'source': source,
+            'start': float(timestamps[0]),
+            'end': float(timestamps[-1]),
+            'chunks': chunks
+        }).encode('utf-8')
+
+        body = PART_PREAMBLE.pack(PART_MAGIC, len(header)) + header + b''.join(blobs)
+        digest = hashlib.sha256(body).hexdigest()
+        key = part_key(self.session_id, timestamps[0], timestamps[-1], digest, self.prefix)
+        self.s3_client.put_object(Bucket=self.s3_bucket, Key=key, Body=body, ContentType='application/octet-stream')
+
+        with self._lock:
+            if self._parts is not None:
+                self._parts[key] = (float(timestamps[0]), float(timestamps[-1]))
+
+        logger.info(f"Stored {frames} pose frames for session {self.session_id} at {key}: "
+                    f"{len(body)} bytes ({keypoints.size * 4} as float32)")
+        return {
+            'key': key,
+            'frames': frames,
+            'chunks': len(chunks),
+            'stored_bytes': len(body),
+            'raw_bytes': int(keypoints.size * 4)
+        }
+
+    def covers(self, start_time: float, end_time: float, max_gap: float = 1.0) -> bool:
+        """Whether stored parts span start_time..end_time with no hole longer than max_gap seconds"""
+        reached = start_time
+        for part_start, part_end in sorted(self.parts().values()):
+            if part_start > reached + max_gap:
+                break
+            reached = max(reached, part_end)
+        return reached + max_gap >= end_time
+
+    def load_range(self, start_time: float, end_time: float, dtype=np.float32) -> Dict[str, Any]:
+        """
+        Pose frames with start_time <= t <= end_time from every overlapping part
+
+        Only the chunks overlapping the range are fetched. Frames present in
+        more than one part (overlapping runs) are returned once.
+
+        Returns:
+            Dictionary with timestamps (float64), keypoints (dtype, frames x
+            persons x landmarks x 3), aspect_ratio and frames_processed, like
+            PoseEstimationEngine's estimates
+        """
+        pieces = []
+        aspect_ratio = None
+        for key, (part_start, part_end) in sorted(self.parts().items(), key=lambda item: item[1]):
+            if part_end < start_time or part_start > end_time:
+                continue
+            header = self._header(key)
+            aspect_ratio = aspect_ratio or header['aspect_ratio']
+            wanted = [i for i, chunk in enumerate(header['chunks'])
+                      if chunk['end'] >= start_time and chunk['start'] <= end_time]
+            for timestamps, keypoints in self._chunks(key, header, wanted):
+                in_range = (timestamps >= start_time) & (timestamps <= end_time)
+                pieces.append((timestamps[in_range], keypoints[in_range]))
+
+        if not pieces:
+            return {
+                'timestamps': np.zeros(0, dtype=np.float64),
+                'keypoints': np.zeros((0, 1, 33, 3), dtype=dtype),
+                'aspect_ratio': 16 / 9,
+                'frames_processed': 0
+            }
+
+        persons = max(keypoints.shape[1] for _, keypoints in pieces)
+        landmarks = pieces[0][1].shape[2]
+        timestamps = np.concatenate([t for t, _ in pieces])
+        keypoints = np.full((timestamps.size, persons, landmarks, 3), np.nan, dtype=dtype)
+        row = 0
+        for piece_times, piece_keypoints in pieces:
+            keypoints[row:row + piece_times.size, :piece_keypoints.shape[1]] = piece_keypoints
+            row += piece_times.size
+
+        timestamps, first = np.unique(timestamps, return_index=True)
+        return {
+            'timestamps': timestamps,
+            'keypoints': keypoints[first],
+            'aspect_ratio': aspect_ratio,
+            'frames_processed': int(timestamps.size)
+        }
+
+    def _read(self, key: str, first_byte: int, last_byte: int) -> bytes:
+        response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key, Range=f"bytes={first_byte}-{last_byte}")
+        data = response['Body'].read()
+        with self._lock:
+            self.bytes_read += len(data)
+        return data
+
+    def _header(self, key: str) -> Dict[str, Any]:
+        """Index of a part, from its first bytes (cached per container)"""
+        cache_key = f"{self.s3_bucket}/{key}"
+        with _part_headers_lock:
+            if cache_key in _part_headers:
+                return _part_headers[cache_key]
+
+        probe = self._read(key, 0, HEADER_PROBE_BYTES - 1)
+        magic, header_length = PART_PREAMBLE.unpack_from(probe)
+        if magic != PART_MAGIC:
+            raise ValueError(f"{key} is not a pose part")
+        end = PART_PREAMBLE.size + header_length
+        if end > len(probe):
+            probe += self._read(key, len(probe), end - 1)
+
+        header = json.loads(probe[PART_PREAMBLE.size:end].decode('utf-8'))
+        header['data_offset'] = end
+        with _part_headers_lock:
+            _part_headers[cache_key] = header
+        return header
+
+    def _chunks(self, key: str, header: Dict[str, Any], indices: List[int]) -> List[tuple]:
+        """Memory-mapped (timestamps, keypoints) of the given chunks, fetching the missing ones in one read"""
+        digest = hashlib.sha256(f"{self.s3_bucket}/{key}".encode('utf-8')).hexdigest()[:24]
+        paths = {i: os.path.join(self.cache_dir, f"{digest}_{i:05d}") for i in indices}
+        missing = [i for i in indices if not os.path.exists(paths[i] + '_kp.npy')]
+
+        if missing:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            chunks = header['chunks']
+            # Wanted chunks are contiguous, so one ranged GET covers them
+            first = header['data_offset'] + chunks[missing[0]]['offset']
+            last = header['data_offset'] + chunks[missing[-1]]['offset'] + chunks[missing[-1]]['length'] - 1
+            data = self._read(key, first, last)
+            for i in missing:
+                begin = header['data_offset'] + chunks[i]['offset'] - first
+                timestamps, keypoints = decode_chunk(
+                    data[begin:begin + chunks[i]['length']],
+                    chunks[i]['frames'], header['persons'], header['landmarks']
+                )
+                # Write then rename, so a concurrent reader never maps a partial file
+                for suffix, array in (('_ts.npy', timestamps), ('_kp.npy', keypoints)):
+                    temporary = f"{paths[i]}{suffix}.{threading.get_ident()}"
+                    np.save(temporary, array)
+                    os.replace(temporary + '.npy', paths[i] + suffix)
+
+        return [
+            (np.load(paths[i] + '_ts.npy', mmap_mode='r'), np.load(paths[i] + '_kp.npy', mmap_mode='r'))
+            for i in indices
+        ]
@@ -0,0 +1,330 @@
+"""
+Recording Integrity - Chain-of-custody fingerprint of an uploaded recording
+Reads the object as parallel ranged GETs, hashes the chunks concurrently and
+combines them into a Merkle tree root (RFC 6962 hashing), so the byte range
+behind any clip can later be verified by rehashing only its chunks
+"""
+
+import hashlib
+import logging
+import math
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Leaf size; raised for very large objects so a session holds at most
+# RECORDING_HASH_MAX_CHUNKS chunk hashes (~70 KB in the session item)
+RECORDING_HASH_CHUNK_BYTES = int(os.environ.get('RECORDING_HASH_CHUNK_BYTES', str(8 * 1024 * 1024)))
+RECORDING_HASH_MAX_CHUNKS = 1024
+
+# Concurrent ranged GETs; one S3 stream tops out well below what a Lambda can hash
+RECORDING_HASH_WORKERS = int(os.environ.get('RECORDING_HASH_WORKERS', '16'))
+
+# Bytes handed to the hash per read of a ranged GET body
+HASH_READ_BYTES = 1024 * 1024
+
+# Domain separation of leaves and interior nodes (RFC 6962 section 2.1)
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+INTEGRITY_ALGORITHM = 'sha256-merkle-rfc6962'
+
+
+def chunk_size_for(object_bytes: int, chunk_bytes: int = RECORDING_HASH_CHUNK_BYTES) -> int:
+    """Chunk size for an object: chunk_bytes, grown in whole MiB to stay within RECORDING_HASH_MAX_CHUNKS"""
+    needed = math.ceil(object_bytes / RECORDING_HASH_MAX_CHUNKS)
+    if needed <= chunk_bytes:
+        return chunk_bytes
+    mib = 1024 * 1024
+    return math.ceil(needed / mib) * mib
+
+
+def chunk_ranges(object_bytes: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """[start, end) byte range of every chunk (one empty chunk for an empty object)"""
+    if object_bytes == 0:
+        return [(0, 0)]
+    return [(start, min(start + chunk_bytes, object_bytes)) for start in range(0, object_bytes, chunk_bytes)]
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _split(count: int) -> int:
+    """Largest power of two smaller than count"""
+    return 1 << ((count - 1).bit_length() - 1)
+
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    """
+    Root of the Merkle tree over leaf hashes
+
+    The tree is the RFC 6962 shape: the left subtree holds the largest power
+    of two of leaves, so the root is defined for any leaf count.
+    """
+    if not leaves:
+        return hashlib.sha256(b'').digest()
+    if len(leaves) == 1:
+        return leaves[0]
+    k = _split(len(leaves))
+    return _node(merkle_root(leaves[:k]), merkle_root(leaves[k:]))
+
+
+def audit_path(leaves: List[bytes], index: int) -> List[bytes]:
+    """Sibling hashes from leaf index up to the root (RFC 6962 PATH)"""
+    if len(leaves) <= 1:
+        return []
+    k = _split(len(leaves))
+    if index < k:
+        return audit_path(leaves[:k], index) + [merkle_root(leaves[k:])]
+    return audit_path(leaves[k:], index - k) + [merkle_root(leaves[:k])]
+
+
+def verify_audit_path(leaf: bytes, index: int, count: int, path: List[bytes], root: bytes) -> bool:
+    """Check one leaf hash against the root with its audit path (RFC 9162 section 2.1.3.2)"""
+    if index >= count:
+        return False
+    fn, sn, result = index, count - 1, leaf
+    for sibling in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            result = _node(sibling, result)
+            while not fn & 1 and fn:
+                fn >>= 1
+                sn >>= 1
+        else:
+            result = _node(result, sibling)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and result == root
+
+
+def hash_chunk(s3_client, s3_bucket: str, s3_key: str, start: int, end: int, etag: Optional[str] = None) -> bytes:
+    """
+    Leaf hash of bytes [start, end) of an object, read with one ranged GET
+
+    With etag, the read fails if the object was replaced since it was
+    sized, so every chunk hashes the same version.
+    """
+    digest = hashlib.sha256(LEAF_PREFIX)
+    if end > start:
+        request = {'Bucket': s3_bucket, 'Key': s3_key, 'Range': f"bytes={start}-{end - 1}"}
+        if etag:
+            request['IfMatch'] = etag
+        body = s3_client.get_object(**request)['Body']
+        try:
+            # hashlib releases the GIL on large updates, so chunks hash in parallel
+            for data in iter(lambda: body.read(HASH_READ_BYTES), b''):
+                digest.update(data)
+        finally:
+            body.close()
+    return digest.digest()
+
+
+def hash_chunks(
+    s3_client,
+    s3_bucket: str,
+    s3_key: str,
+    ranges: List[Tuple[int, int]],
+    etag: Optional[str] = None,
+    workers: int = RECORDING_HASH_WORKERS
+) -> List[bytes]:
+    """Leaf hashes of the given byte ranges, read concurrently, in range order"""
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as pool:
+        return list(pool.map(lambda byte_range: hash_chunk(s3_client, s3_bucket, s3_key, *byte_range, etag=etag), ranges))
+
+
+def hash_recording(
+    s3_bucket: str,
+    s3_key: str,
+    s3_client=None,
+    chunk_bytes: int = RECORDING_HASH_CHUNK_BYTES,
+    workers: int = RECORDING_HASH_WORKERS
+) -> Dict[str, Any]:
+    """
+    Merkle fingerprint of a recording in S3
+
+    Args:
+        s3_bucket: Bucket holding the recording
+        s3_key: Key of the recording
+        chunk_bytes: Leaf size (grown for very large objects, see chunk_size_for)
+        workers: Concurrent ranged GETs
+
+    Returns:
+        Dictionary with algorithm, root and chunk_hashes (hex), chunk_bytes,
+        object_bytes, the etag and version_id that were hashed, hash_seconds
+        and throughput_mib_s
+    """
+    s3_client = s3_client or boto3.client('s3')
+    head = s3_client.head_object(Bucket=s3_bucket, Key=s3_key)
+    object_bytes = int(head['ContentLength'])
+    etag = head.get('ETag')
+    chunk_bytes = chunk_size_for(object_bytes, chunk_bytes)
+
+    started = time.perf_counter()
+    leaves = hash_chunks(s3_client, s3_bucket, s3_key, chunk_ranges(object_bytes, chunk_bytes), etag, workers)
+    root = merkle_root(leaves)
+    hash_seconds = time.perf_counter() - started
+
+    throughput = object_bytes / 2 ** 20 / max(hash_seconds, 1e-6)
+    logger.info(f"Integrity root of {s3_key}: {root.hex()} over {len(leaves)} chunks of {chunk_bytes} bytes "
+                f"({object_bytes} bytes in {hash_seconds:.2f}s, {throughput:.0f} MiB/s)")
+
+    return {
+        'algorithm': INTEGRITY_ALGORITHM,
+        'root': root.hex(),
+        'chunk_hashes': [leaf.hex() for leaf in leaves],
+        'chunk_bytes': chunk_bytes,
+        'object_bytes': object_bytes,
+        'etag': etag,
+        'version_id': head.get('VersionId'),
+        'hash_seconds': round(hash_seconds, 3),
+        'throughput_mib_s': round(throughput, 1)
+    }
+
+
+def verify_chunks(
+    s3_bucket: str,
+    s3_key: str,
+    integrity: Dict[str, Any],
+    indices: List[int],
+    s3_client=None,
+    workers: int = RECORDING_HASH_WORKERS
+) -> Dict[str, Any]:
+    """
+    Verify the given chunks of a recording against its stored fingerprint
+
+    The stored chunk hashes are first checked against the stored root; then
+    only the given chunks are read and rehashed. The first and last chunks are
+    always included, since they hold the container header and index a player
+    needs to decode any part of the recording.
+
+    Returns:
+        Dictionary with verified, root_matches, chunks (indices checked),
+        mismatched (indices whose bytes changed), bytes_read and proofs
+        (audit path of each checked chunk, hex, so a third party holding
+        only the root can check the same chunks)
+    """
+    s3_client = s3_client or boto3.client('s3')
+    chunk_bytes = int(integrity['chunk_bytes'])
+    object_bytes = int(integrity['object_bytes'])
+    leaves = [bytes.fromhex(leaf) for leaf in integrity['chunk_hashes']]
+    root_matches = merkle_root(leaves).hex() == integrity['root']
+
+    ranges = chunk_ranges(object_bytes, chunk_bytes)
+    indices = sorted({0, len(ranges) - 1, *indices})
+
+    rehashed = hash_chunks(s3_client, s3_bucket, s3_key, [ranges[index] for index in indices], workers=workers)
+    mismatched = [index for index, leaf in zip(indices, rehashed) if leaf != leaves[index]]
+
+    return {
+        'verified': root_matches and not mismatched,
+        'root_matches': root_matches,
+        'chunks': indices,
+        'mismatched': mismatched,
+        'bytes_read': sum(ranges[index][1] - ranges[index][0] for index in indices),
+        'proofs': {str(index): [node.hex() for node in audit_path(leaves, index)] for index in indices}
+    }
+
+
+def byte_range_chunks(integrity: Dict[str, Any], first_byte: int, end_byte: int) -> List[int]:
+    """Indices of the chunks holding bytes [first_byte, end_byte) of the recording"""
+    chunk_bytes = int(integrity['chunk_bytes'])
+    count = len(integrity['chunk_hashes'])
+    first = max(0, min(first_byte // chunk_bytes, count - 1))
+    last = max(first, min(math.ceil(end_byte / chunk_bytes), count) - 1)
+    return list(range(first, last + 1))
+
+
+def clip_chunks(integrity: Dict[str, Any], start_time: float, end_time: float) -> List[int]:
+    """Indices of the chunks a clip (start_time to end_time seconds) decodes from, per the ingest time index"""
+    return [
+        index for index, span in enumerate(integrity.get('chunk_times') or [])
+        if span and float(span[0]) <= end_time and float(span[1]) >= start_time
+    ]
+
+
+def chunk_time_spans(source: str, chunk_bytes: int, chunk_count: int) -> List[Optional[List[float]]]:
+    """
+    Presentation-time span (seconds) of the packets stored in each chunk
+
+    One ffprobe pass over packet headers, without decoding, streamed so memory
+    stays flat on long recordings. Each packet counts until the next keyframe
+    of its stream, since a clip starting anywhere before then decodes from
+    the packets since the last keyframe, so the chunks whose span overlaps a
+    clip are the chunks needed to cut it. Chunks holding no packets
+    (container header or index) are None.
+    """
+    spans: List[Optional[List[float]]] = [None] * chunk_count
+
+    def extend(first: int, last: int, low: float, high: float) -> None:
+        for index in range(max(0, first), min(last, chunk_count - 1) + 1):
+            span = spans[index]
+            if span is None:
+                spans[index] = [low, high]
+            else:
+                span[0], span[1] = min(span[0], low), max(span[1], high)
+
+    # Stream -> chunks holding its packets since its latest keyframe
+    open_gops: Dict[str, set] = {}
+    end_time = 0.0
+    process = subprocess.Popen([
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'packet=stream_index,pts_time,dts_time,size,pos,flags',
+        '-of', 'compact=p=0', source
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        for line in process.stdout:
+            packet = dict(field.split('=', 1) for field in line.strip().split('|') if '=' in field)
+            time_text = packet.get('pts_time', 'N/A')
+            if time_text == 'N/A':
+                time_text = packet.get('dts_time', 'N/A')
+            if time_text == 'N/A' or packet.get('pos', 'N/A') == 'N/A':
+                continue
+            packet_time, pos = float(time_text), int(packet['pos'])
+            first, last = pos // chunk_bytes, (pos + max(int(packet.get('size', 1)), 1) - 1) // chunk_bytes
+            extend(first, last, packet_time, packet_time)
+            end_time = max(end_time, packet_time)
+
+            stream = packet.get('stream_index', '')
+            if 'K' in packet.get('flags', ''):
+                for index in open_gops.pop(stream, ()):
+                    extend(index, index, packet_time, packet_time)
+            open_gops.setdefault(stream, set()).update(range(first, last + 1))
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffprobe failed: {stderr.strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    # The last group of pictures of each stream runs to the end of the recording
+    for chunks in open_gops.values():
+        for index in chunks:
+            extend(index, index, end_time, end_time)
+
+    return [[round(span[0], 3), round(span[1], 3)] if span else None for span in spans]
+
+
+def fingerprint_recording(s3_bucket: str, s3_key: str, source: str, s3_client=None) -> Dict[str, Any]:
+    """
+    hash_recording plus the chunk_times index (see chunk_time_spans), so a clip
+    can later be verified by time without probing the recording again
+
+    A failed index is logged and left out; the fingerprint stands without it.
+    """
+    integrity = hash_recording(s3_bucket, s3_key, s3_client=s3_client)
+    try:
+        integrity['chunk_times'] = chunk_time_spans(source, integrity['chunk_bytes'], len(integrity['chunk_hashes']))
+    except Exception as e:
+        logger.error(f"Chunk time index failed for {s3_key}: {str(e)}")
+    return integrity
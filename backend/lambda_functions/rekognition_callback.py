@@ -0,0 +1,383 @@
+"""
+Rekognition Callback Lambda - Resumes Step Functions when Rekognition jobs finish
+Rekognition publishes job completion to SNS; this handler records each completion
+and sends the waiting task token back to Step Functions once every job is done
+"""
+
+import json
+import boto3
+import logging
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+CME_REKOGNITION_JOBS_TABLE = os.environ.get('CME_REKOGNITION_JOBS_TABLE', 'cme-rekognition-jobs')
+
+# Registry rows expire after a day so abandoned callbacks do not accumulate
+REGISTRY_TTL_SECONDS = 86400
+
+# Get API that reports the status of each job type
+JOB_STATUS_APIS = {
+    'motion_analysis': 'get_label_detection',
+    'pose_detection': 'get_person_tracking'
+}
+
+class RekognitionJobRegistry:
+    """
+    DynamoDB-backed registry linking Rekognition job IDs to a waiting task token
+
+    One callback row (keyed by callback_id) holds the task token, the caller's
+    context and the set of still-pending job IDs. One row per job (keyed by
+    job_id) points back to its callback row.
+    """
+
+    def __init__(self, table_name: str = CME_REKOGNITION_JOBS_TABLE):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def register(
+        self,
+        callback_id: str,
+        task_token: str,
+        jobs: Dict[str, str],
+        context: Dict[str, Any]
+    ) -> None:
+        """
+        Register a set of jobs that must all finish before the task resumes
+
+        Args:
+            callback_id: Unique ID for this wait (one per declared test or session)
+            task_token: Step Functions task token to resume
+            jobs: Mapping of job_type -> Rekognition JobId
+            context: JSON-serialisable context returned with the task output
+        """
+        expires_at = int(time.time()) + REGISTRY_TTL_SECONDS
+
+        self.table.put_item(Item={
+            'job_id': callback_id,
+            'task_token': task_token,
+            'pending': set(jobs.values()),
+            'jobs': {job_type: {'job_id': job_id, 'status': 'IN_PROGRESS'} for job_type, job_id in jobs.items()},
+            'context': json.dumps(context, default=str),
+            'expires_at': expires_at
+        })
+
+        for job_type, job_id in jobs.items():
+            self.table.put_item(Item={
+                'job_id': job_id,
+                'callback_id': callback_id,
+                'job_type': job_type,
+                'expires_at': expires_at
+            })
+
+    def complete_job(self, job_id: str, status: str) -> Optional[Dict[str, Any]]:
+        """
+        Record a job completion
+
+        Returns:
+            The callback record once no jobs remain pending (or a job failed),
+            otherwise None
+        """
+        job_row = self.table.get_item(Key={'job_id': job_id}).get('Item')
+        if not job_row:
+            logger.warning(f"No callback registered for Rekognition job {job_id}")
+            return None
+
+        callback_id = job_row['callback_id']
+        job_type = job_row['job_type']
+
+        # DELETE on a string set is atomic, so concurrent notifications for the
+        # same callback cannot both observe an empty pending set
+        response = self.table.update_item(
+            Key={'job_id': callback_id},
+            UpdateExpression='SET jobs.#job_type.#status = :status DELETE pending :job',
+            ExpressionAttributeNames={'#job_type': job_type, '#status': 'status'},
+            ExpressionAttributeValues={':job': {job_id}, ':status': status},
+            ReturnValues='ALL_NEW'
+        )
+        callback = response.get('Attributes', {})
+
+        if (status != 'SUCCEEDED' or not callback.get('pending')) and self._claim(callback_id):
+            return _callback_record(callback_id, callback)
+        return None
+
+    def _claim(self, callback_id: str) -> bool:
+        """Mark a callback as resumed; only the first caller wins"""
+        try:
+            self.table.update_item(
+                Key={'job_id': callback_id},
+                UpdateExpression='SET resumed = :true',
+                ConditionExpression='attribute_not_exists(resumed)',
+                ExpressionAttributeValues={':true': True}
+            )
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+
+class InMemoryJobRegistry:
+    """Local stand-in for RekognitionJobRegistry used for offline runs"""
+
+    def __init__(self):
+        self.callbacks: Dict[str, Dict[str, Any]] = {}
+        self.job_index: Dict[str, Dict[str, str]] = {}
+
+    def register(
+        self,
+        callback_id: str,
+        task_token: str,
+        jobs: Dict[str, str],
+        context: Dict[str, Any]
+    ) -> None:
+        self.callbacks[callback_id] = {
+            'task_token': task_token,
+            'pending': set(jobs.values()),
+            'jobs': {job_type: {'job_id': job_id, 'status': 'IN_PROGRESS'} for job_type, job_id in jobs.items()},
+            'context': json.dumps(context, default=str)
+        }
+        for job_type, job_id in jobs.items():
+            self.job_index[job_id] = {'callback_id': callback_id, 'job_type': job_type}
+
+    def complete_job(self, job_id: str, status: str) -> Optional[Dict[str, Any]]:
+        job_row = self.job_index.get(job_id)
+        if not job_row:
+            logger.warning(f"No callback registered for Rekognition job {job_id}")
+            return None
+
+        callback_id = job_row['callback_id']
+        callback = self.callbacks[callback_id]
+        callback['pending'].discard(job_id)
+        callback['jobs'][job_row['job_type']]['status'] = status
+
+        if (status != 'SUCCEEDED' or not callback['pending']) and not callback.get('resumed'):
+            callback['resumed'] = True
+            return _callback_record(callback_id, callback)
+        return None
+
+
+class LocalStepFunctions:
+    """
+    Local stand-in for the Step Functions task-token API
+
+    Records every task outcome and optionally forwards successful outputs to
+    on_success, which lets an offline run chain straight into finalisation.
+    """
+
+    def __init__(self, on_success=None):
+        self.outcomes: Dict[str, Dict[str, Any]] = {}
+        self.on_success = on_success
+
+    def send_task_success(self, taskToken: str, output: str) -> Dict[str, Any]:
+        self.outcomes[taskToken] = {'status': 'SUCCEEDED', 'output': json.loads(output)}
+        if self.on_success:
+            self.on_success(json.loads(output))
+        return {}
+
+    def send_task_failure(self, taskToken: str, error: str = '', cause: str = '') -> Dict[str, Any]:
+        self.outcomes[taskToken] = {'status': 'FAILED', 'error': error, 'cause': cause}
+        return {}
+
+
+class LocalRekognitionClient:
+    """
+    Local stand-in for the asynchronous Rekognition video APIs
+
+    Start calls return sequential job IDs and are remembered until the owning
+    channel completes them; Get calls return the canned responses set on
+    label_response / person_response. The synchronous DetectLabels calls of
+    image mode return image_label_response (Person instances included) and
+    are counted.
+    """
+
+    def __init__(self):
+        self.job_count = 0
+        self.started: List[Dict[str, Any]] = []
+        self.label_response: Dict[str, Any] = {'Labels': []}
+        self.person_response: Dict[str, Any] = {'Persons': []}
+        self.image_label_response: Dict[str, Any] = {'Labels': []}
+        self.image_calls = 0
+
+    def _start(self, api: str, **kwargs) -> Dict[str, Any]:
+        self.job_count += 1
+        job_id = f"local-{api}-{self.job_count}"
+        self.started.append({'job_id': job_id, 'api': api, 'job_tag': kwargs.get('JobTag', '')})
+        return {'JobId': job_id}
+
+    def start_label_detection(self, **kwargs) -> Dict[str, Any]:
+        return self._start('StartLabelDetection', **kwargs)
+
+    def start_person_tracking(self, **kwargs) -> Dict[str, Any]:
+        return self._start('StartPersonTracking', **kwargs)
+
+    def _status(self, job_id: str) -> str:
+        # Jobs stay in progress until the channel publishes their completion
+        return 'IN_PROGRESS' if any(job['job_id'] == job_id for job in self.started) else 'SUCCEEDED'
+
+    def get_label_detection(self, JobId: str, **kwargs) -> Dict[str, Any]:
+        return {'JobStatus': self._status(JobId), **self.label_response}
+
+    def get_person_tracking(self, JobId: str, **kwargs) -> Dict[str, Any]:
+        return {'JobStatus': self._status(JobId), **self.person_response}
+
+    def detect_labels(self, **kwargs) -> Dict[str, Any]:
+        self.image_calls += 1
+        return dict(self.image_label_response)
+
+
+class LocalRekognitionChannel:
+    """
+    Offline replacement for Rekognition, SNS and Step Functions task tokens
+
+    Bundles an in-memory registry, a local task-token API and a local
+    Rekognition client, and delivers Rekognition-shaped completion
+    notifications through the real handler code.
+    """
+
+    def __init__(self, on_success=None):
+        self.registry = InMemoryJobRegistry()
+        self.stepfunctions = LocalStepFunctions(on_success=on_success)
+        self.rekognition = LocalRekognitionClient()
+
+    def complete_all(self, status: str = 'SUCCEEDED') -> List[Dict[str, Any]]:
+        """Finish every job started on the local Rekognition client"""
+        resumed = []
+        while self.rekognition.started:
+            job = self.rekognition.started.pop(0)
+            resumed.extend(self.notify(job['job_id'], job['api'], status, job['job_tag']))
+        return resumed
+
+    def notify(self, job_id: str, api: str, status: str = 'SUCCEEDED', job_tag: str = '') -> List[Dict[str, Any]]:
+        """Deliver one completion notification as Rekognition would publish it"""
+        event = build_sns_event(job_id, api, status, job_tag)
+        return process_notifications(event, self.registry, self.stepfunctions)
+
+
+def build_sns_event(job_id: str, api: str, status: str = 'SUCCEEDED', job_tag: str = '') -> Dict[str, Any]:
+    """Build an SNS Lambda event carrying a Rekognition completion message"""
+    message = {
+        'JobId': job_id,
+        'Status': status,
+        'API': api,
+        'JobTag': job_tag,
+        'Timestamp': int(time.time() * 1000)
+    }
+    return {'Records': [{'EventSource': 'aws:sns', 'Sns': {'Message': json.dumps(message)}}]}
+
+
+def _callback_record(callback_id: str, callback: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalise a callback row into the task output sent to Step Functions"""
+    return {
+        'callback_id': callback_id,
+        'task_token': callback.get('task_token'),
+        'jobs': callback.get('jobs', {}),
+        'context': json.loads(callback.get('context') or '{}')
+    }
+
+
+def process_notifications(event: Dict[str, Any], registry, stepfunctions_client) -> List[Dict[str, Any]]:
+    """
+    Apply every Rekognition notification in an SNS event and resume finished tasks
+
+    Returns:
+        List of task outputs that were sent back to Step Functions
+    """
+    resumed = []
+
+    for record in event.get('Records', []):
+        message = json.loads(record.get('Sns', {}).get('Message', '{}'))
+        job_id = message.get('JobId')
+        status = message.get('Status', 'FAILED')
+
+        if not job_id:
+            logger.warning(f"Ignoring notification without JobId: {message}")
+            continue
+
+        logger.info(f"Rekognition {message.get('API')} job {job_id} finished with {status}")
+
+        callback = registry.complete_job(job_id, status)
+        if callback:
+            resumed.append(_resume_task(callback, stepfunctions_client))
+
+    return resumed
+
+
+def _resume_task(callback: Dict[str, Any], stepfunctions_client) -> Dict[str, Any]:
+    """Send a finished callback's output to its waiting task"""
+    task_token = callback.pop('task_token')
+    failed = [job_type for job_type, job in callback['jobs'].items() if job.get('status') != 'SUCCEEDED']
+    if failed:
+        # Still resume: the finalize step scores failed jobs as not observed
+        logger.error(f"Rekognition jobs {failed} failed for callback {callback['callback_id']}")
+
+    output = {**callback['context'], 'callback_id': callback['callback_id'], 'jobs': callback['jobs']}
+    stepfunctions_client.send_task_success(taskToken=task_token, output=json.dumps(output, default=str))
+    logger.info(f"Resumed task for callback {callback['callback_id']}")
+    return output
+
+
+def reconcile_jobs(
+    jobs: Dict[str, str],
+    registry,
+    stepfunctions_client,
+    rekognition_client
+) -> List[Dict[str, Any]]:
+    """
+    Apply completions that were published before the jobs were registered
+
+    Jobs start before their callback is registered, and complete_job drops
+    notifications for jobs it does not know yet, so a job finishing in that
+    window would leave its task waiting until it times out. Reading each
+    job's status once right after registering closes the window; if the
+    notification is also processed, nothing happens twice, since a callback
+    resumes only once.
+
+    Args:
+        jobs: Mapping of job key -> JobId as registered; the key ends in the
+            job type ('motion_analysis', or '<clip index>:pose_detection')
+
+    Returns:
+        Task outputs sent back to Step Functions (at most one)
+    """
+    resumed = []
+    for job_key, job_id in jobs.items():
+        get_status = getattr(rekognition_client, JOB_STATUS_APIS[job_key.split(':')[-1]])
+        try:
+            status = get_status(JobId=job_id, MaxResults=1).get('JobStatus')
+        except Exception as e:
+            # The notification is still on its way if the job has not finished
+            logger.warning(f"Could not read the status of Rekognition job {job_id}: {str(e)}")
+            continue
+
+        if status in ('SUCCEEDED', 'FAILED'):
+            logger.info(f"Rekognition job {job_id} finished with {status} before its callback was registered")
+            callback = registry.complete_job(job_id, status)
+            if callback:
+                resumed.append(_resume_task(callback, stepfunctions_client))
+
+    return resumed
+
+
+def handler(event, context):
+    """
+    Lambda handler subscribed to the Rekognition completion SNS topic
+    """
+    try:
+        logger.info(f"Rekognition callback invoked: {json.dumps(event)}")
+
+        registry = RekognitionJobRegistry()
+        stepfunctions_client = boto3.client('stepfunctions')
+
+        resumed = process_notifications(event, registry, stepfunctions_client)
+
+        return {
+            'statusCode': 200,
+            'resumed': len(resumed)
+        }
+
+    except Exception as e:
+        logger.error(f"Error in Rekognition callback handler: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise e
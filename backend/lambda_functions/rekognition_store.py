@@ -0,0 +1,251 @@
+"""
+Rekognition Result Store - Compact columnar arrays for video analysis results
+Streams every page of get_label_detection / get_person_tracking into NumPy
+columns and saves them as one small binary artifact per job
+"""
+
+import io
+import json
+import logging
+from typing import Dict, Any, List, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Result arrays returned by each Rekognition video API
+RESULT_ITEMS_KEY = {
+    'motion_analysis': 'Labels',
+    'pose_detection': 'Persons'
+}
+
+# Only labels above this confidence count as detected
+MIN_LABEL_CONFIDENCE = 60.0
+
+PAGE_SIZE = 1000
+
+
+class RekognitionTimeline:
+    """
+    Columnar view of one Rekognition video job
+
+    One row per detection, sorted by timestamp:
+        timestamps:   int64 milliseconds from the start of the analyzed video
+        label_ids:    int32 index into `labels` (-1 for person-tracking rows)
+        confidence:   float32 0-100
+        person_index: int32 Rekognition person index (-1 for label rows)
+        bboxes:       float32 (N, 4) left, top, width, height (NaN if absent)
+
+    Label names are interned once in `labels`, with their Rekognition parent
+    categories in `label_parents`.
+    """
+
+    def __init__(
+        self,
+        job_type: str,
+        timestamps: np.ndarray,
+        label_ids: np.ndarray,
+        confidence: np.ndarray,
+        person_index: np.ndarray,
+        bboxes: np.ndarray,
+        labels: List[str],
+        label_parents: Optional[List[List[str]]] = None,
+        video_metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.job_type = job_type
+        self.timestamps = timestamps
+        self.label_ids = label_ids
+        self.confidence = confidence
+        self.person_index = person_index
+        self.bboxes = bboxes
+        self.labels = labels
+        self.label_parents = label_parents or [[] for _ in labels]
+        self.video_metadata = video_metadata or {}
+
+    def __len__(self) -> int:
+        return int(self.timestamps.shape[0])
+
+    @classmethod
+    def from_pages(cls, job_type: str, pages: Iterable[Dict[str, Any]]) -> 'RekognitionTimeline':
+        """
+        Build a timeline from an iterable of Rekognition response pages
+
+        Each page is converted to arrays as soon as it arrives, so only one raw
+        page is held in memory at a time.
+        """
+        items_key = RESULT_ITEMS_KEY[job_type]
+        vocabulary: Dict[str, int] = {}
+        labels: List[str] = []
+        label_parents: List[List[str]] = []
+        video_metadata: Dict[str, Any] = {}
+        chunks = []
+
+        for page in pages:
+            video_metadata = video_metadata or page.get('VideoMetadata', {})
+            rows = []
+
+            for item in page.get(items_key, []):
+                timestamp = item.get('Timestamp', 0)
+
+                if job_type == 'motion_analysis':
+                    label = item.get('Label', {})
+                    name = label.get('Name', '')
+                    if name not in vocabulary:
+                        vocabulary[name] = len(labels)
+                        labels.append(name)
+                        label_parents.append([parent.get('Name', '') for parent in label.get('Parents', [])])
+                    label_id = vocabulary[name]
+
+                    # One row per located instance, or a single row if unlocated
+                    instances = label.get('Instances') or [{}]
+                    for instance in instances:
+                        rows.append((
+                            timestamp, label_id,
+                            label.get('Confidence', 0.0), -1,
+                            _bbox(instance.get('BoundingBox'))
+                        ))
+                else:
+                    person = item.get('Person', {})
+                    index = person.get('Index')
+                    rows.append((
+                        timestamp, -1, 100.0,
+                        -1 if index is None else index,
+                        _bbox(person.get('BoundingBox'))
+                    ))
+
+            if rows:
+                chunks.append(_rows_to_columns(rows))
+
+        if chunks:
+            columns = [np.concatenate([chunk[i] for chunk in chunks]) for i in range(5)]
+        else:
+            columns = [
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int32),
+                np.zeros((0, 4), dtype=np.float32)
+            ]
+
+        # Pages requested with SortBy=TIMESTAMP are already ordered; a stable
+        # sort keeps that cheap and guards against NAME-sorted input
+        order = np.argsort(columns[0], kind='stable')
+        return cls(job_type, *(column[order] for column in columns),
+                   labels=labels, label_parents=label_parents, video_metadata=video_metadata)
+
+    def slice(self, start_time: float, end_time: float) -> 'RekognitionTimeline':
+        """Rows with start_time <= t <= end_time (seconds); arrays are views"""
+        lo = int(np.searchsorted(self.timestamps, int(start_time * 1000), side='left'))
+        hi = int(np.searchsorted(self.timestamps, int(end_time * 1000), side='right'))
+        return RekognitionTimeline(
+            self.job_type,
+            self.timestamps[lo:hi], self.label_ids[lo:hi], self.confidence[lo:hi],
+            self.person_index[lo:hi], self.bboxes[lo:hi],
+            labels=self.labels, label_parents=self.label_parents,
+            video_metadata=self.video_metadata
+        )
+
+    def label_names(self, min_confidence: float = MIN_LABEL_CONFIDENCE) -> List[str]:
+        """Distinct label names detected above min_confidence"""
+        mask = (self.label_ids >= 0) & (self.confidence > min_confidence)
+        return [self.labels[i] for i in np.unique(self.label_ids[mask])]
+
+    def person_count(self) -> int:
+        """Number of distinct tracked person indices"""
+        return int(np.unique(self.person_index[self.person_index >= 0]).size)
+
+    def to_bytes(self) -> bytes:
+        """Serialise to a compressed .npz artifact"""
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            timestamps=self.timestamps,
+            label_ids=self.label_ids,
+            confidence=self.confidence,
+            person_index=self.person_index,
+            bboxes=self.bboxes,
+            meta=np.frombuffer(json.dumps({
+                'job_type': self.job_type,
+                'labels': self.labels,
+                'label_parents': self.label_parents,
+                'video_metadata': self.video_metadata
+            }).encode('utf-8'), dtype=np.uint8)
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RekognitionTimeline':
+        """Load a timeline saved with to_bytes"""
+        with np.load(io.BytesIO(data)) as arrays:
+            meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+            return cls(
+                meta['job_type'],
+                arrays['timestamps'], arrays['label_ids'], arrays['confidence'],
+                arrays['person_index'], arrays['bboxes'],
+                labels=meta['labels'], label_parents=meta['label_parents'],
+                video_metadata=meta['video_metadata']
+            )
+
+
+def _bbox(box: Optional[Dict[str, Any]]) -> tuple:
+    if not box:
+        return (np.nan, np.nan, np.nan, np.nan)
+    return (box.get('Left', np.nan), box.get('Top', np.nan), box.get('Width', np.nan), box.get('Height', np.nan))
+
+
+def _rows_to_columns(rows: List[tuple]) -> List[np.ndarray]:
+    timestamps, label_ids, confidence, person_index, bboxes = zip(*rows)
+    return [
+        np.asarray(timestamps, dtype=np.int64),
+        np.asarray(label_ids, dtype=np.int32),
+        np.asarray(confidence, dtype=np.float32),
+        np.asarray(person_index, dtype=np.int32),
+        np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+    ]
+
+
+def iter_result_pages(rekognition, job_id: str, job_type: str):
+    """
+    Yield every page of a Rekognition job, following NextToken
+
+    Pages are requested lazily, so a caller can inspect JobStatus on the first
+    page before deciding whether to consume the rest.
+    """
+    fetch = rekognition.get_label_detection if job_type == 'motion_analysis' else rekognition.get_person_tracking
+    kwargs = {'JobId': job_id, 'MaxResults': PAGE_SIZE, 'SortBy': 'TIMESTAMP'}
+
+    while True:
+        page = fetch(**kwargs)
+        yield page
+        next_token = page.get('NextToken')
+        if not next_token:
+            break
+        kwargs['NextToken'] = next_token
+
+
+def fetch_timeline(rekognition, job_id: str, job_type: str) -> RekognitionTimeline:
+    """Fetch all pages of a finished job straight into a columnar timeline"""
+    timeline = RekognitionTimeline.from_pages(job_type, iter_result_pages(rekognition, job_id, job_type))
+    logger.info(f"Fetched {len(timeline)} {job_type} rows for Rekognition job {job_id}")
+    return timeline
+
+
+def artifact_key(job_id: str, prefix: str = 'cme-rekognition') -> str:
+    """S3 key of the binary artifact for one Rekognition job"""
+    return f"{prefix}/{job_id}.npz"
+
+
+def save_timeline(s3_client, s3_bucket: str, key: str, timeline: RekognitionTimeline) -> str:
+    """Upload a timeline artifact to S3"""
+    s3_client.put_object(
+        Bucket=s3_bucket,
+        Key=key,
+        Body=timeline.to_bytes(),
+        ContentType='application/octet-stream'
+    )
+    return key
+
+
+def load_timeline(s3_client, s3_bucket: str, key: str) -> RekognitionTimeline:
+    """Download a timeline artifact from S3"""
+    response = s3_client.get_object(Bucket=s3_bucket, Key=key)
+    return RekognitionTimeline.from_bytes(response['Body'].read())
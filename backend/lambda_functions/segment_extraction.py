@@ -0,0 +1,343 @@
+"""
+Segment Extraction - Pluggable backends that cut per-test clips out of a recording
+The video Lambda submits extraction jobs and collects their output keys; the
+queue backend hands them to an SQS-fed worker Lambda that ships ffmpeg, the
+local service runs ffmpeg workers in-process with bounded concurrency
+"""
+
+import hashlib
+import json
+import boto3
+from abc import ABC, abstractmethod
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+EXTRACTION_QUEUE_URL = os.environ.get('EXTRACTION_QUEUE_URL', '')
+CME_EXTRACTION_JOBS_TABLE = os.environ.get('CME_EXTRACTION_JOBS_TABLE', 'cme-extraction-jobs')
+
+# Concurrent ffmpeg workers in the local service
+LOCAL_EXTRACTION_WORKERS = int(os.environ.get('LOCAL_EXTRACTION_WORKERS', '2'))
+
+# How long a submitter waits for a queued job, and how often it checks
+EXTRACTION_RESULT_TIMEOUT = float(os.environ.get('EXTRACTION_RESULT_TIMEOUT', '600'))
+EXTRACTION_POLL_INTERVAL = 2.0
+
+# Job rows expire after a day so finished jobs do not accumulate
+JOB_TTL_SECONDS = 86400
+
+# Throughput is reported over this trailing window
+THROUGHPUT_WINDOW_SECONDS = 300
+
+
+def extraction_job_id(s3_bucket: str, video_s3_key: str, start_time: float, duration: float, output_key: str) -> str:
+    """Identical requests map to the same job ID, which is what deduplicates them"""
+    spec = f"{s3_bucket}|{video_s3_key}|{start_time:.3f}|{duration:.3f}|{output_key}"
+    return f"extract_{hashlib.sha1(spec.encode('utf-8')).hexdigest()[:20]}"
+
+
+def run_extraction_job(job: Dict[str, Any], s3_client=None) -> str:
+    """
+    Cut one clip with ffmpeg and upload it
+
+    ffmpeg seeks the recording through a presigned URL (-ss before -i), so only
+    the bytes around the window are fetched rather than the whole recording.
+
+    Returns:
+        S3 key of the uploaded clip
+    """
+    s3_client = s3_client or boto3.client('s3')
+    source = s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': job['s3_bucket'], 'Key': job['video_s3_key']},
+        ExpiresIn=3600
+    )
+
+    with tempfile.TemporaryDirectory() as job_dir:
+        local_output = os.path.join(job_dir, 'segment.mp4')
+        result = subprocess.run([
+            'ffmpeg', '-v', 'error', '-nostdin', '-y',
+            '-ss', str(job['start_time']), '-i', source,
+            '-t', str(job['duration']),
+            '-c:v', 'libx264', '-c:a', 'aac',
+            local_output
+        ], capture_output=True, text=True, timeout=600)
+        if result.returncode != 0:
+            raise RuntimeError(f"Segment extraction failed: {result.stderr.strip()}")
+
+        s3_client.upload_file(local_output, job['s3_bucket'], job['output_key'])
+
+    return job['output_key']
+
+
+class ExtractionBackend(ABC):
+    """
+    Common submit/collect interface and bookkeeping for extraction backends
+
+    submit() returns a job ID; submitting a request identical to one already
+    in flight (or already finished) returns the existing job instead of
+    cutting the clip again. result() blocks until the job finishes and
+    returns its output key, or None on failure or timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self._latencies = []
+        self._finished_at = []
+
+    def submit(
+        self,
+        s3_bucket: str,
+        video_s3_key: str,
+        start_time: float,
+        duration: float,
+        output_key: str
+    ) -> str:
+        job = {
+            'job_id': extraction_job_id(s3_bucket, video_s3_key, start_time, duration, output_key),
+            's3_bucket': s3_bucket,
+            'video_s3_key': video_s3_key,
+            'start_time': start_time,
+            'duration': duration,
+            'output_key': output_key
+        }
+        created = self._enqueue(job)
+        with self._lock:
+            if created:
+                self.submitted += 1
+            else:
+                self.deduplicated += 1
+        if not created:
+            logger.info(f"Extraction job {job['job_id']} already submitted; reusing it")
+        return job['job_id']
+
+    def extract(self, s3_bucket: str, video_s3_key: str, start_time: float, duration: float, output_key: str,
+                timeout: float = EXTRACTION_RESULT_TIMEOUT) -> Optional[str]:
+        """Submit a job and wait for its output"""
+        return self.result(self.submit(s3_bucket, video_s3_key, start_time, duration, output_key), timeout)
+
+    def _record_finish(self, succeeded: bool, latency: Optional[float]) -> None:
+        now = time.time()
+        with self._lock:
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+            if latency is not None:
+                self._latencies.append(latency)
+            self._finished_at = [t for t in self._finished_at if now - t < THROUGHPUT_WINDOW_SECONDS] + [now]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters, mean latency and jobs finished per minute over the trailing window"""
+        now = time.time()
+        with self._lock:
+            recent = [t for t in self._finished_at if now - t < THROUGHPUT_WINDOW_SECONDS]
+            return {
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'completed': self.completed,
+                'failed': self.failed,
+                'mean_latency_seconds': round(sum(self._latencies) / len(self._latencies), 3) if self._latencies else None,
+                'throughput_per_minute': round(len(recent) * 60.0 / THROUGHPUT_WINDOW_SECONDS, 3)
+            }
+
+    @abstractmethod
+    def _enqueue(self, job: Dict[str, Any]) -> bool:
+        """Start the job unless one with its job_id exists; True if it was created"""
+
+    @abstractmethod
+    def result(self, job_id: str, timeout: float = EXTRACTION_RESULT_TIMEOUT) -> Optional[str]:
+        """Output key of the job once it finishes, or None on failure or timeout"""
+
+
+class LocalExtractionService(ExtractionBackend):
+    """
+    Local stand-in for the queue: ffmpeg workers in a bounded thread pool
+
+    Used for offline runs and on hosts without the worker Lambda. Each ffmpeg
+    process is its own OS process, so threads are enough to bound concurrency.
+    """
+
+    def __init__(self, workers: int = LOCAL_EXTRACTION_WORKERS, s3_client=None):
+        super().__init__()
+        self.workers = workers
+        self.s3_client = s3_client
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extract')
+        self._jobs: Dict[str, Future] = {}
+
+    def _enqueue(self, job: Dict[str, Any]) -> bool:
+        with self._lock:
+            if job['job_id'] in self._jobs:
+                return False
+            self._jobs[job['job_id']] = self._pool.submit(self._run, job, time.time())
+            return True
+
+    def _run(self, job: Dict[str, Any], submitted_at: float) -> Optional[str]:
+        try:
+            output_key = run_extraction_job(job, self.s3_client)
+            self._record_finish(True, time.time() - submitted_at)
+            return output_key
+        except Exception as e:
+            logger.error(f"Extraction job {job['job_id']} failed: {str(e)}")
+            self._record_finish(False, time.time() - submitted_at)
+            with self._lock:
+                # Let a later identical request retry
+                self._jobs.pop(job['job_id'], None)
+            return None
+
+    def result(self, job_id: str, timeout: float = EXTRACTION_RESULT_TIMEOUT) -> Optional[str]:
+        future = self._jobs.get(job_id)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"Extraction job {job_id} did not finish: {str(e)}")
+            return None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = sum(1 for future in self._jobs.values() if not future.done())
+            running = sum(1 for future in self._jobs.values() if future.running())
+        return {**super().metrics(), 'queue_depth': in_flight - running, 'in_flight': running,
+                'workers': self.workers}
+
+
+class QueueExtractionBackend(ExtractionBackend):
+    """
+    SQS-backed worker pool
+
+    A conditional put on the jobs table is the dedup point: only the first
+    submitter of a job ID enqueues it, later ones wait on the same row. The
+    worker Lambda (handler below) records the outcome on that row, and its
+    SQS event-source concurrency bounds the number of ffmpeg workers.
+    """
+
+    def __init__(self, queue_url: str = EXTRACTION_QUEUE_URL, table_name: str = CME_EXTRACTION_JOBS_TABLE,
+                 sqs=None, table=None):
+        super().__init__()
+        self.queue_url = queue_url
+        self.sqs = sqs or boto3.client('sqs')
+        self.table = table or boto3.resource('dynamodb').Table(table_name)
+
+    def _enqueue(self, job: Dict[str, Any]) -> bool:
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={
+                    'job_id': job['job_id'],
+                    'job_status': 'QUEUED',
+                    'request': json.dumps(job),
+                    'output_key': job['output_key'],
+                    'submitted_at': now,
+                    'expires_at': now + JOB_TTL_SECONDS
+                },
+                # A FAILED row may be retried by a new submission
+                ConditionExpression='attribute_not_exists(job_id) OR job_status = :failed',
+                ExpressionAttributeValues={':failed': 'FAILED'}
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+        self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(job))
+        return True
+
+    def result(self, job_id: str, timeout: float = EXTRACTION_RESULT_TIMEOUT) -> Optional[str]:
+        deadline = time.time() + timeout
+        while True:
+            row = self.table.get_item(Key={'job_id': job_id}, ConsistentRead=True).get('Item') or {}
+            status = row.get('job_status')
+            if status in ('SUCCEEDED', 'FAILED'):
+                latency = float(row['completed_at'] - row['submitted_at']) if 'completed_at' in row else None
+                self._record_finish(status == 'SUCCEEDED', latency)
+                if status == 'FAILED':
+                    logger.error(f"Extraction job {job_id} failed: {row.get('error', '')}")
+                    return None
+                return row['output_key']
+            if time.time() >= deadline:
+                logger.error(f"Timed out waiting for extraction job {job_id} ({status})")
+                return None
+            time.sleep(EXTRACTION_POLL_INTERVAL)
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = super().metrics()
+        try:
+            attributes = self.sqs.get_queue_attributes(
+                QueueUrl=self.queue_url,
+                AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible']
+            )['Attributes']
+            metrics['queue_depth'] = int(attributes.get('ApproximateNumberOfMessages', 0))
+            metrics['in_flight'] = int(attributes.get('ApproximateNumberOfMessagesNotVisible', 0))
+        except Exception as e:
+            logger.warning(f"Could not read extraction queue depth: {str(e)}")
+        return metrics
+
+
+_backend: Optional[ExtractionBackend] = None
+
+
+def get_extraction_backend() -> ExtractionBackend:
+    """Queue backend when a queue is configured, otherwise the local service (one per container)"""
+    global _backend
+    if _backend is None:
+        _backend = QueueExtractionBackend() if EXTRACTION_QUEUE_URL else LocalExtractionService()
+    return _backend
+
+
+def handler(event, context):
+    """
+    Worker Lambda fed by the extraction SQS queue
+
+    Failed jobs are recorded on the jobs table and not retried by SQS, so a
+    bad window fails fast instead of cycling to the dead-letter queue.
+    """
+    table = boto3.resource('dynamodb').Table(CME_EXTRACTION_JOBS_TABLE)
+    processed = 0
+
+    for record in event.get('Records', []):
+        job = json.loads(record['body'])
+        job_id = job['job_id']
+
+        row = table.get_item(Key={'job_id': job_id}, ConsistentRead=True).get('Item') or {}
+        if row.get('job_status') == 'SUCCEEDED':
+            # At-least-once delivery: the clip is already there
+            continue
+
+        table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression='SET job_status = :running, started_at = :now',
+            ExpressionAttributeValues={':running': 'RUNNING', ':now': int(time.time())}
+        )
+        try:
+            run_extraction_job(job)
+            table.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression='SET job_status = :done, completed_at = :now',
+                ExpressionAttributeValues={':done': 'SUCCEEDED', ':now': int(time.time())}
+            )
+        except Exception as e:
+            logger.error(f"Extraction job {job_id} failed: {str(e)}")
+            table.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression='SET job_status = :failed, completed_at = :now, #error = :error',
+                ExpressionAttributeNames={'#error': 'error'},
+                ExpressionAttributeValues={':failed': 'FAILED', ':now': int(time.time()), ':error': str(e)[:1000]}
+            )
+        processed += 1
+
+    return {
+        'statusCode': 200,
+        'processed': processed
+    }
@@ -0,0 +1,185 @@
+"""
+Test Alignment - Match declared tests to the motion they announce
+Extracts motion events from the recording-wide motion-energy curve and aligns
+the ordered declared tests to them with a monotonic dynamic program, so tests
+announced ahead of time or in a batch ("reflexes and then strength") are
+analyzed where the motion actually happened instead of around the declaration
+"""
+
+import logging
+import os
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Active samples closer than this are one event; shorter events are dropped
+MOTION_EVENT_MERGE_GAP = 2.0
+MOTION_EVENT_MIN_SECONDS = 1.0
+
+# Motion may follow its declaration by up to ALIGNMENT_MAX_LEAD seconds
+# (announced ahead, or batched) and precede it by up to ALIGNMENT_MAX_LAG
+# (narrated afterwards). Each second of gap costs 1 / scale; leaving a test
+# on its fixed window costs ALIGNMENT_SKIP_COST.
+ALIGNMENT_MAX_LEAD = float(os.environ.get('ALIGNMENT_MAX_LEAD', '180'))
+ALIGNMENT_MAX_LAG = float(os.environ.get('ALIGNMENT_MAX_LAG', '30'))
+ALIGNMENT_LEAD_SCALE = 60.0
+ALIGNMENT_LAG_SCALE = 15.0
+ALIGNMENT_SKIP_COST = 2.0
+
+# Brief events (shifting in a chair, reaching for a pen) are weaker evidence of
+# a test: matching an event shorter than ALIGNMENT_EVENT_SECONDS costs up to
+# ALIGNMENT_SHORT_EVENT_COST extra, in proportion to how much shorter it is
+ALIGNMENT_EVENT_SECONDS = 5.0
+ALIGNMENT_SHORT_EVENT_COST = 1.0
+
+# Aligned spans: the event padded on both sides, at least / at most this long
+ALIGNMENT_PADDING = 2.0
+ALIGNMENT_MIN_SPAN = 10.0
+ALIGNMENT_MAX_SPAN = 60.0
+
+
+def motion_events(
+    timestamps: np.ndarray,
+    energy: np.ndarray,
+    threshold: float,
+    merge_gap: float = MOTION_EVENT_MERGE_GAP,
+    min_seconds: float = MOTION_EVENT_MIN_SECONDS
+) -> Dict[str, np.ndarray]:
+    """
+    Runs of motion in a motion-energy curve
+
+    Returns:
+        starts, ends: float64 seconds of each event
+        peak: float32 highest energy inside each event
+    """
+    active_times = timestamps[energy > threshold]
+    if active_times.size == 0:
+        return {'starts': np.zeros(0), 'ends': np.zeros(0), 'peak': np.zeros(0, dtype=np.float32)}
+
+    # A new event starts wherever consecutive active samples are far apart
+    breaks = np.flatnonzero(np.diff(active_times) > merge_gap) + 1
+    first = np.concatenate([[0], breaks])
+    last = np.concatenate([breaks, [active_times.size]]) - 1
+    peak = np.maximum.reduceat(energy[energy > threshold], first).astype(np.float32)
+
+    keep = (active_times[last] - active_times[first]) >= min_seconds
+    return {'starts': active_times[first[keep]], 'ends': active_times[last[keep]], 'peak': peak[keep]}
+
+
+def gap_costs(test_time: float, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Cost of matching one test to each of the given events
+
+    The gap is from the declaration to the event's start when the event
+    follows it, from the event's end when it precedes it, and zero when the
+    declaration falls inside the event. Events shorter than
+    ALIGNMENT_EVENT_SECONDS add a brevity cost.
+    """
+    lead = starts - test_time
+    lag = test_time - ends
+    gap = np.where(lead > 0, lead / ALIGNMENT_LEAD_SCALE, np.where(lag > 0, lag / ALIGNMENT_LAG_SCALE, 0.0))
+    brevity = np.clip(1.0 - (ends - starts) / ALIGNMENT_EVENT_SECONDS, 0.0, 1.0)
+    return gap + ALIGNMENT_SHORT_EVENT_COST * brevity
+
+
+def align_tests(
+    test_times: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    skip_cost: float = ALIGNMENT_SKIP_COST,
+    max_lead: float = ALIGNMENT_MAX_LEAD,
+    max_lag: float = ALIGNMENT_MAX_LAG
+) -> Dict[str, Any]:
+    """
+    Best monotonic assignment of tests (in declaration order) to motion events
+
+    Tests keep their order, each event serves at most one test and a test may
+    stay unaligned at skip_cost. With dp[i][j] the cheapest alignment of the
+    first i tests to the first j events,
+
+        dp[i][j] = min(dp[i][j-1], dp[i-1][j] + skip, dp[i-1][j-1] + cost(i, j))
+
+    The dp[i][j-1] term is a running minimum along j, so each row is a few
+    vectorized NumPy passes, and a test can only match the band of events
+    within max_lag / max_lead of it (found by binary search on the sorted,
+    disjoint events motion_events returns). Hundreds of tests over
+    thousands of events take milliseconds.
+
+    Returns:
+        events: int64 (tests,) event index of each test, -1 when unaligned
+        cost: total alignment cost
+    """
+    test_times = np.asarray(test_times, dtype=np.float64)
+    n, m = len(test_times), len(starts)
+    if n == 0 or m == 0:
+        return {'events': np.full(n, -1, dtype=np.int64), 'cost': float(n * skip_cost)}
+
+    band_lo = np.searchsorted(ends, test_times - max_lag, side='left')
+    band_hi = np.searchsorted(starts, test_times + max_lead, side='right')
+    columns = np.arange(m + 1)
+
+    previous = np.zeros(m + 1)
+    match = np.empty(m + 1)
+    best_from = np.zeros((n, m + 1), dtype=np.int32)
+    matched = np.zeros((n, m + 1), dtype=bool)
+    for i in range(n):
+        lo, hi = band_lo[i], band_hi[i]
+        skip = previous + skip_cost
+        match.fill(np.inf)
+        match[lo + 1:hi + 1] = previous[lo:hi] + gap_costs(test_times[i], starts[lo:hi], ends[lo:hi])
+        candidate = np.minimum(skip, match)
+
+        current = np.minimum.accumulate(candidate)
+        # Column each running minimum came from (latest column achieving it)
+        best_from[i] = np.maximum.accumulate(np.where(candidate <= current, columns, 0))
+        matched[i] = match < skip
+        previous = current
+
+    events = np.full(n, -1, dtype=np.int64)
+    j = m
+    for i in range(n - 1, -1, -1):
+        j = best_from[i, j]
+        if matched[i, j]:
+            events[i] = j - 1
+            j -= 1
+
+    return {'events': events, 'cost': float(previous[m])}
+
+
+def aligned_windows(
+    test_times: List[float],
+    events: Dict[str, np.ndarray],
+    padding: float = ALIGNMENT_PADDING,
+    min_span: float = ALIGNMENT_MIN_SPAN,
+    max_span: float = ALIGNMENT_MAX_SPAN
+) -> Dict[str, Any]:
+    """
+    Analysis span of each declared test from its aligned motion event
+
+    Returns:
+        Dictionary with windows ([start, end] seconds, or None for tests left
+        on their fixed window), events (index per test, -1 if unaligned),
+        aligned (count) and cost
+    """
+    test_times = np.asarray(test_times, dtype=np.float64)
+    alignment = align_tests(test_times, events['starts'], events['ends'])
+
+    windows: List[Optional[List[float]]] = []
+    for event in alignment['events']:
+        if event < 0:
+            windows.append(None)
+            continue
+        start = max(0.0, float(events['starts'][event]) - padding)
+        end = float(events['ends'][event]) + padding
+        end = min(max(end, start + min_span), start + max_span)
+        windows.append([round(start, 3), round(end, 3)])
+
+    return {
+        'windows': windows,
+        'events': alignment['events'].tolist(),
+        'aligned': int((alignment['events'] >= 0).sum()),
+        'cost': round(alignment['cost'], 3)
+    }
@@ -311,14 +311,88 @@ function RecordingTab({ session }) {
   }
 
   return (
-    <InfoCard
-      title="Recording Information"
-      icon="M15 10l4.553-2.276A1 1 0 0121 8.618v6.764a1 1 0 01-1.447.894L15 14M5 18h8a2 2 0 002-2V8a2 2 0 00-2-2H5a2 2 0 00-2 2v8a2 2 0 002 2z"
-      items={[
-        { label: 'Video URI', value: session.video_uri, mono: true },
-        { label: 'Upload Date', value: session.updated_at ? new Date(session.updated_at * 1000).toLocaleString() : 'N/A' },
-      ]}
-    />
+    <div className="space-y-6">
+      <InfoCard
+        title="Recording Information"
+        icon="M15 10l4.553-2.276A1 1 0 0121 8.618v6.764a1 1 0 01-1.447.894L15 14M5 18h8a2 2 0 002-2V8a2 2 0 00-2-2H5a2 2 0 00-2 2v8a2 2 0 002 2z"
+        items={[
+          { label: 'Video URI', value: session.video_uri, mono: true },
+          { label: 'Upload Date', value: session.updated_at ? new Date(session.updated_at * 1000).toLocaleString() : 'N/A' },
+        ]}
+      />
+      {session.thumbnail_track && <ScrubPreview sessionId={session.session_id} />}
+    </div>
+  );
+}
+
+// Parse a WebVTT thumbnail track ("sprite.jpg#xywh=x,y,w,h" cues)
+function parseThumbnailVtt(text) {
+  const toSeconds = (stamp) => stamp.split(':').reduce((total, part) => total * 60 + parseFloat(part), 0);
+  return text.split(/\r?\n\r?\n/).reduce((cues, block) => {
+    const lines = block.trim().split(/\r?\n/);
+    const timing = lines.findIndex((line) => line.includes('-->'));
+    if (timing === -1 || !lines[timing + 1]) return cues;
+    const [start, end] = lines[timing].split('-->').map((stamp) => toSeconds(stamp.trim()));
+    const [sprite, fragment = ''] = lines[timing + 1].split('#xywh=');
+    const [x, y, w, h] = fragment.split(',').map(Number);
+    cues.push({ start, end, sprite, x, y, w, h });
+    return cues;
+  }, []);
+}
+
+function ScrubPreview({ sessionId }) {
+  const [track, setTrack] = useState(null);
+  const [cue, setCue] = useState(null);
+
+  useEffect(() => {
+    const loadTrack = async () => {
+      try {
+        const response = await api.get(`/cme/sessions/${sessionId}/thumbnails`);
+        const vtt = await fetch(response.data.vtt_url).then((res) => res.text());
+        setTrack({ ...response.data, cues: parseThumbnailVtt(vtt) });
+      } catch (error) {
+        console.error('Failed to load thumbnails:', error);
+      }
+    };
+    loadTrack();
+  }, [sessionId]);
+
+  if (!track || !track.cues.length) return null;
+
+  const handleMove = (event) => {
+    const rect = event.currentTarget.getBoundingClientRect();
+    const t = ((event.clientX - rect.left) / rect.width) * track.duration;
+    // Cues are contiguous fixed-interval ranges, so the index is direct
+    const index = Math.min(track.cues.length - 1, Math.max(0, Math.floor(t / track.interval)));
+    setCue({ ...track.cues[index], time: t });
+  };
+
+  const formatTime = (seconds) => new Date(seconds * 1000).toISOString().substr(11, 8);
+
+  return (
+    <div className="bg-white rounded-2xl shadow-lg border border-slate-200 p-6">
+      <h3 className="text-lg font-bold text-slate-900 mb-4">Recording Preview</h3>
+      <div
+        className="h-6 bg-slate-200 rounded-full cursor-pointer"
+        onMouseMove={handleMove}
+        onMouseLeave={() => setCue(null)}
+      />
+      <div className="flex items-center gap-4 mt-4 h-24">
+        {cue && (
+          <>
+            <div
+              className="rounded-lg"
+              style={{
+                width: cue.w,
+                height: cue.h,
+                background: `url(${track.sprites[cue.sprite]}) -${cue.x}px -${cue.y}px`,
+              }}
+            />
+            <span className="text-sm font-mono text-slate-600">{formatTime(cue.time)}</span>
+          </>
+        )}
+      </div>
+    </div>
   );
 }
 
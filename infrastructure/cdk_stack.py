@@ -8,11 +8,15 @@ from aws_cdk import (
     Duration,
     Size,
     aws_lambda as lambda_,
+    aws_ecr_assets as ecr_assets,
+    aws_lambda_event_sources as lambda_events,
     aws_dynamodb as dynamodb,
     aws_s3 as s3,
     aws_apigateway as apigateway,
     aws_iam as iam,
     aws_sqs as sqs,
+    aws_sns as sns,
+    aws_sns_subscriptions as sns_subs,
     aws_s3_notifications as s3n,
     aws_stepfunctions as sfn,
     aws_stepfunctions_tasks as tasks,
@@ -122,6 +126,58 @@ class CMEAnalysisPlatformStack(Stack):
             removal_policy=RemovalPolicy.RETAIN
         )
 
+        # Rekognition job registry: maps async job IDs to waiting task tokens
+        rekognition_jobs_table = dynamodb.Table(
+            self, "CMERekognitionJobsTable",
+            table_name="cme-rekognition-jobs",
+            partition_key=dynamodb.Attribute(
+                name="job_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Segment extraction jobs: dedup point and result rows for queued cuts
+        extraction_jobs_table = dynamodb.Table(
+            self, "CMEExtractionJobsTable",
+            table_name="cme-extraction-jobs",
+            partition_key=dynamodb.Attribute(
+                name="job_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # ========== Segment Extraction Queue ==========
+        extraction_dlq = sqs.Queue(
+            self, "SegmentExtractionDLQ",
+            queue_name="cme-segment-extraction-dlq",
+            retention_period=Duration.days(4)
+        )
+        extraction_queue = sqs.Queue(
+            self, "SegmentExtractionQueue",
+            queue_name="cme-segment-extraction",
+            visibility_timeout=Duration.minutes(15),  # Longer than the worker timeout
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=3, queue=extraction_dlq)
+        )
+
+        # ========== Rekognition Completion Notifications ==========
+        rekognition_topic = sns.Topic(
+            self, "RekognitionCompletionTopic",
+            topic_name="AmazonRekognition-cme-job-completion"
+        )
+
+        # Role Rekognition assumes to publish job completion to the topic
+        rekognition_publish_role = iam.Role(
+            self, "RekognitionPublishRole",
+            assumed_by=iam.ServicePrincipal("rekognition.amazonaws.com")
+        )
+        rekognition_topic.grant_publish(rekognition_publish_role)
+
         # ========== Cognito User Pool ==========
         user_pool = cognito.UserPool(
             self, "CMEUserPool",
@@ -167,6 +223,13 @@ class CMEAnalysisPlatformStack(Stack):
         actions_table.grant_read_write_data(lambda_role)
         demeanor_table.grant_read_write_data(lambda_role)
         consent_table.grant_read_write_data(lambda_role)
+        rekognition_jobs_table.grant_read_write_data(lambda_role)
+        extraction_jobs_table.grant_read_write_data(lambda_role)
+        extraction_queue.grant_send_messages(lambda_role)
+        lambda_role.add_to_policy(iam.PolicyStatement(
+            actions=["sqs:GetQueueAttributes"],
+            resources=[extraction_queue.queue_arn]
+        ))
 
         # Grant Bedrock access
         lambda_role.add_to_policy(iam.PolicyStatement(
@@ -189,7 +252,19 @@ class CMEAnalysisPlatformStack(Stack):
                 "rekognition:StartLabelDetection",
                 "rekognition:GetLabelDetection",
                 "rekognition:StartPersonTracking",
-                "rekognition:GetPersonTracking"
+                "rekognition:GetPersonTracking",
+                # Image mode for short clips
+                "rekognition:DetectLabels"
+            ],
+            resources=["*"]
+        ))
+        rekognition_publish_role.grant_pass_role(lambda_role)
+
+        # Allow the video and callback Lambdas to resume waiting workflow tasks
+        lambda_role.add_to_policy(iam.PolicyStatement(
+            actions=[
+                "states:SendTaskSuccess",
+                "states:SendTaskFailure"
             ],
             resources=["*"]
         ))
@@ -203,6 +278,16 @@ class CMEAnalysisPlatformStack(Stack):
             resources=["*"]
         ))
 
+        # Media image (backend/Dockerfile, see DEPLOYMENT.md Step 7): ffmpeg/ffprobe
+        # plus the numpy/OpenCV wheels, too large together for a zip and layers.
+        # Every Lambda that decodes media runs it, with its own handler
+        def media_image(handler: str) -> lambda_.DockerImageCode:
+            return lambda_.DockerImageCode.from_image_asset(
+                "../backend",
+                cmd=[handler],
+                platform=ecr_assets.Platform.LINUX_AMD64  # Static amd64 ffmpeg build
+            )
+
         # Main API Lambda
         api_lambda = lambda_.Function(
             self, "CMEAPIHandler",
@@ -225,6 +310,21 @@ class CMEAnalysisPlatformStack(Stack):
             }
         )
 
+        # Media Ingest Lambda (packages recordings as HLS for the pipeline)
+        media_ingest_lambda = lambda_.DockerImageFunction(
+            self, "CMEMediaIngest",
+            function_name="cme-media-ingest",
+            code=media_image("cme_media_ingest.handler"),
+            timeout=Duration.minutes(15),
+            memory_size=3008,
+            ephemeral_storage_size=Size.gibibytes(10),  # HLS package is staged in /tmp
+            role=lambda_role,
+            environment={
+                "S3_BUCKET": cme_bucket.bucket_name,
+                "CME_SESSIONS_TABLE": sessions_table.table_name
+            }
+        )
+
         # Transcription Waiter Lambda (for Step Functions)
         transcription_waiter_lambda = lambda_.Function(
             self, "TranscriptionWaiter",
@@ -241,16 +341,15 @@ class CMEAnalysisPlatformStack(Stack):
         )
         
         # NLP Processor Lambda
-        nlp_lambda = lambda_.Function(
+        nlp_lambda = lambda_.DockerImageFunction(
             self, "CMENLPProcessor",
             function_name="cme-nlp-processor",
-            runtime=lambda_.Runtime.PYTHON_3_11,
-            code=lambda_.Code.from_asset("../backend/lambda_functions"),
-            handler="cme_nlp_processor.handler",
-            timeout=Duration.minutes(5),
+            code=media_image("cme_nlp_processor.handler"),
+            timeout=Duration.minutes(10),  # Streams the speech track for the audio demeanor pass
             memory_size=2048,
             role=lambda_role,
             environment={
+                "S3_BUCKET": cme_bucket.bucket_name,
                 "CME_SESSIONS_TABLE": sessions_table.table_name,
                 "CME_STEPS_TABLE": steps_table.table_name,
                 "CME_DEMEANOR_TABLE": demeanor_table.table_name
@@ -258,22 +357,61 @@ class CMEAnalysisPlatformStack(Stack):
         )
 
         # Video Processor Lambda
-        video_lambda = lambda_.Function(
+        video_lambda = lambda_.DockerImageFunction(
             self, "CMEVideoProcessor",
             function_name="cme-video-processor",
-            runtime=lambda_.Runtime.PYTHON_3_11,
-            code=lambda_.Code.from_asset("../backend/lambda_functions"),
-            handler="cme_video_processor.handler",
+            code=media_image("cme_video_processor.handler"),
             timeout=Duration.minutes(15),
             memory_size=3008,
             ephemeral_storage_size=Size.gibibytes(10),  # For video processing
             role=lambda_role,
             environment={
                 "S3_BUCKET": cme_bucket.bucket_name,
-                "CME_ACTIONS_TABLE": actions_table.table_name
+                "CME_SESSIONS_TABLE": sessions_table.table_name,
+                "CME_ACTIONS_TABLE": actions_table.table_name,
+                "CME_REKOGNITION_JOBS_TABLE": rekognition_jobs_table.table_name,
+                "CME_EXTRACTION_JOBS_TABLE": extraction_jobs_table.table_name,
+                "EXTRACTION_QUEUE_URL": extraction_queue.queue_url,
+                "REKOGNITION_SNS_TOPIC_ARN": rekognition_topic.topic_arn,
+                "REKOGNITION_ROLE_ARN": rekognition_publish_role.role_arn
             }
         )
 
+        # Segment Extraction Worker Lambda (ffmpeg workers fed by the extraction queue)
+        extraction_worker_lambda = lambda_.DockerImageFunction(
+            self, "CMESegmentExtractionWorker",
+            function_name="cme-segment-extraction-worker",
+            code=media_image("segment_extraction.handler"),
+            timeout=Duration.minutes(10),
+            memory_size=2048,
+            ephemeral_storage_size=Size.gibibytes(2),
+            role=lambda_role,
+            environment={
+                "CME_EXTRACTION_JOBS_TABLE": extraction_jobs_table.table_name
+            }
+        )
+        extraction_worker_lambda.add_event_source(lambda_events.SqsEventSource(
+            extraction_queue,
+            batch_size=1,
+            max_concurrency=10  # Bounds concurrent ffmpeg workers
+        ))
+
+        # Rekognition Callback Lambda (resumes Step Functions on job completion)
+        rekognition_callback_lambda = lambda_.Function(
+            self, "CMERekognitionCallback",
+            function_name="cme-rekognition-callback",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            code=lambda_.Code.from_asset("../backend/lambda_functions"),
+            handler="rekognition_callback.handler",
+            timeout=Duration.seconds(30),
+            memory_size=256,
+            role=lambda_role,
+            environment={
+                "CME_REKOGNITION_JOBS_TABLE": rekognition_jobs_table.table_name
+            }
+        )
+        rekognition_topic.add_subscription(sns_subs.LambdaSubscription(rekognition_callback_lambda))
+
         # Report Generator Lambda
         report_lambda = lambda_.Function(
             self, "CMEReportGenerator",
@@ -327,6 +465,12 @@ class CMEAnalysisPlatformStack(Stack):
 
         report = session_detail.add_resource("report")
         report.add_method("GET", api_integration)
+        
+        thumbnails = session_detail.add_resource("thumbnails")
+        thumbnails.add_method("GET", api_integration)
+
+        integrity = session_detail.add_resource("integrity")
+        integrity.add_method("GET", api_integration)
 
         consent = cme.add_resource("consent")
         consent.add_method("POST", api_integration)
@@ -354,6 +498,12 @@ class CMEAnalysisPlatformStack(Stack):
                 title="Processing Time",
                 left=[nlp_lambda.metric_duration(), video_lambda.metric_duration()],
                 width=12
+            ),
+            cloudwatch.GraphWidget(
+                title="Segment Extraction Queue",
+                left=[extraction_queue.metric_approximate_number_of_messages_visible()],
+                right=[extraction_worker_lambda.metric_invocations()],
+                width=12
             )
         )
 
@@ -362,6 +512,7 @@ class CMEAnalysisPlatformStack(Stack):
         
         state_machine = create_cme_processing_workflow(
             self,
+            media_ingest_lambda,
             transcription_waiter_lambda,
             nlp_lambda,
             video_lambda,
@@ -370,6 +521,7 @@ class CMEAnalysisPlatformStack(Stack):
         )
         
         # Grant Step Function permissions to invoke Lambdas
+        media_ingest_lambda.grant_invoke(state_machine)
         transcription_waiter_lambda.grant_invoke(state_machine)
         nlp_lambda.grant_invoke(state_machine)
         video_lambda.grant_invoke(state_machine)
@@ -17,26 +17,103 @@ from constructs import Construct
 
 def create_cme_processing_workflow(
     scope: Construct,
+    media_ingest_lambda: lambda_.Function,
     transcribe_waiter_lambda: lambda_.Function,
     nlp_processor_lambda: lambda_.Function,
     video_processor_lambda: lambda_.Function,
     report_generator_lambda: lambda_.Function,
-    sessions_table
+    sessions_table,
+    analysis_mode: str = 'session'
 ) -> sfn.StateMachine:
     """
     Create Step Function workflow for CME processing
     
     Pipeline:
-    1. Start Transcription Job
-    2. Wait for Transcription to Complete
-    3. Run NLP Analysis (test detection + demeanor)
-    4. Map over each detected test → Extract video segment + Analyze
-    5. Generate Report
-    6. Update Session Status
+    1. Ingest: probe the recording and start transcription on an extracted
+       mono 16 kHz speech track; then, in parallel states, package it as HLS
+       (clips become sub-playlists) and encode the analysis proxy when video
+       is analyzed, and fingerprint the upload. A failed rendition degrades
+       to the original.
+    2. Wait for Transcription to Complete, then run NLP Analysis (test
+       detection + demeanor, including raised-voice intervals streamed from
+       the speech track); alongside, decode the recording once for the
+       scrub-preview sprite sheets, WebVTT thumbnail track and the
+       recording-wide motion curve batch analysis slices
+    3. Video analysis (skipped for Audio Only sessions and audio-only
+       recordings), depending on analysis_mode:
+       - 'session': one Rekognition label job and one person-tracking job on
+         the whole recording, then map over each detected test → slice the
+         stored results to the test's window
+       - 'per_test': map over each detected test → Extract video segment +
+         Analyze with its own Rekognition jobs
+    4. Generate Report
+    5. Update Session Status
     """
     
-    # Step 1: Start Transcription Job (already done by API handler)
-    # This workflow starts AFTER transcription job is initiated
+    # Step 1: Ingest the recording once - speech track + Transcribe job
+    ingest_recording = tasks.LambdaInvoke(
+        scope, "IngestRecording",
+        lambda_function=media_ingest_lambda,
+        payload=sfn.TaskInput.from_object({
+            "session_id.$": "$.session_id",
+            "video_s3_key.$": "$.video_s3_key"
+        }),
+        result_selector={
+            "transcription_job_name.$": "$.Payload.transcription.job_name",
+            "speech_s3_key.$": "$.Payload.transcription.media_key",
+            "analyze_video.$": "$.Payload.analyze_video"
+        },
+        result_path="$.ingest_result"
+    )
+    
+    # Step 1 (continued): the HLS package per-test clips reference, the
+    # analysis proxy and the integrity fingerprint, each in an invocation of
+    # its own so no ffmpeg run shares the Lambda time limit with another. A
+    # state that fails outright is caught and its rendition falls back to
+    # the original.
+    def ingest_rendition(state_id: str, action: str) -> tasks.LambdaInvoke:
+        rendition = tasks.LambdaInvoke(
+            scope, state_id,
+            lambda_function=media_ingest_lambda,
+            payload=sfn.TaskInput.from_object({
+                "action": action,
+                "session_id.$": "$.session_id",
+                "video_s3_key.$": "$.video_s3_key",
+                "analyze_video.$": "$.ingest_result.analyze_video"
+            }),
+            payload_response_only=True
+        )
+        rendition.add_catch(
+            sfn.Pass(scope, f"{state_id}Failed"),
+            errors=["States.ALL"],
+            result_path="$.error"
+        )
+        return rendition
+    
+    prepare_renditions = sfn.Parallel(scope, "PrepareRenditions", result_path="$.renditions")
+    prepare_renditions.branch(ingest_rendition("PackageHLS", "hls"))
+    prepare_renditions.branch(ingest_rendition("BuildAnalysisProxy", "proxy"))
+    prepare_renditions.branch(ingest_rendition("FingerprintRecording", "integrity"))
+    
+    # Failed renditions come back as None, so later states read the original
+    merge_renditions = tasks.LambdaInvoke(
+        scope, "MergeRenditions",
+        lambda_function=media_ingest_lambda,
+        payload=sfn.TaskInput.from_object({
+            "action": "merge",
+            "session_id.$": "$.session_id",
+            "ingest.$": "$.ingest_result",
+            "renditions.$": "$.renditions"
+        }),
+        result_selector={
+            "transcription_job_name.$": "$.Payload.transcription_job_name",
+            "speech_s3_key.$": "$.Payload.speech_s3_key",
+            "analyze_video.$": "$.Payload.analyze_video",
+            "hls_playlist_key.$": "$.Payload.hls_playlist_key",
+            "proxy_s3_key.$": "$.Payload.proxy_s3_key"
+        },
+        result_path="$.ingest_result"
+    )
     
     # Step 2: Wait for Transcription Job to Complete
     wait_for_transcription = tasks.LambdaInvoke(
@@ -44,7 +121,7 @@ def create_cme_processing_workflow(
         lambda_function=transcribe_waiter_lambda,
         payload=sfn.TaskInput.from_object({
             "session_id.$": "$.session_id",
-            "transcription_job_name.$": "$.transcription_job_name"
+            "transcription_job_name.$": "$.ingest_result.transcription_job_name"
         }),
         result_path="$.transcription_result",
         retry_on_service_exceptions=True,
@@ -58,45 +135,146 @@ def create_cme_processing_workflow(
         backoff_rate=1.0
     )
     
-    # Step 3: Run NLP Analysis
+    # Step 2 (continued): Run NLP Analysis
     run_nlp_analysis = tasks.LambdaInvoke(
         scope, "RunNLPAnalysis",
         lambda_function=nlp_processor_lambda,
         payload=sfn.TaskInput.from_object({
             "session_id.$": "$.session_id",
-            "transcript_uri.$": "$.transcription_result.Payload.transcript_uri"
+            "transcript_uri.$": "$.transcription_result.Payload.transcript_uri",
+            "speech_s3_key.$": "$.ingest_result.speech_s3_key"
         }),
         result_path="$.nlp_result"
     )
     
-    # Step 4: Process Each Detected Test (Map State)
-    process_single_test = tasks.LambdaInvoke(
-        scope, "ProcessSingleTest",
+    # Step 3: Process Each Detected Test (Map State)
+    if analysis_mode == 'session':
+        # One pair of Rekognition jobs for the whole recording; the task waits
+        # on its token until the callback Lambda resumes it
+        start_session_analysis = tasks.LambdaInvoke(
+            scope, "StartSessionAnalysis",
+            lambda_function=video_processor_lambda,
+            integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+            payload=sfn.TaskInput.from_object({
+                "action": "start_session",
+                "task_token": sfn.JsonPath.task_token,
+                "session_id.$": "$.session_id",
+                "video_s3_key.$": "$.video_s3_key",
+                "proxy_s3_key.$": "$.ingest_result.proxy_s3_key"
+            }),
+            timeout=Duration.hours(1),  # Upper bound on full-recording job time
+            result_path="$.session_analysis"
+        )
+        
+        # Fetch every result page once and store it for window queries
+        store_session_analysis = tasks.LambdaInvoke(
+            scope, "StoreSessionAnalysis",
+            lambda_function=video_processor_lambda,
+            payload=sfn.TaskInput.from_object({
+                "action": "finalize_session",
+                "analysis.$": "$.session_analysis"
+            }),
+            result_path="$.session_analysis"
+        )
+        
+        # Answer each chunk of declared tests by interval queries over stored results
+        process_test_batch = tasks.LambdaInvoke(
+            scope, "AnalyzeTestWindows",
+            lambda_function=video_processor_lambda,
+            payload=sfn.TaskInput.from_object({
+                "action": "analyze_windows",
+                "session_id.$": "$.session_id",
+                "declared_tests.$": "$.tests",
+                "result_keys.$": "$.result_keys",
+                "video_s3_key.$": "$.video_s3_key",
+                "hls_playlist_key.$": "$.hls_playlist_key"
+            }),
+            result_path="$.video_result"
+        )
+        
+        process_all_tests = sfn.Map(
+            scope, "ProcessAllTests",
+            items_path="$.nlp_result.Payload.declared_test_batches",
+            parameters={
+                "session_id.$": "$.session_id",
+                "result_keys.$": "$.session_analysis.Payload.result_keys",
+                "video_s3_key.$": "$.video_s3_key",
+                "hls_playlist_key.$": "$.ingest_result.hls_playlist_key",
+                "tests.$": "$$.Map.Item.Value"
+            },
+            max_concurrency=10,  # Window queries are cheap; no Rekognition jobs
+            result_path="$.all_test_results"
+        )
+        process_all_tests.iterator(process_test_batch)
+        
+        video_analysis = start_session_analysis.next(store_session_analysis).next(process_all_tests)
+    
+    else:
+        # The video Lambda fetches the recording once for a chunk of tests,
+        # analyzes them on a thread pool and starts Rekognition jobs for the
+        # uncertain ones; the task then waits on its token until the
+        # Rekognition callback Lambda sees every job of the chunk finish
+        process_test_batch = tasks.LambdaInvoke(
+            scope, "ProcessTestBatch",
+            lambda_function=video_processor_lambda,
+            integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+            payload=sfn.TaskInput.from_object({
+                "action": "start_batch",
+                "task_token": sfn.JsonPath.task_token,
+                "session_id.$": "$.session_id",
+                "declared_tests.$": "$.tests",
+                "video_s3_key.$": "$.video_s3_key",
+                "hls_playlist_key.$": "$.hls_playlist_key",
+                "proxy_s3_key.$": "$.proxy_s3_key"
+            }),
+            timeout=Duration.minutes(45),  # Chunk analysis plus Rekognition job time
+            result_path="$.video_result"
+        )
+        
+        # Score the finished jobs and persist the chunk's observed actions
+        finalize_test_batch = tasks.LambdaInvoke(
+            scope, "FinalizeTestBatch",
+            lambda_function=video_processor_lambda,
+            payload=sfn.TaskInput.from_object({
+                "action": "finalize_batch",
+                "analysis.$": "$.video_result"
+            }),
+            result_path="$.video_result"
+        )
+        
+        # Map over chunks of detected tests (one recording fetch per chunk)
+        process_all_tests = sfn.Map(
+            scope, "ProcessAllTests",
+            items_path="$.nlp_result.Payload.declared_test_batches",
+            parameters={
+                "session_id.$": "$.session_id",
+                "video_s3_key.$": "$.video_s3_key",
+                "hls_playlist_key.$": "$.ingest_result.hls_playlist_key",
+                "proxy_s3_key.$": "$.ingest_result.proxy_s3_key",
+                "tests.$": "$$.Map.Item.Value"
+            },
+            max_concurrency=3,  # Process up to 3 chunks in parallel
+            result_path="$.all_test_results"
+        )
+        process_all_tests.iterator(process_test_batch.next(finalize_test_batch))
+        
+        video_analysis = process_all_tests
+    
+    # Step 2 (alongside transcription): one frame-bus decode of the recording
+    # for the scrub previews and the motion curve the local tier slices
+    generate_thumbnails = tasks.LambdaInvoke(
+        scope, "GenerateThumbnails",
         lambda_function=video_processor_lambda,
         payload=sfn.TaskInput.from_object({
-            "session_id.$": "$.session_id",
-            "declared_test.$": "$.test",
-            "video_s3_key.$": "$.video_s3_key"
-        }),
-        result_path="$.video_result"
-    )
-    
-    # Map over all detected tests
-    process_all_tests = sfn.Map(
-        scope, "ProcessAllTests",
-        items_path="$.nlp_result.Payload.declared_tests",
-        parameters={
+            "action": "thumbnails",
             "session_id.$": "$.session_id",
             "video_s3_key.$": "$.video_s3_key",
-            "test.$": "$$.Map.Item.Value"
-        },
-        max_concurrency=3,  # Process up to 3 tests in parallel
-        result_path="$.all_test_results"
+            "proxy_s3_key.$": "$.ingest_result.proxy_s3_key"
+        }),
+        result_path="$.thumbnail_result"
     )
     
-    process_all_tests.iterator(process_single_test)
-    
-    # Step 5: Generate Report
+    # Step 4: Generate Report
     generate_report = tasks.LambdaInvoke(
         scope, "GenerateReport",
         lambda_function=report_generator_lambda,
@@ -107,7 +285,7 @@ def create_cme_processing_workflow(
         result_path="$.report_result"
     )
     
-    # Step 6: Update Session Status to Completed
+    # Step 5: Update Session Status to Completed
     update_status = tasks.DynamoUpdateItem(
         scope, "UpdateSessionStatus",
         table=sessions_table,
@@ -135,7 +313,7 @@ def create_cme_processing_workflow(
         scope, "HandleError",
         parameters={
             "error": "Processing failed",
-            "cause.$": "$.cause"
+            "cause.$": "$.error.Cause"
         }
     )
     
@@ -165,12 +343,52 @@ def create_cme_processing_workflow(
         result_path="$.error"
     )
     
+    # Without a transcription there is nothing to analyze
+    for ingest_step in (ingest_recording, merge_renditions):
+        ingest_step.add_catch(
+            handle_error,
+            errors=["States.ALL"],
+            result_path="$.error"
+        )
+    
+    # Previews are optional; a failure must not block analysis or the report
+    skip_thumbnails = sfn.Pass(scope, "SkipThumbnails")
+    generate_thumbnails.add_catch(
+        skip_thumbnails,
+        errors=["States.ALL"],
+        result_path="$.thumbnail_error"
+    )
+    
+    # Transcription and NLP run while the recording is decoded; the state
+    # continues with the transcription branch's output (sessions and the
+    # analysis cache hold what the decode produced)
+    decode_branch = sfn.Choice(scope, "DecodeRecording?").when(
+        sfn.Condition.boolean_equals("$.ingest_result.analyze_video", True),
+        generate_thumbnails
+    ).otherwise(sfn.Pass(scope, "SkipRecordingDecode"))
+    prepare_session = sfn.Parallel(scope, "TranscribeAndDecode", output_path="$[0]")
+    prepare_session.branch(wait_for_transcription.next(run_nlp_analysis))
+    prepare_session.branch(decode_branch)
+    
+    # Audio-only sessions go straight from NLP to the report
+    skip_video_analysis = sfn.Pass(scope, "SkipVideoAnalysis")
+    check_video = (
+        sfn.Choice(scope, "AnalyzeVideo?")
+        .when(
+            sfn.Condition.boolean_equals("$.ingest_result.analyze_video", True),
+            video_analysis.next(generate_report)
+        )
+        .otherwise(skip_video_analysis)
+    )
+    skip_video_analysis.next(generate_report)
+    generate_report.next(update_status)
+    
     definition = (
-        wait_for_transcription
-        .next(run_nlp_analysis)
-        .next(process_all_tests)
-        .next(generate_report)
-        .next(update_status)
+        ingest_recording
+        .next(prepare_renditions)
+        .next(merge_renditions)
+        .next(prepare_session)
+        .next(check_video)
     )
     
     # Create the state machine